@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Microbenchmarks for the pricing and parsing hot paths.
+
+Each benchmark runs over a synthetic catalog (``synthetic_catalog.py``) of
+1k, 10k and 100k variants and keeps the best of ``--repeat`` timings.  Runs
+are appended to a JSON history (``BENCH_HISTORY``, default
+``benchmark_history.json`` next to this file).  A run fails with exit code 1
+when a benchmark is slower than the median of the last ``--window`` recorded
+runs by more than ``--tolerance`` (``BENCH_TOLERANCE``, default 25%); failing
+runs are not recorded unless ``--accept`` is given.  Every run also times a
+fixed calibration loop, and the baseline is scaled by it, so a machine that
+is busier or slower than usual does not read as a regression.
+
+    python scripts/benchmarks.py
+    python scripts/benchmarks.py --sizes 1000 10000 --only round_to_tidy
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from scripts import pricing, synthetic_catalog
+
+SIZES = (1000, 10000, 100000)
+HISTORY_FILE = os.path.join(os.path.dirname(__file__), "benchmark_history.json")
+SURCHARGES_FILE = os.path.join(os.path.dirname(__file__), "..", "tempo solution", "variant_prices.json")
+# Differences below this many seconds are timer noise, whatever the ratio.
+NOISE_FLOOR = 0.0005
+
+
+class _Page:
+    """A ``products.json`` response decoded on demand, like ``requests``."""
+
+    status_code = 200
+
+    def __init__(self, text, next_info):
+        self.text = text
+        self.headers = {"Link": f'<https://bench/products.json?page_info={next_info}>; rel="next"'} if next_info else {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class _PagedSession:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get(self, url, params=None, **kwargs):
+        index = int((params or {}).get("page_info") or 0)
+        next_info = str(index + 1) if index + 1 < len(self.pages) else None
+        return _Page(self.pages[index], next_info)
+
+
+def _round_to_tidy(products, workdir):
+    prices = [float(row["original_price"]) * 1.075 for row in synthetic_catalog.backup_rows(products)]
+    round_to_tidy = pricing.round_to_tidy
+
+    def run():
+        for price in prices:
+            round_to_tidy(price)
+    return run
+
+
+def _fetch_all_variants(products, workdir):
+    from scripts import update_prices_shopify
+
+    session = _PagedSession(synthetic_catalog.rest_pages(products))
+    return lambda: update_prices_shopify.fetch_all_variants(session, "https://bench/admin/api")
+
+
+def _percentage_groups(products, workdir):
+    rows = synthetic_catalog.backup_rows(products)
+
+    def run():
+        updates, _ = pricing.percentage_updates(rows, 7.5)
+        pricing.chunk_groups(updates)
+    return run
+
+
+def _reset_groups(products, workdir):
+    rows = synthetic_catalog.backup_rows(products)
+    return lambda: pricing.chunk_groups(pricing.reset_updates(rows))
+
+
+def _ensemble_surcharges(products, workdir):
+    with open(SURCHARGES_FILE, encoding="utf-8") as f:
+        surcharges = json.load(f)
+    nodes = [synthetic_catalog.variant_nodes(p) for p in products]
+
+    def run():
+        for product_nodes in nodes:
+            pricing.ensemble_updates(product_nodes, surcharges)
+    return run
+
+
+def _backup_save(products, workdir):
+    rows = synthetic_catalog.backup_rows(products)
+    path = os.path.join(workdir, "shopify_backup.json")
+    return lambda: pricing.save_backup(path, rows)
+
+
+def _backup_load(products, workdir):
+    path = os.path.join(workdir, "shopify_backup.json")
+    pricing.save_backup(path, synthetic_catalog.backup_rows(products))
+    return lambda: pricing.load_backup(path)
+
+
+# name -> setup(products, workdir) returning the callable to time.
+BENCHMARKS = {
+    "round_to_tidy": _round_to_tidy,
+    "fetch_all_variants": _fetch_all_variants,
+    "percentage_groups": _percentage_groups,
+    "reset_groups": _reset_groups,
+    "ensemble_surcharges": _ensemble_surcharges,
+    "backup_save": _backup_save,
+    "backup_load": _backup_load,
+}
+
+
+def history_path():
+    return os.getenv("BENCH_HISTORY", HISTORY_FILE)
+
+
+def _calibration_loop():
+    total = 0
+    for i in range(200000):
+        total += i * i
+    return total
+
+
+def best_of(func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(sizes=SIZES, repeat=5, only=None):
+    """Return ``{"<benchmark>[<size>]": best seconds}``."""
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            products = synthetic_catalog.generate(size)
+            for name, setup in BENCHMARKS.items():
+                if only and name not in only:
+                    continue
+                results[f"{name}[{size}]"] = best_of(setup(products, workdir), repeat)
+    return results
+
+
+def load_history(path=None):
+    path = path or history_path()
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_history(history, path=None):
+    path = path or history_path()
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(history, f, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def calibrate(repeat=5):
+    """Seconds taken by a fixed pure-Python loop on this machine right now."""
+    return best_of(_calibration_loop, repeat)
+
+
+def baseline(history, window=5, calibration=None):
+    """Median of each benchmark over the last ``window`` runs that timed it.
+
+    With ``calibration``, each recorded time is first rescaled by the ratio
+    of ``calibration`` to the calibration of its own run.
+    """
+    values = {}
+    for entry in reversed(history):
+        scale = 1.0
+        if calibration and entry.get("calibration"):
+            scale = calibration / entry["calibration"]
+        for key, seconds in entry.get("results", {}).items():
+            if len(values.setdefault(key, [])) < window:
+                values[key].append(seconds * scale)
+    return {key: statistics.median(v) for key, v in values.items()}
+
+
+def regressions(results, history, tolerance=0.25, window=5, calibration=None):
+    """Return ``[(key, baseline, current)]`` for results slower than allowed."""
+    base = baseline(history, window, calibration)
+    slow = []
+    for key, current in results.items():
+        reference = base.get(key)
+        if reference is None:
+            continue
+        if current - reference > max(reference * tolerance, NOISE_FLOOR):
+            slow.append((key, reference, current))
+    return slow
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS))
+    p.add_argument("--tolerance", type=float, default=float(os.getenv("BENCH_TOLERANCE", "0.25")),
+                   help="Allowed slowdown against the baseline (0.25 = 25%%)")
+    p.add_argument("--window", type=int, default=5, help="Recorded runs the baseline is taken from")
+    p.add_argument("--history", default=None, help="History file (default: BENCH_HISTORY)")
+    p.add_argument("--accept", action="store_true", help="Record this run even if it regressed")
+    p.add_argument("--no-save", action="store_true", help="Compare without recording the run")
+    args = p.parse_args(argv)
+
+    history = load_history(args.history)
+    calibration = calibrate(args.repeat)
+    results = run(args.sizes, args.repeat, args.only)
+    base = baseline(history, args.window, calibration)
+    for key, seconds in results.items():
+        reference = base.get(key)
+        change = f"{(seconds / reference - 1) * 100:+6.1f}%" if reference else "    new"
+        print(f"{key:32} {seconds * 1000:10.2f} ms  {change}")
+
+    slow = regressions(results, history, args.tolerance, args.window, calibration)
+    for key, reference, current in slow:
+        print(f"[ERROR] {key} regressed: {reference * 1000:.2f} ms -> {current * 1000:.2f} ms")
+
+    if not args.no_save and (not slow or args.accept):
+        history.append({
+            "at": time.time(),
+            "python": platform.python_version(),
+            "repeat": args.repeat,
+            "calibration": calibration,
+            "results": results,
+        })
+        save_history(history, args.history)
+    if slow:
+        return 1
+    print(f"[OK] {len(results)} benchmarks within {args.tolerance:.0%} of the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
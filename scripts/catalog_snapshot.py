@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Export the catalog to a local snapshot file.
+
+The snapshot holds every product with its tags, vendor, collection handles,
+``custom.base_price`` metafield and variants (id, SKU, options, price,
+compare-at price).  Other
+tools read it instead of crawling Shopify each time:
+
+    python scripts/catalog_snapshot.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dotenv import load_dotenv
+
+from scripts import shopify_client
+
+load_dotenv()
+
+SNAPSHOT_FILE = os.path.join(os.path.dirname(__file__), "catalog_snapshot.json")
+
+BASE_PRICE_QUERY = """
+query BasePrices($ids: [ID!]!) {
+  nodes(ids: $ids) {
+    ... on Product {
+      id
+      metafield(namespace: "custom", key: "base_price") { value }
+      collections(first: 25) { nodes { handle } }
+    }
+  }
+}
+"""
+# Products per base price query.  Shopify's static estimate charges each one
+# 1 (product) + 1 (metafield) + 2 + 25 (collections) = 29 points, so 30 stay
+# under the 1000-point limit of a single query.
+BASE_PRICE_QUERY_IDS = 30
+
+
+def snapshot_path():
+    return os.getenv("CATALOG_SNAPSHOT", SNAPSHOT_FILE)
+
+
+def _split_tags(tags):
+    if isinstance(tags, list):
+        return [t.strip() for t in tags if t.strip()]
+    return [t.strip() for t in (tags or "").split(",") if t.strip()]
+
+
+def product_from_rest(prod):
+    """Convert a REST ``product`` resource to the snapshot layout."""
+    option_names = [o.get("name") for o in prod.get("options", [])]
+    variants = []
+    for v in prod.get("variants", []):
+        values = [v.get("option1"), v.get("option2"), v.get("option3")]
+        variants.append({
+            "id": int(v["id"]),
+            "title": v.get("title", ""),
+            "sku": v.get("sku") or "",
+            "price": v.get("price"),
+            "compare_at_price": v.get("compare_at_price"),
+            "options": {
+                name: value
+                for name, value in zip(option_names, values)
+                if name and value
+            },
+        })
+    return {
+        "id": int(prod["id"]),
+        "title": prod.get("title", ""),
+        "handle": prod.get("handle", ""),
+        "vendor": prod.get("vendor", ""),
+        "product_type": prod.get("product_type", ""),
+        "tags": _split_tags(prod.get("tags")),
+        "base_price": None,
+        "collections": [],
+        "variants": variants,
+    }
+
+
+def _fill_base_prices(session, products):
+    """Add the base price and collections REST does not return."""
+    by_id = {p["id"]: p for p in products}
+    for i in range(0, len(products), BASE_PRICE_QUERY_IDS):
+        ids = [f"gid://shopify/Product/{p['id']}" for p in products[i:i + BASE_PRICE_QUERY_IDS]]
+        resp = shopify_client.graphql_post(session, BASE_PRICE_QUERY, {"ids": ids})
+        for node in shopify_client.graphql_data(resp).get("nodes") or []:
+            if not node:
+                continue
+            product = by_id.get(int(node["id"].rsplit("/", 1)[-1]))
+            if product is None:
+                continue
+            if node.get("metafield"):
+                product["base_price"] = node["metafield"].get("value")
+            product["collections"] = [c["handle"] for c in (node.get("collections") or {}).get("nodes", [])]
+
+
+def fetch_catalog(session):
+    """Yield every product in snapshot layout, one REST page at a time."""
+    page_info = None
+    while True:
+        params = {"limit": 250}
+        if page_info:
+            params["page_info"] = page_info
+        resp = shopify_client.rest_get(session, "products.json", params)
+        resp.raise_for_status()
+        page = [product_from_rest(p) for p in resp.json().get("products", [])]
+        if page:
+            _fill_base_prices(session, page)
+        yield from page
+        page_info = shopify_client.next_page_info(resp)
+        if not page_info:
+            break
+
+
+def save_snapshot(products, path=None):
+    """Atomically write ``products`` to the snapshot file."""
+    path = path or snapshot_path()
+    payload = {
+        "exported_at": time.time(),
+        "shop": os.getenv("SHOP_DOMAIN"),
+        "products": products,
+    }
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
+
+
+def load_snapshot(path=None):
+    """Return the snapshot's product list, or ``None`` if there is none."""
+    path = path or snapshot_path()
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("products", [])
+
+
+def main():
+    session = shopify_client.get_session()
+    products = []
+    for prod in fetch_catalog(session):
+        products.append(prod)
+        if len(products) % 250 == 0:
+            print(f"[PROGRESS] exported {len(products)} products")
+    path = save_snapshot(products)
+    variants = sum(len(p["variants"]) for p in products)
+    print(f"[DONE] Exported {len(products)} products / {variants} variants to {path}")
+
+
+if __name__ == "__main__":
+    main()
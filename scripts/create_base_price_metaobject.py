@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 import os
+import sys
 import time
 import requests
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts import shopify_client
+
 load_dotenv()
 
 TOKEN = os.getenv("API_TOKEN")
@@ -12,7 +16,7 @@ API_VERSION = os.getenv("API_VERSION", "2024-04")
 
 
 def graphql_request(session, query, variables=None):
-    url = f"https://{DOMAIN}/admin/api/{API_VERSION}/graphql.json"
+    url = f"{shopify_client.admin_url(DOMAIN)}/graphql.json"
     payload = {"query": query, "variables": variables or {}}
     while True:
         resp = session.post(url, json=payload, timeout=30)
@@ -0,0 +1,121 @@
+"""Typed progress events for jobs streamed to the web interface.
+
+Scripts keep printing their log lines.  When ``JOB_EVENTS=1`` (the web
+app's job runner sets it) they also print machine-readable events, one JSON
+object per line behind ``@event ``::
+
+    @event {"type": "progress", "done": 120, "total": 2000, "ok": 118, "failed": 2}
+
+Types are ``phase`` (``name``, ``total``), ``progress`` (``done``,
+``total``, ``ok``, ``failed``), ``ok`` and ``error`` (``message``) and
+``summary`` (the final counts and ``seconds``).  ``webapp.routes`` sends
+them as named SSE events, adding throughput and ETA to ``progress``.
+"""
+
+import json
+import os
+import threading
+import time
+
+PREFIX = "@event "
+TYPES = ("phase", "progress", "ok", "error", "summary")
+# Minimum seconds between two progress events of a tracker.
+PROGRESS_INTERVAL = 0.25
+
+
+def enabled():
+    return os.getenv("JOB_EVENTS") == "1"
+
+
+def emit(type_, **fields):
+    if enabled():
+        print(PREFIX + json.dumps({"type": type_, **fields}), flush=True)
+
+
+def phase(name, total=None):
+    emit("phase", name=name, total=total)
+
+
+def ok(message):
+    emit("ok", message=message)
+
+
+def error(message):
+    emit("error", message=message)
+
+
+class Progress:
+    """Count finished items and report them as ``progress`` events.
+
+    ``total`` may be ``None`` when it is not known up front.  Safe to share
+    between threads.
+    """
+
+    def __init__(self, total=None, name=None):
+        self.total = total
+        self.done = self.ok = self.failed = 0
+        self.started = time.monotonic()
+        self._last = None
+        self._lock = threading.Lock()
+        if name:
+            phase(name, total)
+
+    def advance(self, ok=0, failed=0):
+        with self._lock:
+            self.ok += ok
+            self.failed += failed
+            self.done += ok + failed
+            now = time.monotonic()
+            finished = self.total is not None and self.done >= self.total
+            if not finished and self._last is not None and now - self._last < PROGRESS_INTERVAL:
+                return
+            self._last = now
+            fields = self._counts()
+        emit("progress", **fields)
+
+    def _counts(self):
+        return {"done": self.done, "total": self.total, "ok": self.ok, "failed": self.failed}
+
+    def summary(self, **extra):
+        with self._lock:
+            fields = self._counts()
+        emit("summary", seconds=round(time.monotonic() - self.started, 2), **fields, **extra)
+
+
+def parse(line):
+    """Return the event of an ``@event`` line, or ``None`` for log text."""
+    if not line.startswith(PREFIX):
+        return None
+    try:
+        event = json.loads(line[len(PREFIX):])
+    except ValueError:
+        return None
+    if not isinstance(event, dict) or event.get("type") not in TYPES:
+        return None
+    return event
+
+
+class Meter:
+    """Add ``rate`` (items per second) and ``eta`` (seconds) to progress events.
+
+    Rates are measured from the latest ``phase`` event, or from the first
+    event seen when the script announces no phase.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started = None
+
+    def annotate(self, event):
+        now = self.clock()
+        if event["type"] == "phase" or self.started is None:
+            self.started = now
+        if event["type"] != "progress":
+            return event
+        elapsed = now - self.started
+        done, total = event.get("done") or 0, event.get("total")
+        rate = done / elapsed if elapsed > 0 else None
+        eta = None
+        if rate and total is not None:
+            eta = round(max(0, total - done) / rate, 1)
+        return dict(event, rate=round(rate, 1) if rate else None, eta=eta)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Export current, base and planned prices from the catalog snapshot.
+
+One row per variant: product, variant, options, current and compare-at
+price, the product's ``custom.base_price`` and, with ``--plan``, the price
+the percentage, ensemble or chain surcharge job would set (the rules of
+``scripts/preview.py``).  Rows are written as they are produced, so the
+output is never held in memory:
+
+    python scripts/export_prices.py --out prices.csv
+    python scripts/export_prices.py --format parquet --plan percentage --percent 5 --out prices.parquet
+
+Parquet needs the optional ``pyarrow`` package; it is written in row
+groups of ``PARQUET_ROW_GROUP`` rows.  The web app streams the CSV straight
+to the browser (``/export/prices.csv``) and runs this script as a job for
+Parquet files.
+"""
+
+import argparse
+import csv
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from scripts import events, preview
+
+COLUMNS = (
+    "product_id", "product", "handle", "vendor", "tags",
+    "variant_id", "variant", "sku", "options",
+    "price", "compare_at_price", "base_price", "planned_price",
+)
+FORMATS = ("csv", "parquet")
+# Rows per chunk sent to the HTTP response.
+CSV_CHUNK = 500
+PARQUET_ROW_GROUP = 10000
+
+
+def _price(value):
+    return None if value in (None, "") else float(value)
+
+
+def planned_prices(plan, percent=None):
+    """``{variant_id: new price}`` of a job kind, or ``{}`` without a plan."""
+    if not plan:
+        return {}
+    rows, _ = preview.diff(plan, percent)
+    return {r["variant_id"]: r["new"] for r in rows}
+
+
+def load_products():
+    products = preview.snapshot_products()
+    if products is None:
+        raise ValueError("No catalog snapshot; run scripts/catalog_snapshot.py first")
+    return products
+
+
+def rows(products, planned=None, progress=None):
+    """Yield one export row (a tuple in ``COLUMNS`` order) per variant."""
+    planned = planned or {}
+    for product in products:
+        tags = ", ".join(product.get("tags", []))
+        base_price = _price(product.get("base_price"))
+        for v in product.get("variants", []):
+            yield (
+                product["id"], product.get("title", ""), product.get("handle", ""),
+                product.get("vendor", ""), tags,
+                v["id"], v.get("title", ""), v.get("sku", ""),
+                "; ".join(f"{name}: {value}" for name, value in v.get("options", {}).items()),
+                _price(v.get("price")), _price(v.get("compare_at_price")), base_price,
+                planned.get(v["id"]),
+            )
+        if progress:
+            progress.advance(ok=1)
+
+
+def iter_csv(rows_iter, chunk=CSV_CHUNK):
+    """Yield the CSV text of ``rows_iter`` (header first) in chunks."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(COLUMNS)
+    for i, row in enumerate(rows_iter, 1):
+        writer.writerow(row)
+        if i % chunk == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+
+def write_parquet(rows_iter, path, row_group=PARQUET_ROW_GROUP):
+    """Write ``rows_iter`` to ``path`` one row group at a time; returns the row count."""
+    pa = _pyarrow()
+    schema = pa.schema([
+        ("product_id", pa.int64()), ("product", pa.string()), ("handle", pa.string()),
+        ("vendor", pa.string()), ("tags", pa.string()),
+        ("variant_id", pa.int64()), ("variant", pa.string()), ("sku", pa.string()),
+        ("options", pa.string()),
+        ("price", pa.float64()), ("compare_at_price", pa.float64()),
+        ("base_price", pa.float64()), ("planned_price", pa.float64()),
+    ])
+    count = 0
+    batch = []
+    with pa.parquet.ParquetWriter(path, schema) as writer:
+        for row in rows_iter:
+            batch.append(row)
+            if len(batch) == row_group:
+                writer.write_table(pa.Table.from_pylist([dict(zip(COLUMNS, r)) for r in batch], schema))
+                count += len(batch)
+                batch = []
+        if batch or not count:
+            writer.write_table(pa.Table.from_pylist([dict(zip(COLUMNS, r)) for r in batch], schema))
+            count += len(batch)
+    return count
+
+
+def write_csv(rows_iter, path):
+    """Write ``rows_iter`` to ``path`` as CSV; returns the row count."""
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows_iter:
+            count += 1
+            yield row
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for chunk in iter_csv(counted()):
+            f.write(chunk)
+    return count
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Export prices from the catalog snapshot")
+    p.add_argument("--format", choices=FORMATS, default="csv")
+    p.add_argument("--out", help="Output file (default: prices.<format> in JOB_DIR or here)")
+    p.add_argument("--plan", choices=preview.KINDS, help="Add the price this job would set")
+    p.add_argument("--percent", type=float, help="Percentage for --plan percentage")
+    args = p.parse_args(argv)
+
+    out = args.out or os.path.join(os.getenv("JOB_DIR") or ".", f"prices.{args.format}")
+    try:
+        products = load_products()
+        planned = planned_prices(args.plan, args.percent)
+        progress = events.Progress(len(products), "export")
+        produced = rows(products, planned, progress)
+        if args.format == "parquet":
+            count = write_parquet(produced, out)
+        else:
+            count = write_csv(produced, out)
+    except (ValueError, RuntimeError) as exc:
+        print(f"[ERROR] {exc}")
+        events.error(str(exc))
+        return 1
+    progress.summary(rows=count)
+    print(f"[DONE] Wrote {count} variants to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,930 @@
+#!/usr/bin/env python3
+r"""Local stand-in for the Shopify Admin API.
+
+It serves an in-memory catalog over the calls the scripts and the webhook
+path make:
+
+ • REST ``products.json`` (with ``Link`` header pagination),
+   ``products/<id>.json``, ``products/<id>/metafields.json`` and
+   ``webhooks.json``
+ • GraphQL ``products``, ``nodes``/``product``, ``productsCount``,
+   ``productVariantsBulkUpdate`` (aliased or not), ``metafieldsSet``,
+   ``metaobjects``/``metaobjectCreate``/``metaobjectDefinitionCreate`` and
+   bulk mutations (``stagedUploadsCreate``, the staged upload itself,
+   ``bulkOperationRunMutation``, polling and the result download) and bulk
+   queries (``bulkOperationRunQuery``, answered with every product's tags and
+   base price followed by its variants)
+
+Rate limits follow Shopify's leaky buckets: GraphQL calls spend cost points
+(reported in ``extensions.cost`` with ``throttleStatus``) and get a
+``THROTTLED`` error when the bucket is empty; REST calls get ``429`` with
+``Retry-After`` and ``X-Shopify-Shop-Api-Call-Limit``.  Query cost is the
+number of objects returned (at most a full bucket) rather than Shopify's
+static estimate.  Latency and faults (``500`` responses, dropped
+connections) can be injected.
+
+Point anything at it with ``SHOP_DOMAIN=http://127.0.0.1:<port>``:
+
+    python scripts/fake_shopify.py --port 8081 --products 500 --variants 4
+    python scripts/fake_shopify.py --synthetic 10000 --latency 0.05 \
+        --run scripts/update_prices_shopify.py --percent 5
+
+``--run`` serves a throwaway stand-in for one script and prints its wall
+time and request counts.  ``GET /_stats`` returns the same counters plus the
+applied price changes, ``POST /_reset`` clears them.
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from scripts import synthetic_catalog, tracing
+from scripts.catalog_snapshot import load_snapshot
+
+ALIAS_RE = re.compile(r"(\w+)\s*:\s*productVariantsBulkUpdate\s*\(\s*productId:\s*\$(\w+)\s*,\s*variants:\s*\$(\w+)")
+PLAIN_BULK_RE = re.compile(r"productVariantsBulkUpdate\s*\(\s*productId:\s*\$(\w+)\s*,\s*variants:\s*\$(\w+)")
+ADMIN_RE = re.compile(r"^/admin/api/[^/]+/(.+)$")
+PRODUCTS_RE = re.compile(r"\bproducts\s*\(([^)]*)\)")
+FIRST_RE = re.compile(r"first:\s*(?:(\d+)|\$(\w+))")
+FILTER_RE = re.compile(r"query:\s*(?:\"([^\"]*)\"|\$(\w+))")
+VARIABLE_RE = re.compile(r"(\w+)\s*:\s*\$(\w+)")
+
+# Requested cost of a mutation field.
+MUTATION_COST = 10
+# Standard plan limits.
+GRAPHQL_BUCKET = 1000
+GRAPHQL_RESTORE_RATE = 50.0
+REST_BUCKET = 40
+REST_LEAK_RATE = 2.0
+MAX_METAFIELDS = 25
+REST_PAGE_LIMIT = 250
+
+
+def _legacy_id(gid):
+    return int(str(gid).rsplit("/", 1)[-1])
+
+
+def _encode_cursor(offset):
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    if not cursor:
+        return 0
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        return int(base64.urlsafe_b64decode(padded).decode().split(":", 1)[1])
+    except (ValueError, IndexError):
+        return 0
+
+
+class LeakyBucket:
+    """Points that refill at ``rate`` per second up to ``size``."""
+
+    def __init__(self, size, rate):
+        self.size = float(size)
+        self.rate = float(rate)
+        self.points = float(size)
+        self.at = time.monotonic()
+
+    def available(self):
+        now = time.monotonic()
+        self.points = min(self.size, self.points + (now - self.at) * self.rate)
+        self.at = now
+        return self.points
+
+    def take(self, cost):
+        """Spend ``cost`` points; ``False`` (and nothing spent) if short."""
+        if self.available() < cost:
+            return False
+        self.points -= cost
+        return True
+
+
+class FakeShop:
+    """In-memory catalog plus the bookkeeping exposed on ``/_stats``.
+
+    ``products`` maps each product id to ``{variant_id: variant}``; a variant
+    holds ``price`` and ``compareAtPrice``.  Pass ``catalog`` (products in the
+    snapshot layout, e.g. from ``synthetic_catalog.generate``) to seed it
+    with titles, tags, options and base prices instead of plain products.
+    """
+
+    def __init__(self, products=100, variants=4, price="100.00", catalog=None,
+                 bucket=GRAPHQL_BUCKET, restore_rate=GRAPHQL_RESTORE_RATE,
+                 rest_bucket=REST_BUCKET, rest_leak_rate=REST_LEAK_RATE,
+                 latency=0.0, jitter=0.0, fault_rate=0.0, faults=("500", "drop"),
+                 bulk_seconds=0.0, seed=None):
+        self.lock = threading.Lock()
+        self.products = {}
+        self.meta = {}
+        self.metafields = {}
+        self.metaobjects = {}
+        self.webhooks = []
+        self.staged = {}
+        self.bulk_operations = {}
+        self.graphql_bucket = LeakyBucket(bucket, restore_rate)
+        self.rest_bucket = LeakyBucket(rest_bucket, rest_leak_rate)
+        self.latency = latency
+        self.jitter = jitter
+        self.fault_rate = fault_rate
+        self.faults = tuple(faults)
+        self.bulk_seconds = bulk_seconds
+        self.rng = random.Random(seed)
+        self._ids = 0
+        if catalog is None:
+            catalog = [
+                {
+                    "id": p, "title": f"Product {p}", "handle": f"product-{p}", "vendor": "",
+                    "product_type": "", "tags": [], "base_price": None,
+                    "variants": [
+                        {"id": p * 1000 + v, "title": f"Variant {v}", "sku": "", "price": price,
+                         "compare_at_price": None, "options": {"Title": f"Variant {v}"}}
+                        for v in range(1, variants + 1)
+                    ],
+                }
+                for p in range(1, products + 1)
+            ]
+        for product in catalog:
+            self.add_product(product)
+        self.reset_stats()
+
+    def add_product(self, product):
+        """Add a product in the catalog snapshot layout."""
+        pid = int(product["id"])
+        variants = product.get("variants", [])
+        self.meta[pid] = {
+            "title": product.get("title", ""),
+            "handle": product.get("handle", ""),
+            "vendor": product.get("vendor", ""),
+            "product_type": product.get("product_type", ""),
+            "tags": list(product.get("tags", [])),
+            "collections": list(product.get("collections", [])),
+            "options": list(variants[0].get("options", {})) if variants else [],
+        }
+        self.products[pid] = {
+            int(v["id"]): {
+                "price": v.get("price"),
+                "compareAtPrice": v.get("compare_at_price"),
+                "title": v.get("title", ""),
+                "sku": v.get("sku", ""),
+                "options": dict(v.get("options", {})),
+            }
+            for v in variants
+        }
+        self.metafields[pid] = {}
+        if product.get("base_price") is not None:
+            self._set_metafield(pid, "custom", "base_price", "number_decimal", str(product["base_price"]))
+
+    def _next_id(self):
+        self._ids += 1
+        return self._ids
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = {"graphql": 0, "rest": 0}
+            self.operations = {}
+            self.throttled = {"graphql": 0, "rest": 0}
+            self.faults_injected = 0
+            self.cost_points = 0
+            self.mutations = 0
+            self.variant_updates = 0
+            self.applied = []
+            self.first_request = None
+            self.last_request = None
+
+    def stats(self):
+        with self.lock:
+            wall = 0.0
+            if self.first_request is not None:
+                wall = self.last_request - self.first_request
+            return {
+                "requests": dict(self.requests),
+                "operations": dict(self.operations),
+                "throttled": dict(self.throttled),
+                "faults": self.faults_injected,
+                "cost_points": self.cost_points,
+                "wall_seconds": round(wall, 3),
+                "mutations": self.mutations,
+                "variant_updates": self.variant_updates,
+                "applied": list(self.applied),
+            }
+
+    def _count(self, api, operation):
+        now = time.time()
+        with self.lock:
+            self.requests[api] += 1
+            self.operations[operation] = self.operations.get(operation, 0) + 1
+            if self.first_request is None:
+                self.first_request = now
+            self.last_request = now
+
+    def finish_request(self):
+        with self.lock:
+            self.last_request = time.time()
+
+    def delay(self):
+        """Sleep for the injected latency."""
+        if self.latency or self.jitter:
+            with self.lock:
+                seconds = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+            time.sleep(max(0.0, seconds))
+
+    def fault(self):
+        """Return the fault to inject into this request (``"500"``, ``"drop"``) or ``None``."""
+        if not self.fault_rate:
+            return None
+        with self.lock:
+            if self.rng.random() >= self.fault_rate:
+                return None
+            self.faults_injected += 1
+            return self.rng.choice(self.faults)
+
+    # -- GraphQL -------------------------------------------------------
+    def graphql(self, query, variables, base_url=""):
+        """Answer one GraphQL request, charging its cost to the bucket."""
+        self._count("graphql", tracing.graphql_name(query))
+        is_mutation = query.lstrip().startswith("mutation")
+        if is_mutation:
+            requested = MUTATION_COST * max(1, len(ALIAS_RE.findall(query)))
+            with self.lock:
+                allowed = self.graphql_bucket.take(requested)
+            if not allowed:
+                return self._throttled(requested)
+            payload = self.execute(query, variables, base_url)
+        else:
+            payload = self.execute(query, variables, base_url)
+            requested = min(1 + self._objects(payload.get("data")), int(self.graphql_bucket.size))
+            with self.lock:
+                allowed = self.graphql_bucket.take(requested)
+            if not allowed:
+                return self._throttled(requested)
+        with self.lock:
+            self.cost_points += requested
+            available = self.graphql_bucket.available()
+        payload["extensions"] = {"cost": {
+            "requestedQueryCost": requested,
+            "actualQueryCost": requested,
+            "throttleStatus": self._throttle_status(available),
+        }}
+        return payload
+
+    def _throttle_status(self, available):
+        return {
+            "maximumAvailable": self.graphql_bucket.size,
+            "currentlyAvailable": int(available),
+            "restoreRate": self.graphql_bucket.rate,
+        }
+
+    def _throttled(self, requested):
+        with self.lock:
+            self.throttled["graphql"] += 1
+            available = self.graphql_bucket.available()
+        return {
+            "errors": [{"message": "Throttled", "extensions": {"code": "THROTTLED"}}],
+            "extensions": {"cost": {
+                "requestedQueryCost": requested,
+                "actualQueryCost": None,
+                "throttleStatus": self._throttle_status(available),
+            }},
+        }
+
+    def _objects(self, node):
+        if isinstance(node, list):
+            return sum(self._objects(n) for n in node)
+        if isinstance(node, dict):
+            own = 1 if "id" in node else 0
+            return own + sum(self._objects(v) for k, v in node.items() if k != "edges")
+        return 0
+
+    def execute(self, query, variables, base_url=""):
+        """Run ``query`` against the catalog without rate limiting."""
+        if "stagedUploadsCreate" in query:
+            return self._staged_upload(base_url)
+        if "bulkOperationRunMutation" in query:
+            return self._run_bulk(variables, base_url)
+        if "bulkOperationRunQuery" in query:
+            return self._run_bulk_query(base_url)
+        if "productVariantsBulkUpdate" in query:
+            return self._bulk_update(query, variables)
+        if "metafieldsSet" in query:
+            return self._metafields_set(query, variables)
+        if "metaobjectDefinitionCreate" in query:
+            with self.lock:
+                definition = f"gid://shopify/MetaobjectDefinition/{self._next_id()}"
+            return {"data": {"metaobjectDefinitionCreate": {
+                "metaobjectDefinition": {"id": definition},
+                "userErrors": [],
+            }}}
+        if "metaobjectCreate" in query:
+            return self._metaobject_create(query, variables)
+
+        data = {}
+        if "productsCount" in query:
+            match = FILTER_RE.search(query[query.index("productsCount"):])
+            data["productsCount"] = {"count": len(self._matching(self._filter(match, variables)))}
+        if "productVariantsCount" in query:
+            with self.lock:
+                data["productVariantsCount"] = {"count": sum(len(v) for v in self.products.values())}
+        match = PRODUCTS_RE.search(query)
+        if match:
+            data["products"] = self._products_page(match.group(1), variables)
+        if re.search(r"\bmetaobjects\s*\(", query):
+            data["metaobjects"] = self._metaobjects(variables)
+        if "nodes(ids" in query:
+            data["nodes"] = [self._node(gid) for gid in variables.get("ids", [])]
+        elif re.search(r"\bnode\s*\(\s*id", query):
+            data["node"] = self._node(variables.get("id"))
+        if "product(id" in query:
+            data["product"] = self._product_node(variables.get("id"))
+        if re.search(r"\bshop\s*\{", query):
+            data["shop"] = {"id": "gid://shopify/Shop/1", "name": "Fake Shopify"}
+        if not data:
+            return {"errors": [{"message": "Unsupported operation for the stand-in"}]}
+        return {"data": data}
+
+    def _filter(self, match, variables):
+        if not match:
+            return None
+        return match.group(1) if match.group(1) is not None else variables.get(match.group(2))
+
+    def _matching(self, search):
+        """Product ids matching a ``tag:<name>`` search (others match all)."""
+        with self.lock:
+            ids = sorted(self.products)
+            if search and search.startswith("tag:"):
+                tag = search[4:].strip().strip("'\"").lower()
+                ids = [pid for pid in ids if tag in [t.lower() for t in self.meta[pid]["tags"]]]
+            return ids
+
+    def _products_page(self, args, variables):
+        first = FIRST_RE.search(args)
+        limit = 50
+        if first:
+            limit = int(first.group(1) or variables.get(first.group(2)) or 50)
+        after = None
+        for name, var in VARIABLE_RE.findall(args):
+            if name == "after":
+                after = variables.get(var)
+        ids = self._matching(self._filter(FILTER_RE.search(args), variables))
+        start = _decode_cursor(after)
+        page = ids[start:start + limit]
+        edges = [
+            {"cursor": _encode_cursor(start + i + 1), "node": self._product_node(f"gid://shopify/Product/{pid}")}
+            for i, pid in enumerate(page)
+        ]
+        return {
+            "edges": edges,
+            "nodes": [e["node"] for e in edges],
+            "pageInfo": {
+                "hasNextPage": start + limit < len(ids),
+                "endCursor": edges[-1]["cursor"] if edges else None,
+            },
+        }
+
+    def _node(self, gid):
+        if gid and "/BulkOperation/" in str(gid):
+            return self._bulk_node(gid)
+        return self._product_node(gid)
+
+    def _product_node(self, gid):
+        with self.lock:
+            pid = _legacy_id(gid)
+            variants = self.products.get(pid)
+            if variants is None:
+                return None
+            meta = self.meta[pid]
+            nodes = [
+                {
+                    "id": f"gid://shopify/ProductVariant/{vid}",
+                    "price": v["price"],
+                    "compareAtPrice": v["compareAtPrice"],
+                    "title": v["title"],
+                    "sku": v["sku"],
+                    "selectedOptions": [{"name": n, "value": val} for n, val in v["options"].items()],
+                }
+                for vid, v in variants.items()
+            ]
+            base = self.metafields[pid].get(("custom", "base_price"))
+            return {
+                "id": f"gid://shopify/Product/{pid}",
+                "title": meta["title"],
+                "handle": meta["handle"],
+                "tags": list(meta["tags"]),
+                "metafield": {"value": base["value"]} if base else None,
+                "collections": {"nodes": [{"handle": h} for h in meta["collections"]]},
+                "variants": {"nodes": nodes, "edges": [{"node": n} for n in nodes]},
+            }
+
+    def _bulk_update(self, query, variables):
+        calls = ALIAS_RE.findall(query)
+        if not calls:
+            plain = PLAIN_BULK_RE.search(query)
+            pvar, vvar = plain.groups() if plain else ("productId", "variants")
+            calls = [("productVariantsBulkUpdate", pvar, vvar)]
+        data, errors = {}, []
+        now = time.time()
+        with self.lock:
+            for alias, pvar, vvar in calls:
+                pid = _legacy_id(variables.get(pvar, "0"))
+                product = self.products.get(pid)
+                if product is None:
+                    data[alias] = None
+                    errors.append({"message": "Product does not exist", "path": [alias]})
+                    continue
+                user_errors, prices = [], set()
+                for item in variables.get(vvar, []):
+                    vid = _legacy_id(item["id"])
+                    if vid not in product:
+                        user_errors.append({"field": ["variants"], "message": f"Variant {vid} not found"})
+                        continue
+                    for key in ("price", "compareAtPrice"):
+                        if key in item:
+                            product[vid][key] = item[key]
+                    prices.add(item.get("price"))
+                    self.variant_updates += 1
+                self.mutations += 1
+                for price in prices:
+                    self.applied.append({"product_id": pid, "price": price, "at": now})
+                data[alias] = {
+                    "userErrors": user_errors,
+                    "product": {"id": f"gid://shopify/Product/{pid}"},
+                    "productVariants": [{"id": item["id"], "price": item.get("price")}
+                                        for item in variables.get(vvar, [])],
+                }
+        payload = {"data": data}
+        if errors:
+            payload["errors"] = errors
+        return payload
+
+    def _set_metafield(self, pid, namespace, key, type_, value):
+        existing = self.metafields[pid].get((namespace, key))
+        mid = existing["id"] if existing else self._next_id()
+        self.metafields[pid][(namespace, key)] = {"id": mid, "type": type_, "value": value}
+        return mid
+
+    def _metafields_set(self, query, variables):
+        match = re.search(r"metafieldsSet\s*\(\s*metafields:\s*\$(\w+)", query)
+        inputs = variables.get(match.group(1) if match else "metafields") or []
+        if len(inputs) > MAX_METAFIELDS:
+            return {"data": {"metafieldsSet": {"metafields": None, "userErrors": [{
+                "field": ["metafields"],
+                "message": f"Exceeded the maximum number of metafields ({MAX_METAFIELDS})",
+            }]}}}
+        created, user_errors = [], []
+        with self.lock:
+            for i, mf in enumerate(inputs):
+                pid = _legacy_id(mf.get("ownerId", "0"))
+                if pid not in self.products:
+                    user_errors.append({"field": ["metafields", str(i), "ownerId"], "message": "Owner does not exist"})
+                    continue
+                mid = self._set_metafield(pid, mf.get("namespace"), mf.get("key"), mf.get("type"), mf.get("value"))
+                created.append({"id": f"gid://shopify/Metafield/{mid}", "key": mf.get("key"), "value": mf.get("value")})
+            self.mutations += 1
+        return {"data": {"metafieldsSet": {"metafields": created, "userErrors": user_errors}}}
+
+    def _metaobject_create(self, query, variables):
+        match = re.search(r"metaobjectCreate\s*\(\s*metaobject:\s*\$(\w+)", query)
+        obj = variables.get(match.group(1) if match else "metaobject") or {}
+        with self.lock:
+            mid = f"gid://shopify/Metaobject/{self._next_id()}"
+            self.metaobjects[mid] = {
+                "id": mid,
+                "type": obj.get("type"),
+                "owner": obj.get("ownerId"),
+                "fields": {f["key"]: f.get("value") for f in obj.get("fields", [])},
+            }
+            self.mutations += 1
+        return {"data": {"metaobjectCreate": {"metaobject": {"id": mid}, "userErrors": []}}}
+
+    def _metaobjects(self, variables):
+        owner = variables.get("owner")
+        with self.lock:
+            found = [
+                m for m in self.metaobjects.values()
+                if m["type"] == variables.get("type", m["type"])
+                and (owner is None or owner in (m["owner"], m["fields"].get("product")))
+            ]
+        return {"edges": [{"node": {"id": m["id"]}} for m in found[:1 if owner else None]]}
+
+    # -- bulk operations -----------------------------------------------
+    def _staged_upload(self, base_url):
+        with self.lock:
+            key = f"staged/{self._next_id()}/bulk_op_vars.jsonl"
+            self.mutations += 1
+        return {"data": {"stagedUploadsCreate": {
+            "stagedTargets": [{
+                "url": f"{base_url}/_staged",
+                "resourceUrl": f"{base_url}/_staged/{key}",
+                "parameters": [{"name": "key", "value": key}],
+            }],
+            "userErrors": [],
+        }}}
+
+    def receive_upload(self, content_type, body):
+        """Store a multipart staged upload; return its key or ``None``."""
+        message = BytesParser(policy=default_policy).parsebytes(
+            b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body
+        )
+        key, content = None, None
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if part.get_filename():
+                content = part.get_payload(decode=True)
+            elif name == "key":
+                key = part.get_payload(decode=True).decode()
+        if key is None or content is None:
+            return None
+        with self.lock:
+            self.staged[key] = content.decode()
+        return key
+
+    def _run_bulk(self, variables, base_url):
+        with self.lock:
+            staged = self.staged.get(variables.get("path"))
+            self.mutations += 1
+        if staged is None:
+            return {"data": {"bulkOperationRunMutation": {
+                "bulkOperation": None,
+                "userErrors": [{"field": ["stagedUploadPath"], "message": "Staged upload not found"}],
+            }}}
+        lines = []
+        for number, line in enumerate(row for row in staged.splitlines() if row.strip()):
+            result = self.execute(variables.get("mutation", ""), json.loads(line), base_url)
+            lines.append(json.dumps({"data": result.get("data"), "__lineNumber": number}))
+        with self.lock:
+            op_id = f"gid://shopify/BulkOperation/{self._next_id()}"
+            self.bulk_operations[op_id] = {
+                "ready_at": time.monotonic() + self.bulk_seconds,
+                "count": len(lines),
+                "result": "\n".join(lines) + "\n",
+                "url": f"{base_url}/_bulk/{_legacy_id(op_id)}.jsonl",
+            }
+        return {"data": {"bulkOperationRunMutation": {
+            "bulkOperation": {"id": op_id, "status": "CREATED"},
+            "userErrors": [],
+        }}}
+
+    def _run_bulk_query(self, base_url):
+        lines = []
+        with self.lock:
+            for pid, variants in self.products.items():
+                gid = f"gid://shopify/Product/{pid}"
+                base = self.metafields[pid].get(("custom", "base_price"))
+                lines.append({
+                    "id": gid,
+                    "tags": list(self.meta[pid]["tags"]),
+                    "metafield": {"value": base["value"]} if base else None,
+                })
+                for vid, v in variants.items():
+                    lines.append({
+                        "id": f"gid://shopify/ProductVariant/{vid}",
+                        "price": v["price"],
+                        "compareAtPrice": v["compareAtPrice"],
+                        "selectedOptions": [{"name": n, "value": val} for n, val in v["options"].items()],
+                        "__parentId": gid,
+                    })
+            op_id = f"gid://shopify/BulkOperation/{self._next_id()}"
+            self.bulk_operations[op_id] = {
+                "ready_at": time.monotonic() + self.bulk_seconds,
+                "count": len(lines),
+                "result": "".join(json.dumps(line) + "\n" for line in lines),
+                "url": f"{base_url}/_bulk/{_legacy_id(op_id)}.jsonl",
+            }
+        return {"data": {"bulkOperationRunQuery": {
+            "bulkOperation": {"id": op_id, "status": "CREATED"},
+            "userErrors": [],
+        }}}
+
+    def _bulk_node(self, gid):
+        with self.lock:
+            op = self.bulk_operations.get(gid)
+        if op is None:
+            return None
+        done = time.monotonic() >= op["ready_at"]
+        return {
+            "id": gid,
+            "status": "COMPLETED" if done else "RUNNING",
+            "errorCode": None,
+            "objectCount": str(op["count"]) if done else "0",
+            "url": op["url"] if done else None,
+            "partialDataUrl": None,
+        }
+
+    def bulk_result(self, op_number):
+        with self.lock:
+            op = self.bulk_operations.get(f"gid://shopify/BulkOperation/{op_number}")
+        return op["result"] if op else None
+
+    # -- REST ----------------------------------------------------------
+    def rest_allowed(self):
+        """Spend one REST call; returns ``(allowed, calls_in_bucket)``."""
+        with self.lock:
+            allowed = self.rest_bucket.take(1)
+            if not allowed:
+                self.throttled["rest"] += 1
+            used = int(round(self.rest_bucket.size - self.rest_bucket.available()))
+        return allowed, used
+
+    def _rest_product(self, pid):
+        meta = self.meta[pid]
+        names = meta["options"]
+        return {
+            "id": pid,
+            "title": meta["title"],
+            "handle": meta["handle"],
+            "vendor": meta["vendor"],
+            "product_type": meta["product_type"],
+            "tags": ", ".join(meta["tags"]),
+            "options": [{"name": n, "position": i + 1} for i, n in enumerate(names)],
+            "variants": [
+                {
+                    "id": vid,
+                    "product_id": pid,
+                    "title": v["title"],
+                    "sku": v["sku"],
+                    "price": v["price"],
+                    "compare_at_price": v["compareAtPrice"],
+                    **{f"option{i + 1}": v["options"].get(n) for i, n in enumerate(names)},
+                }
+                for vid, v in self.products[pid].items()
+            ],
+        }
+
+    def rest(self, method, resource, params, body, base_url):
+        """Answer a REST call; returns ``(status, payload, headers)``."""
+        self._count("rest", f"{method} " + re.sub(r"/\d+", "/:id", resource))
+        if resource == "products.json" and method == "GET":
+            return self._products_json(params, base_url)
+        match = re.fullmatch(r"products/(\d+)\.json", resource)
+        if match and method == "GET":
+            pid = int(match.group(1))
+            with self.lock:
+                if pid not in self.products:
+                    return 404, {"errors": "Not Found"}, {}
+                return 200, {"product": self._rest_product(pid)}, {}
+        match = re.fullmatch(r"products/(\d+)/metafields\.json", resource)
+        if match and method == "GET":
+            pid = int(match.group(1))
+            with self.lock:
+                if pid not in self.products:
+                    return 404, {"errors": "Not Found"}, {}
+                metafields = [
+                    {"id": mf["id"], "namespace": ns, "key": key, "value": mf["value"],
+                     "type": mf["type"], "owner_id": pid, "owner_resource": "product"}
+                    for (ns, key), mf in self.metafields[pid].items()
+                    if params.get("namespace", ns) == ns and params.get("key", key) == key
+                ]
+            return 200, {"metafields": metafields}, {}
+        if resource == "webhooks.json":
+            with self.lock:
+                if method == "GET":
+                    hooks = [h for h in self.webhooks if params.get("topic", h["topic"]) == h["topic"]]
+                    return 200, {"webhooks": hooks}, {}
+                hook = dict((body or {}).get("webhook") or {})
+                if not hook.get("topic") or not hook.get("address"):
+                    return 422, {"errors": {"topic": ["can't be blank"]}}, {}
+                hook["id"] = self._next_id()
+                self.webhooks.append(hook)
+                return 201, {"webhook": hook}, {}
+        return 404, {"errors": "Not Found"}, {}
+
+    def _products_json(self, params, base_url):
+        limit = min(int(params.get("limit", 50)), REST_PAGE_LIMIT)
+        start = _decode_cursor(params.get("page_info"))
+        with self.lock:
+            ids = sorted(self.products)
+            page = [self._rest_product(pid) for pid in ids[start:start + limit]]
+        links = []
+        url = f"{base_url}/products.json"
+        if start > 0:
+            links.append(f'<{url}?{urlencode({"limit": limit, "page_info": _encode_cursor(max(0, start - limit))})}>; rel="previous"')
+        if start + limit < len(ids):
+            links.append(f'<{url}?{urlencode({"limit": limit, "page_info": _encode_cursor(start + limit)})}>; rel="next"')
+        headers = {"Link": ", ".join(links)} if links else {}
+        return 200, {"products": page}, headers
+
+
+def make_handler(shop):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload, headers=None, content_type="application/json"):
+            body = payload.encode() if isinstance(payload, str) else json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def _json(self, body):
+            try:
+                return json.loads(body or b"{}")
+            except ValueError:
+                return None
+
+        def _base_url(self):
+            return f"http://{self.headers.get('Host', '127.0.0.1')}"
+
+        def _admin(self, method, body=b""):
+            """Serve an Admin API path; ``False`` if it is not one."""
+            url = urlparse(self.path)
+            match = ADMIN_RE.match(url.path)
+            if not match:
+                return False
+            resource = match.group(1)
+            shop.delay()
+            fault = shop.fault()
+            if fault == "drop":
+                self.close_connection = True
+                return True
+            if fault:
+                self._send(int(fault), {"errors": "Internal Server Error"})
+                return True
+            admin_base = self._base_url() + url.path[: -len(resource) - 1]
+            if resource == "graphql.json" and method == "POST":
+                payload = self._json(body)
+                if payload is None:
+                    self._send(400, {"errors": "Invalid JSON"})
+                else:
+                    result = shop.graphql(payload.get("query", ""), payload.get("variables") or {}, self._base_url())
+                    self._send(200, result)
+                shop.finish_request()
+                return True
+            allowed, used = shop.rest_allowed()
+            limit = {"X-Shopify-Shop-Api-Call-Limit": f"{used}/{int(shop.rest_bucket.size)}"}
+            if not allowed:
+                shop._count("rest", f"{method} " + re.sub(r"/\d+", "/:id", resource))
+                self._send(429, {"errors": "Exceeded 2 calls per second for api client. Reduce request rates to resume uninterrupted service."},
+                           {**limit, "Retry-After": "2.0"})
+                return True
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            status, payload, headers = shop.rest(method, resource, params, self._json(body), admin_base)
+            self._send(status, payload, {**limit, **headers})
+            shop.finish_request()
+            return True
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == "/_stats":
+                return self._send(200, shop.stats())
+            match = re.fullmatch(r"/_bulk/(\d+)\.jsonl", path)
+            if match:
+                result = shop.bulk_result(int(match.group(1)))
+                if result is None:
+                    return self._send(404, {"errors": "Not Found"})
+                return self._send(200, result, content_type="application/jsonl")
+            if not self._admin("GET"):
+                self._send(404, {"errors": "Not Found"})
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            body = self._body()
+            if path == "/_reset":
+                shop.reset_stats()
+                return self._send(200, {"ok": True})
+            if path == "/_staged":
+                key = shop.receive_upload(self.headers.get("Content-Type", ""), body)
+                if key is None:
+                    return self._send(400, {"errors": "Missing key or file"})
+                return self._send(201, {"key": key})
+            if not self._admin("POST", body):
+                self._send(404, {"errors": "Not Found"})
+
+    return Handler
+
+
+def serve(shop, host="127.0.0.1", port=8081):
+    """Start the stand-in in a daemon thread and return the server."""
+    server = ThreadingHTTPServer((host, port), make_handler(shop))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def report(stats, seconds):
+    """Summary lines for a ``--run``: wall time and request counts."""
+    lines = [
+        f"[REPORT] wall time {seconds:.2f}s",
+        f"[REPORT] requests: {stats['requests']['graphql']} GraphQL, {stats['requests']['rest']} REST; "
+        f"throttled: {stats['throttled']['graphql']} GraphQL, {stats['throttled']['rest']} REST; "
+        f"faults injected: {stats['faults']}",
+        f"[REPORT] {stats['cost_points']} cost points, {stats['mutations']} mutation fields, "
+        f"{stats['variant_updates']} variant updates",
+    ]
+    for operation, count in sorted(stats["operations"].items(), key=lambda item: -item[1]):
+        lines.append(f"[REPORT]   {count:6d}  {operation}")
+    return lines
+
+
+def run_script(shop, command, env=None):
+    """Run ``command`` (a script and its arguments) against a fresh stand-in.
+
+    The price backup and catalog snapshot go to a temporary directory, so a
+    run never touches the real ones.  Returns ``(returncode, seconds, stats)``.
+    """
+    server = serve(shop, port=0)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            child_env = dict(os.environ if env is None else env)
+            child_env.update({
+                "SHOP_DOMAIN": f"http://127.0.0.1:{server.server_port}",
+                "API_TOKEN": child_env.get("API_TOKEN") or "fake-token",
+                "PRICE_BACKUP": os.path.join(workdir, "shopify_backup.json"),
+                "CATALOG_SNAPSHOT": os.path.join(workdir, "catalog_snapshot.json"),
+            })
+            started = time.monotonic()
+            proc = subprocess.run([sys.executable, *command], env=child_env)
+            seconds = time.monotonic() - started
+    finally:
+        server.shutdown()
+    stats = shop.stats()
+    stats.pop("applied")
+    return proc.returncode, seconds, stats
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8081)
+    p.add_argument("--products", type=int, default=100)
+    p.add_argument("--variants", type=int, default=4)
+    p.add_argument("--synthetic", type=int, metavar="VARIANTS",
+                   help="Seed from a synthetic catalog with this many variants")
+    p.add_argument("--catalog", help="Seed from a catalog snapshot file")
+    p.add_argument("--bucket", type=float, default=GRAPHQL_BUCKET, help="GraphQL bucket size (points)")
+    p.add_argument("--restore-rate", type=float, default=GRAPHQL_RESTORE_RATE, help="GraphQL points restored per second")
+    p.add_argument("--rest-bucket", type=float, default=REST_BUCKET)
+    p.add_argument("--rest-leak-rate", type=float, default=REST_LEAK_RATE)
+    p.add_argument("--latency", type=float, default=0.0, help="Seconds added to every Admin API call")
+    p.add_argument("--jitter", type=float, default=0.0, help="Random +/- seconds on top of --latency")
+    p.add_argument("--fault-rate", type=float, default=0.0, help="Share of calls that fail")
+    p.add_argument("--faults", default="500,drop", help="Fault kinds to pick from: 500, 502, 503, drop")
+    p.add_argument("--bulk-seconds", type=float, default=0.0, help="Time a bulk operation stays RUNNING")
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--report", help="With --run, also write the stats as JSON to this file")
+    p.add_argument("--run", nargs=argparse.REMAINDER,
+                   help="Run a script and its arguments against the stand-in, then report")
+    args = p.parse_args()
+
+    catalog = None
+    if args.catalog:
+        catalog = load_snapshot(args.catalog)
+        if catalog is None:
+            p.error(f"No snapshot at {args.catalog}")
+    elif args.synthetic:
+        catalog = synthetic_catalog.generate(args.synthetic, seed=args.seed or 0)
+    shop = FakeShop(
+        args.products, args.variants, catalog=catalog,
+        bucket=args.bucket, restore_rate=args.restore_rate,
+        rest_bucket=args.rest_bucket, rest_leak_rate=args.rest_leak_rate,
+        latency=args.latency, jitter=args.jitter,
+        fault_rate=args.fault_rate, faults=[f.strip() for f in args.faults.split(",") if f.strip()],
+        bulk_seconds=args.bulk_seconds, seed=args.seed,
+    )
+    products = len(shop.products)
+    variants = sum(len(v) for v in shop.products.values())
+
+    if args.run:
+        returncode, seconds, stats = run_script(shop, args.run)
+        for line in report(stats, seconds):
+            print(line)
+        if args.report:
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump({"command": args.run, "returncode": returncode, "seconds": seconds, **stats}, f, indent=2)
+        sys.exit(returncode)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(shop))
+    print(f"[OK] Fake Shopify on http://{args.host}:{server.server_port} "
+          f"({products} products / {variants} variants)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Import explicit per-variant prices from a CSV file.
+
+The file needs a ``price`` column and a ``variant_id`` or ``sku`` column (a
+row may use either); other columns are ignored.  Rows are read one at a
+time and checked against the catalog snapshot:
+
+- unknown variant IDs or SKUs, SKUs shared by several variants, variants
+  listed twice and prices that are not non-negative numbers are rejected
+- prices equal to the current snapshot price are skipped
+
+The remaining prices are grouped by product and pushed as
+``productVariantsBulkUpdate`` calls: aliased documents packed up to the cost
+ceiling and sent by ``IMPORT_WORKERS`` threads, or one bulk mutation from
+``IMPORT_BULK_THRESHOLD`` products on.  Rejected rows are written to
+``import_rejected.csv`` next to the job:
+
+    python scripts/import_prices.py prices.csv --dry-run
+    python scripts/import_prices.py prices.csv
+"""
+
+import argparse
+import csv
+import os
+import sys
+from decimal import Decimal, InvalidOperation
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from scripts import events, preview, pricing, shopify_client
+
+KEY_COLUMNS = ("variant_id", "sku")
+REJECTED_FILE = "import_rejected.csv"
+REJECTED_COLUMNS = ("line", "variant_id", "sku", "price", "error")
+
+
+def _env_int(name, default):
+    try:
+        return max(0, int(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+def workers():
+    """Threads sending packed documents (``IMPORT_WORKERS``, 4)."""
+    return max(1, _env_int("IMPORT_WORKERS", 4))
+
+
+def bulk_threshold():
+    """Products from which one bulk mutation is used (``IMPORT_BULK_THRESHOLD``, 500)."""
+    return _env_int("IMPORT_BULK_THRESHOLD", 500)
+
+
+class Catalog:
+    """Variant lookups by ID and SKU over the snapshot's products."""
+
+    def __init__(self, products):
+        self.variants = {}
+        self.skus = {}
+        for product in products:
+            for v in product.get("variants", []):
+                self.variants[str(v["id"])] = (product["id"], v["id"], v.get("price"))
+                sku = (v.get("sku") or "").strip()
+                if sku:
+                    # ``None`` marks a SKU carried by more than one variant.
+                    self.skus[sku] = None if sku in self.skus else str(v["id"])
+
+    def find(self, variant_id, sku):
+        """``(product_id, variant_id, current_price)``; raises ``ValueError``."""
+        if variant_id:
+            variant_id = variant_id.rsplit("/", 1)[-1]
+            found = self.variants.get(variant_id)
+            if found is None:
+                raise ValueError(f"unknown variant {variant_id}")
+            return found
+        if not sku:
+            raise ValueError("variant_id or sku is required")
+        if sku not in self.skus:
+            raise ValueError(f"unknown sku {sku!r}")
+        if self.skus[sku] is None:
+            raise ValueError(f"sku {sku!r} matches several variants")
+        return self.variants[self.skus[sku]]
+
+
+def parse_price(value):
+    """Normalise a price to two decimals; raises ``ValueError``."""
+    try:
+        price = Decimal((value or "").strip().replace(",", "."))
+    except InvalidOperation:
+        raise ValueError(f"invalid price {value!r}") from None
+    if not price.is_finite() or price < 0:
+        raise ValueError(f"invalid price {value!r}")
+    return f"{price.quantize(Decimal('0.01'))}"
+
+
+def _same(current, price):
+    try:
+        return current is not None and Decimal(str(current)) == Decimal(price)
+    except InvalidOperation:
+        return False
+
+
+def read_rows(lines):
+    """Yield ``(line, variant_id, sku, price)`` for each data row of a CSV."""
+    reader = csv.DictReader(lines)
+    columns = {(name or "").strip().lower(): name for name in reader.fieldnames or []}
+    if "price" not in columns or not any(c in columns for c in KEY_COLUMNS):
+        raise ValueError("The CSV needs a price column and a variant_id or sku column")
+    for row in reader:
+        value = {key: (row.get(columns[key]) or "").strip() if key in columns else ""
+                 for key in ("variant_id", "sku", "price")}
+        yield reader.line_num, value["variant_id"], value["sku"], value["price"]
+
+
+def plan(rows, catalog, rejected=None):
+    """Validate and diff ``rows``; return ``(updates_by_product, counts)``.
+
+    ``rejected(line, variant_id, sku, price, error)`` is called for every
+    rejected row.
+    """
+    updates, seen = {}, set()
+    counts = {"rows": 0, "changed": 0, "unchanged": 0, "rejected": 0}
+    for line, variant_id, sku, value in rows:
+        counts["rows"] += 1
+        try:
+            product_id, vid, current = catalog.find(variant_id, sku)
+            if vid in seen:
+                raise ValueError(f"variant {vid} is listed twice")
+            seen.add(vid)
+            price = parse_price(value)
+        except ValueError as exc:
+            counts["rejected"] += 1
+            if rejected:
+                rejected(line, variant_id, sku, value, str(exc))
+            continue
+        if _same(current, price):
+            counts["unchanged"] += 1
+            continue
+        counts["changed"] += 1
+        updates.setdefault(product_id, []).append({"id": pricing.variant_gid(vid), "price": price})
+    return updates, counts
+
+
+def send(session, updates_by_product):
+    """Push the planned updates; yields ``(pid, inputs, error)`` per group."""
+    groups = pricing.chunk_groups(updates_by_product)
+    threshold = bulk_threshold()
+    if threshold and len(updates_by_product) >= threshold:
+        print(f"[INFO] Sending {len(groups)} groups as one bulk mutation")
+        return shopify_client.send_bulk_updates(session, groups)
+    return shopify_client.send_concurrent_updates(session, groups, workers())
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Import variant prices from a CSV file")
+    p.add_argument("file", help="CSV with price and variant_id or sku columns")
+    p.add_argument("--dry-run", action="store_true", help="Validate and diff without updating Shopify")
+    p.add_argument("--rejected", help=f"Rejected rows file (default: {REJECTED_FILE} in JOB_DIR or here)")
+    args = p.parse_args(argv)
+
+    products = preview.snapshot_products()
+    if products is None:
+        print("[ERROR] No catalog snapshot; run scripts/catalog_snapshot.py first")
+        events.error("No catalog snapshot")
+        return 1
+    catalog = Catalog(products)
+
+    rejected_path = args.rejected or os.path.join(os.getenv("JOB_DIR") or ".", REJECTED_FILE)
+    rejected_file = None
+    rejected_writer = None
+
+    def rejected(line, variant_id, sku, price, error):
+        nonlocal rejected_file, rejected_writer
+        print(f"[ERROR] line {line}: {error}")
+        events.error(f"line {line}: {error}")
+        if rejected_writer is None:
+            rejected_file = open(rejected_path, "w", encoding="utf-8", newline="")
+            rejected_writer = csv.writer(rejected_file)
+            rejected_writer.writerow(REJECTED_COLUMNS)
+        rejected_writer.writerow((line, variant_id, sku, price, error))
+
+    events.phase("validate")
+    try:
+        with open(args.file, encoding="utf-8-sig", newline="") as f:
+            updates, counts = plan(read_rows(f), catalog, rejected)
+    except (OSError, ValueError, csv.Error) as exc:
+        print(f"[ERROR] {exc}")
+        events.error(str(exc))
+        return 1
+    finally:
+        if rejected_file:
+            rejected_file.close()
+    print(f"[INFO] {counts['rows']} rows: {counts['changed']} changes in {len(updates)} products, "
+          f"{counts['unchanged']} unchanged, {counts['rejected']} rejected")
+
+    if args.dry_run:
+        events.emit("summary", dry_run=True, **counts)
+        print("[DONE] Dry run, nothing was sent")
+        return 0
+
+    progress = events.Progress(counts["changed"], "prices")
+    session = shopify_client.get_session()
+    for pid, inputs, error in send(session, updates):
+        if error:
+            print(f"[ERROR] {pid}: {error}")
+            events.error(f"{pid}: {error}")
+            progress.advance(failed=len(inputs))
+            continue
+        for u in inputs:
+            print(f"[OK] {u['id'].split('/')[-1]} → {u['price']}")
+        progress.advance(ok=len(inputs))
+
+    progress.summary(**{k: v for k, v in counts.items() if k != "changed"})
+    print(f"[DONE] Imported {progress.ok} of {counts['changed']} prices")
+    return 0 if not progress.failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,9 @@ import requests
 from urllib.parse import urlparse, parse_qs
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts import events, shopify_client, tracing
+
 load_dotenv()
 sys.stdout.reconfigure(encoding="utf-8")
 TOKEN       = os.getenv("API_TOKEN")
@@ -18,58 +21,74 @@ API_VERSION = os.getenv("API_VERSION", "2024-04")
 
 def shopify_get(session, url, **kwargs):
 
-    while True:
-        try:
-            resp = session.get(url, timeout=30, **kwargs)
-        except requests.exceptions.ReadTimeout:
-            print(f"[ERROR] {url}: request timed out")
-            time.sleep(2)
-            continue
-        except requests.exceptions.ConnectionError:
-            print(f"[ERROR] {url}: connection failed")
-            time.sleep(2)
-            continue
-        if resp.status_code == 429:
-            time.sleep(2)
-            continue
-        return resp
+    operation = shopify_client.rest_operation(url)
+    with tracing.span("rest", f"GET {operation}", url):
+        while True:
+            started = time.monotonic()
+            try:
+                resp = session.get(url, timeout=30, **kwargs)
+            except requests.exceptions.ReadTimeout:
+                print(f"[ERROR] {url}: request timed out")
+                shopify_client.record_request("rest", operation, started)
+                shopify_client.throttle_wait("rest")
+                continue
+            except requests.exceptions.ConnectionError:
+                print(f"[ERROR] {url}: connection failed")
+                shopify_client.record_request("rest", operation, started)
+                shopify_client.throttle_wait("rest")
+                continue
+            shopify_client.record_request("rest", operation, started, resp)
+            if resp.status_code == 429:
+                shopify_client.throttle_wait("rest")
+                continue
+            return resp
 
 
 def graphql_post(session, query, variables=None):
 
-    url = f"https://{DOMAIN}/admin/api/{API_VERSION}/graphql.json"
+    url = f"{shopify_client.admin_url(DOMAIN)}/graphql.json"
     payload = {"query": query, "variables": variables or {}}
-    while True:
-        try:
-            resp = session.post(url, json=payload, timeout=30)
-        except requests.exceptions.ReadTimeout:
-            prod_id = None
-            try:
-                prod_id = variables["mf"][0]["ownerId"].split("/")[-1]
-            except Exception:
-                pass
-            if prod_id:
-                print(f"[ERROR] {prod_id}: request timed out")
-            else:
-                print("[ERROR] request timed out")
-            time.sleep(2)
-            continue
-        except requests.exceptions.ConnectionError:
-            prod_id = None
+    operation = shopify_client.graphql_operation(query)
+    with tracing.span("graphql", tracing.graphql_name(query), variables):
+        while True:
+            started = time.monotonic()
             try:
-                prod_id = variables["mf"][0]["ownerId"].split("/")[-1]
-            except Exception:
-                pass
-            if prod_id:
-                print(f"[ERROR] {prod_id}: request failed")
-            else:
-                print("[ERROR] request failed")
-            time.sleep(2)
-            continue
-        if resp.status_code == 429:
-            time.sleep(2)
-            continue
-        return resp
+                resp = session.post(url, json=payload, timeout=30)
+            except requests.exceptions.ReadTimeout:
+                prod_id = None
+                try:
+                    prod_id = variables["mf"][0]["ownerId"].split("/")[-1]
+                except Exception:
+                    pass
+                if prod_id:
+                    print(f"[ERROR] {prod_id}: request timed out")
+                else:
+                    print("[ERROR] request timed out")
+                shopify_client.record_request("graphql", operation, started)
+                shopify_client.throttle_wait("graphql")
+                continue
+            except requests.exceptions.ConnectionError:
+                prod_id = None
+                try:
+                    prod_id = variables["mf"][0]["ownerId"].split("/")[-1]
+                except Exception:
+                    pass
+                if prod_id:
+                    print(f"[ERROR] {prod_id}: request failed")
+                else:
+                    print("[ERROR] request failed")
+                shopify_client.record_request("graphql", operation, started)
+                shopify_client.throttle_wait("graphql")
+                continue
+            shopify_client.record_request("graphql", operation, started, resp)
+            if resp.status_code == 429:
+                shopify_client.throttle_wait("graphql")
+                continue
+            wait = shopify_client.graphql_throttle(resp)
+            if wait is not None:
+                shopify_client.throttle_wait("graphql", wait)
+                continue
+            return resp
 
 
 def set_base_prices(session, products):
@@ -123,12 +142,14 @@ def main():
     processed = 0
     total_products = 0
     lock = threading.Lock()
+    progress = events.Progress(None, "base_price")
 
     def progress_cb(count):
         nonlocal processed
         with lock:
             processed += count
             print(f"[PROGRESS] processed {processed}")
+        progress.advance(ok=count)
 
     def process_chunk(products):
         """Process a list of ``(product_id, price)`` tuples.
@@ -144,7 +165,7 @@ def main():
         finally:
             progress_cb(len(products))
 
-    base_url = f"https://{DOMAIN}/admin/api/{API_VERSION}"
+    base_url = shopify_client.admin_url(DOMAIN)
     page_info = None
     chunk = []
     # ``metafieldsSet`` only accepts up to 25 metafields per call.  Using more
@@ -192,6 +213,7 @@ def main():
         if chunk:
             executor.submit(process_chunk, chunk)
 
+    progress.summary(products=total_products)
     if processed != total_products:
         print(f"[DONE] Finished initializing base prices! Processed {processed} of {total_products} products (mismatch)")
     else:
@@ -16,6 +16,9 @@ from typing import Dict, Iterator, Optional
 import requests
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts import shopify_client
+
 load_dotenv()
 sys.stdout.reconfigure(encoding="utf-8")
 
@@ -31,7 +34,7 @@ def graphql_request(
 ) -> requests.Response:
     """Send a GraphQL request, retrying on Shopify rate limiting."""
 
-    url = f"https://{DOMAIN}/admin/api/{API_VERSION}/graphql.json"
+    url = f"{shopify_client.admin_url(DOMAIN)}/graphql.json"
     payload = {"query": query, "variables": variables or {}}
 
     while True:
@@ -44,6 +47,10 @@ def graphql_request(
         if resp.status_code == 429:
             time.sleep(2)
             continue
+        wait = shopify_client.graphql_throttle(resp)
+        if wait is not None:
+            time.sleep(wait)
+            continue
         return resp
 
 
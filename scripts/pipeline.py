@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""Run the price jobs as one pipeline over a single catalog snapshot.
+
+Steps apply the rules of the separate jobs, each after the steps it
+depends on:
+
+- ``percentage`` – backup price plus ``--percent`` with tidy rounding
+  (``update_prices_shopify.py``); a product's base price becomes the new
+  price of its first variant
+- ``base_price`` – the base price of ``chaine_update`` products follows
+  their Forsat S variant (``tempo solution/update_prices.py``)
+- ``surcharges`` – chain variants at the base price plus the chain's
+  surcharge, after ``base_price``
+- ``ensemble`` – ``ensemble`` products at their first variant's price plus
+  the collier and bracelet surcharges (``update_ensemble_prices.py``),
+  after ``percentage`` and ``surcharges``
+
+The steps only change prices in memory.  The final price of every variant
+is then compared with the snapshot and each variant that moves is pushed
+once; changed base prices are written 25 per call.  Webhook processing is
+paused meanwhile, and the deliveries echoing the pipeline's own base price
+writes are dropped, so the app never applies flat intermediate prices:
+
+    python scripts/pipeline.py --percent 5 --dry-run
+    python scripts/pipeline.py --percent 5
+    python scripts/pipeline.py --steps base_price,surcharges,ensemble --snapshot
+"""
+
+import argparse
+import os
+import sys
+from decimal import Decimal, InvalidOperation
+from graphlib import TopologicalSorter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dotenv import load_dotenv
+
+from scripts import catalog_snapshot, events, preview, pricing, shopify_client, surcharges as surcharge_config
+
+load_dotenv()
+
+# Step -> steps whose prices it reads.
+DEPENDS = {
+    "percentage": (),
+    "base_price": ("percentage",),
+    "surcharges": ("base_price",),
+    "ensemble": ("percentage", "surcharges"),
+}
+STEPS = tuple(DEPENDS)
+
+
+def _env_int(name, default):
+    try:
+        return max(0, int(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+def workers():
+    """Threads sending packed documents (``PIPELINE_WORKERS``, 4)."""
+    return max(1, _env_int("PIPELINE_WORKERS", 4))
+
+
+def bulk_threshold():
+    """Products from which one bulk mutation is used (``PIPELINE_BULK_THRESHOLD``, 500)."""
+    return _env_int("PIPELINE_BULK_THRESHOLD", 500)
+
+
+def order(steps):
+    """``steps`` in dependency order; raises ``ValueError`` for unknown ones."""
+    unknown = [s for s in steps if s not in DEPENDS]
+    if unknown:
+        raise ValueError(f"Unknown step: {', '.join(unknown)}")
+    graph = {s: [d for d in DEPENDS[s] if d in steps] for s in steps}
+    return list(TopologicalSorter(graph).static_order())
+
+
+def _price(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _chain_category(product):
+    tags = {t.strip().lower() for t in product.get("tags", [])}
+    if preview.CHAIN_TAG not in tags:
+        return None
+    return pricing.chain_category(tags)
+
+
+def step_percentage(products, state, ctx):
+    factor = 1 + ctx["percent"] / 100.0
+    originals = ctx["originals"]
+    tidy = {}
+    for product in products:
+        first = True
+        for v in product.get("variants", []):
+            base = _price(originals.get(v["id"]))
+            if base is None:
+                continue
+            if base not in tidy:
+                tidy[base] = float(pricing.round_to_tidy(base * factor))
+            state["prices"][v["id"]] = tidy[base]
+            if first:
+                state["bases"][product["id"]] = tidy[base]
+                first = False
+
+
+def step_base_price(products, state, ctx):
+    prices, bases = state["prices"], state["bases"]
+    for product in products:
+        variants = product.get("variants", [])
+        if not variants or not _chain_category(product):
+            continue
+        forsat = next((v for v in variants if pricing.BASE_CHAIN in v.get("options", {}).values()), None)
+        if forsat and prices.get(forsat["id"]) is not None:
+            bases[product["id"]] = prices[forsat["id"]]
+        elif bases.get(product["id"]) is None:
+            bases[product["id"]] = prices.get(variants[0]["id"])
+
+
+def step_surcharges(products, state, ctx):
+    prices, bases = state["prices"], state["bases"]
+    for product in products:
+        cat = _chain_category(product)
+        base = bases.get(product["id"])
+        if not cat or base is None:
+            continue
+        chains = ctx["surcharges"][cat]
+        for v in product.get("variants", []):
+            chain = next((o for o in v.get("options", {}).values() if o in chains), None)
+            if chain is not None:
+                prices[v["id"]] = float(pricing.chain_price(base, chain, chains))
+
+
+def step_ensemble(products, state, ctx):
+    prices = state["prices"]
+    for product in products:
+        variants = product.get("variants", [])
+        if preview.ENSEMBLE_TAG not in [t.lower() for t in product.get("tags", [])] or not variants:
+            continue
+        if prices.get(variants[0]["id"]) is None:
+            continue
+        nodes = [
+            {"id": v["id"], "price": prices.get(v["id"]),
+             "selectedOptions": [{"name": n, "value": val} for n, val in v.get("options", {}).items()]}
+            for v in variants
+        ]
+        for update in pricing.ensemble_updates(nodes, ctx["surcharges"]):
+            prices[update["id"]] = float(update["price"])
+
+
+RUNNERS = {
+    "percentage": step_percentage,
+    "base_price": step_base_price,
+    "surcharges": step_surcharges,
+    "ensemble": step_ensemble,
+}
+
+
+def _same(a, b):
+    try:
+        return a is not None and b is not None and Decimal(str(a)) == Decimal(str(b))
+    except InvalidOperation:
+        return False
+
+
+def run_steps(products, steps, ctx, report=None):
+    """Apply ``steps`` to the snapshot's prices in memory.
+
+    Returns ``(updates_by_product, base_prices)``: the variant inputs of
+    every variant whose final price differs from the snapshot, and
+    ``{product_id: price}`` for the base prices that change.  ``report``
+    is called with each step's name and the number of prices it changed.
+    """
+    state = {
+        "prices": {v["id"]: _price(v.get("price")) for p in products for v in p.get("variants", [])},
+        "bases": {p["id"]: _price(p.get("base_price")) for p in products},
+    }
+    for step in order(steps):
+        before = dict(state["prices"])
+        RUNNERS[step](products, state, ctx)
+        if report:
+            report(step, sum(1 for vid, price in state["prices"].items() if price != before[vid]))
+
+    updates = {}
+    for product in products:
+        for v in product.get("variants", []):
+            new = state["prices"][v["id"]]
+            if new is not None and not _same(v.get("price"), new):
+                updates.setdefault(product["id"], []).append(
+                    {"id": pricing.variant_gid(v["id"]), "price": f"{new:.2f}"})
+    bases = {
+        p["id"]: f"{state['bases'][p['id']]:.2f}"
+        for p in products
+        if state["bases"][p["id"]] is not None and not _same(p.get("base_price"), state["bases"][p["id"]])
+    }
+    return updates, bases
+
+
+def _originals(products):
+    """Original prices of the percentage step, from the backup (made if missing)."""
+    path = preview.backup_path()
+    if not os.path.exists(path):
+        variants = [
+            {"product_id": p["id"], "variant_id": v["id"], "original_price": v.get("price")}
+            for p in products for v in p.get("variants", [])
+        ]
+        pricing.save_backup(path, variants)
+        print(f"[INFO] Backup saved to {path}")
+    else:
+        variants = pricing.load_backup(path)
+    return {v["variant_id"]: v["original_price"] for v in variants}
+
+
+def send(session, updates_by_product):
+    """Push the final prices; yields ``(pid, inputs, error)`` per group."""
+    groups = pricing.chunk_groups(updates_by_product)
+    threshold = bulk_threshold()
+    if threshold and len(updates_by_product) >= threshold:
+        print(f"[INFO] Sending {len(groups)} groups as one bulk mutation")
+        return shopify_client.send_bulk_updates(session, groups)
+    return shopify_client.send_concurrent_updates(session, groups, workers())
+
+
+def push(session, products, updates, bases, written):
+    """Send ``updates`` and ``bases``; record the snapshot's new prices.
+
+    ``written`` receives the base prices that were set.  Returns the
+    progress trackers of the variants and of the base prices.
+    """
+    variants = {v["id"]: v for p in products for v in p.get("variants", [])}
+    progress = events.Progress(sum(len(u) for u in updates.values()), "prices")
+    for pid, inputs, error in send(session, updates):
+        if error:
+            print(f"[ERROR] {pid}: {error}")
+            events.error(f"{pid}: {error}")
+            progress.advance(failed=len(inputs))
+            continue
+        for u in inputs:
+            variants[int(u["id"].rsplit("/", 1)[-1])]["price"] = u["price"]
+        progress.advance(ok=len(inputs))
+
+    base_progress = events.Progress(len(bases), "base_price")
+    errors = shopify_client.set_base_prices(session, bases)
+    by_id = {p["id"]: p for p in products}
+    for pid, price in bases.items():
+        if pid in errors:
+            print(f"[ERROR] base_price {pid}: {errors[pid]}")
+            events.error(f"{pid}: base_price: {errors[pid]}")
+            base_progress.advance(failed=1)
+        else:
+            by_id[pid]["base_price"] = price
+            written[pid] = price
+            base_progress.advance(ok=1)
+    return progress, base_progress
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Run the price steps as one pipeline")
+    p.add_argument("--percent", type=float, help="Percentage of the percentage step (e.g. 10 or -5)")
+    p.add_argument("--steps", help=f"Comma-separated steps (default: {','.join(STEPS)}, "
+                                   "without percentage when --percent is not given)")
+    p.add_argument("--snapshot", action="store_true", help="Use the existing catalog snapshot instead of exporting one")
+    p.add_argument("--dry-run", action="store_true", help="Print the changes without updating Shopify")
+    args = p.parse_args(argv)
+
+    steps = args.steps.split(",") if args.steps else [s for s in STEPS if s != "percentage" or args.percent is not None]
+    try:
+        steps = order([s.strip() for s in steps if s.strip()])
+    except ValueError as exc:
+        print(f"[ERROR] {exc}")
+        return 1
+    if "percentage" in steps and args.percent is None:
+        print("[ERROR] The percentage step needs --percent")
+        return 1
+
+    session = shopify_client.get_session()
+    events.phase("snapshot")
+    if args.snapshot:
+        products = catalog_snapshot.load_snapshot()
+        if products is None:
+            print("[ERROR] No catalog snapshot; run scripts/catalog_snapshot.py first")
+            events.error("No catalog snapshot")
+            return 1
+    else:
+        products = list(catalog_snapshot.fetch_catalog(session))
+        catalog_snapshot.save_snapshot(products)
+    print(f"[INFO] {len(products)} products / {sum(len(p['variants']) for p in products)} variants")
+
+    version, surcharges = surcharge_config.load()
+    ctx = {"percent": args.percent, "surcharges": surcharges}
+    if "percentage" in steps:
+        ctx["originals"] = _originals(products)
+    print(f"[INFO] Steps: {' → '.join(steps)} (surcharges version {version})")
+
+    def report(step, changed):
+        print(f"[INFO] {step}: {changed} prices changed")
+
+    updates, bases = run_steps(products, steps, ctx, report)
+    changed = sum(len(u) for u in updates.values())
+    print(f"[INFO] {changed} variants in {len(updates)} products and {len(bases)} base prices to update")
+
+    if args.dry_run:
+        events.emit("summary", dry_run=True, done=0, total=changed, ok=0, failed=0, base_prices=len(bases))
+        print("[DONE] Dry run, nothing was sent")
+        return 0
+
+    # Imported here: the queue lives with the web app.
+    from webapp import webhook_queue
+
+    owner = f"pipeline-{os.getenv('JOB_ID') or os.getpid()}"
+    with webhook_queue.paused(owner) as written:
+        print("[INFO] Webhook processing paused")
+        progress, base_progress = push(session, products, updates, bases, written)
+    print("[INFO] Webhook processing resumed")
+    catalog_snapshot.save_snapshot(products)
+
+    progress.summary(base_prices=base_progress.ok)
+    failed = progress.failed + base_progress.failed
+    print(f"[DONE] Updated {progress.ok} variants and {base_progress.ok} base prices"
+          + (f", {failed} failed" if failed else ""))
+    return 0 if not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
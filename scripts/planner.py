@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""Dry-run plans: what a job would send to Shopify and how long it takes.
+
+A plan counts the products and variants a job touches, then derives the
+GraphQL requests, mutation fields, metafield writes and cost points using
+the same packing as the real run (``shopify_client.pack_groups``).  Wall
+time is estimated from the shop's GraphQL bucket (``throttleStatus``) and
+the REST call limit.
+
+Counts come from the price backup or the catalog snapshot when they exist;
+otherwise a cheap count query is made.
+
+    python scripts/planner.py percentage
+    python scripts/update_prices_shopify.py --percent 5 --plan
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dotenv import load_dotenv
+
+from scripts import shopify_client
+from scripts.catalog_snapshot import load_snapshot
+
+load_dotenv()
+
+BACKUP_FILE = os.path.join(os.path.dirname(__file__), "shopify_backup.json")
+VARIANTS_PER_GROUP = 50
+REST_PAGE = 250
+ENSEMBLE_PAGE = 250
+ENSEMBLE_TAG = "ensemble"
+
+# Fallbacks when the shop cannot be asked (standard plan limits).
+DEFAULT_BUCKET = 1000
+DEFAULT_RESTORE_RATE = 50.0
+REST_BUCKET = 40
+REST_LEAK_RATE = 2.0
+# Cost of a metafieldsSet call with one metafield.
+METAFIELD_COST = 10
+
+THROTTLE_QUERY = "query Throttle { shop { id } }"
+
+COUNT_QUERY = """
+query Counts($query: String) {
+  productsCount(query: $query) { count }
+  productVariantsCount { count }
+}
+"""
+
+
+def _float_env(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return float(default)
+
+
+def request_seconds():
+    """Typical round-trip time of one Admin API call (``PLAN_REQUEST_SECONDS``)."""
+    return _float_env("PLAN_REQUEST_SECONDS", "0.4")
+
+
+def throttle_status(session=None):
+    """Return ``(bucket, restore_rate, source)`` for the GraphQL cost limit."""
+    rate = os.getenv("GRAPHQL_RESTORE_RATE")
+    if rate:
+        return _float_env("GRAPHQL_BUCKET", str(DEFAULT_BUCKET)), float(rate), "GRAPHQL_RESTORE_RATE"
+    try:
+        session = session or shopify_client.get_session()
+        resp = shopify_client.graphql_post(session, THROTTLE_QUERY)
+        resp.raise_for_status()
+        status = resp.json()["extensions"]["cost"]["throttleStatus"]
+        return float(status["maximumAvailable"]), float(status["restoreRate"]), "shop"
+    except Exception:
+        return float(DEFAULT_BUCKET), DEFAULT_RESTORE_RATE, "default"
+
+
+def _load_backup():
+    path = os.getenv("PRICE_BACKUP") or BACKUP_FILE
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _variant_counts(rows):
+    """``{product_id: variant count}`` from backup rows."""
+    counts = {}
+    for row in rows:
+        counts[row["product_id"]] = counts.get(row["product_id"], 0) + 1
+    return counts
+
+
+def _count_query(session, query=None):
+    resp = shopify_client.graphql_post(session or shopify_client.get_session(), COUNT_QUERY, {"query": query})
+    data = shopify_client.graphql_data(resp)
+    return data["productsCount"]["count"], data["productVariantsCount"]["count"]
+
+
+def _estimated_counts(session, query=None):
+    """Products matching ``query``, each with the shop's average number of
+    variants per product."""
+    products, variants = _count_query(session, query)
+    if query:
+        total_products, total_variants = _count_query(session)
+        variants = products * total_variants / total_products if total_products else 0
+    average = variants / products if products else 0
+    return {i: average for i in range(products)}
+
+
+def affected(kind, session=None):
+    """Return ``({product_id: variants}, reads, source)`` for a job kind.
+
+    ``reads`` is ``(rest_pages, graphql_pages)`` fetched before updating.
+    """
+    if kind in ("percentage", "reset"):
+        backup = _load_backup()
+        if backup is not None:
+            return _variant_counts(backup), (0, 0), "backup"
+        if kind == "reset":
+            return {}, (0, 0), "no backup"
+        snapshot = load_snapshot()
+        if snapshot is not None:
+            counts = {p["id"]: len(p.get("variants", [])) for p in snapshot}
+            source = "snapshot"
+        else:
+            counts = _estimated_counts(session)
+            source = "count query"
+        return counts, (math.ceil(len(counts) / REST_PAGE), 0), source
+    if kind == "ensemble":
+        snapshot = load_snapshot()
+        if snapshot is not None:
+            counts = {
+                p["id"]: len(p.get("variants", []))
+                for p in snapshot
+                if ENSEMBLE_TAG in [t.lower() for t in p.get("tags", [])]
+            }
+            source = "snapshot"
+        else:
+            counts = _estimated_counts(session, f"tag:{ENSEMBLE_TAG}")
+            source = "count query (variants estimated)"
+        return counts, (0, max(1, math.ceil(len(counts) / ENSEMBLE_PAGE))), source
+    raise ValueError(f"Unknown job kind: {kind}")
+
+
+def _groups(counts):
+    groups = []
+    for pid, variants in counts.items():
+        variants = int(math.ceil(variants))
+        for start in range(0, variants, VARIANTS_PER_GROUP):
+            groups.append((pid, [None] * min(VARIANTS_PER_GROUP, variants - start)))
+    return groups
+
+
+def plan(kind, session=None, bucket=None, restore_rate=None):
+    """Return the dry-run plan of ``kind`` (``percentage``, ``reset``, ``ensemble``)."""
+    counts, (rest_pages, graphql_pages), source = affected(kind, session)
+    groups = _groups(counts)
+    documents = sum(1 for _ in shopify_client.pack_groups(groups))
+    metafield_writes = len(counts) if kind == "percentage" else 0
+
+    mutation_cost = len(groups) * shopify_client.MUTATION_COST
+    metafield_cost = metafield_writes * METAFIELD_COST
+    # A paged products query costs roughly one point per returned node.
+    read_cost = graphql_pages * 2 + (sum(counts.values()) + len(counts) if graphql_pages else 0)
+    cost = mutation_cost + metafield_cost + read_cost
+
+    throttle_source = "given"
+    if bucket is None or restore_rate is None:
+        bucket, restore_rate, throttle_source = throttle_status(session)
+    graphql_requests = documents + metafield_writes + graphql_pages
+    latency = request_seconds()
+    throttled = max(0.0, cost - bucket) / restore_rate if restore_rate else 0.0
+    graphql_seconds = max(graphql_requests * latency, throttled)
+    rest_seconds = max(rest_pages * latency, max(0, rest_pages - REST_BUCKET) / REST_LEAK_RATE)
+
+    return {
+        "job": kind,
+        "source": source,
+        "products": len(counts),
+        "variants": int(round(sum(counts.values()))),
+        "mutation_fields": len(groups),
+        "graphql_requests": graphql_requests,
+        "rest_requests": rest_pages,
+        "metafield_writes": metafield_writes,
+        "cost_points": int(round(cost)),
+        "bucket": bucket,
+        "restore_rate": restore_rate,
+        "throttle_source": throttle_source,
+        "throttled_seconds": round(throttled, 1),
+        "estimated_seconds": round(graphql_seconds + rest_seconds, 1),
+    }
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
+
+
+def format_plan(p):
+    """Human-readable lines for a plan, as printed by ``--plan``."""
+    return [
+        f"[PLAN] {p['job']}: {p['products']} products / {p['variants']} variants (from {p['source']})",
+        f"[PLAN] {p['graphql_requests']} GraphQL requests carrying {p['mutation_fields']} "
+        f"productVariantsBulkUpdate fields, {p['metafield_writes']} metafield writes, "
+        f"{p['rest_requests']} REST pages",
+        f"[PLAN] ~{p['cost_points']} cost points; bucket {p['bucket']:.0f} restoring "
+        f"{p['restore_rate']:.0f}/s ({p['throttle_source']}), ~{format_duration(p['throttled_seconds'])} throttled",
+        f"[PLAN] Estimated wall time: {format_duration(p['estimated_seconds'])}",
+    ]
+
+
+def print_plan(kind, session=None):
+    for line in format_plan(plan(kind, session)):
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate a job without running it")
+    parser.add_argument("kind", choices=["percentage", "reset", "ensemble"])
+    parser.add_argument("--json", action="store_true", help="Print the plan as JSON")
+    args = parser.parse_args()
+    if args.json:
+        print(json.dumps(plan(args.kind), indent=2))
+    else:
+        print_plan(args.kind)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""Preview the prices a job would set, variant by variant, without running it.
+
+Targets are computed with the jobs' own rules (``scripts/pricing.py``):
+
+- ``percentage`` – the backup's original price (the snapshot price when no
+  backup exists yet) plus ``percent`` with tidy rounding
+- ``ensemble`` – ``ensemble``-tagged products, first variant plus the
+  collier and bracelet surcharges
+- ``surcharge`` – ``chaine_update`` products of the variant updater, base
+  price plus the chain surcharge
+
+Current prices come from the catalog snapshot, or from the backup when there
+is no snapshot.  The diff of a kind is computed once per snapshot, backup and
+surcharge version and then sorted, filtered and paginated from memory:
+
+    python scripts/preview.py percentage --percent 5 --min-change 10
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from scripts import pricing, surcharges as surcharge_config
+from scripts.catalog_snapshot import snapshot_path
+
+KINDS = ("percentage", "ensemble", "surcharge")
+SORT_KEYS = ("product", "variant", "old", "new", "change", "change_pct")
+BACKUP_FILE = os.path.join(os.path.dirname(__file__), "shopify_backup.json")
+ENSEMBLE_TAG = "ensemble"
+CHAIN_TAG = "chaine_update"
+PER_PAGE = 100
+MAX_PER_PAGE = 1000
+# Diffs kept in memory (kind and parameters).
+CACHE_SIZE = 8
+
+_files = {}
+_bases = (None, None)
+_diffs = OrderedDict()
+_lock = threading.Lock()
+
+
+def backup_path():
+    return os.getenv("PRICE_BACKUP") or BACKUP_FILE
+
+
+def _load(path, pick):
+    """``pick(json)`` of ``path``, cached until its mtime or size changes."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None, None
+    key = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        cached = _files.get(path)
+        if cached and cached[0] == key:
+            return key, cached[1]
+    with open(path, encoding="utf-8") as f:
+        data = pick(json.load(f))
+    with _lock:
+        _files[path] = (key, data)
+    return key, data
+
+
+def _products(data):
+    return data.get("products", [])
+
+
+def snapshot_products():
+    """The catalog snapshot's products (cached), or ``None`` without one."""
+    return _load(snapshot_path(), _products)[1]
+
+
+def _price(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _row(product, variant, old, new):
+    change = None if old is None or new is None else round(new - old, 2)
+    if change is None or not old:
+        change_pct = None
+    else:
+        change_pct = round(100.0 * change / old, 2)
+    return {
+        "product_id": product["id"],
+        "product": product.get("title", ""),
+        "variant_id": variant["id"],
+        "variant": variant.get("title", ""),
+        "sku": variant.get("sku", ""),
+        "old": old,
+        "new": new,
+        "change": change,
+        "change_pct": change_pct,
+    }
+
+
+def _percentage_variants(products, backup):
+    """Yield ``(product, variant, current, base)``; the job prices from ``base``."""
+    originals = {row["variant_id"]: row["original_price"] for row in backup or []}
+    if products is None:
+        # No snapshot: the backup is all there is.
+        products = {}
+        for row in backup or []:
+            products.setdefault(row["product_id"], {"id": row["product_id"], "variants": []})["variants"].append(
+                {"id": row["variant_id"], "price": row["original_price"]})
+        products = list(products.values())
+    for product in products:
+        for v in product.get("variants", []):
+            yield product, v, _price(v.get("price")), _price(originals.get(v["id"], v.get("price")))
+
+
+def _percentage(products, backup, percent):
+    factor = 1 + percent / 100.0
+    rows = []
+    # Catalogs repeat a few hundred prices; round each one once.
+    tidy = {None: None}
+    for product, v, current, base in _percentage_variants(products, backup):
+        if base not in tidy:
+            tidy[base] = float(pricing.round_to_tidy(base * factor))
+        rows.append(_row(product, v, current, tidy[base]))
+    return rows
+
+
+def _inputs(need_backup):
+    """``(snap_key, products, backup_key, backup)`` from the cached files."""
+    snap_key, products = _load(snapshot_path(), _products)
+    backup_key, backup = (None, None)
+    if need_backup:
+        backup_key, backup = _load(backup_path(), lambda data: data)
+    return snap_key, products, backup_key, backup
+
+
+def percentage_prices():
+    """``(key, pairs, source)`` for the percentage rule.
+
+    ``pairs`` holds ``(current, base)`` per variant; ``key`` changes with the
+    snapshot or backup, and ``pairs`` is the same list until it does.
+    Raises ``ValueError`` when neither exists.
+    """
+    global _bases
+    snap_key, products, backup_key, backup = _inputs(True)
+    if products is None and backup is None:
+        raise ValueError("No catalog snapshot or price backup to preview from")
+    key = (snap_key, backup_key)
+    with _lock:
+        if _bases[0] == key:
+            return _bases[1]
+    pairs = [(current, base) for _, _, current, base in _percentage_variants(products, backup)]
+    result = (key, pairs, "snapshot" if products is not None else "backup")
+    with _lock:
+        _bases = (key, result)
+    return result
+
+
+def surcharge_rows(surcharges):
+    """Rows of the ensemble and chain surcharge rules priced with ``surcharges``."""
+    products = snapshot_products()
+    if products is None:
+        raise ValueError("The ensemble and surcharge previews need the catalog snapshot")
+    return _ensemble(products, surcharges) + _surcharge(products, surcharges)
+
+
+def _ensemble(products, surcharges):
+    rows = []
+    for product in products:
+        variants = product.get("variants", [])
+        if ENSEMBLE_TAG not in [t.lower() for t in product.get("tags", [])] or not variants:
+            continue
+        nodes = [
+            {"id": v["id"], "price": v.get("price"),
+             "selectedOptions": [{"name": n, "value": val} for n, val in v.get("options", {}).items()]}
+            for v in variants
+        ]
+        if _price(nodes[0]["price"]) is None:
+            continue
+        for v, update in zip(variants, pricing.ensemble_updates(nodes, surcharges)):
+            rows.append(_row(product, v, _price(v.get("price")), float(update["price"])))
+    return rows
+
+
+def _surcharge(products, surcharges):
+    """Prices of ``tempo solution/update_prices.py``; other variants are skipped."""
+    rows = []
+    for product in products:
+        tags = {t.strip().lower() for t in product.get("tags", [])}
+        if CHAIN_TAG not in tags:
+            continue
+        cat = "bracelets" if "bracelet" in tags else ("colliers" if "collier" in tags else None)
+        variants = product.get("variants", [])
+        if not cat or not variants:
+            continue
+        chains = surcharges[cat]
+        forsat = next((v for v in variants if pricing.BASE_CHAIN in v.get("options", {}).values()), None)
+        base = _price((forsat or {}).get("price")) if forsat else _price(product.get("base_price"))
+        if base is None:
+            base = _price(variants[0].get("price"))
+        for v in variants:
+            chain = next((o for o in v.get("options", {}).values() if o in chains), None)
+            if chain is None or base is None:
+                continue
+            rows.append(_row(product, v, _price(v.get("price")), float(pricing.chain_price(base, chain, chains))))
+    return rows
+
+
+def diff(kind, percent=None):
+    """Return ``(rows, source)``: one row per variant the job would price."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown preview kind: {kind}")
+    if kind == "percentage" and percent is None:
+        raise ValueError("percent is required")
+    snap_key, products, backup_key, backup = _inputs(kind == "percentage")
+    version = None
+    if kind == "percentage":
+        if products is None and backup is None:
+            raise ValueError("No catalog snapshot or price backup to preview from")
+    else:
+        if products is None:
+            raise ValueError("The ensemble and surcharge previews need the catalog snapshot")
+        version, surcharges = surcharge_config.store().current()
+    key = (kind, percent, snap_key, backup_key, version)
+    with _lock:
+        if key in _diffs:
+            _diffs.move_to_end(key)
+            return _diffs[key]
+    if kind == "percentage":
+        rows = _percentage(products, backup, percent)
+    elif kind == "ensemble":
+        rows = _ensemble(products, surcharges)
+    else:
+        rows = _surcharge(products, surcharges)
+    source = "snapshot" if products is not None else "backup"
+    result = (rows, {"source": source, "surcharge_version": version})
+    with _lock:
+        _diffs[key] = result
+        while len(_diffs) > CACHE_SIZE:
+            _diffs.popitem(last=False)
+    return result
+
+
+def _sort_key(field):
+    if field in ("product", "variant"):
+        return lambda r: (r[field].lower(), r["variant_id"])
+    if field.startswith("change"):
+        return lambda r: abs(r[field])
+    return lambda r: r[field]
+
+
+def query(rows, sort="change_pct", descending=True, min_change=None, changed_only=False,
+          search=None, page=1, per_page=PER_PAGE):
+    """Filter, sort and paginate diff ``rows``.
+
+    ``min_change`` keeps rows whose price moves by at least that many percent
+    (either way); ``change``/``change_pct`` sort by magnitude.
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Unknown sort key: {sort}")
+    selected = rows
+    if changed_only:
+        selected = [r for r in selected if r["change"]]
+    if min_change is not None:
+        selected = [r for r in selected if r["change_pct"] is not None and abs(r["change_pct"]) >= min_change]
+    if search:
+        needle = search.lower()
+        selected = [r for r in selected
+                    if needle in r["product"].lower() or needle in r["variant"].lower() or needle in r["sku"].lower()]
+    # Rows without a value (no current price) go last either way.
+    missing = [r for r in selected if r[sort] is None]
+    selected = sorted((r for r in selected if r[sort] is not None), key=_sort_key(sort), reverse=descending)
+    selected += missing
+    per_page = max(1, min(int(per_page), MAX_PER_PAGE))
+    pages = max(1, math.ceil(len(selected) / per_page))
+    page = max(1, min(int(page), pages))
+    changes = [r["change"] for r in selected if r["change"]]
+    return {
+        "total": len(rows),
+        "matched": len(selected),
+        "changed": len(changes),
+        "increase": round(sum(c for c in changes if c > 0), 2),
+        "decrease": round(sum(c for c in changes if c < 0), 2),
+        "page": page,
+        "pages": pages,
+        "per_page": per_page,
+        "rows": selected[(page - 1) * per_page:page * per_page],
+    }
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Preview the price changes of a job")
+    p.add_argument("kind", choices=KINDS)
+    p.add_argument("--percent", type=float)
+    p.add_argument("--sort", choices=SORT_KEYS, default="change_pct")
+    p.add_argument("--ascending", action="store_true")
+    p.add_argument("--min-change", type=float, help="Only changes of at least this many percent")
+    p.add_argument("--search")
+    p.add_argument("--limit", type=int, default=50)
+    args = p.parse_args(argv)
+
+    try:
+        rows, info = diff(args.kind, args.percent)
+    except ValueError as exc:
+        print(f"[ERROR] {exc}")
+        return 1
+    result = query(rows, args.sort, not args.ascending, args.min_change, True, args.search, 1, args.limit)
+    for r in result["rows"]:
+        pct = "" if r["change_pct"] is None else f"{r['change_pct']:+.1f}%"
+        print(f"{r['variant_id']:>14}  {r['product'][:30]:<30} {r['variant'][:24]:<24} "
+              f"{r['old'] if r['old'] is not None else '-':>10} -> {r['new']:>10}  {pct}")
+    print(f"[OK] {result['changed']} of {result['total']} variants change "
+          f"({result['matched']} shown by the filters, from the {info['source']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
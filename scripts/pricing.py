@@ -0,0 +1,156 @@
+"""Price computations shared by the updater scripts.
+
+These are the per-variant hot paths of the percentage, reset and ensemble
+jobs, kept apart from the Shopify calls so they can be benchmarked
+(``scripts/benchmarks.py``).
+"""
+
+import json
+import os
+import tempfile
+
+# Variant inputs per productVariantsBulkUpdate call.
+GROUP_SIZE = 50
+# Chain whose variant carries a chain product's base price.
+BASE_CHAIN = "Forsat S"
+
+
+def round_to_tidy(price: float) -> str:
+    price_int = int(round(price))
+    rem = price_int % 100
+    base = price_int - rem
+    opts = [base, base + 90, base + 100]
+    tidy = min(opts, key=lambda x: abs(price_int - x))
+    return f"{tidy:.2f}"
+
+
+def variant_gid(variant_id):
+    return f"gid://shopify/ProductVariant/{variant_id}"
+
+
+def percentage_updates(variants, percent):
+    """Apply ``percent`` and tidy rounding to backup ``variants``.
+
+    Returns ``(updates_by_product, base_price_values)``; the base price of a
+    product is the new price of its first variant.
+    """
+    factor = 1 + percent / 100.0
+    updates_by_product = {}
+    base_price_values = {}
+    for v in variants:
+        tidy = round_to_tidy(float(v["original_price"]) * factor)
+        pid = v["product_id"]
+        updates_by_product.setdefault(pid, []).append({
+            "id": variant_gid(v["variant_id"]),
+            "price": tidy,
+        })
+        if pid not in base_price_values:
+            base_price_values[pid] = tidy
+    return updates_by_product, base_price_values
+
+
+def reset_updates(variants):
+    """Group backup ``variants`` by product with their original prices."""
+    updates_by_product = {}
+    for v in variants:
+        updates_by_product.setdefault(v["product_id"], []).append({
+            "id": variant_gid(v["variant_id"]),
+            "price": v["original_price"],
+        })
+    return updates_by_product
+
+
+def chunk_groups(updates_by_product, size=GROUP_SIZE):
+    """Split per-product updates into ``(product_id, inputs)`` groups of ``size``."""
+    return [
+        (pid, updates[i:i + size])
+        for pid, updates in updates_by_product.items()
+        for i in range(0, len(updates), size)
+    ]
+
+
+def chain_category(tags):
+    """Surcharge table of a chain product from its ``tags``.
+
+    ``"bracelets"`` wins over ``"colliers"`` when a product has both tags;
+    ``None`` when it has neither.
+    """
+    tags = {t.strip().lower() for t in tags}
+    if "bracelet" in tags:
+        return "bracelets"
+    if "collier" in tags:
+        return "colliers"
+    return None
+
+
+def chain_surcharge(colliers, bracelets, collier, bracelet):
+    """Surcharge of a collier + bracelet pair; unknown or empty chains add 0."""
+    return colliers.get(collier, 0) + bracelets.get(bracelet, 0)
+
+
+def chain_price(base_price, chain, chains):
+    """Price of a chain variant for the variant updater: base plus surcharge.
+
+    The base chain (Forsat S) carries the base price itself; no rounding.
+    """
+    if chain == BASE_CHAIN:
+        return base_price
+    return base_price + chains[chain]
+
+
+def surcharge_matrix(surcharges):
+    """``{(collier, bracelet): surcharge}`` for every pair of known chains.
+
+    ``""`` stands for a variant without that chain.
+    """
+    colliers = surcharges["colliers"]
+    bracelets = surcharges["bracelets"]
+    return {
+        (collier, bracelet): chain_surcharge(colliers, bracelets, collier, bracelet)
+        for collier in ("", *colliers)
+        for bracelet in ("", *bracelets)
+    }
+
+
+def ensemble_updates(variant_nodes, surcharges, base_price=None):
+    """Price ensemble variants from the first variant plus their surcharges.
+
+    ``variant_nodes`` are GraphQL variant nodes with ``selectedOptions``;
+    returns the ``ProductVariantsBulkInput`` list for the product.  Pass
+    ``base_price`` to price from it instead of the first variant.
+    """
+    if base_price is None:
+        base_price = variant_nodes[0]["price"]
+    base_price = float(base_price)
+    colliers = surcharges["colliers"]
+    bracelets = surcharges["bracelets"]
+    updates = []
+    for v in variant_nodes:
+        collier = ""
+        bracelet = ""
+        for opt in v.get("selectedOptions", []):
+            name = opt.get("name", "").lower()
+            if name == "collier":
+                collier = opt.get("value", "")
+            elif name == "bracelet":
+                bracelet = opt.get("value", "")
+        price = base_price + chain_surcharge(colliers, bracelets, collier, bracelet)
+        updates.append({"id": v["id"], "price": round_to_tidy(price)})
+    return updates
+
+
+def load_backup(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_backup(path, variants):
+    """Atomically write the price backup."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(variants, f, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Run a script under the profiler and write reports next to it.
+
+    python scripts/profiling.py --out /tmp/prof scripts/update_prices_shopify.py --percent 5
+
+Two profilers run side by side:
+
+ • ``cProfile`` in every thread, merged into ``profile.pstats`` (open with
+   ``python -m pstats`` or snakeviz) plus a text summary in ``profile.txt``
+ • a wall-clock sampler over all threads, written as collapsed stacks to
+   ``profile.collapsed`` (``flamegraph.pl`` or speedscope).  Unlike cProfile
+   it also shows time spent blocked on the network.
+
+The job runner uses this when a job is started with ``profile=1``.
+"""
+
+import argparse
+import cProfile
+import io
+import os
+import pstats
+import re
+import runpy
+import sys
+import threading
+import time
+from collections import Counter
+
+PSTATS_FILE = "profile.pstats"
+SUMMARY_FILE = "profile.txt"
+COLLAPSED_FILE = "profile.collapsed"
+
+
+class StackSampler:
+    """Sample the stacks of all threads every ``interval`` seconds."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            # Pool threads share one root so their stacks merge.
+            names = {t.ident: re.sub(r"_\d+$", "", t.name) for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, "thread"))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ThreadProfiles:
+    """One ``cProfile.Profile`` per thread, merged when the run ends."""
+
+    def __init__(self):
+        self.profiles = []
+        self._lock = threading.Lock()
+
+    def _start_in_thread(self, *args):
+        sys.setprofile(None)
+        prof = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(prof)
+        prof.enable()
+
+    def start(self):
+        threading.setprofile(self._start_in_thread)
+        self._start_in_thread()
+
+    def stop(self):
+        threading.setprofile(None)
+        self.profiles[0].disable()
+
+    def stats(self):
+        stream = io.StringIO()
+        stats = None
+        for prof in self.profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(prof, stream=stream)
+                else:
+                    stats.add(prof)
+            except TypeError:
+                # A thread that never made a call leaves an empty profile.
+                continue
+        return stats, stream
+
+
+def run(script, args, out_dir, interval=0.005):
+    """Run ``script`` with ``args`` as ``__main__``; return the written files."""
+    os.makedirs(out_dir, exist_ok=True)
+    sys.argv = [script] + list(args)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    profiles = ThreadProfiles()
+    sampler = StackSampler(interval)
+    sampler.start()
+    started = time.perf_counter()
+    profiles.start()
+    exit_code = 0
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit as exc:
+        exit_code = exc.code
+    finally:
+        profiles.stop()
+        elapsed = time.perf_counter() - started
+        sampler.stop()
+
+        files = []
+        stats, stream = profiles.stats()
+        if stats is not None:
+            stats.dump_stats(os.path.join(out_dir, PSTATS_FILE))
+            stats.sort_stats("cumulative").print_stats(40)
+            stats.sort_stats("tottime").print_stats(40)
+            with open(os.path.join(out_dir, SUMMARY_FILE), "w", encoding="utf-8") as f:
+                f.write(f"Wall time: {elapsed:.2f}s, threads profiled: {len(profiles.profiles)}\n")
+                f.write(stream.getvalue())
+            files += [PSTATS_FILE, SUMMARY_FILE]
+        sampler.write(os.path.join(out_dir, COLLAPSED_FILE))
+        files.append(COLLAPSED_FILE)
+        print(f"[PROFILE] {elapsed:.2f}s profiled, reports written to {out_dir}")
+    if exit_code:
+        sys.exit(exit_code)
+    return files
+
+
+def main():
+    p = argparse.ArgumentParser(description="Profile a script")
+    p.add_argument("--out", default=os.getenv("JOB_DIR") or "profile", help="Directory for the reports")
+    p.add_argument("--interval", type=float, default=0.005, help="Sampling interval in seconds")
+    p.add_argument("script")
+    p.add_argument("args", nargs=argparse.REMAINDER)
+    args = p.parse_args()
+    run(args.script, args.args, args.out, args.interval)
+
+
+if __name__ == "__main__":
+    main()
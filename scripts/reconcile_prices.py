@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""Repair variant prices that drifted from ``custom.base_price``.
+
+Missed or failed webhooks leave variants at prices their product's base
+price no longer gives.  Instead of rewriting every price
+(``sync_prices_from_base.py``), this job exports products, variants and
+base prices with one bulk query, works out the drift in memory and
+repairs only the drifting variants with one bulk mutation.
+
+The expected price follows the product's tags:
+
+- ``flat`` – price and compare-at price equal the base price, as the
+  ``metafields/update`` webhook sets them
+- ``chain`` – ``chaine_update`` bracelets and colliers: the base price plus
+  the chain's surcharge; variants of unknown chains are left alone
+- ``ensemble`` – the base price plus the collier and bracelet surcharges,
+  with tidy rounding
+
+Products without a base price are skipped.  Each run is appended to a JSON
+history (``RECONCILE_HISTORY``, default ``reconcile_history.json`` next to
+this file), so the drift can be followed over time, and the drifting
+variants are written to ``drift.csv`` in ``JOB_DIR``:
+
+    python scripts/reconcile_prices.py --dry-run
+    python scripts/reconcile_prices.py
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+from decimal import Decimal, InvalidOperation
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dotenv import load_dotenv
+
+from scripts import events, metrics, preview, pricing, shopify_client, surcharges as surcharge_config
+
+load_dotenv()
+
+HISTORY_FILE = os.path.join(os.path.dirname(__file__), "reconcile_history.json")
+HISTORY_LIMIT = 1000
+DRIFT_FILE = "drift.csv"
+RULES = ("flat", "chain", "ensemble")
+
+EXPORT_QUERY = """
+{
+  products {
+    edges {
+      node {
+        id
+        tags
+        metafield(namespace: "custom", key: "base_price") { value }
+        variants {
+          edges {
+            node { id price compareAtPrice selectedOptions { name value } }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+DRIFT = metrics.gauge(
+    "price_drift_variants", "Variants off their base price at the last reconciliation.", ("rule",)
+)
+REPAIRS = metrics.counter(
+    "price_drift_repairs_total", "Drifting variants sent for repair by outcome.", ("status",)
+)
+
+
+def history_path():
+    return os.getenv("RECONCILE_HISTORY", HISTORY_FILE)
+
+
+def load_history(path=None):
+    path = path or history_path()
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_history(history, path=None):
+    path = path or history_path()
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(history[-HISTORY_LIMIT:], f, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _legacy_id(gid):
+    return int(str(gid).rsplit("/", 1)[-1])
+
+
+def parse_export(lines):
+    """Products of the bulk export, each with its ``variants``."""
+    products = {}
+    for line in lines:
+        parent = line.get("__parentId")
+        if parent is None:
+            metafield = line.get("metafield") or {}
+            products[line["id"]] = {
+                "id": _legacy_id(line["id"]),
+                "tags": line.get("tags") or [],
+                "base_price": metafield.get("value"),
+                "variants": [],
+            }
+        elif parent in products:
+            products[parent]["variants"].append({
+                "id": _legacy_id(line["id"]),
+                "price": line.get("price"),
+                "compare_at_price": line.get("compareAtPrice"),
+                "options": {o["name"]: o["value"] for o in line.get("selectedOptions") or []},
+            })
+    return list(products.values())
+
+
+def rule(product):
+    """Pricing rule of ``product``: ``flat``, ``chain`` or ``ensemble``."""
+    tags = {t.strip().lower() for t in product.get("tags", [])}
+    if preview.ENSEMBLE_TAG in tags:
+        return "ensemble"
+    if preview.CHAIN_TAG in tags and pricing.chain_category(tags):
+        return "chain"
+    return "flat"
+
+
+def _decimal(value):
+    try:
+        return Decimal(str(value)) if value not in (None, "") else None
+    except InvalidOperation:
+        return None
+
+
+def expected(product, surcharges):
+    """``(variant, input)`` for each variant the rule prices.
+
+    ``input`` holds the fields the variant should have; variants the rule
+    does not price (unknown chains) are left out.
+    """
+    kind = rule(product)
+    base = _decimal(product.get("base_price"))
+    if base is None:
+        return
+    if kind == "flat":
+        price = f"{base:.2f}"
+        for v in product["variants"]:
+            yield v, {"price": price, "compareAtPrice": price}
+    elif kind == "chain":
+        chains = surcharges[pricing.chain_category(product["tags"])]
+        for v in product["variants"]:
+            chain = next((o for o in v["options"].values() if o in chains), None)
+            if chain is not None:
+                yield v, {"price": f"{pricing.chain_price(float(base), chain, chains):.2f}"}
+    elif product["variants"]:
+        nodes = [
+            {"id": v["id"], "selectedOptions": [{"name": n, "value": val} for n, val in v["options"].items()]}
+            for v in product["variants"]
+        ]
+        for v, update in zip(product["variants"], pricing.ensemble_updates(nodes, surcharges, base)):
+            yield v, {"price": update["price"]}
+
+
+def drift(products, surcharges):
+    """Variant inputs repairing the drift, and the drift counts.
+
+    Returns ``(updates_by_product, rows, counts)``; ``rows`` describe each
+    drifting variant and ``counts`` hold the variants checked and drifting
+    per rule.
+    """
+    updates, rows = {}, []
+    counts = {"products": len(products), "variants": 0, "no_base": 0,
+              "drift": 0, "by_rule": dict.fromkeys(RULES, 0)}
+    for product in products:
+        counts["variants"] += len(product["variants"])
+        if _decimal(product.get("base_price")) is None:
+            counts["no_base"] += 1
+            continue
+        kind = rule(product)
+        for v, fields in expected(product, surcharges):
+            current = {"price": v["price"], "compareAtPrice": v["compare_at_price"]}
+            if all(_decimal(current[k]) == _decimal(value) for k, value in fields.items()):
+                continue
+            updates.setdefault(product["id"], []).append({"id": pricing.variant_gid(v["id"]), **fields})
+            rows.append({
+                "product_id": product["id"], "variant_id": v["id"], "rule": kind,
+                "base_price": product["base_price"], "price": v["price"], "expected": fields["price"],
+            })
+            counts["drift"] += 1
+            counts["by_rule"][kind] += 1
+    return updates, rows, counts
+
+
+def write_drift(rows, directory):
+    path = os.path.join(directory, DRIFT_FILE)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["product_id", "variant_id", "rule", "base_price", "price", "expected"])
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def repair(session, updates):
+    """Send ``updates`` as one bulk mutation; return the progress tracker."""
+    progress = events.Progress(sum(len(u) for u in updates.values()), "variants")
+    if not updates:
+        return progress
+    for pid, inputs, error in shopify_client.send_bulk_updates(session, pricing.chunk_groups(updates)):
+        if error:
+            print(f"[ERROR] {pid}: {error}")
+            events.error(f"{pid}: {error}")
+            progress.advance(failed=len(inputs))
+        else:
+            progress.advance(ok=len(inputs))
+    REPAIRS.inc(progress.ok, status="ok")
+    REPAIRS.inc(progress.failed, status="failed")
+    return progress
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Repair variant prices that drifted from their base price")
+    p.add_argument("--dry-run", action="store_true", help="Report the drift without repairing it")
+    args = p.parse_args(argv)
+
+    session = shopify_client.get_session()
+    events.phase("export")
+    products = parse_export(shopify_client.run_bulk_query(session, EXPORT_QUERY))
+    version, surcharges = surcharge_config.load()
+    updates, rows, counts = drift(products, surcharges)
+    for kind in RULES:
+        DRIFT.set(counts["by_rule"][kind], rule=kind)
+    print(f"[INFO] {counts['products']} products / {counts['variants']} variants, "
+          f"{counts['no_base']} products without base price (surcharges version {version})")
+    print(f"[INFO] {counts['drift']} variants drifted: "
+          + ", ".join(f"{kind} {counts['by_rule'][kind]}" for kind in RULES))
+    if rows and os.getenv("JOB_DIR"):
+        write_drift(rows, os.environ["JOB_DIR"])
+
+    entry = dict(counts, at=time.time(), job_id=os.getenv("JOB_ID"), dry_run=args.dry_run, repaired=0, failed=0)
+    if args.dry_run:
+        events.emit("summary", dry_run=True, done=0, total=counts["drift"], ok=0, failed=0)
+        print("[DONE] Dry run, nothing was sent")
+    else:
+        events.phase("repair")
+        progress = repair(session, updates)
+        entry.update(repaired=progress.ok, failed=progress.failed)
+        progress.summary(drift=counts["drift"])
+        print(f"[DONE] Repaired {progress.ok} variants" + (f", {progress.failed} failed" if progress.failed else ""))
+
+    history = load_history()
+    history.append(entry)
+    save_history(history)
+    return 0 if not entry["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,9 @@ import time
 import requests
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts import shopify_client
+
 load_dotenv()
 
 TOKEN = os.getenv("API_TOKEN")
@@ -31,7 +34,7 @@ def main():
         "X-Shopify-Access-Token": TOKEN,
         "Content-Type": "application/json",
     })
-    base_url = f"https://{DOMAIN}/admin/api/{API_VERSION}"
+    base_url = shopify_client.admin_url(DOMAIN)
     address = f"{APP_BASE_URL.rstrip('/')}/webhook/metaobject"
 
     resp = shopify_request(
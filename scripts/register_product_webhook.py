@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import requests
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts import shopify_client
+
+load_dotenv()
+
+TOKEN = os.getenv("API_TOKEN")
+DOMAIN = os.getenv("SHOP_DOMAIN")
+API_VERSION = os.getenv("API_VERSION", "2024-04")
+APP_BASE_URL = os.getenv("APP_BASE_URL")
+
+TOPICS = ("products/update", "products/delete")
+
+if not APP_BASE_URL:
+    print("APP_BASE_URL is not set")
+    sys.exit(1)
+
+
+def shopify_request(session, method, url, **kwargs):
+    while True:
+        resp = session.request(method, url, timeout=30, **kwargs)
+        if resp.status_code == 429:
+            time.sleep(2)
+            continue
+        return resp
+
+
+def register(session, base_url, address, topic):
+    resp = shopify_request(
+        session,
+        "get",
+        f"{base_url}/webhooks.json",
+        params={"topic": topic},
+    )
+    if resp.ok:
+        for hook in resp.json().get("webhooks", []):
+            if hook.get("address") == address:
+                print(f"[OK] {topic} webhook already registered (id={hook.get('id')})")
+                return
+
+    payload = {
+        "webhook": {
+            "topic": topic,
+            "address": address,
+            "format": "json",
+        }
+    }
+    resp = shopify_request(
+        session, "post", f"{base_url}/webhooks.json", json=payload
+    )
+    if resp.ok:
+        wid = resp.json().get("webhook", {}).get("id")
+        print(f"[OK] Registered {topic} webhook (id={wid})")
+    else:
+        print(f"[ERROR] {topic}: {resp.status_code} {resp.text}")
+        resp.raise_for_status()
+
+
+def main():
+    session = requests.Session()
+    session.headers.update({
+        "X-Shopify-Access-Token": TOKEN,
+        "Content-Type": "application/json",
+    })
+    base_url = shopify_client.admin_url(DOMAIN)
+    address = f"{APP_BASE_URL.rstrip('/')}/webhook/product"
+    for topic in TOPICS:
+        register(session, base_url, address, topic)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 import os
-import json
+import sys
 import requests
 from dotenv import load_dotenv
 import argparse
-import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts import events, planner, pricing, shopify_client
 
 # 1) Load .env
 load_dotenv()
@@ -15,20 +17,11 @@ DOMAIN      = os.getenv("SHOP_DOMAIN")
 API_VERSION = os.getenv("API_VERSION", "2024-04")
 
 
-def graphql_post(session, query, variables=None):
-    """POST to Shopify's GraphQL API with basic retry for rate limits."""
-    url = f"https://{DOMAIN}/admin/api/{API_VERSION}/graphql.json"
-    payload = {"query": query, "variables": variables or {}}
-    while True:
-        resp = session.post(url, json=payload)
-        if resp.status_code == 429:
-            time.sleep(2)
-            continue
-        return resp
-
 def main():
     p = argparse.ArgumentParser()
-    p.parse_args()
+    p.add_argument("--plan", action="store_true",
+                   help="Print the estimated Shopify cost and duration, then exit")
+    args = p.parse_args()
 
     session = requests.Session()
     session.headers.update({
@@ -36,54 +29,34 @@ def main():
         "Content-Type": "application/json"
     })
 
-    backup_file = os.path.join(os.path.dirname(__file__), "shopify_backup.json")
+    if args.plan:
+        planner.print_plan("reset", session)
+        return
+
+    backup_file = os.getenv("PRICE_BACKUP") or os.path.join(os.path.dirname(__file__), "shopify_backup.json")
     if not os.path.exists(backup_file):
         print("❌  No backup found. Cannot reset.")
         return
 
-    variants = json.load(open(backup_file, "r", encoding="utf-8"))
-
-    mutation = """
-    mutation BulkUpdate($productId: ID!, $variants: [ProductVariantsBulkInput!]!) {
-      productVariantsBulkUpdate(productId: $productId, variants: $variants) {
-        userErrors { field message }
-      }
-    }
-    """
-
-    updates_by_product = {}
-
-
-
-    def send_batch(pid, items):
-        resp = graphql_post(session, mutation, {
-            "productId": f"gid://shopify/Product/{pid}",
-            "variants": items
-        })
-        if resp.ok:
-            errors = resp.json()["data"]["productVariantsBulkUpdate"]["userErrors"]
-            for e in errors:
-                print(f"❌ {e['field']}: {e['message']}")
-            for u in items:
-                print(f"🔄  {u['id'].split('/')[-1]} → {u['price']}")
-        else:
-            print(f"❌  bulk update failed: {resp.text}")
-
-    for v in variants:
-        pid = v["product_id"]
-
-        updates_by_product.setdefault(pid, [])
-        updates_by_product[pid].append({
-
-            "id": f"gid://shopify/ProductVariant/{v['variant_id']}",
-            "price": v["original_price"],
-        })
-
-    for pid, items in updates_by_product.items():
-        for i in range(0, len(items), 50):
-            send_batch(pid, items[i:i+50])
-
+    variants = pricing.load_backup(backup_file)
 
+    groups = pricing.chunk_groups(pricing.reset_updates(variants))
+    progress = events.Progress(sum(len(items) for _, items in groups), "reset")
+    for pid, items, node, error in shopify_client.send_packed_updates(session, groups):
+        if node is None:
+            print(f"❌  bulk update failed: {error}")
+            events.error(f"{pid}: bulk update failed: {error}")
+            progress.advance(failed=len(items))
+            continue
+        for e in node.get("userErrors") or []:
+            print(f"❌ {e['field']}: {e['message']}")
+            events.error(f"{pid}: {e['field']}: {e['message']}")
+        for u in items:
+            print(f"🔄  {u['id'].split('/')[-1]} → {u['price']}")
+        failed = len(node.get("userErrors") or [])
+        progress.advance(ok=len(items) - failed, failed=failed)
+
+    progress.summary()
     print("✅  All prices reset.")
 
 if __name__=="__main__":
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Inverted index over the catalog snapshot for selecting products and variants.
+
+Queries are space-separated terms, all of which must match; quote values
+with spaces and prefix a term with ``-`` to exclude it::
+
+    tag:bracelet chain:"Gourmette M"
+    option:"Bracelet=Gourmette M" -vendor:Azor
+    collection:ensembles forsat
+
+Product terms are ``tag``, ``vendor``, ``collection``, ``type`` (product
+type) and bare words (title words).  Variant terms are ``option``
+(``Name=Value``), ``value`` (an option value under any name; ``chain`` is
+the same) and ``sku``.  Matching ignores case.  A query selects the variants
+matching every variant term within the products matching every product
+term.  The index is rebuilt when the snapshot changes:
+
+    python scripts/search_index.py 'tag:bracelet chain:"Gourmette M"'
+"""
+
+import argparse
+import os
+import re
+import shlex
+import sys
+import threading
+from collections import defaultdict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from scripts import preview
+
+PRODUCT_FIELDS = ("tag", "vendor", "collection", "type", "word")
+VARIANT_FIELDS = ("option", "value", "sku")
+ALIASES = {"chain": "value"}
+RESULTS = 50
+
+_WORD_RE = re.compile(r"\w+")
+
+_index = (None, None)
+_index_lock = threading.Lock()
+
+
+def _norm(value):
+    return str(value).strip().casefold()
+
+
+class SearchIndex:
+    def __init__(self, products):
+        self.titles = {}
+        self.owner = {}
+        self.variants_of = {}
+        self.postings = {field: defaultdict(set) for field in PRODUCT_FIELDS + VARIANT_FIELDS}
+        for product in products:
+            pid = product["id"]
+            self.titles[pid] = product.get("title", "")
+            self.variants_of[pid] = [v["id"] for v in product.get("variants", [])]
+            terms = {
+                "tag": product.get("tags", []),
+                "vendor": [product.get("vendor")],
+                "collection": product.get("collections", []),
+                "type": [product.get("product_type")],
+                "word": _WORD_RE.findall(product.get("title", "")),
+            }
+            for field, values in terms.items():
+                for value in values:
+                    if value:
+                        self.postings[field][_norm(value)].add(pid)
+            for v in product.get("variants", []):
+                vid = v["id"]
+                self.owner[vid] = pid
+                for name, value in v.get("options", {}).items():
+                    self.postings["option"][f"{_norm(name)}={_norm(value)}"].add(vid)
+                    self.postings["value"][_norm(value)].add(vid)
+                if v.get("sku"):
+                    self.postings["sku"][_norm(v["sku"])].add(vid)
+
+    def values(self, field):
+        """``{value: count}`` of a field, e.g. for suggestions."""
+        field = ALIASES.get(field, field)
+        if field not in self.postings:
+            raise ValueError(f"Unknown field: {field}")
+        return {value: len(ids) for value, ids in self.postings[field].items()}
+
+    def _term(self, token):
+        negate = token.startswith("-") and len(token) > 1
+        if negate:
+            token = token[1:]
+        field, sep, value = token.partition(":")
+        if not sep:
+            field, value = "word", token
+        field = ALIASES.get(field.casefold(), field.casefold())
+        if field not in self.postings:
+            raise ValueError(f"Unknown field: {field}")
+        value = _norm(value)
+        if field == "option":
+            name, _, option = value.partition("=")
+            value = f"{name.strip()}={option.strip()}"
+        return field, negate, self.postings[field].get(value, set())
+
+    def select(self, query):
+        """Return ``(product_ids, variant_ids)`` matching ``query``, sorted.
+
+        Raises ``ValueError`` for unknown fields or unbalanced quotes.
+        """
+        try:
+            tokens = shlex.split(query or "")
+        except ValueError as exc:
+            raise ValueError(f"Invalid query: {exc}") from None
+        include = {"product": [], "variant": []}
+        exclude = {"product": set(), "variant": set()}
+        for token in tokens:
+            field, negate, ids = self._term(token)
+            level = "product" if field in PRODUCT_FIELDS else "variant"
+            if negate:
+                exclude[level] |= ids
+            else:
+                include[level].append(ids)
+
+        # Intersect the smallest sets first.
+        products = None
+        for ids in sorted(include["product"], key=len):
+            products = set(ids) if products is None else products & ids
+        if products is None:
+            products = set(self.titles)
+        products -= exclude["product"]
+
+        variants = None
+        for ids in sorted(include["variant"], key=len):
+            variants = set(ids) if variants is None else variants & ids
+        if variants is None:
+            variants = {vid for pid in products for vid in self.variants_of[pid]}
+        else:
+            variants = {vid for vid in variants if self.owner[vid] in products}
+            products = {self.owner[vid] for vid in variants}
+        if exclude["variant"]:
+            variants -= exclude["variant"]
+            products = {self.owner[vid] for vid in variants}
+        return sorted(products), sorted(variants)
+
+    def search(self, query, limit=RESULTS):
+        """Counts and the first ``limit`` matching products for a search box."""
+        products, variants = self.select(query)
+        matched = defaultdict(int)
+        for vid in variants:
+            matched[self.owner[vid]] += 1
+        return {
+            "products": len(products),
+            "variants": len(variants),
+            "results": [
+                {"id": pid, "title": self.titles[pid], "variants": matched[pid],
+                 "total_variants": len(self.variants_of[pid])}
+                for pid in products[:max(0, limit)]
+            ],
+        }
+
+
+def get_index():
+    """Index of the current catalog snapshot; raises ``ValueError`` without one."""
+    global _index
+    products = preview.snapshot_products()
+    if products is None:
+        raise ValueError("No catalog snapshot; run scripts/catalog_snapshot.py first")
+    with _index_lock:
+        built_from, index = _index
+        if built_from is not products:
+            index = SearchIndex(products)
+            _index = (products, index)
+        return index
+
+
+def select(query):
+    """``(product_ids, variant_ids)`` of ``query`` over the current snapshot."""
+    return get_index().select(query)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Select products and variants from the catalog snapshot")
+    p.add_argument("query")
+    p.add_argument("--limit", type=int, default=20)
+    args = p.parse_args(argv)
+
+    try:
+        result = get_index().search(args.query, args.limit)
+    except ValueError as exc:
+        print(f"[ERROR] {exc}")
+        return 1
+    for r in result["results"]:
+        print(f"{r['id']:>14}  {r['title'][:50]:<50} {r['variants']}/{r['total_variants']} variants")
+    print(f"[OK] {result['products']} products / {result['variants']} variants match")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,545 @@
+"""Shared helpers for talking to the Shopify Admin API.
+
+Sessions are pooled per access token so every caller in a process reuses
+the same keep-alive connections instead of opening a new TLS connection
+per request.
+"""
+
+import concurrent.futures
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scripts import metrics, tracing
+
+POOL_SIZE = 16
+THROTTLE_WAIT = 2
+# Attempts made when the connection fails before the error is raised.
+CONNECT_ATTEMPTS = 5
+
+REQUESTS = metrics.counter(
+    "shopify_requests_total",
+    "Shopify Admin API requests by API, operation and HTTP status.",
+    ("api", "operation", "status"),
+)
+REQUEST_SECONDS = metrics.histogram(
+    "shopify_request_duration_seconds",
+    "Shopify Admin API request latency.",
+    ("api", "operation"),
+)
+THROTTLED_SECONDS = metrics.counter(
+    "shopify_throttled_seconds_total",
+    "Seconds spent waiting after throttled or dropped requests.",
+    ("api",),
+)
+COST_POINTS = metrics.counter(
+    "shopify_graphql_cost_points_total",
+    "GraphQL cost points consumed (actualQueryCost).",
+    ("operation",),
+)
+
+_COST_RE = re.compile(r'"actualQueryCost"\s*:\s*(\d+)')
+_ID_RE = re.compile(r"/\d+(?=/|\.json|$)")
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def api_version():
+    return os.getenv("API_VERSION", "2024-04")
+
+
+def admin_url(domain=None):
+    """Return the Admin REST base URL for ``domain`` (``SHOP_DOMAIN``).
+
+    A domain given with an explicit scheme (``http://127.0.0.1:8081``) is
+    used as is, which lets everything run against a local stand-in.
+    """
+    domain = (domain or os.getenv("SHOP_DOMAIN") or "").rstrip("/")
+    if "://" not in domain:
+        domain = f"https://{domain}"
+    return f"{domain}/admin/api/{api_version()}"
+
+
+def get_session(token=None):
+    """Return the process-wide pooled session for ``token`` (``API_TOKEN``)."""
+    token = token or os.getenv("API_TOKEN")
+    with _sessions_lock:
+        session = _sessions.get(token)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                "X-Shopify-Access-Token": token,
+                "Content-Type": "application/json",
+            })
+            _sessions[token] = session
+        return session
+
+
+def graphql_operation(query):
+    """Return ``"mutation"`` or ``"query"`` for a GraphQL document."""
+    return "mutation" if query.lstrip().startswith("mutation") else "query"
+
+
+def rest_operation(path):
+    """Return a REST path with numeric IDs replaced, e.g. ``products/:id.json``."""
+    path = urlparse(path).path
+    if "/admin/api/" in path:
+        path = path.split("/admin/api/", 1)[1].split("/", 1)[-1]
+    return _ID_RE.sub("/:id", "/" + path.lstrip("/")).lstrip("/")
+
+
+def record_request(api, operation, started, resp=None):
+    """Record one Admin API round trip; ``resp=None`` for a dropped request."""
+    REQUEST_SECONDS.observe(time.monotonic() - started, api=api, operation=operation)
+    status = str(resp.status_code) if resp is not None else "error"
+    REQUESTS.inc(api=api, operation=operation, status=status)
+    cost = None
+    text = getattr(resp, "text", None)
+    if api == "graphql" and isinstance(text, str):
+        match = _COST_RE.search(text)
+        if match:
+            cost = int(match.group(1))
+            COST_POINTS.inc(cost, operation=operation)
+    tracing.note_attempt(resp.status_code if resp is not None else "error", cost)
+
+
+def graphql_throttle(resp):
+    """Seconds to wait before retrying a ``THROTTLED`` GraphQL response.
+
+    Shopify answers a request its cost bucket cannot cover with ``200`` and
+    a ``THROTTLED`` error; the wait is derived from ``throttleStatus``.
+    Returns ``None`` for any other response.
+    """
+    text = getattr(resp, "text", None)
+    if resp.status_code != 200 or not isinstance(text, str) or '"THROTTLED"' not in text:
+        return None
+    try:
+        cost = resp.json()["extensions"]["cost"]
+        status = cost["throttleStatus"]
+        missing = cost["requestedQueryCost"] - status["currentlyAvailable"]
+        return max(0.1, missing / status["restoreRate"])
+    except (ValueError, KeyError, TypeError, ZeroDivisionError):
+        return THROTTLE_WAIT
+
+
+def throttle_wait(api, seconds=THROTTLE_WAIT):
+    """Sleep before a retry and account the time as throttled."""
+    THROTTLED_SECONDS.inc(seconds, api=api)
+    tracing.note_wait(seconds)
+    time.sleep(seconds)
+
+
+def connection_retry(api, attempt, exc):
+    """Wait before retrying a failed connection; re-raise after the last attempt.
+
+    The waits double from ``THROTTLE_WAIT``, so a wrong domain or an outage
+    fails after ``CONNECT_ATTEMPTS`` tries instead of hanging.
+    """
+    if attempt >= CONNECT_ATTEMPTS:
+        raise exc
+    throttle_wait(api, THROTTLE_WAIT * 2 ** (attempt - 1))
+
+
+def rest_get(session, path, params=None, domain=None):
+    """GET ``path`` below the Admin REST URL, retrying on 429 and dropped connections.
+
+    ``path`` may also be a full URL, which is used as is.
+    """
+    url = path if "://" in path else f"{admin_url(domain)}/{path.lstrip('/')}"
+    operation = rest_operation(path)
+    failures = 0
+    with tracing.span("rest", f"GET {operation}", path):
+        while True:
+            started = time.monotonic()
+            try:
+                resp = session.get(url, params=params, timeout=30)
+            except requests.exceptions.ConnectionError as exc:
+                record_request("rest", operation, started)
+                failures += 1
+                connection_retry("rest", failures, exc)
+                continue
+            record_request("rest", operation, started, resp)
+            if resp.status_code == 429:
+                throttle_wait("rest")
+                continue
+            return resp
+
+
+def next_page_info(resp):
+    """Return the ``page_info`` cursor of the ``rel="next"`` Link, if any."""
+    link = resp.headers.get("Link", "")
+    if not link:
+        return None
+    for item in requests.utils.parse_header_links(link):
+        if item.get("rel") == "next":
+            return parse_qs(urlparse(item.get("url", "")).query).get("page_info", [None])[0]
+    return None
+
+
+def graphql_post(session, query, variables=None, domain=None):
+    """POST to the GraphQL endpoint, retrying on 429 and dropped connections."""
+    url = f"{admin_url(domain)}/graphql.json"
+    payload = {"query": query, "variables": variables or {}}
+    operation = graphql_operation(query)
+    failures = 0
+    with tracing.span("graphql", tracing.graphql_name(query), variables):
+        while True:
+            started = time.monotonic()
+            try:
+                resp = session.post(url, json=payload, timeout=30)
+            except requests.exceptions.ConnectionError as exc:
+                record_request("graphql", operation, started)
+                failures += 1
+                connection_retry("graphql", failures, exc)
+                continue
+            record_request("graphql", operation, started, resp)
+            if resp.status_code == 429:
+                throttle_wait("graphql")
+                continue
+            wait = graphql_throttle(resp)
+            if wait is not None:
+                throttle_wait("graphql", wait)
+                continue
+            return resp
+
+
+def graphql_data(resp):
+    """Return the ``data`` node of a GraphQL response or raise."""
+    resp.raise_for_status()
+    payload = resp.json()
+    if payload.get("errors"):
+        raise RuntimeError(f"GraphQL errors: {payload['errors']}")
+    return payload.get("data") or {}
+
+
+def product_gid(product_id):
+    product_id = str(product_id)
+    if product_id.startswith("gid://"):
+        return product_id
+    return f"gid://shopify/Product/{product_id}"
+
+
+BULK_UPDATE_SELECTION = "userErrors { field message }"
+
+# Requested cost of one mutation field.
+MUTATION_COST = 10
+# Variant inputs per aliased document, keeping request bodies small.
+MAX_PACKED_VARIANTS = 250
+
+
+def cost_ceiling():
+    """Requested cost allowed per packed document (``GRAPHQL_COST_CEILING``)."""
+    try:
+        return max(MUTATION_COST, int(os.getenv("GRAPHQL_COST_CEILING", "250")))
+    except ValueError:
+        return 250
+
+
+def aliased_bulk_update(groups, selection=BULK_UPDATE_SELECTION):
+    """Build one document running ``productVariantsBulkUpdate`` per group.
+
+    ``groups`` is a list of ``(product_id, variant_inputs)``.  Field ``i`` is
+    aliased ``p{i}``.  Returns ``(query, variables)``.
+    """
+    params, fields, variables = [], [], {}
+    for i, (product_id, variants) in enumerate(groups):
+        params.append(f"$p{i}: ID!, $v{i}: [ProductVariantsBulkInput!]!")
+        fields.append(
+            f"p{i}: productVariantsBulkUpdate(productId: $p{i}, variants: $v{i}) "
+            f"{{ {selection} }}"
+        )
+        variables[f"p{i}"] = product_gid(product_id)
+        variables[f"v{i}"] = variants
+    query = "mutation Batch(%s) {\n  %s\n}" % (", ".join(params), "\n  ".join(fields))
+    return query, variables
+
+
+def send_aliased_bulk_update(session, groups, selection=BULK_UPDATE_SELECTION, domain=None):
+    """Send ``groups`` as one aliased document.
+
+    Returns a list aligned with ``groups`` of ``(node, error)`` where
+    ``error`` is ``None`` on success.
+    """
+    query, variables = aliased_bulk_update(groups, selection)
+    try:
+        resp = graphql_post(session, query, variables, domain)
+        resp.raise_for_status()
+        payload = resp.json()
+    except Exception as exc:
+        return [(None, str(exc))] * len(groups)
+    data = payload.get("data") or {}
+    alias_errors = {}
+    for err in payload.get("errors") or []:
+        path = err.get("path") or []
+        if not path:
+            return [(None, f"GraphQL errors: {payload['errors']}")] * len(groups)
+        alias_errors.setdefault(path[0], []).append(err.get("message"))
+    results = []
+    for i in range(len(groups)):
+        node = data.get(f"p{i}")
+        if f"p{i}" in alias_errors:
+            results.append((node, f"GraphQL errors: {alias_errors[f'p{i}']}"))
+        elif node is None:
+            results.append((None, "No result returned"))
+        elif node.get("userErrors"):
+            results.append((node, f"Bulk update errors: {node['userErrors']}"))
+        else:
+            results.append((node, None))
+    return results
+
+
+def pack_groups(groups, max_cost=None, max_variants=MAX_PACKED_VARIANTS):
+    """Split ``(product_id, variant_inputs)`` groups into aliased documents.
+
+    A document is closed before its estimated cost would pass ``max_cost``
+    or it would carry more than ``max_variants`` variant inputs.
+    """
+    max_cost = max_cost or cost_ceiling()
+    batch, cost, variants = [], 0, 0
+    for group in groups:
+        size = len(group[1])
+        if batch and (cost + MUTATION_COST > max_cost or variants + size > max_variants):
+            yield batch
+            batch, cost, variants = [], 0, 0
+        batch.append(group)
+        cost += MUTATION_COST
+        variants += size
+    if batch:
+        yield batch
+
+
+def send_packed_updates(session, groups, selection=BULK_UPDATE_SELECTION, domain=None, max_cost=None):
+    """Send ``groups`` packed into as few documents as the ceiling allows.
+
+    Yields ``(product_id, variant_inputs, node, error)`` for every group in
+    order; ``node`` is the group's ``productVariantsBulkUpdate`` result.
+    """
+    for batch in pack_groups(groups, max_cost):
+        results = send_aliased_bulk_update(session, batch, selection, domain)
+        for (product_id, inputs), (node, error) in zip(batch, results):
+            yield product_id, inputs, node, error
+
+
+def send_concurrent_updates(session, groups, max_workers, domain=None):
+    """Push ``groups`` as packed documents on ``max_workers`` threads.
+
+    Yields ``(product_id, variant_inputs, error)`` as documents complete.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(send_aliased_bulk_update, session, batch, BULK_UPDATE_SELECTION, domain): batch
+            for batch in pack_groups(groups)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            for (pid, inputs), (_, error) in zip(futures[future], future.result()):
+                yield pid, inputs, error
+
+
+SET_BASE_PRICES_MUTATION = """
+mutation SetBase($mf: [MetafieldsSetInput!]!) {
+  metafieldsSet(metafields: $mf) {
+    userErrors { field message }
+  }
+}
+"""
+
+# metafieldsSet accepts at most 25 metafields per call.
+METAFIELDS_PER_CALL = 25
+
+
+def set_base_prices(session, prices, domain=None):
+    """Write ``custom.base_price`` for ``{product_id: price}``, 25 per call.
+
+    Returns ``{product_id: error}`` for the products that were not written.
+    """
+    items = list(prices.items())
+    errors = {}
+    for i in range(0, len(items), METAFIELDS_PER_CALL):
+        chunk = items[i:i + METAFIELDS_PER_CALL]
+        try:
+            resp = graphql_post(session, SET_BASE_PRICES_MUTATION, {"mf": [
+                {
+                    "ownerId": product_gid(pid),
+                    "namespace": "custom",
+                    "key": "base_price",
+                    "type": "number_decimal",
+                    "value": str(price),
+                }
+                for pid, price in chunk
+            ]}, domain)
+            node = graphql_data(resp)["metafieldsSet"]
+        except Exception as exc:
+            errors.update((pid, str(exc)) for pid, _ in chunk)
+            continue
+        for e in node.get("userErrors") or []:
+            field = e.get("field") or []
+            try:
+                pid = chunk[int(field[1])][0]
+            except (IndexError, TypeError, ValueError):
+                errors.update((pid, e["message"]) for pid, _ in chunk)
+                break
+            errors[pid] = e["message"]
+    return errors
+
+
+STAGED_UPLOAD_MUTATION = """
+mutation Stage($input: [StagedUploadInput!]!) {
+  stagedUploadsCreate(input: $input) {
+    stagedTargets { url resourceUrl parameters { name value } }
+    userErrors { field message }
+  }
+}
+"""
+
+RUN_BULK_MUTATION = """
+mutation Run($mutation: String!, $path: String!) {
+  bulkOperationRunMutation(mutation: $mutation, stagedUploadPath: $path) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+"""
+
+BULK_OPERATION_QUERY = """
+query Poll($id: ID!) {
+  node(id: $id) {
+    ... on BulkOperation { id status errorCode objectCount url partialDataUrl }
+  }
+}
+"""
+
+BULK_VARIANTS_MUTATION = """
+mutation call($productId: ID!, $variants: [ProductVariantsBulkInput!]!) {
+  productVariantsBulkUpdate(productId: $productId, variants: $variants) {
+    userErrors { field message }
+  }
+}
+"""
+
+
+RUN_BULK_QUERY = """
+mutation RunQuery($query: String!) {
+  bulkOperationRunQuery(query: $query) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+"""
+
+
+def wait_for_bulk_operation(session, operation_id, domain=None, poll_interval=2.0):
+    """Poll a bulk operation until it stops running; return its final node."""
+    while True:
+        resp = graphql_post(session, BULK_OPERATION_QUERY, {"id": operation_id}, domain)
+        node = graphql_data(resp).get("node") or {}
+        if node.get("status") not in ("CREATED", "RUNNING", "CANCELING"):
+            return node
+        time.sleep(poll_interval)
+
+
+def _read_jsonl(url):
+    with tracing.span("download", "GET bulk results"):
+        resp = requests.get(url, timeout=300)
+        tracing.note_attempt(resp.status_code)
+    resp.raise_for_status()
+    return [json.loads(line) for line in resp.text.splitlines() if line.strip()]
+
+
+def run_bulk_mutation(session, rows, mutation=BULK_VARIANTS_MUTATION, domain=None, poll_interval=2.0):
+    """Run ``mutation`` once per variables dict in ``rows`` as a bulk operation.
+
+    Returns a list aligned with ``rows`` holding each line's ``data`` node,
+    or ``None`` where Shopify returned nothing for that line.
+    """
+    body = "\n".join(json.dumps(row) for row in rows) + "\n"
+    resp = graphql_post(session, STAGED_UPLOAD_MUTATION, {"input": [{
+        "resource": "BULK_MUTATION_VARIABLES",
+        "filename": "bulk_op_vars.jsonl",
+        "mimeType": "text/jsonl",
+        "httpMethod": "POST",
+    }]}, domain)
+    staged = graphql_data(resp)["stagedUploadsCreate"]
+    if staged.get("userErrors"):
+        raise RuntimeError(f"Staged upload errors: {staged['userErrors']}")
+    target = staged["stagedTargets"][0]
+    params = {p["name"]: p["value"] for p in target["parameters"]}
+    with tracing.span("upload", "POST bulk variables"):
+        upload = requests.post(
+            target["url"],
+            data=params,
+            files={"file": ("bulk_op_vars.jsonl", body.encode(), "text/jsonl")},
+            timeout=300,
+        )
+        tracing.note_attempt(upload.status_code)
+    upload.raise_for_status()
+
+    resp = graphql_post(session, RUN_BULK_MUTATION, {
+        "mutation": mutation,
+        "path": params.get("key", target.get("resourceUrl")),
+    }, domain)
+    run = graphql_data(resp)["bulkOperationRunMutation"]
+    if run.get("userErrors"):
+        raise RuntimeError(f"Bulk operation errors: {run['userErrors']}")
+    node = wait_for_bulk_operation(session, run["bulkOperation"]["id"], domain, poll_interval)
+    if node.get("status") != "COMPLETED":
+        raise RuntimeError(f"Bulk operation {node.get('status')}: {node.get('errorCode')}")
+
+    results = [None] * len(rows)
+    url = node.get("url") or node.get("partialDataUrl")
+    if url:
+        for line in _read_jsonl(url):
+            idx = line.get("__lineNumber")
+            if isinstance(idx, int) and 0 <= idx < len(rows):
+                results[idx] = line.get("data")
+    return results
+
+
+def run_bulk_query(session, query, domain=None, poll_interval=2.0):
+    """Run ``query`` as a bulk operation and return its result objects.
+
+    Objects of nested connections follow their parent and carry its ID in
+    ``__parentId``.
+    """
+    resp = graphql_post(session, RUN_BULK_QUERY, {"query": query}, domain)
+    run = graphql_data(resp)["bulkOperationRunQuery"]
+    if run.get("userErrors"):
+        raise RuntimeError(f"Bulk operation errors: {run['userErrors']}")
+    node = wait_for_bulk_operation(session, run["bulkOperation"]["id"], domain, poll_interval)
+    if node.get("status") != "COMPLETED":
+        raise RuntimeError(f"Bulk operation {node.get('status')}: {node.get('errorCode')}")
+    # Shopify gives no URL when the query matched nothing.
+    return _read_jsonl(node["url"]) if node.get("url") else []
+
+
+def send_bulk_updates(session, groups, domain=None):
+    """Push ``groups`` as one bulk mutation.
+
+    Yields ``(product_id, variant_inputs, error)`` for every group.
+    """
+    try:
+        results = run_bulk_mutation(session, [
+            {"productId": product_gid(pid), "variants": inputs}
+            for pid, inputs in groups
+        ], domain=domain)
+    except Exception as exc:
+        for pid, inputs in groups:
+            yield pid, inputs, str(exc)
+        return
+    for (pid, inputs), data in zip(groups, results):
+        node = (data or {}).get("productVariantsBulkUpdate")
+        if node is None:
+            yield pid, inputs, "No result returned"
+        elif node.get("userErrors"):
+            yield pid, inputs, f"Bulk update errors: {node['userErrors']}"
+        else:
+            yield pid, inputs, None
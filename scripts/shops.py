@@ -0,0 +1,114 @@
+"""Registry of the Shopify stores jobs can run against.
+
+Stores are listed in ``shops.json`` (``SHOPS_CONFIG``)::
+
+    {"shops": [
+        {"name": "ma", "domain": "azor-ma.myshopify.com", "token_env": "API_TOKEN_MA"},
+        {"name": "fr", "domain": "azor-fr.myshopify.com", "token_env": "API_TOKEN_FR",
+         "cost_ceiling": 500, "env": {"IMPORT_WORKERS": "8"}}
+    ]}
+
+``token_env`` names the variable holding the access token (``token`` puts
+it in the file itself).  ``cost_ceiling`` is the shop's per-request GraphQL
+budget (``GRAPHQL_COST_CEILING``) and ``env`` any other per-shop settings.
+
+Scripts keep reading ``SHOP_DOMAIN``, ``API_TOKEN``, ``PRICE_BACKUP`` and
+``CATALOG_SNAPSHOT``: ``env(shop)`` sets them for one store, with its
+backup and snapshot under ``shop_data/<name>/`` (``SHOP_DATA_DIR``).  Each
+store then runs in its own process, with its own connection pool and
+throttle state, and stores run side by side.  Without a registry file jobs
+use the environment as before.
+"""
+
+import json
+import os
+import re
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+REGISTRY_FILE = os.path.join(ROOT, "shops.json")
+NAME_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,31}$")
+
+_cache = (None, None)
+
+
+def registry_path():
+    return os.getenv("SHOPS_CONFIG") or REGISTRY_FILE
+
+
+def data_dir():
+    return os.getenv("SHOP_DATA_DIR") or os.path.join(ROOT, "shop_data")
+
+
+def _check(shop):
+    if not isinstance(shop, dict):
+        raise ValueError("Each shop must be an object")
+    name = shop.get("name")
+    if not isinstance(name, str) or not NAME_RE.match(name):
+        raise ValueError(f"Invalid shop name: {name!r}")
+    if not shop.get("domain"):
+        raise ValueError(f"Shop {name} has no domain")
+    if not (shop.get("token") or shop.get("token_env")):
+        raise ValueError(f"Shop {name} has no token or token_env")
+    if not isinstance(shop.get("env", {}), dict):
+        raise ValueError(f"Shop {name}: env must be an object")
+    return shop
+
+
+def load():
+    """``{name: shop}`` in file order; ``{}`` without a registry file.
+
+    Cached until the file changes.  Raises ``ValueError`` for an invalid file.
+    """
+    global _cache
+    path = registry_path()
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {}
+    key = (path, st.st_mtime_ns, st.st_size)
+    if _cache[0] == key:
+        return _cache[1]
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    shops = {}
+    for shop in data.get("shops", []) if isinstance(data, dict) else []:
+        shop = _check(shop)
+        if shop["name"] in shops:
+            raise ValueError(f"Shop {shop['name']} is listed twice")
+        shops[shop["name"]] = shop
+    _cache = (key, shops)
+    return shops
+
+
+def names():
+    return list(load())
+
+
+def get(name):
+    """The shop called ``name``; raises ``ValueError`` if it is not registered."""
+    shop = load().get(name)
+    if shop is None:
+        raise ValueError(f"Unknown shop: {name}")
+    return shop
+
+
+def env(name):
+    """Environment variables running a script against shop ``name``."""
+    shop = get(name)
+    directory = os.path.join(data_dir(), name)
+    os.makedirs(directory, exist_ok=True)
+    token = shop.get("token") or os.getenv(shop["token_env"], "")
+    values = {
+        "SHOP_NAME": name,
+        "SHOP_DOMAIN": shop["domain"],
+        "API_TOKEN": token,
+        "PRICE_BACKUP": os.path.join(directory, "shopify_backup.json"),
+        "CATALOG_SNAPSHOT": os.path.join(directory, "catalog_snapshot.json"),
+        "RECONCILE_HISTORY": os.path.join(directory, "reconcile_history.json"),
+    }
+    if shop.get("api_version"):
+        values["API_VERSION"] = str(shop["api_version"])
+    if shop.get("cost_ceiling"):
+        values["GRAPHQL_COST_CEILING"] = str(int(shop["cost_ceiling"]))
+    values.update({key: str(value) for key, value in shop.get("env", {}).items()})
+    return values
@@ -0,0 +1,125 @@
+"""Chain surcharge table (``tempo solution/variant_prices.json``).
+
+``SurchargeStore`` keeps the parsed table cached by the file's mtime and
+size, so reading it costs one ``stat``.  Saves go through a temporary file
+and ``os.replace``, and bump a version counter kept next to the file in
+``variant_prices.version.json``; a reader never sees a half-written table.
+
+Jobs started from the web interface run against a copy pinned when they
+start (``SURCHARGE_FILE`` / ``SURCHARGE_VERSION``, see ``webapp.jobqueue``),
+so saving new surcharges while a job runs does not change its prices.
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_PATH = os.path.join(ROOT, "tempo solution", "variant_prices.json")
+
+
+def config_path():
+    return os.getenv("SURCHARGE_CONFIG") or DEFAULT_PATH
+
+
+def write_json(path, data):
+    """Write ``data`` to ``path`` through a temporary file and ``os.replace``."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class SurchargeStore:
+    def __init__(self, path=None):
+        self.path = path or config_path()
+        self.version_path = os.path.splitext(self.path)[0] + ".version.json"
+        self._key = None
+        self._cached = None
+        self._lock = threading.Lock()
+
+    def _stat_key(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def _stored_version(self, key):
+        """Version of the file with stat ``key``.
+
+        A file changed by hand since the last save counts as the next version.
+        """
+        try:
+            with open(self.version_path, encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        version = int(info.get("version", 0))
+        if (info.get("mtime_ns"), info.get("size")) != key:
+            version += 1
+        return version
+
+    def current(self):
+        """Return ``(version, table)``.  Callers must not modify ``table``."""
+        with self._lock:
+            key = self._stat_key()
+            if key != self._key:
+                with open(self.path, encoding="utf-8") as f:
+                    table = json.load(f)
+                self._cached = (self._stored_version(key), table)
+                self._key = key
+            return self._cached
+
+    def save(self, table):
+        """Replace the table and return its new version."""
+        with self._lock:
+            try:
+                version = self._stored_version(self._stat_key()) + 1
+            except OSError:
+                version = 1
+            write_json(self.path, table)
+            key = self._stat_key()
+            write_json(self.version_path, {"version": version, "mtime_ns": key[0], "size": key[1]})
+            self._key = key
+            self._cached = (version, table)
+            return version
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def store(path=None):
+    """Shared store for ``path`` (the configured table by default)."""
+    path = path or config_path()
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = SurchargeStore(path)
+        return _stores[path]
+
+
+def load():
+    """Return ``(version, table)`` for this run.
+
+    Scripts use the copy pinned by the job runner when there is one and the
+    current table otherwise.
+    """
+    pinned = os.getenv("SURCHARGE_FILE")
+    if pinned:
+        with open(pinned, encoding="utf-8") as f:
+            return int(os.getenv("SURCHARGE_VERSION") or 0), json.load(f)
+    return store().current()
+
+
+def pin(directory, name="surcharges.json"):
+    """Copy the current table into ``directory`` for a job.
+
+    Returns the environment variables pointing the job at the copy.
+    """
+    version, table = store().current()
+    path = os.path.join(directory, name)
+    write_json(path, table)
+    return {"SURCHARGE_FILE": os.path.abspath(path), "SURCHARGE_VERSION": str(version)}
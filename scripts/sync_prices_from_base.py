@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 import os
+import sys
 import time
 import requests
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts import shopify_client
+
 load_dotenv()
 TOKEN = os.getenv("API_TOKEN")
 DOMAIN = os.getenv("SHOP_DOMAIN")
@@ -20,18 +24,11 @@ def shopify_get(session, url, **kwargs):
 
 
 def graphql_post(session, query, variables=None):
-    url = f"https://{DOMAIN}/admin/api/{API_VERSION}/graphql.json"
-    payload = {"query": query, "variables": variables or {}}
-    while True:
-        resp = session.post(url, json=payload, timeout=30)
-        if resp.status_code == 429:
-            time.sleep(2)
-            continue
-        return resp
+    return shopify_client.graphql_post(session, query, variables, DOMAIN)
 
 
 def fetch_products(session):
-    base_url = f"https://{DOMAIN}/admin/api/{API_VERSION}"
+    base_url = shopify_client.admin_url(DOMAIN)
     page_info = None
     while True:
         params = {"limit": 250}
@@ -42,14 +39,13 @@ def fetch_products(session):
         data = resp.json()
         for prod in data.get("products", []):
             yield prod
-        link = resp.headers.get("Link", "")
-        if 'rel="next"' not in link:
+        page_info = shopify_client.next_page_info(resp)
+        if not page_info:
             break
-        page_info = link.split("page_info=")[1].split(">")[0]
 
 
 def get_base_price(session, product_id):
-    base_url = f"https://{DOMAIN}/admin/api/{API_VERSION}"
+    base_url = shopify_client.admin_url(DOMAIN)
     resp = shopify_get(session, f"{base_url}/products/{product_id}/metafields.json",
                         params={"namespace": "custom", "key": "base_price"})
     if resp.ok:
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Generate a synthetic catalog for benchmarks and the Shopify stand-in.
+
+Products come out in the catalog snapshot layout (see
+``catalog_snapshot.product_from_rest``).  A share of them are tagged
+``ensemble`` and carry Collier/Bracelet options named after the chains in
+``tempo solution/variant_prices.json``; the rest have a size option.  The
+same seed always yields the same catalog:
+
+    python scripts/synthetic_catalog.py --variants 10000 --out /tmp/catalog.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from scripts.catalog_snapshot import save_snapshot
+
+CHAINS = ["Forsat S", "Forsat M", "Forsat L", "Gourmette S", "Chopard S", "Gourmette M", "Chopard M"]
+SIZES = ["48", "50", "52", "54", "56", "58", "60", "62", "64", "66", "68", "70"]
+FIRST_PRODUCT_ID = 7000000000
+
+
+def generate(variants=1000, per_product=12, ensemble_share=0.3, seed=0):
+    """Return products holding ``variants`` variants in total."""
+    rng = random.Random(seed)
+    products = []
+    combos = list(itertools.product(CHAINS, CHAINS))
+    next_variant = FIRST_PRODUCT_ID * 10
+    remaining = variants
+    while remaining > 0:
+        count = min(per_product, remaining)
+        pid = FIRST_PRODUCT_ID + len(products)
+        base = rng.randrange(400, 4000, 10)
+        ensemble = rng.random() < ensemble_share
+        items = []
+        for i in range(count):
+            next_variant += 1
+            if ensemble:
+                collier, bracelet = combos[i % len(combos)]
+                options = {"Collier": collier, "Bracelet": bracelet}
+            else:
+                options = {"Taille": SIZES[i % len(SIZES)]}
+            items.append({
+                "id": next_variant,
+                "title": " / ".join(options.values()),
+                "sku": f"AZ-{pid}-{i}",
+                "price": f"{base + (i % 5) * 10:.2f}",
+                "compare_at_price": None,
+                "options": options,
+            })
+        products.append({
+            "id": pid,
+            "title": f"Synthetic {'ensemble' if ensemble else 'bague'} {len(products) + 1}",
+            "handle": f"synthetic-{pid}",
+            "vendor": "Azor",
+            "product_type": "Ensemble" if ensemble else "Bague",
+            "tags": ["ensemble"] if ensemble else ["bague"],
+            "collections": ["ensembles"] if ensemble else ["bagues"],
+            "base_price": f"{base:.2f}",
+            "variants": items,
+        })
+        remaining -= count
+    return products
+
+
+def rest_product(product):
+    """The REST ``product`` resource for a snapshot-layout product."""
+    names = list(product["variants"][0]["options"]) if product["variants"] else []
+    return {
+        "id": product["id"],
+        "title": product["title"],
+        "handle": product["handle"],
+        "vendor": product["vendor"],
+        "product_type": product["product_type"],
+        "tags": ", ".join(product["tags"]),
+        "options": [{"name": name, "position": i + 1} for i, name in enumerate(names)],
+        "variants": [
+            {
+                "id": v["id"],
+                "product_id": product["id"],
+                "title": v["title"],
+                "sku": v["sku"],
+                "price": v["price"],
+                "compare_at_price": v["compare_at_price"],
+                **{f"option{i + 1}": v["options"].get(name) for i, name in enumerate(names)},
+            }
+            for v in product["variants"]
+        ],
+    }
+
+
+def rest_pages(products, limit=250):
+    """``products.json`` response bodies, ``limit`` products per page."""
+    return [
+        json.dumps({"products": [rest_product(p) for p in products[i:i + limit]]})
+        for i in range(0, len(products), limit)
+    ]
+
+
+def variant_nodes(product):
+    """GraphQL variant nodes (``id``, ``price``, ``selectedOptions``)."""
+    return [
+        {
+            "id": f"gid://shopify/ProductVariant/{v['id']}",
+            "price": v["price"],
+            "selectedOptions": [{"name": n, "value": val} for n, val in v["options"].items()],
+        }
+        for v in product["variants"]
+    ]
+
+
+def backup_rows(products):
+    """Rows in the ``shopify_backup.json`` layout."""
+    return [
+        {"product_id": p["id"], "variant_id": v["id"], "original_price": v["price"]}
+        for p in products
+        for v in p["variants"]
+    ]
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--variants", type=int, default=1000)
+    p.add_argument("--per-product", type=int, default=12)
+    p.add_argument("--ensemble-share", type=float, default=0.3)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", required=True, help="Snapshot file to write")
+    args = p.parse_args()
+
+    products = generate(args.variants, args.per_product, args.ensemble_share, args.seed)
+    save_snapshot(products, args.out)
+    print(f"[DONE] Wrote {len(products)} products / {args.variants} variants to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
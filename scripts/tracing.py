@@ -0,0 +1,218 @@
+"""Record every Shopify call of a job as a span in a JSON-lines file.
+
+A span covers one logical call including its retries::
+
+    {"op": "mutation productVariantsBulkUpdate", "api": "graphql",
+     "pids": [123], "t0": 1718000000.123, "t1": 1718000000.456,
+     "status": 200, "cost": 10, "retries": 1, "wait": 2, "thread": "MainThread"}
+
+Spans go to ``TRACE_FILE`` or, for jobs started by the web app, to
+``$JOB_DIR/trace.jsonl``; without either, tracing is off.  Code running in
+the web app itself (webhook batches) picks a file with ``trace_to()``.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+TRACE_NAME = "trace.jsonl"
+MAX_PRODUCT_IDS = 50
+
+_PRODUCT_RE = re.compile(r"gid://shopify/Product/(\d+)")
+_REST_PRODUCT_RE = re.compile(r"products/(\d+)")
+_ROOT_FIELD_RE = re.compile(r"\{\s*(?:\w+\s*:\s*)?(\w+)")
+
+_local = threading.local()
+_tracers = {}
+_tracers_lock = threading.Lock()
+
+
+class Tracer:
+    """Append spans to ``path``; safe to share between threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        line = json.dumps(span, separators=(",", ":")) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+def _tracer_for(path):
+    with _tracers_lock:
+        tracer = _tracers.get(path)
+        if tracer is None:
+            tracer = _tracers[path] = Tracer(path)
+        return tracer
+
+
+def current_tracer():
+    """Return the tracer for this thread, or ``None`` when tracing is off."""
+    tracer = getattr(_local, "tracer", None)
+    if tracer is not None:
+        return tracer
+    path = os.getenv("TRACE_FILE")
+    if not path and os.getenv("JOB_DIR"):
+        path = os.path.join(os.getenv("JOB_DIR"), TRACE_NAME)
+    return _tracer_for(path) if path else None
+
+
+@contextmanager
+def trace_to(path):
+    """Send the spans recorded in this thread to ``path``."""
+    previous = getattr(_local, "tracer", None)
+    _local.tracer = _tracer_for(path)
+    try:
+        yield
+    finally:
+        _local.tracer = previous
+
+
+def graphql_name(query):
+    """``"mutation productVariantsBulkUpdate"`` for a GraphQL document."""
+    kind = "mutation" if query.lstrip().startswith("mutation") else "query"
+    match = _ROOT_FIELD_RE.search(query)
+    return f"{kind} {match.group(1)}" if match else kind
+
+
+def product_ids(payload):
+    """Product IDs mentioned in GraphQL variables or a REST path."""
+    if not payload:
+        return []
+    text = payload if isinstance(payload, str) else json.dumps(payload)
+    ids = _PRODUCT_RE.findall(text) or _REST_PRODUCT_RE.findall(text)
+    return [int(pid) for pid in dict.fromkeys(ids)][:MAX_PRODUCT_IDS]
+
+
+class Span:
+    def __init__(self, api, operation, pids):
+        self.data = {
+            "op": operation,
+            "api": api,
+            "pids": pids,
+            "t0": round(time.time(), 4),
+            "status": None,
+            "cost": None,
+            "retries": 0,
+            "wait": 0,
+            "thread": threading.current_thread().name,
+        }
+        self._attempts = 0
+
+    def attempt(self, status, cost=None):
+        self._attempts += 1
+        self.data["retries"] = self._attempts - 1
+        self.data["status"] = status
+        if cost is not None:
+            self.data["cost"] = (self.data["cost"] or 0) + cost
+
+    def waited(self, seconds):
+        self.data["wait"] += seconds
+
+
+@contextmanager
+def span(api, operation, payload=None):
+    """Time one logical call; ``payload`` is searched for product IDs.
+
+    The retry helpers report each attempt and throttle wait to the active
+    span (see ``note_attempt`` / ``note_wait``).  Yields ``None`` when
+    tracing is off.
+    """
+    tracer = current_tracer()
+    if tracer is None or getattr(_local, "span", None) is not None:
+        yield None
+        return
+    current = _local.span = Span(api, operation, product_ids(payload))
+    try:
+        yield current
+    except BaseException:
+        if current.data["status"] is None:
+            current.data["status"] = "error"
+        raise
+    finally:
+        _local.span = None
+        current.data["t1"] = round(time.time(), 4)
+        try:
+            tracer.record(current.data)
+        except OSError:
+            pass
+
+
+def note_attempt(status, cost=None):
+    active = getattr(_local, "span", None)
+    if active is not None:
+        active.attempt(status, cost)
+
+
+def note_wait(seconds):
+    active = getattr(_local, "span", None)
+    if active is not None:
+        active.waited(seconds)
+
+
+def load(path, limit=None):
+    """Read spans from ``path``, skipping torn lines."""
+    spans = []
+    if not os.path.exists(path):
+        return spans
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except ValueError:
+                continue
+            if limit and len(spans) >= limit:
+                break
+    return spans
+
+
+def summarize(spans, top=10):
+    """Lay ``spans`` out as a waterfall with one lane per thread.
+
+    Returns ``None`` for an empty trace.  Offsets and widths are percentages
+    of the traced time span; ``products`` ranks products by cost points
+    (a span's cost is split between the products it touched).
+    """
+    spans = [s for s in spans if s.get("t0") is not None and s.get("t1") is not None]
+    if not spans:
+        return None
+    start = min(s["t0"] for s in spans)
+    end = max(s["t1"] for s in spans)
+    total = max(end - start, 1e-6)
+
+    lanes, busy, products = {}, 0.0, {}
+    for s in sorted(spans, key=lambda s: s["t0"]):
+        duration = s["t1"] - s["t0"]
+        busy += duration
+        lanes.setdefault(s.get("thread") or "main", []).append({
+            **s,
+            "duration": duration,
+            "left": (s["t0"] - start) / total * 100,
+            "width": max(duration / total * 100, 0.05),
+        })
+        pids = s.get("pids") or []
+        for pid in pids:
+            entry = products.setdefault(pid, {"id": pid, "cost": 0.0, "calls": 0, "seconds": 0.0})
+            entry["cost"] += (s.get("cost") or 0) / len(pids)
+            entry["calls"] += 1
+            entry["seconds"] += duration / len(pids)
+
+    return {
+        "start": start,
+        "duration": total,
+        "spans": len(spans),
+        "lanes": sorted(lanes.items()),
+        "retries": sum(s.get("retries") or 0 for s in spans),
+        "wait": sum(s.get("wait") or 0 for s in spans),
+        "cost": sum(s.get("cost") or 0 for s in spans),
+        "concurrency": busy / total,
+        "products": sorted(products.values(), key=lambda p: (-p["cost"], -p["seconds"]))[:top],
+        "slowest": sorted(spans, key=lambda s: s["t1"] - s["t0"], reverse=True)[:top],
+    }
@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 import os
-import json
-import time
+import sys
+import argparse
 import requests
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts import events, planner, pricing, shopify_client, surcharges as surcharge_config
+
 
 load_dotenv()
 
@@ -16,26 +19,18 @@ API_VERSION = os.getenv("API_VERSION", "2024-04")
 
 def graphql_post(session, query, variables=None):
     """POST to Shopify GraphQL with retry on rate limits."""
-    url = f"https://{DOMAIN}/admin/api/{API_VERSION}/graphql.json"
-    payload = {"query": query, "variables": variables or {}}
-    while True:
-        resp = session.post(url, json=payload, timeout=30)
-        if resp.status_code == 429:
-            time.sleep(2)
-            continue
-        return resp
+    return shopify_client.graphql_post(session, query, variables)
 
 
-def round_to_tidy(price: float) -> str:
-    price_int = int(round(price))
-    rem = price_int % 100
-    base = price_int - rem
-    opts = [base, base + 90, base + 100]
-    tidy = min(opts, key=lambda x: abs(price_int - x))
-    return f"{tidy:.2f}"
+round_to_tidy = pricing.round_to_tidy
 
 
 def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--plan", action="store_true",
+                   help="Print the estimated Shopify cost and duration, then exit")
+    args = p.parse_args()
+
     session = requests.Session()
 
     session.headers.update(
@@ -45,11 +40,12 @@ def main():
         }
     )
 
-    sur_path = os.path.join(
-        os.path.dirname(__file__), "..", "tempo solution", "variant_prices.json"
-    )
-    with open(sur_path, encoding="utf-8") as f:
-        surcharges = json.load(f)
+    if args.plan:
+        planner.print_plan("ensemble", session)
+        return
+
+    version, surcharges = surcharge_config.load()
+    print(f"[INFO] Surcharges version {version}")
 
     query = """
     query Ensemblers($cursor: String) {
@@ -73,16 +69,9 @@ def main():
     }
     """
 
-    mutation = """
-    mutation BulkUpdate($productId: ID!, $variants: [ProductVariantsBulkInput!]!) {
-      productVariantsBulkUpdate(productId: $productId, variants: $variants) {
-        userErrors { field message }
-      }
-    }
-    """
-
     total = 0
     cursor = None
+    progress = events.Progress(None, "ensemble")
     while True:
         resp = graphql_post(session, query, {"cursor": cursor})
         resp.raise_for_status()
@@ -95,58 +84,36 @@ def main():
         if not products:
             raise RuntimeError(f"No product data returned: {payload}")
 
+        groups = []
         for edge in products["edges"]:
 
             product = edge["node"]
             pid = product["id"]
-            base_price = float(product["variants"]["nodes"][0]["price"])
-
-            updates = []
-            for v in product["variants"]["nodes"]:
-
-                collier = ""
-                bracelet = ""
-                for opt in v.get("selectedOptions", []):
-                    name = opt.get("name", "").lower()
-                    if name == "collier":
-                        collier = opt.get("value", "")
-                    elif name == "bracelet":
-                        bracelet = opt.get("value", "")
-
-
-                price = base_price
-                price += surcharges["colliers"].get(collier, 0)
-                price += surcharges["bracelets"].get(bracelet, 0)
-                tidy = round_to_tidy(price)
-
-                updates.append({"id": v["id"], "price": tidy})
-
-            for i in range(0, len(updates), 50):
-                batch = updates[i : i + 50]
-                resp_u = graphql_post(
-                    session,
-                    mutation,
-                    {"productId": pid, "variants": batch},
-                )
-                if resp_u.ok:
-                    errs = resp_u.json()["data"]["productVariantsBulkUpdate"][
-                        "userErrors"
-                    ]
-                    if errs:
-                        for e in errs:
-                            print(f"[ERROR] {e['field']}: {e['message']}")
-                    for u in batch:
-                        print(f"[OK] {u['id'].split('/')[-1]} → {u['price']}")
-                else:
-                    print(f"[ERROR] bulk update failed: {resp_u.text}")
+            updates = pricing.ensemble_updates(product["variants"]["nodes"], surcharges)
+
+            groups.extend(pricing.chunk_groups({pid: updates}))
 
             total += len(updates)
 
+        for pid, batch, node, error in shopify_client.send_packed_updates(session, groups):
+            if node is None:
+                print(f"[ERROR] bulk update failed: {error}")
+                events.error(f"{pid}: bulk update failed: {error}")
+                progress.advance(failed=len(batch))
+                continue
+            for e in node.get("userErrors") or []:
+                print(f"[ERROR] {e['field']}: {e['message']}")
+                events.error(f"{pid}: {e['field']}: {e['message']}")
+            for u in batch:
+                print(f"[OK] {u['id'].split('/')[-1]} → {u['price']}")
+            failed = len(node.get("userErrors") or [])
+            progress.advance(ok=len(batch) - failed, failed=failed)
 
         if not products["pageInfo"]["hasNextPage"]:
             break
         cursor = products["pageInfo"]["endCursor"]
 
+    progress.summary()
     print(f"[DONE] Updated {total} variants")
 
 
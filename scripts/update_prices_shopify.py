@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 import os
-import json
+import sys
 import requests
 import argparse
-import time
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts import events, planner, pricing, search_index, shopify_client
+
 # 1) Load .env
 load_dotenv()
 
@@ -15,35 +17,17 @@ DOMAIN      = os.getenv("SHOP_DOMAIN")
 API_VERSION = os.getenv("API_VERSION", "2024-04")
 
 
-def shopify_get(session, url, **kwargs):
+def shopify_get(session, url, params=None):
     """GET request with basic retry handling for rate limits."""
-    while True:
-        resp = session.get(url, **kwargs)
-        if resp.status_code == 429:
-            time.sleep(2)
-            continue
-        return resp
+    return shopify_client.rest_get(session, url, params=params)
 
 
 def graphql_post(session, query, variables=None):
     """POST to the GraphQL endpoint with retry on 429."""
-    url = f"https://{DOMAIN}/admin/api/{API_VERSION}/graphql.json"
-    payload = {"query": query, "variables": variables or {}}
-    while True:
-        resp = session.post(url, json=payload)
-        if resp.status_code == 429:
-            time.sleep(2)
-            continue
-        return resp
+    return shopify_client.graphql_post(session, query, variables)
 
-def round_to_tidy(price: float) -> str:
-    price_int = int(round(price))
-    rem = price_int % 100
-    base = price_int - rem
-    opts = [base, base + 90, base + 100]
-    tidy = min(opts, key=lambda x: abs(price_int - x))
-    return f"{tidy:.2f}"
 
+round_to_tidy = pricing.round_to_tidy
 
 
 def set_base_price(session, product_id, price):
@@ -95,17 +79,23 @@ def fetch_all_variants(session, base_url):
                     "variant_id": v["id"],
                     "original_price": v["price"]
                 })
-        link = resp.headers.get("Link", "")
-        if 'rel="next"' not in link:
+        page_info = shopify_client.next_page_info(resp)
+        if not page_info:
             break
-        page_info = link.split("page_info=")[1].split(">")[0]
     return variants
 
-def main():
+def parse_args(argv=None):
     p = argparse.ArgumentParser()
     p.add_argument("--percent", type=float, required=True,
                    help="Percentage to adjust prices by (e.g. 10 or -5)")
-    args = p.parse_args()
+    p.add_argument("--plan", action="store_true",
+                   help="Print the estimated Shopify cost and duration, then exit")
+    p.add_argument("--select", metavar="QUERY",
+                   help="Only update the variants matching a catalog search (scripts/search_index.py)")
+    return p.parse_args(argv)
+
+def main():
+    args = parse_args()
 
     # 3) Setup session
     session = requests.Session()
@@ -113,71 +103,65 @@ def main():
         "X-Shopify-Access-Token": TOKEN,
         "Content-Type": "application/json"
     })
-    base_url = f"https://{DOMAIN}/admin/api/{API_VERSION}"
+    base_url = shopify_client.admin_url(DOMAIN)
+
+    if args.plan:
+        planner.print_plan("percentage", session)
+        return
 
     # 4) Backup current prices
-    backup_file = os.path.join(os.path.dirname(__file__), "shopify_backup.json")
+    backup_file = os.getenv("PRICE_BACKUP") or os.path.join(os.path.dirname(__file__), "shopify_backup.json")
     if not os.path.exists(backup_file):
+        events.phase("backup")
         print("🔄 Fetching current variant prices...")
         variants = fetch_all_variants(session, base_url)
-        with open(backup_file, "w", encoding="utf-8") as bf:
-            json.dump(variants, bf, indent=2)
+        pricing.save_backup(backup_file, variants)
         print(f"✔️  Backup saved to {backup_file}")
     else:
-        with open(backup_file, "r", encoding="utf-8") as bf:
-            variants = json.load(bf)
-
-    factor = 1 + args.percent / 100.0
+        variants = pricing.load_backup(backup_file)
 
     # 5) Apply percentage + tidy rounding
-    mutation = """
-    mutation BulkUpdate($productId: ID!, $variants: [ProductVariantsBulkInput!]!) {
-      productVariantsBulkUpdate(productId: $productId, variants: $variants) {
-        userErrors { field message }
-      }
-    }
-    """
-    updates_by_product = {}
-    base_price_values = {}
-    for v in variants:
-        base = float(v["original_price"])
-        newp = base * (1 + args.percent/100.0)
-        tidy = round_to_tidy(newp)
-
-        pid = v["product_id"]
-        updates_by_product.setdefault(pid, [])
-        updates_by_product[pid].append({
-            "id": f"gid://shopify/ProductVariant/{v['variant_id']}",
-            "price": tidy,
-        })
-        if pid not in base_price_values:
-            base_price_values[pid] = tidy
-
-    for pid, updates in updates_by_product.items():
-        for i in range(0, len(updates), 50):
-            batch = updates[i:i+50]
-            resp = graphql_post(session, mutation, {
-                "productId": f"gid://shopify/Product/{pid}",
-
-                "variants": batch
-
-            })
-            if resp.ok:
-                errors = resp.json()["data"]["productVariantsBulkUpdate"]["userErrors"]
-                if errors:
-                    for e in errors:
-                        print(f"❌ {e['field']}: {e['message']}")
-                for u in batch:
-
-                    print(f"✅  {u['id'].split('/')[-1]} → {u['price']}")
-            else:
-                print(f"❌  bulk update failed: {resp.text}")
-
+    updates_by_product, base_price_values = pricing.percentage_updates(variants, args.percent)
+    if args.select:
+        try:
+            _, selected = search_index.select(args.select)
+        except ValueError as exc:
+            print(f"❌ {exc}")
+            events.error(str(exc))
+            sys.exit(1)
+        selected = set(selected)
+        first = {}
+        for v in variants:
+            first.setdefault(v["product_id"], v["variant_id"])
+        # The base price follows the first variant; keep it only where that one moves.
+        base_price_values = {pid: price for pid, price in base_price_values.items() if first[pid] in selected}
+        variants = [v for v in variants if v["variant_id"] in selected]
+        updates_by_product, _ = pricing.percentage_updates(variants, args.percent)
+        print(f"🔎 Selection matches {len(variants)} variants in {len(updates_by_product)} products")
+    groups = pricing.chunk_groups(updates_by_product)
+    progress = events.Progress(len(variants), "prices")
+    for pid, batch, node, error in shopify_client.send_packed_updates(session, groups):
+        if node is None:
+            print(f"❌  bulk update failed: {error}")
+            events.error(f"{pid}: bulk update failed: {error}")
+            progress.advance(failed=len(batch))
+            continue
+        for e in node.get("userErrors") or []:
+            print(f"❌ {e['field']}: {e['message']}")
+            events.error(f"{pid}: {e['field']}: {e['message']}")
+        for u in batch:
+            print(f"✅  {u['id'].split('/')[-1]} → {u['price']}")
+        failed = len(node.get("userErrors") or [])
+        progress.advance(ok=len(batch) - failed, failed=failed)
+
+    base_progress = events.Progress(len(base_price_values), "base_price")
     for pid, price in base_price_values.items():
+        if set_base_price(session, pid, price):
+            base_progress.advance(ok=1)
+        else:
+            base_progress.advance(failed=1)
 
-        set_base_price(session, pid, price)
-
-
+    progress.summary(base_prices=base_progress.ok)
     print("🎉 Finished updating!")
 
 if __name__=="__main__":
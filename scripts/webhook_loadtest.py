@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+r"""Load-test the webhook endpoints of a running app.
+
+Generates HMAC-signed ``metafields/update`` and ``metaobjects/update``
+deliveries at a fixed rate, resends a share of them with the same
+``X-Shopify-Webhook-Id`` (as Shopify does on retries) and reports:
+
+ • acceptance latency percentiles of the webhook responses
+ • processing lag, from acceptance until the final price of each product
+   reaches the Shopify stand-in
+ • GraphQL requests and mutations the app issued
+
+Run the app against the stand-in, then the test:
+
+    python scripts/fake_shopify.py --port 8081 --products 500
+    SHOP_DOMAIN=http://127.0.0.1:8081 SHOPIFY_WEBHOOK_SECRET=s gunicorn run_webapp:app -b 127.0.0.1:8000
+    python scripts/webhook_loadtest.py --app http://127.0.0.1:8000 --shop http://127.0.0.1:8081 \
+        --secret s --rate 50 --duration 30 --products 500 --duplicates 0.1
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import requests
+from dotenv import load_dotenv
+
+from webapp.webhook import sign_webhook
+
+load_dotenv()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def make_delivery(product_id, price, kind="metafield", when=None):
+    """Return ``(path, topic, body)`` for a base_price change."""
+    when = when or datetime.now(timezone.utc)
+    stamp = when.isoformat()
+    if kind == "metaobject":
+        payload = {
+            "type": "base_price",
+            "updated_at": stamp,
+            "data": {
+                "product": {"id": f"gid://shopify/Product/{product_id}"},
+                "price": price,
+            },
+        }
+        return "/webhook/metaobject", "metaobjects/update", json.dumps(payload).encode()
+    payload = {
+        "namespace": "custom",
+        "key": "base_price",
+        "owner_id": product_id,
+        "owner_resource": "product",
+        "type": "number_decimal",
+        "value": price,
+        "updated_at": stamp,
+    }
+    return "/webhook/metafield", "metafields/update", json.dumps(payload).encode()
+
+
+def signed_headers(body, secret, topic, webhook_id):
+    return {
+        "Content-Type": "application/json",
+        "X-Shopify-Hmac-SHA256": sign_webhook(body, secret),
+        "X-Shopify-Topic": topic,
+        "X-Shopify-Webhook-Id": webhook_id,
+    }
+
+
+def generate(count, products, duplicates, metaobjects, seed=None):
+    """Yield ``(webhook_id, product_id, price, kind)`` deliveries.
+
+    Roughly ``duplicates`` of them repeat an earlier webhook ID.  Every new
+    delivery carries a distinct price so its arrival at Shopify can be told
+    apart from earlier ones.
+    """
+    rng = random.Random(seed)
+    sent = []
+    for n in range(count):
+        if sent and rng.random() < duplicates:
+            yield rng.choice(sent)
+            continue
+        kind = "metaobject" if rng.random() < metaobjects else "metafield"
+        item = (str(uuid.uuid4()), rng.randint(1, products), f"{100 + n}.50", kind)
+        sent.append(item)
+        yield item
+
+
+def main():
+    p = argparse.ArgumentParser(description="Webhook load test")
+    p.add_argument("--app", default="http://127.0.0.1:5000", help="Base URL of the running app")
+    p.add_argument("--shop", help="Base URL of the Shopify stand-in (enables lag/mutation stats)")
+    p.add_argument("--secret", default=os.getenv("SHOPIFY_WEBHOOK_SECRET", ""))
+    p.add_argument("--rate", type=float, default=20.0, help="Deliveries per second")
+    p.add_argument("--duration", type=float, default=10.0, help="Seconds to send for")
+    p.add_argument("--products", type=int, default=100)
+    p.add_argument("--duplicates", type=float, default=0.1, help="Share of redelivered webhooks")
+    p.add_argument("--metaobjects", type=float, default=0.0, help="Share of metaobject deliveries")
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--settle", type=float, default=60.0, help="Max seconds to wait for processing")
+    p.add_argument("--seed", type=int)
+    args = p.parse_args()
+
+    if not args.secret:
+        sys.exit("SHOPIFY_WEBHOOK_SECRET / --secret is required")
+
+    session = requests.Session()
+    if args.shop:
+        session.post(f"{args.shop}/_reset", timeout=10)
+
+    total = int(args.rate * args.duration)
+    latencies, statuses = [], {}
+    bodies = {}  # webhook_id -> (path, topic, body); redeliveries resend it as is
+    final = {}  # product_id -> (changed_at, price, accepted_at) of the newest change
+    lock = threading.Lock()
+
+    def send(item, due):
+        webhook_id, product_id, price, kind = item
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        with lock:
+            duplicate = webhook_id in bodies
+            if not duplicate:
+                bodies[webhook_id] = make_delivery(product_id, price, kind)
+            path, topic, body = bodies[webhook_id]
+        changed_at = json.loads(body)["updated_at"]
+        started = time.time()
+        try:
+            resp = session.post(
+                f"{args.app}{path}",
+                data=body,
+                headers=signed_headers(body, args.secret, topic, webhook_id),
+                timeout=30,
+            )
+            status = resp.status_code
+        except requests.RequestException:
+            status = "error"
+        accepted = time.time()
+        with lock:
+            latencies.append(accepted - started)
+            statuses[status] = statuses.get(status, 0) + 1
+            newest = final.get(product_id)
+            if status == 200 and not duplicate and (newest is None or changed_at > newest[0]):
+                final[product_id] = (changed_at, price, accepted)
+
+    print(f"Sending {total} deliveries at {args.rate}/s to {args.app} ...")
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for i, item in enumerate(generate(total, args.products, args.duplicates, args.metaobjects, args.seed)):
+            pool.submit(send, item, start + i / args.rate)
+    elapsed = time.monotonic() - start
+
+    print(f"\nSent {total} deliveries in {elapsed:.1f}s ({total / elapsed:.1f}/s)")
+    print("Responses: " + ", ".join(f"{k}={v}" for k, v in sorted(statuses.items(), key=str)))
+    print("Acceptance latency (ms): "
+          + "  ".join(f"p{q}={percentile(latencies, q) * 1000:.1f}" for q in (50, 90, 99))
+          + f"  max={max(latencies, default=0) * 1000:.1f}")
+
+    if not args.shop:
+        return
+
+    deadline = time.time() + args.settle
+    lags, stats = {}, {}
+    while True:
+        stats = session.get(f"{args.shop}/_stats", timeout=10).json()
+        applied = {}
+        for change in stats["applied"]:
+            applied.setdefault(change["product_id"], []).append(change)
+        lags = {}
+        for pid, (_, price, accepted) in final.items():
+            hit = next(
+                (c["at"] for c in applied.get(pid, []) if c["price"] == price and c["at"] >= accepted - 1),
+                None,
+            )
+            if hit is not None:
+                lags[pid] = max(0.0, hit - accepted)
+        if len(lags) == len(final) or time.time() > deadline:
+            break
+        time.sleep(0.5)
+
+    values = list(lags.values())
+    print(f"Processed {len(lags)}/{len(final)} products"
+          + ("" if len(lags) == len(final) else f" (gave up after {args.settle:.0f}s)"))
+    print("Processing lag (ms): "
+          + "  ".join(f"p{q}={percentile(values, q) * 1000:.0f}" for q in (50, 90, 99))
+          + f"  max={max(values, default=0) * 1000:.0f}")
+    print(f"Shopify GraphQL requests: {stats['requests']['graphql']}, "
+          f"mutations: {stats['mutations']}, variant updates: {stats['variant_updates']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""Compare pricing scenarios without running a job.
+
+A sweep evaluates percentage scenarios (the percentage job's rule: base
+price plus ``percent`` with tidy rounding) and surcharge table scenarios
+(the ensemble and chain surcharge rules priced with another table) against
+the prices ``scripts/preview.py`` reads.  Each scenario reports:
+
+- ``changed``, ``increased``, ``decreased`` and ``unpriced`` variant counts
+- ``mean_change`` / ``mean_change_pct`` / ``total_change`` against the
+  current prices
+- ``rounding`` (percentage scenarios): what tidy rounding added to the raw
+  price, as a mean, ``ROUNDING_EDGES`` buckets and the ``00``/``90`` endings
+- ``thresholds``: variants whose price crosses each threshold, up or down
+
+Variants sharing their current and base price are evaluated once.  With
+``numpy`` installed all percentage scenarios are computed in one pass over
+arrays; without it the same numbers come from a plain loop::
+
+    python scripts/whatif.py 3 5 7 --threshold 1000 --threshold 3000
+"""
+
+import argparse
+import bisect
+import json
+import math
+import os
+import sys
+import threading
+from collections import Counter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from scripts import preview, pricing
+
+THRESHOLDS = (1000, 2000, 5000, 10000)
+# Bucket edges of the rounding effect (tidy price minus raw price).
+ROUNDING_EDGES = (-40, -20, -5, 5, 20, 40)
+MAX_SCENARIOS = 50
+# Accepted percentages: above -100 (a price must stay positive) and up to
+# MAX_PERCENT.  Surcharges are bounded by MAX_SURCHARGE either way, so
+# scenario prices stay finite.
+MAX_PERCENT = 1000
+MAX_SURCHARGE = 1_000_000
+MAX_THRESHOLDS = 20
+
+_pairs = (None, None)
+_pairs_lock = threading.Lock()
+
+
+def _number(value, what):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"{what} must be a number")
+    return float(value)
+
+
+def _percent(value):
+    percent = _number(value, "percent")
+    if not -100 < percent <= MAX_PERCENT:
+        raise ValueError(f"percent must be above -100 and at most {MAX_PERCENT}")
+    return percent
+
+
+def _surcharge(value, chain):
+    surcharge = _number(value, f"surcharge of {chain!r}")
+    if abs(surcharge) > MAX_SURCHARGE:
+        raise ValueError(f"surcharge of {chain!r} must be at most {MAX_SURCHARGE} either way")
+    return surcharge
+
+
+def check_table(table):
+    """Validate a surcharge table given as a scenario; returns it."""
+    if not isinstance(table, dict) or not all(isinstance(table.get(c), dict) for c in ("colliers", "bracelets")):
+        raise ValueError("a surcharge table needs colliers and bracelets objects")
+    return {
+        cat: {str(chain): _surcharge(value, chain) for chain, value in table[cat].items()}
+        for cat in ("colliers", "bracelets")
+    }
+
+
+def _weighted_pairs():
+    """``(source, Counter of (current, base))`` for the percentage rule, cached."""
+    global _pairs
+    _, pairs, source = preview.percentage_prices()
+    with _pairs_lock:
+        cached_pairs, cached = _pairs
+        if cached_pairs is not pairs:
+            cached = (source, Counter(pairs))
+            _pairs = (pairs, cached)
+        return cached
+
+
+class _Totals:
+    """Weighted scenario statistics, accumulated one distinct price at a time."""
+
+    def __init__(self, thresholds, rounding):
+        self.thresholds = thresholds
+        self.variants = self.unpriced = self.changed = self.increased = self.decreased = 0
+        self.compared = self.pct_compared = 0
+        self.change = self.change_pct = 0.0
+        self.up = [0] * len(thresholds)
+        self.down = [0] * len(thresholds)
+        self.rounding = None
+        if rounding:
+            self.rounding = {"sum": 0.0, "buckets": [0] * (len(ROUNDING_EDGES) + 1), "00": 0, "90": 0}
+
+    def add(self, current, new, weight, effect=None):
+        self.variants += weight
+        if new is None:
+            self.unpriced += weight
+            return
+        if self.rounding is not None:
+            self.rounding["sum"] += effect * weight
+            self.rounding["buckets"][bisect.bisect_right(ROUNDING_EDGES, effect)] += weight
+            self.rounding["00" if new % 100 == 0 else "90"] += weight
+        if current is None:
+            return
+        change = new - current
+        self.compared += weight
+        self.change += change * weight
+        if change:
+            self.changed += weight
+            if change > 0:
+                self.increased += weight
+            else:
+                self.decreased += weight
+        if current > 0:
+            self.pct_compared += weight
+            self.change_pct += 100.0 * change / current * weight
+        for i, t in enumerate(self.thresholds):
+            if current < t <= new:
+                self.up[i] += weight
+            elif new < t <= current:
+                self.down[i] += weight
+
+    def result(self, **label):
+        priced = self.variants - self.unpriced
+        out = dict(label)
+        out.update({
+            "variants": self.variants,
+            "unpriced": self.unpriced,
+            "changed": self.changed,
+            "increased": self.increased,
+            "decreased": self.decreased,
+            "mean_change": round(self.change / self.compared, 2) if self.compared else None,
+            "mean_change_pct": round(self.change_pct / self.pct_compared, 2) if self.pct_compared else None,
+            "total_change": round(self.change, 2),
+            "thresholds": [
+                {"price": t, "up": up, "down": down}
+                for t, up, down in zip(self.thresholds, self.up, self.down)
+            ],
+        })
+        if self.rounding is not None:
+            out["rounding"] = _rounding(
+                self.rounding["sum"] / priced if priced else None,
+                self.rounding["buckets"], self.rounding["00"], self.rounding["90"])
+        return out
+
+
+def _rounding(mean, buckets, ends_00, ends_90):
+    bounds = (None,) + ROUNDING_EDGES + (None,)
+    return {
+        "mean": None if mean is None else round(mean, 2),
+        "buckets": [
+            {"from": bounds[i], "to": bounds[i + 1], "count": int(count)}
+            for i, count in enumerate(buckets)
+        ],
+        "endings": {"00": int(ends_00), "90": int(ends_90)},
+    }
+
+
+def _percentages_python(pairs, percents, thresholds):
+    scenarios = []
+    for percent in percents:
+        factor = 1 + percent / 100.0
+        totals = _Totals(thresholds, rounding=True)
+        for (current, base), weight in pairs.items():
+            if base is None:
+                totals.add(current, None, weight)
+                continue
+            raw = base * factor
+            new = float(pricing.round_to_tidy(raw))
+            totals.add(current, new, weight, new - raw)
+        scenarios.append(totals.result(percent=percent))
+    return scenarios
+
+
+def tidy_array(prices):
+    """``pricing.round_to_tidy`` over a numpy array (as floats)."""
+    # ``rint`` rounds halves to even, like ``round``.
+    whole = numpy.rint(prices)
+    rem = numpy.mod(whole, 100)
+    base = whole - rem
+    to_base = rem
+    to_90 = numpy.abs(rem - 90)
+    to_100 = 100 - rem
+    # Ties go to the first option, as with ``min`` over (base, +90, +100).
+    return numpy.where(
+        (to_base <= to_90) & (to_base <= to_100), base,
+        numpy.where(to_90 <= to_100, base + 90, base + 100))
+
+
+def _percentages_numpy(pairs, percents, thresholds):
+    priced = [(c, b, w) for (c, b), w in pairs.items() if b is not None]
+    unpriced = sum(w for (_, b), w in pairs.items() if b is None)
+    total = sum(pairs.values())
+    current = numpy.array([numpy.nan if c is None else c for c, _, _ in priced], dtype=float)
+    base = numpy.array([b for _, b, _ in priced], dtype=float)
+    weight = numpy.array([w for _, _, w in priced], dtype=float)
+    factors = 1 + numpy.array(percents, dtype=float)[:, None] / 100.0
+
+    # One row per scenario, one column per distinct (current, base) pair.
+    raw = base[None, :] * factors
+    new = tidy_array(raw)
+    effect = new - raw
+    known = ~numpy.isnan(current)
+    change = numpy.where(known, new - current, 0.0)
+    positive = known & (current > 0)
+    pct = numpy.where(positive, 100.0 * change / numpy.where(positive, current, 1.0), 0.0)
+    compared = weight[known].sum()
+    pct_compared = weight[positive].sum()
+    buckets = numpy.searchsorted(numpy.array(ROUNDING_EDGES, dtype=float), effect, side="right")
+    crossings = [
+        (((current < t) & (new >= t)) @ weight, ((new < t) & (current >= t)) @ weight)
+        for t in thresholds
+    ]
+    ends_00 = (numpy.mod(new, 100) == 0) @ weight
+    priced_weight = weight.sum()
+
+    scenarios = []
+    for s, percent in enumerate(percents):
+        row = change[s]
+        scenarios.append({
+            "percent": percent,
+            "variants": total,
+            "unpriced": unpriced,
+            "changed": int(((row != 0) & known) @ weight),
+            "increased": int(((row > 0) & known) @ weight),
+            "decreased": int(((row < 0) & known) @ weight),
+            "mean_change": round(float(row @ weight / compared), 2) if compared else None,
+            "mean_change_pct": round(float(pct[s] @ weight / pct_compared), 2) if pct_compared else None,
+            "total_change": round(float(row @ weight), 2),
+            "thresholds": [
+                {"price": t, "up": int(up[s]), "down": int(down[s])}
+                for t, (up, down) in zip(thresholds, crossings)
+            ],
+            "rounding": _rounding(
+                float(effect[s] @ weight / priced_weight) if priced_weight else None,
+                numpy.bincount(buckets[s], weights=weight, minlength=len(ROUNDING_EDGES) + 1),
+                ends_00[s], priced_weight - ends_00[s]),
+        })
+    return scenarios
+
+
+def _tables(tables, thresholds):
+    scenarios = []
+    for i, table in enumerate(tables):
+        totals = _Totals(thresholds, rounding=False)
+        for (old, new), weight in Counter((r["old"], r["new"]) for r in preview.surcharge_rows(table)).items():
+            totals.add(old, new, weight)
+        scenarios.append(totals.result(table=i))
+    return scenarios
+
+
+def sweep(percents=(), tables=(), thresholds=THRESHOLDS):
+    """Evaluate every scenario; raises ``ValueError`` on bad input.
+
+    Returns ``{"source", "thresholds", "scenarios"}`` with percentage
+    scenarios first, in the order given.
+    """
+    percents = [_percent(p) for p in percents]
+    tables = [check_table(t) for t in tables]
+    thresholds = sorted({_number(t, "threshold") for t in thresholds})
+    if not percents and not tables:
+        raise ValueError("give at least one percentage or surcharge table")
+    if len(percents) + len(tables) > MAX_SCENARIOS:
+        raise ValueError(f"at most {MAX_SCENARIOS} scenarios per sweep")
+    if len(thresholds) > MAX_THRESHOLDS:
+        raise ValueError(f"at most {MAX_THRESHOLDS} thresholds per sweep")
+    result = {"source": "snapshot", "thresholds": thresholds, "scenarios": []}
+    if percents:
+        source, pairs = _weighted_pairs()
+        evaluate = _percentages_numpy if numpy is not None else _percentages_python
+        result["source"] = source
+        result["scenarios"] += evaluate(pairs, percents, thresholds)
+    if tables:
+        result["scenarios"] += _tables(tables, thresholds)
+    return result
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Compare percentage and surcharge scenarios")
+    p.add_argument("percent", type=float, nargs="*")
+    p.add_argument("--table", action="append", default=[], help="Surcharge table JSON file (repeatable)")
+    p.add_argument("--threshold", type=float, action="append", help="Price threshold (repeatable)")
+    args = p.parse_args(argv)
+
+    try:
+        tables = []
+        for path in args.table:
+            with open(path, encoding="utf-8") as f:
+                tables.append(json.load(f))
+        result = sweep(args.percent, tables, args.threshold or THRESHOLDS)
+    except (OSError, ValueError) as exc:
+        print(f"[ERROR] {exc}")
+        return 1
+    for s in result["scenarios"]:
+        name = f"{s['percent']:+g}%" if "percent" in s else f"table {args.table[s['table']]}"
+        crossings = ", ".join(f"{t['price']:g}: +{t['up']}/-{t['down']}" for t in s["thresholds"])
+        print(f"{name:>12}  {s['changed']} of {s['variants']} change, mean {s['mean_change']} "
+              f"({s['mean_change_pct']}%), total {s['total_change']}; thresholds {crossings}")
+        if "rounding" in s:
+            r = s["rounding"]
+            print(f"{'':>12}  rounding mean {r['mean']}, endings 00: {r['endings']['00']} 90: {r['endings']['90']}")
+    print(f"[OK] {len(result['scenarios'])} scenarios from the {result['source']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,55 +11,40 @@ update_prices.py  –  one-shot Shopify variant price updater
 
 import os
 import sys
-import json
-import time
 import textwrap
-import requests
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts import events, pricing, shopify_client, surcharges as surcharge_config
+
 # ─────────── ENV / CONFIG ───────────
 load_dotenv()                                   # expect .env in same dir
 SHOP_DOMAIN = os.getenv("SHOP_DOMAIN")          # azorjewelry.myshopify.com
 API_TOKEN   = os.getenv("API_TOKEN")            # shpat_****
 API_VERSION = os.getenv("API_VERSION", "2024-04")
 
-HEADERS = {
-    "X-Shopify-Access-Token": API_TOKEN,
-    "Content-Type": "application/json"
-}
+SESSION = shopify_client.get_session(API_TOKEN)
 
-SURCHARGE_FILE = os.path.join(os.path.dirname(__file__), "variant_prices.json")
 # ─────────────────────────────────────
 
 
 # ---------- helpers ----------
 def load_surcharges():
-    with open(SURCHARGE_FILE, encoding="utf-8") as f:
-        return json.load(f)
+    version, surcharges = surcharge_config.load()
+    print(f"Surcharges version {version}")
+    return surcharges
 
 
 def get(endpoint, params=None):
-    url = f"https://{SHOP_DOMAIN}/admin/api/{API_VERSION}/{endpoint}"
-    while True:
-        r = requests.get(url, headers=HEADERS, params=params)
-        if r.status_code == 429:
-            time.sleep(2)
-            continue
-        r.raise_for_status()
-        return r
-
+    r = shopify_client.rest_get(SESSION, endpoint, params, SHOP_DOMAIN)
+    r.raise_for_status()
+    return r
 
-GRAPHQL_URL = f"https://{SHOP_DOMAIN}/admin/api/{API_VERSION}/graphql.json"
 
 def graphql_post(query, variables=None):
-    payload = {"query": query, "variables": variables or {}}
-    while True:
-        r = requests.post(GRAPHQL_URL, headers=HEADERS, json=payload)
-        if r.status_code == 429:
-            time.sleep(2)
-            continue
-        r.raise_for_status()
-        return r
+    r = shopify_client.graphql_post(SESSION, query, variables, SHOP_DOMAIN)
+    r.raise_for_status()
+    return r
 
 
 def paginate_products():
@@ -135,9 +120,11 @@ def send_batch(product_id, batch):
     errors = data.get("errors")
     if errors:
         print("ERROR GraphQL error", errors)
+        events.error(f"{product_id}: GraphQL error {errors}")
     user_errors = data["data"]["productVariantsBulkUpdate"]["userErrors"]
     for e in user_errors:
         print(f"ERROR {e['field']}: {e['message']}")
+        events.error(f"{product_id}: {e['field']}: {e['message']}")
 
 
 # ---------- main ----------
@@ -150,6 +137,7 @@ def main():
 
     current_pid = None
     batch = []
+    progress = events.Progress(None, "products")
 
 
     for prod in paginate_products():
@@ -157,7 +145,7 @@ def main():
         if "chaine_update" not in tags:
             continue
 
-        cat = "bracelets" if "bracelet" in tags else ("colliers" if "collier" in tags else None)
+        cat = pricing.chain_category(tags)
         if not cat:
             print(f"* Skip {prod['title']} (no bracelet/collier tag)")
             continue
@@ -199,11 +187,7 @@ def main():
                 print(f"   - {v['title']:<25} not in surcharge list, skipped")
                 continue
 
-            if chain == "Forsat S":
-                new_price = bp
-            else:
-                surcharge = surcharges[cat][chain]
-                new_price = bp + surcharge
+            new_price = pricing.chain_price(bp, chain, surcharges[cat])
 
             if float(v["price"]) == new_price:
                 print(f"   - {chain:<10} already {new_price}")
@@ -218,6 +202,7 @@ def main():
                 batch = []
 
         updated += 1
+        progress.advance(ok=1)
 
         if batch:
 
@@ -230,6 +215,7 @@ def main():
         batch = []
 
 
+    progress.summary()
     print(f"\nDone. Updated {updated} product(s).")
 
 
@@ -0,0 +1,70 @@
+import gzip
+import json
+import os
+import re
+
+import pytest
+
+from webapp import assets, create_app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv('ASSETS_DIR', str(tmp_path / 'dist'))
+    os.environ['SECRET_KEY'] = 'test-key'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def test_build_fingerprints_and_compresses(tmp_path):
+    source = tmp_path / 'static'
+    (source / 'img').mkdir(parents=True)
+    css = b'body { color: red; }\n' * 50
+    (source / 'site.css').write_bytes(css)
+    (source / 'img' / 'logo.png').write_bytes(b'\x89PNG')
+
+    manifest = assets.build(str(source), str(tmp_path / 'dist'))
+
+    assert re.fullmatch(r'site\.[0-9a-f]{12}\.css', manifest['site.css'])
+    assert re.fullmatch(r'img/logo\.[0-9a-f]{12}\.png', manifest['img/logo.png'])
+    built = tmp_path / 'dist' / manifest['site.css']
+    assert gzip.decompress((tmp_path / 'dist' / (manifest['site.css'] + '.gz')).read_bytes()) == css
+    assert not (tmp_path / 'dist' / (manifest['img/logo.png'] + '.gz')).exists()
+    assert json.loads((tmp_path / 'dist' / 'manifest.json').read_text()) == manifest
+    assert assets.load_manifest(str(tmp_path / 'dist'), str(source)) == manifest
+
+    (source / 'site.css').write_bytes(b'body {}\n')
+    os.utime(source / 'site.css', (built.stat().st_mtime + 10,) * 2)
+    assert assets.load_manifest(str(tmp_path / 'dist'), str(source)) is None
+    assert assets.build(str(source), str(tmp_path / 'dist'))['site.css'] != manifest['site.css']
+    assert built.exists()  # still served to pages rendered before the rebuild
+
+
+def test_pages_link_immutable_assets(client):
+    page = client.get('/login').get_data(as_text=True)
+    url = re.search(r'href="(/assets/style\.[0-9a-f]{12}\.css)"', page).group(1)
+    assert re.search(r'src="/assets/script\.[0-9a-f]{12}\.js"', page)
+
+    plain = client.get(url)
+    assert plain.status_code == 200
+    assert plain.headers['Cache-Control'] == assets.CACHE_CONTROL
+    assert plain.headers['Vary'] == 'Accept-Encoding'
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.mimetype == 'text/css'
+
+    zipped = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert zipped.mimetype == 'text/css'
+    assert gzip.decompress(zipped.data) == plain.data
+    assert int(zipped.headers['Content-Length']) < len(plain.data)
+
+    again = client.get(url, headers={'If-None-Match': plain.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_unknown_and_internal_files_are_not_served(client):
+    assert client.get('/assets/manifest.json').status_code == 404
+    assert client.get('/assets/style.css').status_code == 404
+    assert client.get('/assets/../assets.py').status_code == 404
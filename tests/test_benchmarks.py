@@ -0,0 +1,54 @@
+import json
+
+from scripts import benchmarks, pricing, synthetic_catalog
+
+
+def test_synthetic_catalog_feeds_the_pricing_paths():
+    products = synthetic_catalog.generate(100, per_product=12, ensemble_share=1.0)
+    assert sum(len(p['variants']) for p in products) == 100
+    assert len(products) == 9
+
+    rows = synthetic_catalog.backup_rows(products)
+    updates, base_prices = pricing.percentage_updates(rows, 10)
+    assert sum(len(u) for u in updates.values()) == 100
+    assert base_prices[products[0]['id']] == pricing.round_to_tidy(float(rows[0]['original_price']) * 1.1)
+    assert [len(items) for _, items in pricing.chunk_groups(updates, size=5)][:3] == [5, 5, 2]
+
+    surcharges = {'colliers': {'Forsat M': 390.0}, 'bracelets': {'Forsat M': 150.0}}
+    nodes = synthetic_catalog.variant_nodes(products[0])
+    nodes[0]['price'] = '1000.00'
+    prices = [u['price'] for u in pricing.ensemble_updates(nodes, surcharges)]
+    # Variants are Collier x Bracelet combinations: Forsat S/S, S/M, ...
+    assert prices[:2] == ['1000.00', '1190.00']
+    assert nodes[8]['selectedOptions'] == [
+        {'name': 'Collier', 'value': 'Forsat M'}, {'name': 'Bracelet', 'value': 'Forsat M'}]
+    assert prices[8] == '1500.00'  # 1540 rounds to the nearest of 1500, 1590, 1600
+
+
+def test_run_records_history(tmp_path, capsys):
+    history = tmp_path / 'history.json'
+
+    assert benchmarks.main(['--sizes', '50', '--repeat', '1', '--history', str(history)]) == 0
+
+    [entry] = json.loads(history.read_text())
+    assert set(entry['results']) == {f'{name}[50]' for name in benchmarks.BENCHMARKS}
+    assert entry['calibration'] > 0
+    assert '[OK] 7 benchmarks' in capsys.readouterr().out
+
+
+def test_regression_beyond_tolerance_fails(tmp_path, monkeypatch, capsys):
+    history = tmp_path / 'history.json'
+    past = [{'calibration': 0.01, 'results': {'round_to_tidy[50]': s}} for s in (0.010, 0.011, 0.5)]
+    history.write_text(json.dumps(past))
+
+    assert benchmarks.baseline(past) == {'round_to_tidy[50]': 0.011}
+    # Twice as slow on a machine twice as slow is no regression.
+    assert benchmarks.regressions({'round_to_tidy[50]': 0.022}, past, calibration=0.02) == []
+    assert benchmarks.regressions({'round_to_tidy[50]': 0.014}, past, calibration=0.01) == [
+        ('round_to_tidy[50]', 0.011, 0.014)]
+
+    monkeypatch.setattr(benchmarks, 'calibrate', lambda repeat: 0.01)
+    monkeypatch.setattr(benchmarks, 'run', lambda *a: {'round_to_tidy[50]': 0.05})
+    assert benchmarks.main(['--history', str(history)]) == 1
+    assert 'round_to_tidy[50] regressed' in capsys.readouterr().out
+    assert len(json.loads(history.read_text())) == 3
@@ -0,0 +1,48 @@
+import re
+
+from scripts import catalog_snapshot, fake_shopify, shopify_client
+
+# Shopify's limit on the requested (static) cost of a single query.
+MAX_QUERY_COST = 1000
+
+
+def _static_cost(query, ids):
+    """Shopify's requested cost of ``nodes(ids:)`` over products.
+
+    Each product, and its metafield, is one object; a connection costs 2
+    plus one object per ``first`` item.
+    """
+    per_product = 1 + query.count('metafield(') + sum(2 + int(n) for n in re.findall(r'\(first: (\d+)\)', query))
+    return ids * per_product
+
+
+def test_base_price_query_stays_under_the_cost_limit():
+    assert _static_cost(catalog_snapshot.BASE_PRICE_QUERY, catalog_snapshot.BASE_PRICE_QUERY_IDS) <= MAX_QUERY_COST
+    # A full REST page in one query would be far over it.
+    assert _static_cost(catalog_snapshot.BASE_PRICE_QUERY, 250) > MAX_QUERY_COST
+
+
+def test_full_pages_are_queried_in_chunks(monkeypatch):
+    catalog = [
+        {'id': pid, 'title': f'P{pid}', 'base_price': f'{pid}.00', 'collections': ['bagues'],
+         'variants': [{'id': pid * 10, 'price': '1.00', 'options': {'Title': 'Default'}}]}
+        for pid in range(1, 301)
+    ]
+    shop = fake_shopify.FakeShop(catalog=catalog)
+    server = fake_shopify.serve(shop, port=0)
+    monkeypatch.setenv('SHOP_DOMAIN', f'http://127.0.0.1:{server.server_port}')
+    sizes = []
+    post = shopify_client.graphql_post
+
+    def counting_post(session, query, variables=None, domain=None):
+        sizes.append(len((variables or {}).get('ids', [])))
+        return post(session, query, variables, domain)
+
+    monkeypatch.setattr(shopify_client, 'graphql_post', counting_post)
+    try:
+        products = list(catalog_snapshot.fetch_catalog(shopify_client.get_session('test-token')))
+    finally:
+        server.shutdown()
+
+    assert max(sizes) == catalog_snapshot.BASE_PRICE_QUERY_IDS and sum(sizes) == 300
+    assert all(p['base_price'] == f"{p['id']}.00" and p['collections'] == ['bagues'] for p in products)
@@ -0,0 +1,121 @@
+import json
+import os
+import sys
+
+import pytest
+
+from scripts import events
+from webapp import create_app
+from webapp import jobqueue
+from webapp import routes as routes_mod
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv('JOB_DATA_DIR', str(tmp_path / 'jobs'))
+    os.environ['SECRET_KEY'] = 'test-key'
+    os.environ['ADMIN_USERNAME'] = 'admin'
+    os.environ['ADMIN_PASSWORD'] = 'password'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'password'})
+    return client
+
+
+def _emitted(capsys):
+    return [events.parse(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_events_are_only_printed_for_jobs(monkeypatch, capsys):
+    monkeypatch.delenv('JOB_EVENTS', raising=False)
+    events.Progress(3, 'prices').advance(ok=3)
+    assert capsys.readouterr().out == ''
+
+    monkeypatch.setenv('JOB_EVENTS', '1')
+    monkeypatch.setattr(events, 'PROGRESS_INTERVAL', 3600)
+    progress = events.Progress(3, 'prices')
+    progress.advance(ok=1)
+    progress.advance(failed=1)  # within the interval: not reported
+    progress.advance(ok=1)      # finished: always reported
+    progress.summary(base_prices=2)
+
+    phase, first, last, summary = _emitted(capsys)
+    assert phase == {'type': 'phase', 'name': 'prices', 'total': 3}
+    assert first == {'type': 'progress', 'done': 1, 'total': 3, 'ok': 1, 'failed': 0}
+    assert last == {'type': 'progress', 'done': 3, 'total': 3, 'ok': 2, 'failed': 1}
+    assert summary['type'] == 'summary' and summary['base_prices'] == 2 and summary['done'] == 3
+
+
+def test_parse_ignores_log_text():
+    assert events.parse('[OK] 123 → 10.00') is None
+    assert events.parse('@event not json') is None
+    assert events.parse('@event {"type": "unknown"}') is None
+    assert events.parse('@event {"type": "ok", "message": "m"}') == {'type': 'ok', 'message': 'm'}
+
+
+def test_meter_adds_rate_and_eta():
+    now = [100.0]
+    meter = events.Meter(clock=lambda: now[0])
+
+    meter.annotate({'type': 'phase', 'name': 'prices', 'total': 100})
+    now[0] = 104.0
+    event = meter.annotate({'type': 'progress', 'done': 20, 'total': 100})
+    assert (event['rate'], event['eta']) == (5.0, 16.0)
+
+    now[0] = 105.0
+    unknown = meter.annotate({'type': 'progress', 'done': 10, 'total': None})
+    assert (unknown['rate'], unknown['eta']) == (2.0, None)
+
+
+def test_stream_sends_named_events(client, tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    script = tmp_path / 'counting_job.py'
+    script.write_text(
+        'import sys\n'
+        f'sys.path.insert(0, {ROOT!r})\n'
+        'from scripts import events\n'
+        'progress = events.Progress(2, "prices")\n'
+        'print("[OK] first")\n'
+        'progress.advance(ok=1)\n'
+        'events.error("1: price: invalid")\n'
+        'progress.advance(failed=1)\n'
+        'progress.summary()\n'
+    )
+    job_id = jobqueue.enqueue([sys.executable, str(script)])
+    monkeypatch.setattr(routes_mod, 'enqueue', lambda cmd, profile=False, shops=None: job_id)
+
+    body = client.get('/stream/ensemble').get_data(as_text=True)
+
+    assert 'data: [OK] first\n\n' in body
+    assert '@event' not in body
+    messages = [m.split('\n') for m in body.strip().split('\n\n')]
+    named = {m[0][len('event: '):]: json.loads(m[1][len('data: '):]) for m in messages if m[0].startswith('event: ')}
+    assert set(named) >= {'phase', 'progress', 'error', 'summary'}
+    assert named['progress']['done'] == 2 and named['progress']['failed'] == 1
+    assert 'rate' in named['progress'] and 'eta' in named['progress']
+    assert named['error']['message'] == '1: price: invalid'
+    assert body.rstrip().endswith('data: --done--')
+    assert jobqueue.load_job(job_id)['summary']['failed'] == 1
+
+
+def test_a_crashing_job_fails_without_stopping_the_worker(tmp_path, monkeypatch):
+    monkeypatch.setenv('JOB_DATA_DIR', str(tmp_path / 'jobs'))
+    real_run = jobqueue._run
+
+    def run(cmd, env, out_q, shop=None):
+        if cmd[-1] == 'crash':
+            raise OSError('no such interpreter')
+        return real_run(cmd, env, out_q, shop)
+
+    monkeypatch.setattr(jobqueue, '_run', run)
+    crashed = jobqueue.enqueue([sys.executable, 'crash'])
+    assert list(jobqueue.stream(crashed)) == ['[ERROR] Job failed: no such interpreter']
+    assert jobqueue.load_job(crashed)['status'] == 'failed'
+
+    ok = jobqueue.enqueue([sys.executable, '-c', 'print("still running")'])
+    assert list(jobqueue.stream(ok)) == ['still running']
+    assert jobqueue.load_job(ok)['status'] == 'done'
@@ -0,0 +1,95 @@
+import csv
+import io
+import json
+import os
+import sys
+
+import pytest
+
+from scripts import export_prices, synthetic_catalog
+from webapp import create_app
+from webapp import routes as routes_mod
+
+TABLE = {
+    'bracelets': {'Forsat S': 0.0, 'Forsat M': 150.0},
+    'colliers': {'Forsat S': 0.0, 'Forsat M': 390.0},
+}
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    products = synthetic_catalog.generate(60, per_product=8, ensemble_share=0.5, seed=5)
+    snapshot = tmp_path / 'catalog_snapshot.json'
+    snapshot.write_text(json.dumps({'products': products}))
+    table = tmp_path / 'variant_prices.json'
+    table.write_text(json.dumps(TABLE))
+    monkeypatch.setenv('CATALOG_SNAPSHOT', str(snapshot))
+    monkeypatch.setenv('PRICE_BACKUP', str(tmp_path / 'shopify_backup.json'))
+    monkeypatch.setenv('SURCHARGE_CONFIG', str(table))
+    return products
+
+
+@pytest.fixture
+def client(catalog):
+    os.environ['SECRET_KEY'] = 'test-key'
+    os.environ['ADMIN_USERNAME'] = 'admin'
+    os.environ['ADMIN_PASSWORD'] = 'password'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'password'})
+    return client
+
+
+def test_csv_is_streamed_in_chunks(catalog):
+    chunks = list(export_prices.iter_csv(export_prices.rows(catalog), chunk=100))
+    variants = sum(len(p['variants']) for p in catalog)
+    assert len(chunks) == variants // 100 + 1
+    table = list(csv.reader(io.StringIO(''.join(chunks))))
+    assert tuple(table[0]) == export_prices.COLUMNS
+    assert len(table) == variants + 1
+    first = catalog[0]['variants'][0]
+    assert table[1][5] == str(first['id']) and float(table[1][9]) == float(first['price'])
+    assert table[1][12] == ''
+
+
+def test_export_endpoint_adds_planned_prices(client, catalog):
+    resp = client.get('/export/prices.csv?plan=percentage&percent=10')
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    assert 'attachment' in resp.headers['Content-Disposition']
+    table = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+    assert len(table) == sum(len(p['variants']) for p in catalog)
+    assert all(float(r['planned_price']) >= float(r['price']) for r in table)
+
+    assert client.get('/export/prices.csv?plan=percentage').status_code == 400
+    assert client.get('/export/prices.csv?plan=unknown').status_code == 400
+    assert client.get('/stream/export?format=xlsx').status_code == 400
+
+
+def test_export_job_defaults_to_csv(client, monkeypatch):
+    captured = []
+    monkeypatch.setattr(routes_mod, 'enqueue', lambda cmd, profile=False, shops=None: captured.append(cmd))
+    monkeypatch.setattr(routes_mod, 'stream', lambda job_id: iter(()))
+    client.get('/stream/export').get_data()
+    client.get('/stream/export?format=parquet').get_data()
+    assert [cmd[cmd.index('--format') + 1] for cmd in captured] == ['csv', 'parquet']
+
+
+def test_cli_writes_csv_to_the_job_dir(catalog, tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv('JOB_DIR', str(tmp_path))
+    assert export_prices.main(['--plan', 'ensemble']) == 0
+    with open(tmp_path / 'prices.csv', encoding='utf-8') as f:
+        table = list(csv.DictReader(f))
+    assert len(table) == sum(len(p['variants']) for p in catalog)
+    ensemble_ids = {str(v['id']) for p in catalog if 'ensemble' in p['tags'] for v in p['variants']}
+    assert {r['variant_id'] for r in table if r['planned_price']} == ensemble_ids
+    assert '[DONE]' in capsys.readouterr().out
+
+
+def test_parquet_needs_pyarrow(catalog, tmp_path, monkeypatch, capsys):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    out = tmp_path / 'prices.parquet'
+    assert export_prices.main(['--format', 'parquet', '--out', str(out)]) == 1
+    assert 'pyarrow' in capsys.readouterr().out
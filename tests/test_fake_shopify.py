@@ -0,0 +1,117 @@
+import os
+import time
+
+import pytest
+import requests
+
+from scripts import fake_shopify, shopify_client, synthetic_catalog
+from scripts import update_prices_shopify
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    servers = []
+
+    def start(shop):
+        server = fake_shopify.serve(shop, port=0)
+        servers.append(server)
+        monkeypatch.setenv('SHOP_DOMAIN', f'http://127.0.0.1:{server.server_port}')
+        return requests.Session()
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_rest_pages_follow_the_next_link(serve):
+    shop = fake_shopify.FakeShop(products=600, variants=2, rest_bucket=1000)
+    session = serve(shop)
+
+    variants = update_prices_shopify.fetch_all_variants(session, shopify_client.admin_url())
+
+    assert len(variants) == 1200
+    assert len({v['variant_id'] for v in variants}) == 1200
+    assert shop.stats()['requests']['rest'] == 3
+    page = shopify_client.rest_get(session, 'products.json', {'limit': 250, 'page_info': shopify_client.next_page_info(
+        shopify_client.rest_get(session, 'products.json', {'limit': 250}))})
+    assert 'rel="previous"' in page.headers['Link'] and 'rel="next"' in page.headers['Link']
+    assert page.headers['X-Shopify-Shop-Api-Call-Limit'].endswith('/1000')
+
+
+def test_graphql_bucket_throttles_and_clients_wait(serve, monkeypatch):
+    shop = fake_shopify.FakeShop(products=6, variants=2, bucket=20, restore_rate=200)
+    session = serve(shop)
+    waits = []
+    monkeypatch.setattr(shopify_client, 'throttle_wait', lambda api, seconds=2: (waits.append(seconds), time.sleep(seconds)))
+
+    groups = [(pid, [{'id': f'gid://shopify/ProductVariant/{pid * 1000 + 1}', 'price': '5.00'}]) for pid in range(1, 7)]
+    results = list(shopify_client.send_packed_updates(session, groups, max_cost=10))
+
+    assert [error for *_, error in results] == [None] * 6
+    stats = shop.stats()
+    assert stats['throttled']['graphql'] >= 1
+    assert len(waits) == stats['throttled']['graphql']
+    assert all(0 < w <= 0.1 for w in waits)
+    payload = shopify_client.graphql_post(session, 'query { shop { id } }').json()
+    assert payload['extensions']['cost']['throttleStatus']['maximumAvailable'] == 20
+
+
+def test_rest_bucket_answers_429(serve, monkeypatch):
+    shop = fake_shopify.FakeShop(products=2, variants=1, rest_bucket=1, rest_leak_rate=20)
+    session = serve(shop)
+    monkeypatch.setattr(shopify_client, 'throttle_wait', lambda api, seconds=2: time.sleep(0.06))
+
+    for _ in range(3):
+        assert shopify_client.rest_get(session, 'products/1.json').json()['product']['id'] == 1
+
+    assert shop.stats()['throttled']['rest'] >= 1
+    raw = session.get(f"{shopify_client.admin_url()}/products/2.json")
+    raw = raw if raw.status_code == 429 else session.get(f"{shopify_client.admin_url()}/products/2.json")
+    assert raw.status_code == 429
+    assert raw.headers['Retry-After'] == '2.0'
+
+
+def test_bulk_mutation_and_metafields(serve):
+    shop = fake_shopify.FakeShop(catalog=synthetic_catalog.generate(24, per_product=12))
+    session = serve(shop)
+    pid = sorted(shop.products)[0]
+    rows = [{
+        'productId': f'gid://shopify/Product/{pid}',
+        'variants': [{'id': f'gid://shopify/ProductVariant/{vid}', 'price': '42.00'} for vid in shop.products[pid]],
+    }]
+
+    [result] = shopify_client.run_bulk_mutation(session, rows, poll_interval=0)
+
+    assert result['productVariantsBulkUpdate']['userErrors'] == []
+    assert {v['price'] for v in shop.products[pid].values()} == {'42.00'}
+
+    update_prices_shopify.set_base_price(session, pid, '42.00')
+    metafields = shopify_client.rest_get(session, f'products/{pid}/metafields.json').json()['metafields']
+    assert [(m['key'], m['value']) for m in metafields] == [('base_price', '42.00')]
+
+
+def test_faults_are_injected(serve):
+    shop = fake_shopify.FakeShop(products=1, variants=1, fault_rate=1.0, faults=['500'], seed=1)
+    session = serve(shop)
+
+    assert session.get(f"{shopify_client.admin_url()}/products.json").status_code == 500
+    assert shop.stats()['faults'] == 1
+
+
+def test_run_script_reports_against_a_synthetic_catalog():
+    shop = fake_shopify.FakeShop(catalog=synthetic_catalog.generate(120), restore_rate=10000)
+    before = {vid: v['price'] for variants in shop.products.values() for vid, v in variants.items()}
+
+    returncode, seconds, stats = fake_shopify.run_script(
+        shop, [os.path.join(ROOT, 'scripts', 'update_prices_shopify.py'), '--percent', '10'])
+
+    assert returncode == 0
+    assert not os.path.exists(os.path.join(ROOT, 'scripts', 'shopify_backup.json'))
+    assert stats['variant_updates'] == 120
+    assert stats['operations']['GET products.json'] == 1
+    assert seconds >= stats['wall_seconds'] > 0
+    changed = {vid for variants in shop.products.values() for vid, v in variants.items() if v['price'] != before[vid]}
+    assert changed
+    assert any('wall time' in line for line in fake_shopify.report(stats, seconds))
@@ -0,0 +1,132 @@
+import csv
+import io
+import json
+import os
+import sys
+
+import pytest
+
+from scripts import fake_shopify, import_prices, synthetic_catalog
+from webapp import create_app
+from webapp import routes as routes_mod
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    products = synthetic_catalog.generate(240, per_product=6, seed=11)
+    products[1]['variants'][0]['sku'] = products[0]['variants'][0]['sku']
+    snapshot = tmp_path / 'catalog_snapshot.json'
+    snapshot.write_text(json.dumps({'products': products}))
+    monkeypatch.setenv('CATALOG_SNAPSHOT', str(snapshot))
+    return products
+
+
+@pytest.fixture
+def shop(catalog, monkeypatch):
+    shop = fake_shopify.FakeShop(catalog=catalog)
+    server = fake_shopify.serve(shop, port=0)
+    monkeypatch.setenv('SHOP_DOMAIN', f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setenv('API_TOKEN', 'test-token')
+    yield shop
+    server.shutdown()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    os.environ['SECRET_KEY'] = 'test-key'
+    os.environ['ADMIN_USERNAME'] = 'admin'
+    os.environ['ADMIN_PASSWORD'] = 'password'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    monkeypatch.setenv('JOB_DATA_DIR', str(tmp_path / 'jobs'))
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'password'})
+    return client
+
+
+def _csv(*rows, header=('variant_id', 'sku', 'price')):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return buf.getvalue()
+
+
+def test_rows_are_validated_and_diffed(catalog):
+    first, second, third = catalog[2]['variants'][:3]
+    text = _csv(
+        (first['id'], '', '1234.5'),
+        ('', second['sku'], second['price']),
+        (f"gid://shopify/ProductVariant/{third['id']}", '', '99,90'),
+        (first['id'], '', '10'),
+        ('999', '', '10'),
+        ('', 'NOPE', '10'),
+        ('', catalog[0]['variants'][0]['sku'], '10'),
+        (catalog[3]['variants'][0]['id'], '', 'free'),
+        (catalog[3]['variants'][1]['id'], '', '-1'),
+    )
+    rejected = []
+    updates, counts = import_prices.plan(
+        import_prices.read_rows(io.StringIO(text)), import_prices.Catalog(catalog),
+        lambda *row: rejected.append(row))
+
+    assert counts == {'rows': 9, 'changed': 2, 'unchanged': 1, 'rejected': 6}
+    assert updates == {catalog[2]['id']: [
+        {'id': f"gid://shopify/ProductVariant/{first['id']}", 'price': '1234.50'},
+        {'id': f"gid://shopify/ProductVariant/{third['id']}", 'price': '99.90'},
+    ]}
+    assert [r[0] for r in rejected] == [5, 6, 7, 8, 9, 10]
+    assert 'listed twice' in rejected[0][4] and 'several variants' in rejected[3][4]
+    with pytest.raises(ValueError):
+        list(import_prices.read_rows(io.StringIO('product,amount\n1,2\n')))
+
+
+@pytest.mark.parametrize('threshold', ['500', '1'])
+def test_import_updates_the_shop(shop, catalog, tmp_path, monkeypatch, threshold):
+    monkeypatch.setenv('IMPORT_BULK_THRESHOLD', threshold)
+    monkeypatch.setenv('JOB_DIR', str(tmp_path))
+    rows = [(v['id'], '', f"{100 + i}.00") for i, p in enumerate(catalog[:25]) for v in p['variants']]
+    path = tmp_path / 'prices.csv'
+    path.write_text(_csv(*rows, ('', 'NOPE', '1')))
+
+    assert import_prices.main([str(path)]) == 0
+
+    owner = {v['id']: p['id'] for p in catalog for v in p['variants']}
+    for vid, _, price in rows:
+        assert shop.products[owner[vid]][vid]['price'] == price
+    assert shop.stats()['variant_updates'] == len(rows)
+    assert 'NOPE' in (tmp_path / import_prices.REJECTED_FILE).read_text()
+
+
+def test_dry_run_leaves_the_shop_alone(shop, catalog, tmp_path):
+    path = tmp_path / 'prices.csv'
+    path.write_text(_csv((catalog[0]['variants'][0]['id'], '', '1.00')))
+    assert import_prices.main([str(path), '--dry-run', '--rejected', str(tmp_path / 'r.csv')]) == 0
+    assert shop.stats()['requests']['graphql'] == 0
+    assert not (tmp_path / 'r.csv').exists()
+
+
+def test_upload_then_stream(client, monkeypatch):
+    captured = {}
+
+    def fake_enqueue(cmd, profile=False, shops=None):
+        captured['cmd'] = cmd
+        return 'job'
+
+    monkeypatch.setattr(routes_mod, 'enqueue', fake_enqueue)
+    monkeypatch.setattr(routes_mod, 'stream', lambda job_id: iter(()))
+
+    assert client.post('/import/upload', data={}).status_code == 400
+    resp = client.post('/import/upload', data={'file': (io.BytesIO(b'sku,price\nA,1\n'), 'prices.csv')})
+    upload = resp.get_json()['upload']
+    assert client.get(f'/stream/import?upload={upload}&dry_run=1').status_code == 200
+    cmd = captured['cmd']
+    assert cmd[:2] == [sys.executable, routes_mod.SCRIPTS['import']]
+    assert cmd[3] == '--dry-run'
+    with open(cmd[2], encoding='utf-8') as f:
+        assert f.read() == 'sku,price\nA,1\n'
+
+    assert client.get('/stream/import?upload=missing').status_code == 404
+    assert client.get('/stream/import?upload=../x').status_code == 404
+    assert b'import-form' in client.get('/import').data
@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+from scripts import fake_shopify, webhook_loadtest
+from webapp import create_app
+from webapp import variant_index
+from webapp import webhook as webhook_mod
+from webapp import webhook_queue
+
+
+@pytest.fixture
+def shop(monkeypatch):
+    fake = fake_shopify.FakeShop(products=5, variants=2)
+    server = fake_shopify.serve(fake, port=0)
+    monkeypatch.setenv('SHOP_DOMAIN', f'http://127.0.0.1:{server.server_port}')
+    yield fake
+    server.shutdown()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, shop):
+    monkeypatch.setenv('WEBHOOK_QUEUE_DB', str(tmp_path / 'webhooks.sqlite3'))
+    monkeypatch.setenv('JOB_DATA_DIR', str(tmp_path / 'jobs'))
+    monkeypatch.setenv('WEBHOOK_WORKERS', '0')
+    monkeypatch.setenv('CATALOG_SNAPSHOT', str(tmp_path / 'missing.json'))
+    monkeypatch.delenv('VARIANT_INDEX_DB', raising=False)
+    monkeypatch.setenv('SHOPIFY_WEBHOOK_SECRET', 'shhh')
+    monkeypatch.setenv('API_TOKEN', 'loadtest-token')
+    variant_index.reset_index()
+    os.environ['SECRET_KEY'] = 'test'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def test_generator_repeats_webhook_ids():
+    items = list(webhook_loadtest.generate(200, products=10, duplicates=0.2, metaobjects=0.5, seed=7))
+    ids = [i[0] for i in items]
+    assert len(set(ids)) < len(ids)
+    prices = {i[2] for i in items}
+    assert len(prices) == len(set(ids))
+    assert {i[3] for i in items} == {'metafield', 'metaobject'}
+
+
+def test_signed_deliveries_are_applied_by_the_stand_in(client, shop):
+    items = list(webhook_loadtest.generate(12, products=5, duplicates=0.25, metaobjects=0.5, seed=3))
+    bodies, newest = {}, {}
+    for webhook_id, product_id, price, kind in items:
+        duplicate = webhook_id in bodies
+        if not duplicate:
+            bodies[webhook_id] = webhook_loadtest.make_delivery(product_id, price, kind)
+            newest[product_id] = price
+        path, topic, body = bodies[webhook_id]
+        headers = webhook_loadtest.signed_headers(body, 'shhh', topic, webhook_id)
+        resp = client.post(path, data=body, headers=headers)
+        assert resp.status_code == 200
+        assert webhook_queue.status(webhook_id) is not None
+        assert json.loads(body)['updated_at']
+
+    webhook_queue.drain()
+
+    stats = shop.stats()
+    assert stats['requests']['graphql'] >= 1
+    for product_id, price in newest.items():
+        assert {v['price'] for v in shop.products[product_id].values()} == {price}
+
+
+def test_tampered_delivery_is_rejected(client):
+    path, topic, body = webhook_loadtest.make_delivery(1, '10.00')
+    headers = webhook_loadtest.signed_headers(body, 'wrong', topic, 'x')
+    assert client.post(path, data=body, headers=headers).status_code == 401
+    assert webhook_mod.sign_webhook(body, 'shhh') != headers['X-Shopify-Hmac-SHA256']
+
+
+def test_percentile():
+    assert webhook_loadtest.percentile([], 99) == 0.0
+    assert webhook_loadtest.percentile([1, 2, 3, 4], 50) == 2.5
+    assert webhook_loadtest.percentile([5], 90) == 5
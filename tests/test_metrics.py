@@ -0,0 +1,111 @@
+import os
+import sys
+
+import pytest
+
+from scripts import metrics, shopify_client
+from webapp import create_app
+from webapp import jobqueue
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class DummyResp:
+    def __init__(self, status_code=200, text='{}'):
+        self.status_code = status_code
+        self.text = text
+
+
+class DummySession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def post(self, url, json=None, timeout=None):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.delenv('METRICS_TOKEN', raising=False)
+    os.environ['SECRET_KEY'] = 'test'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def test_render_and_merge():
+    registry = metrics.Registry()
+    registry.counter('things_total', 'Things.', ('kind',)).inc(2, kind='a"b')
+    hist = registry.histogram('wait_seconds', 'Waits.', (), buckets=(1, 5))
+    hist.observe(0.5)
+    hist.observe(3)
+
+    other = metrics.Registry()
+    other.merge(registry.snapshot())
+    other.merge(registry.snapshot())
+    text = other.render()
+
+    assert '# TYPE things_total counter' in text
+    assert 'things_total{kind="a\\"b"} 4' in text
+    assert 'wait_seconds_bucket{le="1"} 2' in text
+    assert 'wait_seconds_bucket{le="5"} 4' in text
+    assert 'wait_seconds_bucket{le="+Inf"} 4' in text
+    assert 'wait_seconds_count 4' in text
+
+
+def test_graphql_post_records_latency_throttling_and_cost(monkeypatch):
+    monkeypatch.setattr(shopify_client.time, 'sleep', lambda s: None)
+    monkeypatch.setenv('SHOP_DOMAIN', 'example.myshopify.com')
+    cost = '{"data": {}, "extensions": {"cost": {"requestedQueryCost": 12, "actualQueryCost": 7}}}'
+    session = DummySession([DummyResp(429), DummyResp(200, cost)])
+    before_cost = shopify_client.COST_POINTS.value(operation='mutation')
+    before_wait = shopify_client.THROTTLED_SECONDS.value(api='graphql')
+    before_429 = shopify_client.REQUESTS.value(api='graphql', operation='mutation', status='429')
+
+    shopify_client.graphql_post(session, 'mutation { x }')
+
+    assert session.calls == 2
+    assert shopify_client.COST_POINTS.value(operation='mutation') == before_cost + 7
+    assert shopify_client.THROTTLED_SECONDS.value(api='graphql') == before_wait + shopify_client.THROTTLE_WAIT
+    assert shopify_client.REQUESTS.value(api='graphql', operation='mutation', status='429') == before_429 + 1
+
+
+def test_rest_operation_hides_ids():
+    url = 'https://shop.myshopify.com/admin/api/2024-04/products/123/variants/456.json'
+    assert shopify_client.rest_operation(url) == 'products/:id/variants/:id.json'
+    assert shopify_client.rest_operation('products.json') == 'products.json'
+
+
+def test_metrics_endpoint_and_token(client, monkeypatch):
+    resp = client.get('/metrics')
+    assert resp.status_code == 200
+    assert b'# TYPE shopify_requests_total counter' in resp.data
+    assert b'# TYPE job_queue_depth gauge' in resp.data
+
+    monkeypatch.setenv('METRICS_TOKEN', 'scrape')
+    assert client.get('/metrics').status_code == 401
+    resp = client.get('/metrics', headers={'Authorization': 'Bearer scrape'})
+    assert resp.status_code == 200
+
+
+def test_job_metrics_are_merged_from_the_script(tmp_path, monkeypatch):
+    monkeypatch.setenv('JOB_DATA_DIR', str(tmp_path / 'jobs'))
+    script = tmp_path / 'metrics_job.py'
+    script.write_text(
+        'import sys\n'
+        f'sys.path.insert(0, {ROOT!r})\n'
+        'from scripts import metrics\n'
+        'metrics.counter("script_items_total", "Items.").inc(3)\n'
+        'print("[OK] done")\n'
+    )
+    before = jobqueue.JOB_RUN.count(job='metrics_job')
+
+    job_id = jobqueue.enqueue([sys.executable, str(script)])
+    assert list(jobqueue.stream(job_id)) == ['[OK] done']
+
+    assert jobqueue.JOB_RUN.count(job='metrics_job') == before + 1
+    assert jobqueue.JOBS.value(job='metrics_job', status='ok') >= 1
+    assert metrics.REGISTRY.counter('script_items_total', 'Items.').value() >= 3
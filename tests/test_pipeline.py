@@ -0,0 +1,179 @@
+import json
+import os
+import time
+
+import pytest
+
+from scripts import catalog_snapshot, fake_shopify, pipeline
+from webapp import create_app
+from webapp import routes as routes_mod
+from webapp import webhook_queue
+
+TABLE = {
+    'bracelets': {'Forsat S': 0.0, 'Forsat M': 150.0},
+    'colliers': {'Forsat S': 0.0, 'Forsat M': 390.0},
+}
+
+PRODUCTS = [
+    {
+        'id': 1, 'title': 'Chaine bracelet', 'tags': ['chaine_update', 'Bracelet'], 'base_price': '500.00',
+        'variants': [
+            {'id': 11, 'title': 'Forsat S', 'price': '480.00', 'options': {'Chaine': 'Forsat S'}},
+            {'id': 12, 'title': 'Forsat M', 'price': '700.00', 'options': {'Chaine': 'Forsat M'}},
+            {'id': 13, 'title': 'Gold', 'price': '900.00', 'options': {'Chaine': 'Gold'}},
+        ],
+    },
+    {
+        'id': 2, 'title': 'Ensemble', 'tags': ['ensemble'],
+        'variants': [
+            {'id': 21, 'price': '1000.00', 'options': {'Collier': 'Forsat S', 'Bracelet': 'Forsat S'}},
+            {'id': 22, 'price': '1000.00', 'options': {'Collier': 'Forsat M', 'Bracelet': 'Forsat S'}},
+            {'id': 23, 'price': '1200.00', 'options': {'Collier': 'Forsat S', 'Bracelet': 'Forsat M'}},
+        ],
+    },
+    {
+        'id': 3, 'title': 'Bague', 'tags': [],
+        'variants': [{'id': 31, 'price': '300.00'}, {'id': 32, 'price': '410.00'}],
+    },
+]
+
+# Percentage (+10 %, tidy), then Forsat S as base price, chain surcharges and ensembles.
+FINAL = {11: '500.00', 12: '650.00', 13: '990.00', 21: '1100.00', 22: '1490.00', 23: '1290.00', 31: '300.00', 32: '490.00'}
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    snapshot = tmp_path / 'catalog_snapshot.json'
+    snapshot.write_text(json.dumps({'products': PRODUCTS}))
+    table = tmp_path / 'variant_prices.json'
+    table.write_text(json.dumps(TABLE))
+    monkeypatch.setenv('CATALOG_SNAPSHOT', str(snapshot))
+    monkeypatch.setenv('PRICE_BACKUP', str(tmp_path / 'shopify_backup.json'))
+    monkeypatch.setenv('SURCHARGE_CONFIG', str(table))
+    monkeypatch.setenv('WEBHOOK_QUEUE_DB', str(tmp_path / 'webhooks.sqlite3'))
+    monkeypatch.setenv('WEBHOOK_WORKERS', '0')
+    return tmp_path
+
+
+def test_steps_run_in_dependency_order():
+    assert pipeline.order(['ensemble', 'surcharges', 'percentage', 'base_price']) == list(pipeline.STEPS)
+    assert pipeline.order(['ensemble', 'percentage']) == ['percentage', 'ensemble']
+    with pytest.raises(ValueError):
+        pipeline.order(['percentage', 'rounding'])
+
+
+def test_final_prices_combine_every_step():
+    ctx = {'percent': 10, 'surcharges': TABLE,
+           'originals': {v['id']: v['price'] for p in PRODUCTS for v in p['variants']}}
+    changed = {}
+    updates, bases = pipeline.run_steps(PRODUCTS, pipeline.STEPS, ctx, lambda step, n: changed.setdefault(step, n))
+
+    prices = {int(u['id'].rsplit('/', 1)[-1]): u['price'] for inputs in updates.values() for u in inputs}
+    assert prices == {vid: price for vid, price in FINAL.items() if vid != 31}
+    # The chain product's base price stays on its Forsat S variant.
+    assert bases == {2: '1100.00', 3: '300.00'}
+    assert changed == {'percentage': 7, 'base_price': 0, 'surcharges': 1, 'ensemble': 2}
+
+    updates, bases = pipeline.run_steps(PRODUCTS, ['base_price', 'surcharges'], ctx)
+    assert updates == {1: [{'id': 'gid://shopify/ProductVariant/12', 'price': '630.00'}]}
+    assert bases == {1: '480.00'}
+
+
+def test_pipeline_pushes_each_variant_once(files, monkeypatch):
+    shop = fake_shopify.FakeShop(catalog=PRODUCTS)
+    server = fake_shopify.serve(shop, port=0)
+    monkeypatch.setenv('SHOP_DOMAIN', f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setenv('API_TOKEN', 'test-token')
+    try:
+        assert pipeline.main(['--percent', '10', '--snapshot']) == 0
+    finally:
+        server.shutdown()
+
+    prices = {vid: v['price'] for variants in shop.products.values() for vid, v in variants.items()}
+    assert prices == FINAL
+    assert shop.stats()['variant_updates'] == 7
+    assert shop.metafields[2][('custom', 'base_price')]['value'] == '1100.00'
+    assert webhook_queue.paused_until() is None
+    snapshot = {v['id']: v['price'] for p in catalog_snapshot.load_snapshot() for v in p['variants']}
+    assert snapshot == FINAL
+    assert os.path.exists(files / 'shopify_backup.json')
+
+
+def test_paused_deliveries_wait_and_echoes_are_dropped(files, monkeypatch):
+    applied = {}
+    monkeypatch.setattr(webhook_queue, '_handler', lambda prices: applied.update(prices) or {})
+
+    webhook_queue.pause('pipeline-test')
+    webhook_queue.enqueue('echo', 'metafields/update', 2, '1100.0')
+    webhook_queue.enqueue('edit', 'metafields/update', 5, '20.00')
+    retries = webhook_queue.process_batch([2, 5])
+    assert set(retries) == {2, 5} and all(0 < d <= webhook_queue.PAUSE_RETRY for d in retries.values())
+    assert applied == {}
+    assert webhook_queue.status('edit')['attempts'] == 0
+
+    assert webhook_queue.resume('pipeline-test', {2: '1100.00'}) == 1
+    assert webhook_queue.paused_until() is None
+    assert webhook_queue.status('echo')['status'] == 'stale'
+    webhook_queue.drain()
+    assert applied == {5: '20.00'}
+
+
+def test_pipeline_route(files, monkeypatch):
+    os.environ['SECRET_KEY'] = 'test-key'
+    os.environ['ADMIN_USERNAME'] = 'admin'
+    os.environ['ADMIN_PASSWORD'] = 'password'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'password'})
+    assert 'step-surcharges' in client.get('/pipeline').get_data(as_text=True)
+
+    captured = {}
+    monkeypatch.setattr(routes_mod, 'enqueue', lambda cmd, profile=False, shops=None: captured.setdefault('cmd', cmd))
+    monkeypatch.setattr(routes_mod, 'stream', lambda job_id: iter(()))
+    client.get('/stream/pipeline?step=ensemble&step=percentage&percent=5&dry_run=1')
+    assert captured['cmd'][1:] == [routes_mod.SCRIPTS['pipeline'], '--steps', 'ensemble,percentage',
+                                   '--percent', '5', '--dry-run']
+    assert client.get('/stream/pipeline?step=percentage').status_code == 400
+    assert client.get('/stream/pipeline?step=rounding').status_code == 400
+
+
+def test_echoes_arriving_after_the_pause_are_dropped(files, monkeypatch):
+    applied = {}
+    monkeypatch.setattr(webhook_queue, '_handler', lambda prices: applied.update(prices) or {})
+
+    with webhook_queue.paused('pipeline-test') as written:
+        written[2] = '1100.00'
+        written[3] = '300.00'
+        wrote_at = time.time()
+    assert webhook_queue.paused_until() is None
+
+    webhook_queue.enqueue('late-echo', 'metafields/update', 2, '1100.0', updated_at=wrote_at)
+    webhook_queue.drain()
+    assert applied == {}
+    assert webhook_queue.status('late-echo')['status'] == 'stale'
+
+    # The echo is consumed: the same price set again later is a real edit.
+    webhook_queue.enqueue('same-again', 'metafields/update', 2, '1100.00')
+    webhook_queue.drain()
+    assert applied == {2: '1100.00'}
+
+    # Another edit applied to the product forgets its pending echo.
+    webhook_queue.enqueue('edit', 'metafields/update', 3, '350.00', updated_at=wrote_at + 60)
+    webhook_queue.drain()
+    webhook_queue.enqueue('back', 'metafields/update', 3, '300.00', updated_at=wrote_at + 120)
+    webhook_queue.drain()
+    assert applied == {2: '1100.00', 3: '300.00'}
+    assert webhook_queue.status('back')['status'] == 'done'
+
+
+def test_echo_matches_the_write_time_not_only_the_price(files, monkeypatch):
+    applied = {}
+    monkeypatch.setattr(webhook_queue, '_handler', lambda prices: applied.update(prices) or {})
+    with webhook_queue.paused('pipeline-test') as written:
+        written[2] = '1100.00'
+
+    webhook_queue.enqueue('merchant', 'metafields/update', 2, '1100.00', updated_at=time.time() + 600)
+    webhook_queue.drain()
+    assert applied == {2: '1100.00'}
@@ -0,0 +1,128 @@
+import importlib
+import json
+import os
+
+import pytest
+
+from scripts import catalog_snapshot, fake_shopify, planner, shopify_client
+from webapp import create_app
+
+
+def _backup(products, variants):
+    return [
+        {'product_id': pid, 'variant_id': pid * 1000 + v, 'original_price': '100.00'}
+        for pid, count in zip(range(1, products + 1), variants)
+        for v in range(1, count + 1)
+    ]
+
+
+@pytest.fixture
+def backup_file(tmp_path, monkeypatch):
+    path = tmp_path / 'shopify_backup.json'
+    monkeypatch.setattr(planner, 'BACKUP_FILE', str(path))
+    monkeypatch.setenv('GRAPHQL_RESTORE_RATE', '50')
+    monkeypatch.setenv('GRAPHQL_BUCKET', '1000')
+    return path
+
+
+def test_percentage_plan_from_backup(backup_file):
+    # 40 products with 3 variants and one with 120 (three groups of <= 50).
+    backup_file.write_text(json.dumps(_backup(41, [3] * 40 + [120])))
+
+    plan = planner.plan('percentage')
+
+    assert plan['source'] == 'backup'
+    assert plan['products'] == 41
+    assert plan['variants'] == 240
+    assert plan['mutation_fields'] == 43
+    assert plan['metafield_writes'] == 41
+    assert plan['rest_requests'] == 0
+    documents = len(list(shopify_client.pack_groups([(0, [None] * 3)] * 40 + [(1, [None] * 50)] * 2 + [(1, [None] * 20)])))
+    assert plan['graphql_requests'] == documents + 41
+    assert plan['cost_points'] == 43 * 10 + 41 * 10
+    assert plan['estimated_seconds'] > 0
+    assert any('Estimated wall time' in line for line in planner.format_plan(plan))
+
+
+def test_reset_plan_matches_the_real_run(backup_file, tmp_path, monkeypatch, capsys):
+    backup_file.write_text(json.dumps(_backup(30, [3] * 30)))
+    shop = fake_shopify.FakeShop(products=30, variants=3)
+    server = fake_shopify.serve(shop, port=0)
+    try:
+        monkeypatch.setenv('SHOP_DOMAIN', f'http://127.0.0.1:{server.server_port}')
+        monkeypatch.setenv('API_TOKEN', 'token')
+        reset = importlib.reload(importlib.import_module('scripts.reset_prices_shopify'))
+        monkeypatch.setattr(reset, '__file__', str(tmp_path / 'reset_prices_shopify.py'))
+
+        monkeypatch.setattr('sys.argv', ['reset_prices_shopify.py', '--plan'])
+        reset.main()
+        out = capsys.readouterr().out
+        assert '[PLAN] reset: 30 products / 90 variants (from backup)' in out
+        assert shop.stats()['mutations'] == 0
+
+        monkeypatch.setattr('sys.argv', ['reset_prices_shopify.py'])
+        reset.main()
+    finally:
+        server.shutdown()
+
+    plan = planner.plan('reset')
+    assert plan['graphql_requests'] == shop.stats()['requests']['graphql']
+    assert plan['mutation_fields'] == shop.stats()['mutations']
+
+
+def test_ensemble_plan_from_snapshot(tmp_path, monkeypatch):
+    path = tmp_path / 'snapshot.json'
+    monkeypatch.setenv('CATALOG_SNAPSHOT', str(path))
+    products = [
+        {'id': 1, 'tags': ['Ensemble'], 'variants': [{'id': i} for i in range(60)]},
+        {'id': 2, 'tags': ['bague'], 'variants': [{'id': 99}]},
+        {'id': 3, 'tags': ['ensemble'], 'variants': [{'id': 100}]},
+    ]
+    catalog_snapshot.save_snapshot(products, str(path))
+
+    plan = planner.plan('ensemble', bucket=1000, restore_rate=50)
+
+    assert plan['source'] == 'snapshot'
+    assert (plan['products'], plan['variants']) == (2, 61)
+    assert plan['mutation_fields'] == 3
+    assert plan['graphql_requests'] == 2  # one read page, one packed document
+    assert plan['metafield_writes'] == 0
+
+
+def test_throttle_status_reads_the_shop(monkeypatch):
+    monkeypatch.delenv('GRAPHQL_RESTORE_RATE', raising=False)
+
+    class Resp:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {'data': {}, 'extensions': {'cost': {'throttleStatus': {
+                'maximumAvailable': 2000.0, 'currentlyAvailable': 1990, 'restoreRate': 100.0}}}}
+
+    monkeypatch.setattr(shopify_client, 'graphql_post', lambda *a, **k: Resp())
+    assert planner.throttle_status(object()) == (2000.0, 100.0, 'shop')
+
+    def offline(*a, **k):
+        raise ConnectionError('offline')
+
+    monkeypatch.setattr(shopify_client, 'graphql_post', offline)
+    assert planner.throttle_status(object())[2] == 'default'
+
+
+def test_plan_endpoint(backup_file, monkeypatch):
+    backup_file.write_text(json.dumps(_backup(2, [1, 1])))
+    os.environ['SECRET_KEY'] = 'test-key'
+    os.environ['ADMIN_USERNAME'] = 'admin'
+    os.environ['ADMIN_PASSWORD'] = 'password'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+    assert client.get('/plan/reset').status_code == 302
+    client.post('/login', data={'username': 'admin', 'password': 'password'})
+
+    data = client.get('/plan/reset').get_json()
+    assert data['plan']['products'] == 2
+    assert data['lines'][0].startswith('[PLAN] reset')
+    assert client.get('/plan/unknown').status_code == 404
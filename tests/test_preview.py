@@ -0,0 +1,102 @@
+import json
+import os
+
+import pytest
+
+from scripts import pricing, preview, synthetic_catalog
+from webapp import create_app
+
+TABLE = {
+    'bracelets': {'Forsat S': 0.0, 'Forsat M': 150.0},
+    'colliers': {'Forsat S': 0.0, 'Forsat M': 390.0},
+}
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    products = synthetic_catalog.generate(240, per_product=12, ensemble_share=0.5, seed=3)
+    chain = {
+        'id': 1, 'title': 'Chaine bracelet', 'tags': ['chaine_update', 'Bracelet'], 'base_price': '500.00',
+        'variants': [
+            {'id': 11, 'title': 'Forsat S', 'sku': 'CB-S', 'price': '480.00', 'options': {'Chaine': 'Forsat S'}},
+            {'id': 12, 'title': 'Forsat M', 'sku': 'CB-M', 'price': '700.00', 'options': {'Chaine': 'Forsat M'}},
+            {'id': 13, 'title': 'Gold', 'sku': 'CB-G', 'price': '900.00', 'options': {'Chaine': 'Gold'}},
+        ],
+    }
+    snapshot = tmp_path / 'catalog_snapshot.json'
+    snapshot.write_text(json.dumps({'products': products + [chain]}))
+    table = tmp_path / 'variant_prices.json'
+    table.write_text(json.dumps(TABLE))
+    monkeypatch.setenv('CATALOG_SNAPSHOT', str(snapshot))
+    monkeypatch.setenv('PRICE_BACKUP', str(tmp_path / 'shopify_backup.json'))
+    monkeypatch.setenv('SURCHARGE_CONFIG', str(table))
+    return products
+
+
+@pytest.fixture
+def client(catalog):
+    os.environ['SECRET_KEY'] = 'test-key'
+    os.environ['ADMIN_USERNAME'] = 'admin'
+    os.environ['ADMIN_PASSWORD'] = 'password'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'password'})
+    return client
+
+
+def test_percentage_uses_the_backup_prices(catalog, tmp_path):
+    rows, info = preview.diff('percentage', 10)
+    assert info['source'] == 'snapshot'
+    assert len(rows) == 243
+    first = catalog[0]['variants'][0]
+    assert rows[0]['new'] == float(pricing.round_to_tidy(float(first['price']) * 1.1))
+
+    backup = synthetic_catalog.backup_rows(catalog)
+    backup[0]['original_price'] = '100.00'
+    (tmp_path / 'shopify_backup.json').write_text(json.dumps(backup))
+    rows, _ = preview.diff('percentage', 10)
+    assert (rows[0]['old'], rows[0]['new']) == (float(first['price']), 100.0)
+
+
+def test_ensemble_and_surcharge_rules(catalog):
+    rows, info = preview.diff('ensemble')
+    ensemble = next(p for p in catalog if 'ensemble' in p['tags'])
+    expected = pricing.ensemble_updates(synthetic_catalog.variant_nodes(ensemble), TABLE)
+    assert [r['new'] for r in rows[:len(expected)]] == [float(u['price']) for u in expected]
+    assert info['surcharge_version'] == 0
+
+    rows, _ = preview.diff('surcharge')
+    # Forsat S carries the base, other chains add their surcharge, unknown ones are skipped.
+    assert [(r['variant_id'], r['old'], r['new']) for r in rows] == [(11, 480.0, 480.0), (12, 700.0, 630.0)]
+
+
+def test_query_filters_sorts_and_pages(catalog):
+    rows, _ = preview.diff('percentage', 12)
+    result = preview.query(rows, sort='change_pct', min_change=12, changed_only=True, per_page=5, page=2)
+
+    assert result['total'] == 243
+    assert result['page'] == 2 and len(result['rows']) == 5
+    assert all(abs(r['change_pct']) >= 12 for r in result['rows'])
+    everything = preview.query(rows, sort='change_pct', min_change=12, per_page=1000)['rows']
+    magnitudes = [abs(r['change_pct']) for r in everything]
+    assert magnitudes == sorted(magnitudes, reverse=True)
+    assert result['rows'] == everything[5:10]
+
+    by_sku = preview.query(rows, search=catalog[1]['variants'][0]['sku'])
+    assert [r['variant_id'] for r in by_sku['rows']] == [catalog[1]['variants'][0]['id']]
+    assert preview.diff('percentage', 12)[0] is rows
+    with pytest.raises(ValueError):
+        preview.query(rows, sort='price')
+
+
+def test_preview_endpoint(client):
+    body = client.get('/preview/percentage?percent=5&min_change=3&order=asc&sort=new&per_page=10').get_json()
+    assert body['per_page'] == 10 and body['source'] == 'snapshot'
+    news = [r['new'] for r in body['rows']]
+    assert news == sorted(news)
+
+    assert client.get('/preview/percentage').status_code == 400
+    assert client.get('/preview/unknown').status_code == 404
+    assert b'preview-rows' in client.get('/preview').data
@@ -0,0 +1,69 @@
+import os
+import pstats
+import sys
+
+import pytest
+
+from webapp import create_app
+from webapp import jobqueue
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv('JOB_DATA_DIR', str(tmp_path / 'jobs'))
+    os.environ['SECRET_KEY'] = 'test-key'
+    os.environ['ADMIN_USERNAME'] = 'admin'
+    os.environ['ADMIN_PASSWORD'] = 'password'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def _write_job(tmp_path):
+    script = tmp_path / 'busy_job.py'
+    script.write_text(
+        'from concurrent.futures import ThreadPoolExecutor\n'
+        'def crunch(n):\n'
+        '    return sum(i * i for i in range(20000 + n))\n'
+        'with ThreadPoolExecutor(2) as pool:\n'
+        '    list(pool.map(crunch, range(4)))\n'
+        'print("[OK] crunched")\n'
+    )
+    return str(script)
+
+
+def test_profiled_job_leaves_reports(tmp_path, monkeypatch):
+    monkeypatch.setenv('JOB_DATA_DIR', str(tmp_path / 'jobs'))
+    monkeypatch.chdir(ROOT)
+    job_id = jobqueue.enqueue([sys.executable, _write_job(tmp_path)], profile=True)
+    lines = list(jobqueue.stream(job_id))
+    assert '[OK] crunched' in lines
+
+    record = jobqueue.load_job(job_id)
+    assert record['status'] == 'done'
+    assert record['job'] == 'busy_job'
+    assert {'profile.pstats', 'profile.collapsed', 'profile.txt'} <= set(record['artifacts'])
+    stats = pstats.Stats(os.path.join(jobqueue.job_dir(job_id), 'profile.pstats'))
+    assert any(func[2] == 'crunch' for func in stats.stats)
+
+
+def test_artifacts_are_streamed_and_downloadable(client, tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    job_id = jobqueue.enqueue([sys.executable, _write_job(tmp_path)], profile=True)
+    from webapp import routes as routes_mod
+    monkeypatch.setattr(routes_mod, 'enqueue', lambda cmd, profile=False, shops=None: job_id)
+    client.post('/login', data={'username': 'admin', 'password': 'password'})
+
+    body = client.get('/stream/ensemble?profile=1').get_data(as_text=True)
+    assert 'event: artifacts' in body
+    assert f'/jobs/{job_id}/profile.pstats' in body
+    assert body.rstrip().endswith('data: --done--')
+
+    resp = client.get(f'/jobs/{job_id}/profile.collapsed')
+    assert resp.status_code == 200
+    assert b'crunch' in resp.data
+    assert client.get(f'/jobs/{job_id}/job.json').status_code == 404
+    assert client.get('/jobs/not-a-job/profile.txt').status_code == 404
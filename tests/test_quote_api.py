@@ -0,0 +1,94 @@
+import json
+import os
+
+import pytest
+
+from scripts import pricing, surcharges, synthetic_catalog
+from webapp import api, create_app
+
+TABLE = {
+    'bracelets': {'Forsat S': 0.0, 'Forsat M': 150.0},
+    'colliers': {'Forsat S': 0.0, 'Forsat M': 390.0, 'Chopard M': 1890.0},
+}
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    path = tmp_path / 'variant_prices.json'
+    path.write_text(json.dumps(TABLE))
+    monkeypatch.setenv('SURCHARGE_CONFIG', str(path))
+    return path
+
+
+@pytest.fixture
+def client(config, monkeypatch):
+    monkeypatch.setenv('QUOTE_API_TOKEN', 'pos-token')
+    os.environ['SECRET_KEY'] = 'test-key'
+    os.environ['WTF_CSRF_ENABLED'] = 'true'
+    app = create_app()
+    app.config['TESTING'] = True
+    yield app.test_client()
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+
+
+def post(client, body, token='pos-token'):
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    return client.post('/api/ensemble/quote', json=body, headers=headers)
+
+
+def test_requires_a_token_or_session(client):
+    assert post(client, {'quotes': []}, token=None).status_code == 401
+    assert post(client, {'quotes': []}, token='wrong').status_code == 401
+    assert post(client, {'quotes': []}).status_code == 200
+
+
+def test_quotes_match_the_ensemble_job(client):
+    product = synthetic_catalog.generate(36, per_product=36, ensemble_share=1.0)[0]
+    nodes = synthetic_catalog.variant_nodes(product)
+    nodes[0]['price'] = '1234.50'
+    expected = [u['price'] for u in pricing.ensemble_updates(nodes, TABLE)]
+    options = [{o['name']: o['value'] for o in n['selectedOptions']} for n in nodes]
+    known = [i for i, o in enumerate(options)
+             if o['Collier'] in TABLE['colliers'] and o['Bracelet'] in TABLE['bracelets']]
+    assert len(known) >= 4
+
+    body = post(client, {'quotes': [
+        [1234.5, options[i]['Collier'], options[i]['Bracelet']] for i in known
+    ]}).get_json()
+
+    assert body['version'] == 0
+    assert [q['price'] for q in body['quotes']] == [expected[i] for i in known]
+
+
+def test_each_quote_reports_its_own_error(client):
+    body = post(client, {'quotes': [
+        {'base_price': 1000, 'collier': 'Forsat M', 'bracelet': 'Forsat M'},
+        {'base_price': '1000', 'collier': 'Forsat M'},
+        {'base_price': 1000, 'collier': 'Gold', 'bracelet': 'Forsat S'},
+        [1000, 'Forsat S', 'Gold'],
+        [-5, 'Forsat S', 'Forsat S'],
+        [1000, 'Forsat S'],
+    ]}).get_json()
+
+    assert body['quotes'][:2] == [{'price': '1500.00', 'surcharge': 540.0}, {'price': '1390.00', 'surcharge': 390.0}]
+    assert [q['error'] for q in body['quotes'][2:]] == [
+        "unknown collier 'Gold'",
+        "unknown bracelet 'Gold'",
+        'base_price must be a non-negative number',
+        'expected {"base_price", "collier", "bracelet"} or a 3-item list',
+    ]
+    assert post(client, {'nope': 1}).status_code == 400
+
+
+def test_matrix_follows_the_surcharge_version(client, config, monkeypatch):
+    monkeypatch.setenv('QUOTE_MAX_BATCH', '5000')
+    body = post(client, {'quotes': [[1000, 'Chopard M', 'Forsat M']] * 5000}).get_json()
+    assert len(body['quotes']) == 5000
+    assert body['quotes'][0]['price'] == '3000.00'
+    first = api.surcharge_matrix()[1]
+    assert api.surcharge_matrix()[1] is first
+
+    surcharges.store().save(dict(TABLE, colliers={'Chopard M': 990.0}))
+    body = post(client, {'quotes': [[1000, 'Chopard M', 'Forsat M']]}).get_json()
+    assert body == {'version': 1, 'quotes': [{'price': '2100.00', 'surcharge': 1140.0}]}
+    assert post(client, {'quotes': [[1000, '', '']] * 5001}).status_code == 413
@@ -0,0 +1,173 @@
+import json
+import os
+import time
+
+import pytest
+
+from scripts import fake_shopify, reconcile_prices
+from webapp import create_app
+from webapp import routes as routes_mod
+from webapp import webhook_queue
+
+TABLE = {
+    'bracelets': {'Forsat S': 0.0, 'Forsat M': 150.0},
+    'colliers': {'Forsat S': 0.0, 'Forsat M': 390.0},
+}
+
+PRODUCTS = [
+    {
+        'id': 1, 'title': 'Chaine bracelet', 'tags': ['chaine_update', 'Bracelet'], 'base_price': '500.00',
+        'variants': [
+            {'id': 11, 'price': '500.00', 'options': {'Chaine': 'Forsat S'}},
+            {'id': 12, 'price': '600.00', 'options': {'Chaine': 'Forsat M'}},
+            {'id': 13, 'price': '123.00', 'options': {'Chaine': 'Gold'}},
+        ],
+    },
+    {
+        'id': 2, 'title': 'Ensemble', 'tags': ['ensemble'], 'base_price': '1000',
+        'variants': [
+            {'id': 21, 'price': '1000.00', 'options': {'Collier': 'Forsat S', 'Bracelet': 'Forsat S'}},
+            {'id': 22, 'price': '1390.00', 'options': {'Collier': 'Forsat M', 'Bracelet': 'Forsat S'}},
+            {'id': 23, 'price': '1000.00', 'options': {'Collier': 'Forsat S', 'Bracelet': 'Forsat M'}},
+        ],
+    },
+    {
+        'id': 3, 'title': 'Bague', 'tags': [], 'base_price': '300.0',
+        'variants': [
+            {'id': 31, 'price': '300.00', 'compare_at_price': '300.00'},
+            {'id': 32, 'price': '410.00', 'compare_at_price': '300.00'},
+        ],
+    },
+    {'id': 4, 'title': 'Sans prix de base', 'tags': [], 'variants': [{'id': 41, 'price': '50.00'}]},
+]
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    table = tmp_path / 'variant_prices.json'
+    table.write_text(json.dumps(TABLE))
+    monkeypatch.setenv('SURCHARGE_CONFIG', str(table))
+    monkeypatch.setenv('RECONCILE_HISTORY', str(tmp_path / 'reconcile_history.json'))
+    monkeypatch.delenv('JOB_DIR', raising=False)
+    return tmp_path
+
+
+def test_drift_follows_each_products_rule():
+    products = [
+        dict(p, variants=[dict(v, compare_at_price=v.get('compare_at_price')) for v in p['variants']])
+        for p in PRODUCTS
+    ]
+    updates, rows, counts = reconcile_prices.drift(products, TABLE)
+
+    assert updates == {
+        1: [{'id': 'gid://shopify/ProductVariant/12', 'price': '650.00'}],
+        2: [{'id': 'gid://shopify/ProductVariant/23', 'price': '1190.00'}],
+        3: [{'id': 'gid://shopify/ProductVariant/32', 'price': '300.00', 'compareAtPrice': '300.00'}],
+    }
+    assert [r['variant_id'] for r in rows] == [12, 23, 32]
+    assert counts == {'products': 4, 'variants': 9, 'no_base': 1, 'drift': 3,
+                      'by_rule': {'flat': 1, 'chain': 1, 'ensemble': 1}}
+
+
+def test_reconcile_repairs_only_drifting_variants(files, monkeypatch):
+    shop = fake_shopify.FakeShop(catalog=PRODUCTS)
+    server = fake_shopify.serve(shop, port=0)
+    monkeypatch.setenv('SHOP_DOMAIN', f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setenv('API_TOKEN', 'test-token')
+    try:
+        assert reconcile_prices.main(['--dry-run']) == 0
+        assert shop.stats()['variant_updates'] == 0
+        assert reconcile_prices.main([]) == 0
+        repaired = shop.stats()['variant_updates']
+        assert reconcile_prices.main([]) == 0
+    finally:
+        server.shutdown()
+
+    assert repaired == 3
+    prices = {vid: v['price'] for variants in shop.products.values() for vid, v in variants.items()}
+    assert (prices[12], prices[13], prices[23], prices[32], prices[41]) == ('650.00', '123.00', '1190.00', '300.00', '50.00')
+    assert shop.products[3][32]['compareAtPrice'] == '300.00'
+
+    history = reconcile_prices.load_history()
+    assert [(run['dry_run'], run['drift'], run['repaired']) for run in history] == [
+        (True, 3, 0), (False, 3, 3), (False, 0, 0)]
+    assert history[0]['by_rule'] == {'flat': 1, 'chain': 1, 'ensemble': 1}
+
+
+def test_reconcile_page_and_route(files, monkeypatch):
+    reconcile_prices.save_history([{
+        'at': 1700000000, 'job_id': None, 'dry_run': False, 'products': 4, 'variants': 9, 'no_base': 1,
+        'drift': 3, 'by_rule': {'flat': 1, 'chain': 1, 'ensemble': 1}, 'repaired': 3, 'failed': 0,
+    }])
+    os.environ['SECRET_KEY'] = 'test-key'
+    os.environ['ADMIN_USERNAME'] = 'admin'
+    os.environ['ADMIN_PASSWORD'] = 'password'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'password'})
+    assert 'reconcile-runs' in client.get('/reconcile').get_data(as_text=True)
+
+    captured = {}
+    monkeypatch.setattr(routes_mod, 'enqueue', lambda cmd, profile=False, shops=None: captured.setdefault('cmd', cmd))
+    monkeypatch.setattr(routes_mod, 'stream', lambda job_id: iter(()))
+    client.get('/stream/reconcile?dry_run=1')
+    assert captured['cmd'][1:] == [routes_mod.SCRIPTS['reconcile'], '--dry-run']
+
+
+def test_reconciliation_is_scheduled_when_configured(monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(routes_mod, '_reconcile_scheduled', False)
+    monkeypatch.setattr(routes_mod, 'schedule',
+                        lambda cmd, interval, shops=None, guard=None: scheduled.append((cmd[1:], interval, shops)))
+    monkeypatch.setenv('RECONCILE_INTERVAL_MINUTES', '0')
+    routes_mod.start_reconcile_schedule()
+    assert scheduled == []
+
+    monkeypatch.setenv('RECONCILE_INTERVAL_MINUTES', '15')
+    monkeypatch.setenv('RECONCILE_SHOPS', 'ma, fr')
+    routes_mod.start_reconcile_schedule()
+    routes_mod.start_reconcile_schedule()
+    assert scheduled == [([routes_mod.SCRIPTS['reconcile']], 900.0, ['ma', 'fr'])]
+
+
+def test_scheduled_runs_take_a_lease_and_respect_pauses(tmp_path, monkeypatch):
+    monkeypatch.setenv('WEBHOOK_QUEUE_DB', str(tmp_path / 'webhooks.sqlite3'))
+    monkeypatch.setenv('WEBHOOK_WORKERS', '0')
+    guards = []
+    monkeypatch.setattr(routes_mod, '_reconcile_scheduled', False)
+    monkeypatch.setattr(routes_mod, 'schedule', lambda cmd, interval, shops=None, guard=None: guards.append(guard))
+    monkeypatch.setenv('RECONCILE_INTERVAL_MINUTES', '15')
+    routes_mod.start_reconcile_schedule()
+    guard, = guards
+
+    with webhook_queue.paused('price-job'):
+        with guard() as go:
+            assert go is False
+
+    # Each call stands for another app process starting the same run.
+    with guard() as first:
+        with guard() as second:
+            assert (first, second) == (True, False)
+    with guard() as later:
+        assert later is False  # the lease covers the rest of the interval
+
+    with webhook_queue.leased('short', 0.05) as held:
+        assert held
+    time.sleep(0.1)
+    with webhook_queue.leased('short', 0.05) as held:
+        assert held  # an expired lease is taken over
+
+
+def test_rules_match_the_jobs_that_wrote_the_prices():
+    products = [
+        {'id': 5, 'tags': ['chaine_update', 'Collier', 'Bracelet'], 'base_price': '500',
+         'variants': [{'id': 51, 'price': '650.00', 'compare_at_price': None, 'options': {'Chaine': 'Forsat M'}}]},
+        {'id': 6, 'tags': ['ensemble'], 'base_price': '1000',
+         'variants': [{'id': 61, 'price': '1390.00', 'compare_at_price': None,
+                       'options': {'collier': 'Forsat M', 'BRACELET': 'Forsat S'}}]},
+    ]
+    updates, _, counts = reconcile_prices.drift(products, TABLE)
+    assert updates == {}
+    assert counts['by_rule'] == {'flat': 0, 'chain': 0, 'ensemble': 0}
@@ -0,0 +1,128 @@
+import json
+import os
+import sys
+
+import pytest
+
+from scripts import fake_shopify, search_index, synthetic_catalog, update_prices_shopify
+from webapp import create_app
+from webapp import routes as routes_mod
+
+CHAIN_PRODUCTS = [
+    {
+        'id': 1, 'title': 'Bracelet Forsat', 'vendor': 'Azor', 'tags': ['chaine_update', 'Bracelet'],
+        'collections': ['bracelets'],
+        'variants': [
+            {'id': 11, 'sku': 'BF-S', 'price': '500.00', 'options': {'Chaine': 'Forsat S'}},
+            {'id': 12, 'sku': 'BF-GM', 'price': '650.00', 'options': {'Chaine': 'Gourmette M'}},
+        ],
+    },
+    {
+        'id': 2, 'title': 'Collier Forsat', 'vendor': 'Azor', 'tags': ['chaine_update', 'Collier'],
+        'collections': ['colliers'],
+        'variants': [
+            {'id': 21, 'sku': 'CF-GM', 'price': '900.00', 'options': {'Chaine': 'Gourmette M'}},
+        ],
+    },
+    {
+        'id': 3, 'title': 'Ensemble Lune', 'vendor': 'Atelier', 'tags': ['ensemble'],
+        'collections': ['ensembles'],
+        'variants': [
+            {'id': 31, 'sku': 'EL-1', 'price': '1200.00', 'options': {'Collier': 'Forsat S', 'Bracelet': 'Gourmette M'}},
+            {'id': 32, 'sku': 'EL-2', 'price': '1300.00', 'options': {'Collier': 'Gourmette M', 'Bracelet': 'Forsat S'}},
+        ],
+    },
+]
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    path = tmp_path / 'catalog_snapshot.json'
+    path.write_text(json.dumps({'products': CHAIN_PRODUCTS}))
+    monkeypatch.setenv('CATALOG_SNAPSHOT', str(path))
+    return path
+
+
+def test_queries_combine_product_and_variant_terms():
+    index = search_index.SearchIndex(CHAIN_PRODUCTS)
+
+    assert index.select('tag:bracelet chain:"Gourmette M"') == ([1], [12])
+    assert index.select('chain:"gourmette m"') == ([1, 2, 3], [12, 21, 31, 32])
+    assert index.select('option:"Bracelet=Gourmette M"') == ([3], [31])
+    assert index.select('collection:ensembles -option:"Collier=Gourmette M"') == ([3], [31])
+    assert index.select('forsat -tag:collier') == ([1], [11, 12])
+    assert index.select('vendor:azor sku:cf-gm') == ([2], [21])
+    assert index.select('') == ([1, 2, 3], [11, 12, 21, 31, 32])
+    assert index.select('tag:missing') == ([], [])
+    assert index.values('chain')['gourmette m'] == 4
+    for bad in ('price:10', 'tag:"open'):
+        with pytest.raises(ValueError):
+            index.select(bad)
+
+
+def test_index_follows_the_snapshot(snapshot):
+    first = search_index.get_index()
+    assert search_index.get_index() is first
+    products = CHAIN_PRODUCTS + [{'id': 4, 'title': 'Bague', 'tags': ['Bracelet'], 'variants': [{'id': 41}]}]
+    snapshot.write_text(json.dumps({'products': products}))
+    os.utime(snapshot, ns=(1, 1))
+    assert search_index.select('tag:bracelet') == ([1, 4], [11, 12, 41])
+
+
+def test_large_catalog_queries_are_fast():
+    import time
+    index = search_index.SearchIndex(synthetic_catalog.generate(50000, per_product=49, ensemble_share=0.5))
+    started = time.perf_counter()
+    products, variants = index.select('tag:ensemble option:"Bracelet=Gourmette M"')
+    assert time.perf_counter() - started < 0.05
+    assert products and len(variants) == len(products) * 7
+
+
+def test_search_and_select_endpoints(snapshot, monkeypatch):
+    monkeypatch.setenv('QUOTE_API_TOKEN', 'pos-token')
+    os.environ['SECRET_KEY'] = 'test-key'
+    os.environ['ADMIN_USERNAME'] = 'admin'
+    os.environ['ADMIN_PASSWORD'] = 'password'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+
+    assert client.get('/api/select?q=tag:collier').status_code == 401
+    body = client.get('/api/select?q=tag:collier', headers={'Authorization': 'Bearer pos-token'}).get_json()
+    assert (body['products'], body['variants']) == ([2], [21])
+
+    client.post('/login', data={'username': 'admin', 'password': 'password'})
+    body = client.get('/catalog/search?q=chain:"Gourmette M"&limit=1').get_json()
+    assert (body['products'], body['variants']) == (3, 4)
+    assert body['results'] == [{'id': 1, 'title': 'Bracelet Forsat', 'variants': 1, 'total_variants': 2}]
+    assert client.get('/catalog/search?q=nope:1').status_code == 400
+
+    captured = {}
+    monkeypatch.setattr(routes_mod, 'enqueue', lambda cmd, profile=False, shops=None: captured.setdefault('cmd', cmd))
+    monkeypatch.setattr(routes_mod, 'stream', lambda job_id: iter(()))
+    client.get('/stream/percentage?percent=5&select=tag:bracelet')
+    assert captured['cmd'][1:] == [routes_mod.SCRIPTS['percentage'], '--percent', '5', '--select=tag:bracelet']
+
+    captured.clear()
+    client.get('/stream/percentage?percent=5&select=-vendor:Azor')
+    assert captured['cmd'][-1] == '--select=-vendor:Azor'
+    assert update_prices_shopify.parse_args(captured['cmd'][2:]).select == '-vendor:Azor'
+
+
+def test_percentage_job_updates_only_the_selection(snapshot, tmp_path, monkeypatch):
+    shop = fake_shopify.FakeShop(catalog=CHAIN_PRODUCTS)
+    server = fake_shopify.serve(shop, port=0)
+    monkeypatch.setenv('SHOP_DOMAIN', f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setattr(update_prices_shopify, 'DOMAIN', os.environ['SHOP_DOMAIN'])
+    monkeypatch.setenv('PRICE_BACKUP', str(tmp_path / 'shopify_backup.json'))
+    monkeypatch.setattr(sys, 'argv', ['update_prices_shopify.py', '--percent', '10', '--select', 'chain:"Gourmette M"'])
+    try:
+        update_prices_shopify.main()
+    finally:
+        server.shutdown()
+
+    prices = {vid: v['price'] for variants in shop.products.values() for vid, v in variants.items()}
+    assert prices == {11: '500.00', 12: '700.00', 21: '990.00', 31: '1300.00', 32: '1400.00'}
+    # Base prices follow the first variant, so only products 2 and 3 get one.
+    assert {pid for pid, fields in shop.metafields.items() if fields} == {2, 3}
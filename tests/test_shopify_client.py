@@ -0,0 +1,135 @@
+import importlib
+import json
+
+import pytest
+import requests
+
+from scripts import shopify_client
+
+
+class DummyResp:
+    status_code = 200
+    ok = True
+
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        pass
+
+
+def _groups(count, variants=3):
+    return [
+        (pid, [{'id': f'gid://shopify/ProductVariant/{pid}{i}', 'price': '1.00'} for i in range(variants)])
+        for pid in range(count)
+    ]
+
+
+def test_pack_groups_respects_cost_ceiling():
+    batches = list(shopify_client.pack_groups(_groups(7), max_cost=30))
+    assert [len(b) for b in batches] == [3, 3, 1]
+
+
+def test_pack_groups_respects_variant_limit():
+    batches = list(shopify_client.pack_groups(_groups(4, variants=50), max_cost=1000, max_variants=100))
+    assert [len(b) for b in batches] == [2, 2]
+
+
+def test_aliased_document_splits_results_per_product(monkeypatch):
+    sent = []
+
+    def fake_post(session, query, variables=None, domain=None):
+        sent.append((query, variables))
+        return DummyResp({
+            'data': {
+                'p0': {'userErrors': []},
+                'p1': None,
+                'p2': {'userErrors': [{'field': ['price'], 'message': 'bad'}]},
+            },
+            'errors': [{'message': 'Product not found', 'path': ['p1']}],
+        })
+
+    monkeypatch.setattr(shopify_client, 'graphql_post', fake_post)
+    results = list(shopify_client.send_packed_updates(None, _groups(3), max_cost=1000))
+
+    assert len(sent) == 1
+    query, variables = sent[0]
+    assert 'p2: productVariantsBulkUpdate(productId: $p2, variants: $v2)' in query
+    assert variables['p1'] == 'gid://shopify/Product/1'
+    assert [r[0] for r in results] == [0, 1, 2]
+    assert results[0][3] is None
+    assert 'Product not found' in results[1][3]
+    assert 'bad' in results[2][3]
+
+
+def test_reset_packs_products_into_few_requests(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv('API_TOKEN', 'token')
+    monkeypatch.setenv('SHOP_DOMAIN', 'example.com')
+    reset = importlib.reload(importlib.import_module('scripts.reset_prices_shopify'))
+    backup = [
+        {'product_id': pid, 'variant_id': pid * 10 + i, 'original_price': '100.00'}
+        for pid in range(1, 31)
+        for i in range(3)
+    ]
+    (tmp_path / 'shopify_backup.json').write_text(json.dumps(backup))
+    monkeypatch.setattr(reset, '__file__', str(tmp_path / 'reset_prices_shopify.py'))
+    monkeypatch.setattr('sys.argv', ['reset_prices_shopify.py'])
+
+    requests_sent = []
+
+    def fake_post(session, query, variables=None, domain=None):
+        requests_sent.append(variables)
+        aliases = [k for k in variables if k.startswith('p')]
+        return DummyResp({'data': {a: {'userErrors': []} for a in aliases}})
+
+    monkeypatch.setattr(shopify_client, 'graphql_post', fake_post)
+    reset.main()
+
+    out = capsys.readouterr().out
+    assert len(requests_sent) == 2
+    assert out.count('🔄') == 90
+    assert 'All prices reset.' in out
+
+
+class _OfflineSession:
+    def __init__(self, fail):
+        self.fail = fail
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        if self.calls <= self.fail:
+            raise requests.exceptions.ConnectionError('unreachable')
+        return DummyResp({'data': {}})
+
+    def post(self, url, **kwargs):
+        return self._call()
+
+    def get(self, url, **kwargs):
+        return self._call()
+
+
+def test_graphql_post_gives_up_on_dead_connections(monkeypatch):
+    waits = []
+    monkeypatch.setattr(shopify_client, 'throttle_wait', lambda api, seconds=2: waits.append(seconds))
+
+    session = _OfflineSession(fail=2)
+    assert shopify_client.graphql_post(session, '{ shop { id } }', domain='shop.test').json() == {'data': {}}
+    assert session.calls == 3
+
+    session = _OfflineSession(fail=100)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        shopify_client.graphql_post(session, '{ shop { id } }', domain='shop.test')
+    assert session.calls == shopify_client.CONNECT_ATTEMPTS
+    assert waits == [2, 4, 2, 4, 8, 16]
+
+
+def test_rest_get_gives_up_on_dead_connections(monkeypatch):
+    monkeypatch.setattr(shopify_client, 'throttle_wait', lambda api, seconds=2: None)
+    session = _OfflineSession(fail=100)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        shopify_client.rest_get(session, 'products.json', domain='shop.test')
+    assert session.calls == shopify_client.CONNECT_ATTEMPTS
@@ -0,0 +1,132 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+from scripts import shops
+from webapp import create_app
+from webapp import jobqueue
+from webapp import routes as routes_mod
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+REGISTRY = {'shops': [
+    {'name': 'ma', 'domain': 'azor-ma.myshopify.com', 'token_env': 'TOKEN_MA'},
+    {'name': 'fr', 'domain': 'azor-fr.myshopify.com', 'token': 'shpat-fr', 'api_version': '2024-07',
+     'cost_ceiling': 500, 'env': {'IMPORT_WORKERS': 8}},
+]}
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    path = tmp_path / 'shops.json'
+    path.write_text(json.dumps(REGISTRY))
+    monkeypatch.setenv('SHOPS_CONFIG', str(path))
+    monkeypatch.setenv('SHOP_DATA_DIR', str(tmp_path / 'shop_data'))
+    monkeypatch.setenv('TOKEN_MA', 'shpat-ma')
+    return path
+
+
+@pytest.fixture
+def client(registry, tmp_path, monkeypatch):
+    monkeypatch.setenv('JOB_DATA_DIR', str(tmp_path / 'jobs'))
+    os.environ['SECRET_KEY'] = 'test-key'
+    os.environ['ADMIN_USERNAME'] = 'admin'
+    os.environ['ADMIN_PASSWORD'] = 'password'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'password'})
+    return client
+
+
+def test_env_gives_each_shop_its_own_store_and_files(registry, tmp_path):
+    assert shops.names() == ['ma', 'fr']
+    ma, fr = shops.env('ma'), shops.env('fr')
+
+    assert (ma['SHOP_DOMAIN'], ma['API_TOKEN']) == ('azor-ma.myshopify.com', 'shpat-ma')
+    assert 'GRAPHQL_COST_CEILING' not in ma
+    assert (fr['API_TOKEN'], fr['API_VERSION'], fr['GRAPHQL_COST_CEILING']) == ('shpat-fr', '2024-07', '500')
+    assert fr['IMPORT_WORKERS'] == '8'
+    assert ma['PRICE_BACKUP'] == str(tmp_path / 'shop_data' / 'ma' / 'shopify_backup.json')
+    assert ma['CATALOG_SNAPSHOT'] != fr['CATALOG_SNAPSHOT']
+    assert (tmp_path / 'shop_data' / 'fr').is_dir()
+    with pytest.raises(ValueError):
+        shops.env('de')
+
+
+@pytest.mark.parametrize('shop', [
+    {'name': '../ma', 'domain': 'd', 'token': 't'},
+    {'name': 'ma', 'token': 't'},
+    {'name': 'ma', 'domain': 'd'},
+])
+def test_invalid_registry_is_rejected(registry, shop):
+    registry.write_text(json.dumps({'shops': [shop]}))
+    with pytest.raises(ValueError):
+        shops.load()
+
+
+def test_without_registry_there_are_no_shops(tmp_path, monkeypatch):
+    monkeypatch.setenv('SHOPS_CONFIG', str(tmp_path / 'missing.json'))
+    assert shops.load() == {}
+
+
+def test_job_runs_every_shop_concurrently(client, tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    script = tmp_path / 'shop_job.py'
+    script.write_text(
+        'import os, sys, time\n'
+        f'sys.path.insert(0, {ROOT!r})\n'
+        'from scripts import events\n'
+        'progress = events.Progress(1, "prices")\n'
+        'time.sleep(0.5)\n'
+        'print("[OK]", os.environ["SHOP_DOMAIN"])\n'
+        'open(os.path.join(os.environ["JOB_DIR"], "report.txt"), "w").write(os.environ["SHOP_NAME"])\n'
+        'progress.advance(ok=1)\n'
+        'progress.summary()\n'
+        'sys.exit(1 if os.environ["SHOP_NAME"] == "fr" else 0)\n'
+    )
+    captured = {}
+
+    def fake_enqueue(cmd, profile=False, shops=None):
+        captured['shops'] = shops
+        return jobqueue.enqueue([sys.executable, str(script)], shops=shops)
+
+    monkeypatch.setattr(routes_mod, 'enqueue', fake_enqueue)
+
+    started = time.monotonic()
+    body = client.get('/stream/ensemble?shop=ma&shop=fr').get_data(as_text=True)
+    elapsed = time.monotonic() - started
+
+    assert captured['shops'] == ['ma', 'fr']
+    assert elapsed < 0.95  # two 0.5s runs side by side
+    assert 'data: [ma] [OK] azor-ma.myshopify.com\n\n' in body
+    assert 'data: [fr] [OK] azor-fr.myshopify.com\n\n' in body
+    summaries = [
+        json.loads(m.split('\n')[1][len('data: '):])
+        for m in body.split('\n\n') if m.startswith('event: summary')
+    ]
+    assert sorted(s['shop'] for s in summaries) == ['fr', 'ma']
+    assert all('rate' not in s for s in summaries)
+
+    job_id = next(iter(os.listdir(tmp_path / 'jobs')))
+    record = jobqueue.load_job(job_id)
+    assert record['status'] == 'failed' and record['returncode'] == 1
+    assert record['shop_results']['ma']['returncode'] == 0
+    assert record['shop_results']['ma']['summary']['ok'] == 1
+    assert record['artifacts'] == ['fr/report.txt', 'ma/report.txt']
+    assert client.get(f'/jobs/{job_id}/ma/report.txt').get_data(as_text=True) == 'ma'
+    assert client.get(f'/jobs/{job_id}/ma/../job.json').status_code == 404
+
+
+def test_unknown_shop_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(routes_mod, 'enqueue', lambda cmd, profile=False, shops=None: pytest.fail('enqueued'))
+    assert client.get('/stream/ensemble?shop=ma,de').status_code == 400
+
+
+def test_job_pages_offer_the_registered_shops(client):
+    page = client.get('/ensemble').get_data(as_text=True)
+    assert 'value="ma"' in page and 'value="fr"' in page
@@ -28,8 +28,9 @@ def login(client):
 def setup_patches(monkeypatch):
     captured = {}
 
-    def fake_enqueue(cmd):
+    def fake_enqueue(cmd, profile=False, shops=None):
         captured['cmd'] = cmd
+        captured['profile'] = profile
         return 'job'
 
     def fake_stream(job_id):
@@ -81,3 +82,12 @@ def test_stream_ensemble_uses_sys_executable(client, monkeypatch):
     resp = client.get('/stream/ensemble')
     assert resp.status_code == 200
     assert captured['cmd'] == [sys.executable, routes_mod.SCRIPTS['ensemble']]
+
+
+def test_stream_passes_profile_flag(client, monkeypatch):
+    captured = setup_patches(monkeypatch)
+    login(client)
+    client.get('/stream/ensemble?profile=1')
+    assert captured['profile'] is True
+    client.get('/stream/ensemble')
+    assert captured['profile'] is False
@@ -0,0 +1,93 @@
+import json
+import os
+import sys
+
+import pytest
+
+from scripts import surcharges
+from webapp import create_app
+from webapp import jobqueue
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TABLE = {'bracelets': {'Forsat S': 0.0, 'Forsat M': 150.0}, 'colliers': {'Forsat S': 0.0, 'Forsat M': 390.0}}
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    path = tmp_path / 'variant_prices.json'
+    path.write_text(json.dumps(TABLE))
+    monkeypatch.setenv('SURCHARGE_CONFIG', str(path))
+    return path
+
+
+@pytest.fixture
+def client(config, tmp_path, monkeypatch):
+    monkeypatch.setenv('JOB_DATA_DIR', str(tmp_path / 'jobs'))
+    os.environ['SECRET_KEY'] = 'test-key'
+    os.environ['ADMIN_USERNAME'] = 'admin'
+    os.environ['ADMIN_PASSWORD'] = 'password'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'password'})
+    return client
+
+
+def test_reads_are_cached_until_the_file_changes(config):
+    store = surcharges.SurchargeStore(str(config))
+    version, table = store.current()
+    assert (version, table) == (0, TABLE)
+    assert store.current()[1] is table
+
+    assert store.save(dict(TABLE, colliers={'Forsat S': 0.0})) == 1
+    assert store.save(TABLE) == 2
+    assert surcharges.SurchargeStore(str(config)).current() == (2, TABLE)
+
+    # Edited by hand: the next version, without a write.
+    config.write_text(json.dumps({'bracelets': {}, 'colliers': {}}, indent=4))
+    assert store.current() == (3, {'bracelets': {}, 'colliers': {}})
+    assert store.save(TABLE) == 4
+
+
+def test_failed_save_leaves_the_table_intact(config, monkeypatch):
+    store = surcharges.SurchargeStore(str(config))
+    monkeypatch.setattr(surcharges.json, 'dump', lambda *a, **k: (_ for _ in ()).throw(RuntimeError('disk full')))
+
+    with pytest.raises(RuntimeError):
+        store.save({'bracelets': {}, 'colliers': {}})
+
+    assert json.loads(config.read_text()) == TABLE
+    assert [p.name for p in config.parent.iterdir()] == ['variant_prices.json']
+
+
+def test_variant_page_saves_a_new_version(client, config):
+    resp = client.post('/variant-updater', data={
+        'bracelets_Forsat_S': '0', 'bracelets_Forsat_M': '175',
+        'colliers_Forsat_S': '0', 'colliers_Forsat_M': '390',
+    })
+
+    assert b'Version 1' in resp.data
+    assert json.loads(config.read_text())['bracelets']['Forsat M'] == 175.0
+    assert surcharges.load() == (1, json.loads(config.read_text()))
+
+
+def test_jobs_run_against_the_version_pinned_at_start(client, config, tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    surcharges.store().save(TABLE)
+    script = tmp_path / 'update_ensemble_prices.py'
+    script.write_text(
+        'import sys\n'
+        f'sys.path.insert(0, {ROOT!r})\n'
+        'from scripts import surcharges\n'
+        'version, table = surcharges.load()\n'
+        'print(version, table["bracelets"]["Forsat M"])\n'
+    )
+    job_id = jobqueue.enqueue([sys.executable, str(script)])
+    assert list(jobqueue.stream(job_id)) == ['1 150.0']
+    surcharges.store().save(dict(TABLE, bracelets={'Forsat M': 1.0}))
+
+    record = jobqueue.load_job(job_id)
+    assert record['surcharge_version'] == 1
+    with open(os.path.join(jobqueue.job_dir(job_id), 'surcharges.json')) as f:
+        assert json.load(f) == TABLE
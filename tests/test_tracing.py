@@ -0,0 +1,118 @@
+import os
+
+import pytest
+
+from scripts import fake_shopify, shopify_client, tracing
+from webapp import create_app
+from webapp import jobqueue
+from webapp import variant_index
+from webapp import webhook as webhook_mod
+
+
+class DummyResp:
+    def __init__(self, status_code=200, text='{}'):
+        self.status_code = status_code
+        self.text = text
+
+
+class DummySession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def post(self, url, json=None, timeout=None):
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv('JOB_DATA_DIR', str(tmp_path / 'jobs'))
+    os.environ['SECRET_KEY'] = 'test-key'
+    os.environ['ADMIN_USERNAME'] = 'admin'
+    os.environ['ADMIN_PASSWORD'] = 'password'
+    os.environ['WTF_CSRF_ENABLED'] = 'false'
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'password'})
+    return client
+
+
+def test_span_records_retries_cost_and_products(tmp_path, monkeypatch):
+    trace = tmp_path / 'trace.jsonl'
+    monkeypatch.setenv('TRACE_FILE', str(trace))
+    monkeypatch.setenv('SHOP_DOMAIN', 'example.myshopify.com')
+    monkeypatch.setattr(shopify_client.time, 'sleep', lambda s: None)
+    cost = '{"data": {}, "extensions": {"cost": {"actualQueryCost": 10}}}'
+    session = DummySession([DummyResp(429), DummyResp(200, cost)])
+
+    shopify_client.graphql_post(
+        session,
+        shopify_client.BULK_VARIANTS_MUTATION,
+        {'productId': 'gid://shopify/Product/42', 'variants': []},
+    )
+
+    [span] = tracing.load(str(trace))
+    assert span['op'] == 'mutation productVariantsBulkUpdate'
+    assert span['pids'] == [42]
+    assert span['status'] == 200
+    assert span['retries'] == 1
+    assert span['wait'] == shopify_client.THROTTLE_WAIT
+    assert span['cost'] == 10
+    assert span['t1'] >= span['t0']
+
+
+def test_tracing_is_off_without_a_file(monkeypatch):
+    monkeypatch.delenv('TRACE_FILE', raising=False)
+    monkeypatch.delenv('JOB_DIR', raising=False)
+    with tracing.span('graphql', 'query nodes') as span:
+        assert span is None
+
+
+def test_webhook_calls_are_traced_per_day(tmp_path, monkeypatch):
+    shop = fake_shopify.FakeShop(products=2, variants=2)
+    server = fake_shopify.serve(shop, port=0)
+    try:
+        monkeypatch.setenv('SHOP_DOMAIN', f'http://127.0.0.1:{server.server_port}')
+        monkeypatch.setenv('API_TOKEN', 'trace-token')
+        monkeypatch.setenv('JOB_DATA_DIR', str(tmp_path / 'jobs'))
+        monkeypatch.delenv('VARIANT_INDEX_DB', raising=False)
+        variant_index.reset_index()
+
+        assert webhook_mod._process_deliveries({1: '150.00', 2: '160.00'}) == {}
+    finally:
+        server.shutdown()
+
+    path = os.path.join(jobqueue.job_dir(jobqueue.webhook_trace_id()), tracing.TRACE_NAME)
+    ops = [s['op'] for s in tracing.load(path)]
+    assert ops == ['query nodes', 'mutation productVariantsBulkUpdate']
+
+
+def test_summarize_lays_out_lanes():
+    spans = [
+        {'op': 'query nodes', 'pids': [1], 't0': 10.0, 't1': 11.0, 'cost': 4, 'retries': 0, 'wait': 0, 'thread': 'a'},
+        {'op': 'mutation x', 'pids': [1, 2], 't0': 10.5, 't1': 12.0, 'cost': 20, 'retries': 2, 'wait': 4, 'thread': 'b'},
+    ]
+    view = tracing.summarize(spans)
+    assert view['duration'] == 2.0
+    assert [name for name, _ in view['lanes']] == ['a', 'b']
+    assert view['lanes'][1][1][0]['left'] == 25.0
+    assert view['retries'] == 2
+    assert view['products'][0] == {'id': 1, 'cost': 14.0, 'calls': 2, 'seconds': 1.75}
+    assert tracing.summarize([]) is None
+
+
+def test_timeline_page(client, tmp_path):
+    job = 'webhooks-2024-01-01'
+    path = os.path.join(jobqueue.job_dir(job), tracing.TRACE_NAME)
+    tracer = tracing.Tracer(path)
+    tracer.record({'op': 'mutation productVariantsBulkUpdate', 'api': 'graphql', 'pids': [7],
+                   't0': 1.0, 't1': 1.5, 'status': 200, 'cost': 10, 'retries': 0, 'wait': 0,
+                   'thread': 'webhook_0'})
+
+    resp = client.get(f'/jobs/{job}/timeline')
+    assert resp.status_code == 200
+    assert b'webhook_0' in resp.data
+    assert b'mutation productVariantsBulkUpdate' in resp.data
+
+    assert b'No calls' in client.get('/jobs/webhooks-2024-01-02/timeline').data
+    assert client.get('/jobs/..%2Fsecret/timeline').status_code == 404
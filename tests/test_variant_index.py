@@ -0,0 +1,44 @@
+import json
+
+from webapp.variant_index import VariantIndex
+from webapp import variant_index
+
+
+def test_lru_evicts_least_recently_used():
+    index = VariantIndex(capacity=2)
+    index.put(1, [(11, '1.00', None)])
+    index.put(2, [(21, '2.00', None)])
+    index.get(1)
+    index.put(3, [(31, '3.00', None)])
+    assert index.get(2) is None
+    assert index.get(1) == [(11, '1.00', None)]
+    assert len(index) == 2
+
+
+def test_sqlite_backing_survives_eviction_and_restart(tmp_path):
+    db = str(tmp_path / 'index.sqlite3')
+    index = VariantIndex(capacity=1, db_path=db)
+    index.put(1, [(11, '1.00', '1.00')], updated_at=100.0)
+    index.put(2, [(21, '2.00', None)])
+    assert index.get(1) == [(11, '1.00', '1.00')]
+
+    reopened = VariantIndex(capacity=10, db_path=db)
+    assert reopened.get(2) == [(21, '2.00', None)]
+    assert reopened.put(1, [], updated_at=50.0) is False
+
+
+def test_warm_from_snapshot_keeps_newer_entries(tmp_path, monkeypatch):
+    snapshot = tmp_path / 'catalog.json'
+    snapshot.write_text(json.dumps({'products': [
+        {'id': 1, 'variants': [{'id': 11, 'price': '1.00', 'compare_at_price': None}]},
+        {'id': 2, 'variants': [{'id': 21, 'price': '2.00', 'compare_at_price': None}]},
+    ]}))
+    monkeypatch.setenv('CATALOG_SNAPSHOT', str(snapshot))
+    monkeypatch.delenv('VARIANT_INDEX_DB', raising=False)
+    variant_index.reset_index()
+    variant_index.get_index().put(2, [(21, '9.00', None)])
+
+    assert variant_index.warm_from_snapshot() == 1
+    assert variant_index.get_index().get(1) == [(11, '1.00', None)]
+    assert variant_index.get_index().get(2) == [(21, '9.00', None)]
+    variant_index.reset_index()
@@ -7,6 +7,8 @@ import pytest
 
 from webapp import create_app
 from webapp import webhook as webhook_mod
+from webapp import variant_index
+from webapp import webhook_queue
 
 
 def _sign(body: bytes) -> str:
@@ -15,8 +17,28 @@ def _sign(body: bytes) -> str:
     return base64.b64encode(digest).decode()
 
 
+def _patch_single(monkeypatch, func):
+    """Route batched webhook updates to a per-product ``func(pid, price)``."""
+    def fake_update_products(prices):
+        errors = {}
+        for pid, price in prices.items():
+            try:
+                func(pid, price)
+            except Exception as exc:
+                errors[pid] = str(exc)
+        return errors
+
+    monkeypatch.setattr(webhook_mod, '_update_products', fake_update_products)
+
+
 @pytest.fixture
-def app():
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('WEBHOOK_QUEUE_DB', str(tmp_path / 'webhooks.sqlite3'))
+    monkeypatch.setenv('JOB_DATA_DIR', str(tmp_path / 'jobs'))
+    monkeypatch.setenv('WEBHOOK_WORKERS', '0')
+    monkeypatch.setenv('CATALOG_SNAPSHOT', str(tmp_path / 'missing.json'))
+    monkeypatch.delenv('VARIANT_INDEX_DB', raising=False)
+    variant_index.reset_index()
     os.environ['SECRET_KEY'] = 'test'
     os.environ['WTF_CSRF_ENABLED'] = 'false'
     os.environ['SHOPIFY_WEBHOOK_SECRET'] = 'shhh'
@@ -39,7 +61,7 @@ def test_webhook_triggers_update(monkeypatch, client):
         called['pid'] = pid
         called['price'] = price
 
-    monkeypatch.setattr(webhook_mod, '_update_variant_prices', fake_update)
+    _patch_single(monkeypatch, fake_update)
 
     payload = {
         'namespace': 'custom',
@@ -55,6 +77,8 @@ def test_webhook_triggers_update(monkeypatch, client):
         headers={'Content-Type': 'application/json', 'X-Shopify-Hmac-SHA256': hmac_header},
     )
     assert resp.status_code == 200
+    assert called == {}
+    webhook_queue.drain()
     assert called == {'pid': 42, 'price': '19.99'}
 
 
@@ -65,7 +89,7 @@ def test_metaobject_webhook_triggers_update(monkeypatch, client):
         called['pid'] = pid
         called['price'] = price
 
-    monkeypatch.setattr(webhook_mod, '_update_variant_prices', fake_update)
+    _patch_single(monkeypatch, fake_update)
 
     payload = {
         'data': {
@@ -81,6 +105,7 @@ def test_metaobject_webhook_triggers_update(monkeypatch, client):
         headers={'Content-Type': 'application/json', 'X-Shopify-Hmac-SHA256': hmac_header},
     )
     assert resp.status_code == 200
+    webhook_queue.drain()
     assert called == {'pid': 7, 'price': '29.99'}
 
 
@@ -93,3 +118,273 @@ def test_webhook_invalid_hmac(client):
         headers={'Content-Type': 'application/json', 'X-Shopify-Hmac-SHA256': 'bad'},
     )
     assert resp.status_code == 401
+
+
+def _post_metafield(client, webhook_id, owner_id=42, value='19.99', updated_at=None):
+    payload = {
+        'namespace': 'custom',
+        'key': 'base_price',
+        'owner_id': owner_id,
+        'value': value,
+    }
+    if updated_at:
+        payload['updated_at'] = updated_at
+    body = json.dumps(payload).encode()
+    return client.post(
+        '/webhook/metafield',
+        data=body,
+        headers={
+            'Content-Type': 'application/json',
+            'X-Shopify-Hmac-SHA256': _sign(body),
+            'X-Shopify-Webhook-Id': webhook_id,
+        },
+    )
+
+
+def test_duplicate_delivery_processed_once(monkeypatch, client):
+    calls = []
+    _patch_single(monkeypatch, lambda pid, price: calls.append(pid))
+
+    assert _post_metafield(client, 'abc').status_code == 200
+    assert _post_metafield(client, 'abc').status_code == 200
+    webhook_queue.drain()
+    assert calls == [42]
+    assert webhook_queue.status('abc')['status'] == 'done'
+
+
+def test_failed_delivery_stays_queued(monkeypatch, client):
+    def boom(pid, price):
+        raise RuntimeError('shopify down')
+
+    _patch_single(monkeypatch, boom)
+
+    assert _post_metafield(client, 'retry-me').status_code == 200
+    webhook_queue.drain()
+    row = webhook_queue.status('retry-me')
+    assert row['status'] == 'pending'
+    assert row['attempts'] == 1
+    assert 'shopify down' in row['last_error']
+
+
+def test_burst_coalesced_to_latest_value(monkeypatch, client):
+    calls = []
+    _patch_single(monkeypatch, lambda pid, price: calls.append((pid, price)))
+
+    _post_metafield(client, 'a', value='10', updated_at='2024-05-01T10:00:01+00:00')
+    _post_metafield(client, 'c', value='30', updated_at='2024-05-01T10:00:03+00:00')
+    _post_metafield(client, 'b', value='20', updated_at='2024-05-01T10:00:02+00:00')
+    _post_metafield(client, 'd', owner_id=7, value='5')
+    webhook_queue.drain()
+
+    assert sorted(calls) == [(7, '5'), (42, '30')]
+    assert webhook_queue.status('c')['status'] == 'done'
+    assert webhook_queue.status('a')['status'] == 'coalesced'
+    assert webhook_queue.status('b')['status'] == 'coalesced'
+
+
+def test_out_of_order_delivery_is_skipped(monkeypatch, client):
+    calls = []
+    _patch_single(monkeypatch, lambda pid, price: calls.append(price))
+
+    _post_metafield(client, 'new', value='30', updated_at='2024-05-01T10:00:03+00:00')
+    webhook_queue.drain()
+    _post_metafield(client, 'old', value='10', updated_at='2024-05-01T10:00:01+00:00')
+    webhook_queue.drain()
+
+    assert calls == ['30']
+    assert webhook_queue.status('old')['status'] == 'stale'
+
+
+class FakeGraphQLResp:
+    status_code = 200
+    ok = True
+
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return {'data': self._data}
+
+    def raise_for_status(self):
+        pass
+
+
+def test_update_variant_prices_single_round_trip(monkeypatch, app):
+    sent = []
+    variants = [
+        {'id': 'gid://shopify/ProductVariant/1', 'price': '10.00', 'compareAtPrice': '10.00'},
+        {'id': 'gid://shopify/ProductVariant/2', 'price': '12.00', 'compareAtPrice': None},
+    ]
+
+    def fake_post(session, query, variables=None, domain=None):
+        sent.append(query)
+        if 'productVariantsBulkUpdate' in query:
+            return FakeGraphQLResp({'p0': {'userErrors': []}})
+        return FakeGraphQLResp({'nodes': [
+            {'id': 'gid://shopify/Product/9', 'variants': {'nodes': variants}},
+        ]})
+
+    monkeypatch.setattr(webhook_mod.shopify_client, 'graphql_post', fake_post)
+
+    webhook_mod._update_variant_prices(9, '10')
+    assert len(sent) == 2
+    assert 'productVariantsBulkUpdate' in sent[1]
+
+    # Cached variants already carry the price: nothing is sent.
+    webhook_mod._update_variant_prices(9, '10.00')
+    assert len(sent) == 2
+
+    # A new price costs exactly one request.
+    webhook_mod._update_variant_prices(9, '15')
+    assert len(sent) == 3
+
+
+def _post_product(client, payload, topic):
+    body = json.dumps(payload).encode()
+    return client.post(
+        '/webhook/product',
+        data=body,
+        headers={
+            'Content-Type': 'application/json',
+            'X-Shopify-Hmac-SHA256': _sign(body),
+            'X-Shopify-Topic': topic,
+        },
+    )
+
+
+def test_product_webhook_maintains_index(monkeypatch, client):
+    payload = {
+        'id': 5,
+        'updated_at': '2024-05-01T10:00:00+00:00',
+        'variants': [
+            {'id': 51, 'price': '20.00', 'compare_at_price': '20.00'},
+            {'id': 52, 'price': '25.00', 'compare_at_price': None},
+        ],
+    }
+    assert _post_product(client, payload, 'products/update').status_code == 200
+    index = variant_index.get_index()
+    assert index.get(5) == [(51, '20.00', '20.00'), (52, '25.00', None)]
+
+    sent = []
+
+    def fake_post(session, query, variables=None, domain=None):
+        sent.append(variables)
+        return FakeGraphQLResp({'p0': {'userErrors': []}})
+
+    monkeypatch.setattr(webhook_mod.shopify_client, 'graphql_post', fake_post)
+    webhook_mod._update_variant_prices(5, '20')
+    assert len(sent) == 1
+    assert [v['id'] for v in sent[0]['v0']] == ['gid://shopify/ProductVariant/52']
+
+    older = dict(payload, updated_at='2024-04-01T10:00:00+00:00', variants=[])
+    _post_product(client, older, 'products/update')
+    assert len(index.get(5)) == 2
+
+    assert _post_product(client, {'id': 5}, 'products/delete').status_code == 200
+    assert index.get(5) is None
+
+
+def test_batch_sends_one_aliased_document(monkeypatch, app):
+    sent = []
+    index = variant_index.get_index()
+    for pid in (1, 2, 3):
+        index.put(pid, [(pid * 10, '1.00', '1.00')])
+
+    def fake_post(session, query, variables=None, domain=None):
+        sent.append((query, variables))
+        return FakeGraphQLResp({
+            'p0': {'userErrors': []},
+            'p1': {'userErrors': [{'field': ['variants'], 'message': 'bad'}]},
+        })
+
+    monkeypatch.setattr(webhook_mod.shopify_client, 'graphql_post', fake_post)
+    errors = webhook_mod._update_products({1: '5', 2: '6', 3: '1'})
+
+    assert len(sent) == 1
+    query, variables = sent[0]
+    assert query.count('productVariantsBulkUpdate') == 2
+    assert variables['p0'] == 'gid://shopify/Product/1'
+    assert variables['p1'] == 'gid://shopify/Product/2'
+    assert list(errors) == [2]
+    assert index.get(1) == [(10, '5', '5')]
+    assert index.get(2) is None
+
+
+def test_queue_hands_whole_batch_to_handler(monkeypatch, client):
+    batches = []
+    monkeypatch.setattr(webhook_mod, '_update_products', lambda prices: batches.append(dict(prices)) or {})
+
+    _post_metafield(client, 'x', owner_id=1, value='10')
+    _post_metafield(client, 'y', owner_id=2, value='20')
+    webhook_queue.drain()
+
+    assert batches == [{1: '10', 2: '20'}]
+
+
+def test_recovery_leaves_live_claims_alone(app, monkeypatch):
+    webhook_queue.enqueue('live', 'metafields/update', 1, '10.00')
+    webhook_queue.enqueue('abandoned', 'metafields/update', 2, '20.00')
+    conn = webhook_queue._connect()
+    try:
+        webhook_queue._claim(conn, 1)
+        webhook_queue._claim(conn, 2)
+        with conn:
+            conn.execute("UPDATE deliveries SET claimed_at = ? WHERE webhook_id = 'abandoned'",
+                         (webhook_queue.time.time() - webhook_queue.CLAIM_LEASE - 1,))
+    finally:
+        conn.close()
+    scheduled = []
+    monkeypatch.setattr(webhook_queue, '_schedule', lambda pid, delay: scheduled.append(pid))
+
+    webhook_queue._recover(startup=True)
+
+    assert webhook_queue.status('live')['status'] == 'running'
+    assert webhook_queue.status('abandoned')['status'] == 'pending'
+    assert scheduled == [2]
+
+
+def test_large_batches_use_the_shared_bulk_sender(monkeypatch):
+    monkeypatch.setenv('WEBHOOK_BULK_THRESHOLD', '2')
+    sent = []
+
+    def fake_bulk(session, groups, domain=None):
+        sent.extend(groups)
+        yield 1, groups[0][1], None
+        yield 2, groups[1][1], 'Bulk update errors: [boom]'
+
+    monkeypatch.setattr(webhook_mod.shopify_client, 'send_bulk_updates', fake_bulk)
+    groups = [(1, [{'id': 'v1', 'price': '5'}]), (2, [{'id': 'v2', 'price': '5'}])]
+    assert webhook_mod._send_groups(None, groups) == {2: 'Bulk update errors: [boom]'}
+    assert sent == groups
+
+
+def test_concurrent_claims_never_share_a_product(app):
+    import threading
+
+    for i in range(5):
+        webhook_queue.enqueue(f'd{i}', 'metafields/update', 1, f'{i}.00')
+    barrier = threading.Barrier(2)
+    claimed = [None, None]
+
+    def claim(i):
+        conn = webhook_queue._connect()
+        try:
+            barrier.wait()
+            claimed[i] = [r['webhook_id'] for r in webhook_queue._claim(conn, 1)]
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=claim, args=(i,)) for i in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # One connection gets every delivery; the other sees the running claim.
+    assert sorted(claimed, key=len) == [[], [f'd{i}' for i in range(5)]]
+    webhook_queue.enqueue('late', 'metafields/update', 1, '9.00')
+    conn = webhook_queue._connect()
+    try:
+        assert webhook_queue._claim(conn, 1) == []
+    finally:
+        conn.close()
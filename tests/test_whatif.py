@@ -0,0 +1,114 @@
+import json
+import os
+
+import pytest
+
+from scripts import pricing, preview, synthetic_catalog, whatif
+from webapp import create_app
+
+TABLE = {
+    'bracelets': {'Forsat S': 0.0, 'Forsat M': 150.0},
+    'colliers': {'Forsat S': 0.0, 'Forsat M': 390.0},
+}
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    products = synthetic_catalog.generate(600, per_product=12, ensemble_share=0.5, seed=8)
+    products[0]['variants'][0]['price'] = None
+    snapshot = tmp_path / 'catalog_snapshot.json'
+    snapshot.write_text(json.dumps({'products': products}))
+    table = tmp_path / 'variant_prices.json'
+    table.write_text(json.dumps(TABLE))
+    monkeypatch.setenv('CATALOG_SNAPSHOT', str(snapshot))
+    monkeypatch.setenv('PRICE_BACKUP', str(tmp_path / 'shopify_backup.json'))
+    monkeypatch.setenv('SURCHARGE_CONFIG', str(table))
+    return products
+
+
+@pytest.fixture(params=['python', 'numpy'])
+def engine(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(whatif, 'numpy', None)
+    return request.param
+
+
+def _expected(rows, thresholds):
+    compared = [r for r in rows if r['change'] is not None]
+    return {
+        'variants': len(rows),
+        'changed': sum(1 for r in compared if r['change']),
+        'increased': sum(1 for r in compared if r['change'] > 0),
+        'mean_change': round(sum(r['new'] - r['old'] for r in compared) / len(compared), 2),
+        'thresholds': [
+            {'price': t,
+             'up': sum(1 for r in compared if r['old'] < t <= r['new']),
+             'down': sum(1 for r in compared if r['new'] < t <= r['old'])}
+            for t in thresholds
+        ],
+    }
+
+
+def test_percentage_scenarios_match_the_preview(catalog, engine):
+    result = whatif.sweep([3, 5, -7.5], thresholds=[2000, 3000])
+    assert result['source'] == 'snapshot'
+    assert [s['percent'] for s in result['scenarios']] == [3, 5, -7.5]
+    for scenario in result['scenarios']:
+        rows, _ = preview.diff('percentage', scenario['percent'])
+        got = {k: scenario[k] for k in ('variants', 'changed', 'increased', 'mean_change', 'thresholds')}
+        assert got == _expected(rows, [2000.0, 3000.0])
+        # The snapshot price is the base: the one unpriced variant has no price at all.
+        assert scenario['unpriced'] == 1
+        rounding = scenario['rounding']
+        assert sum(b['count'] for b in rounding['buckets']) == 599
+        assert sum(rounding['endings'].values()) == 599
+        assert abs(rounding['mean']) < 50
+
+
+def test_numpy_tidy_rounding_matches_round_to_tidy():
+    numpy = pytest.importorskip('numpy')
+    prices = [0.5, 1.5, 44.5, 45.0, 45.5, 94.5, 95.0, 95.5, 144.999, 1234.5, 2745.0, 9999.5, 123456.78]
+    expected = [float(pricing.round_to_tidy(p)) for p in prices]
+    assert whatif.tidy_array(numpy.array(prices)).tolist() == expected
+
+
+def test_table_scenarios(catalog, engine):
+    doubled = {cat: {chain: 2 * value for chain, value in chains.items()} for cat, chains in TABLE.items()}
+    result = whatif.sweep(tables=[TABLE, doubled])
+    current, raised = result['scenarios']
+    assert [current['table'], raised['table']] == [0, 1]
+    rows = preview.diff('ensemble')[0] + preview.diff('surcharge')[0]
+    assert current['variants'] == len(rows)
+    assert current['changed'] == sum(1 for r in rows if r['change'])
+    assert 'rounding' not in current
+    assert raised['total_change'] > current['total_change']
+
+    with pytest.raises(ValueError):
+        whatif.sweep(tables=[{'colliers': {'Forsat M': 'lots'}, 'bracelets': {}}])
+    with pytest.raises(ValueError):
+        whatif.sweep()
+
+
+def test_whatif_endpoint(catalog, monkeypatch):
+    monkeypatch.setenv('QUOTE_API_TOKEN', 'pos-token')
+    os.environ['SECRET_KEY'] = 'test-key'
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer pos-token'}
+
+    assert client.post('/api/whatif', json={'percentages': [5]}).status_code == 401
+    body = client.post('/api/whatif', json={'percentages': [3, 5], 'tables': [TABLE]}, headers=headers).get_json()
+    assert [s.get('percent', s.get('table')) for s in body['scenarios']] == [3, 5, 0]
+    assert body['thresholds'] == list(whatif.THRESHOLDS)
+
+    assert client.post('/api/whatif', json={'percentages': ['5']}, headers=headers).status_code == 400
+    assert client.post('/api/whatif', json={'percentages': 5}, headers=headers).status_code == 400
+    for bad in (float('inf'), float('-inf'), float('nan'), 1e308, -100, whatif.MAX_PERCENT + 1):
+        assert client.post('/api/whatif', json={'percentages': [bad]}, headers=headers).status_code == 400
+    huge = {'colliers': {'Forsat M': 1e308}, 'bracelets': {}}
+    assert client.post('/api/whatif', json={'tables': [huge]}, headers=headers).status_code == 400
+    too_many = {'percentages': list(range(whatif.MAX_SCENARIOS + 1))}
+    assert client.post('/api/whatif', json=too_many, headers=headers).status_code == 413
@@ -1,4 +1,4 @@
-from flask import Flask, g, session
+from flask import Flask, g, request, session
 from flask_wtf import CSRFProtect
 from dotenv import load_dotenv
 import os
@@ -55,6 +55,7 @@ TRANSLATIONS = {
     'run_reset': {'en': 'Run Reset', 'fr': 'Exécuter la réinitialisation'},
     'login_error': {'en': 'Invalid credentials', 'fr': 'Identifiants invalides'},
     'surcharges_saved': {'en': 'Surcharges saved.', 'fr': 'Suppléments enregistrés.'},
+    'surcharges_version': {'en': 'Version {version}', 'fr': 'Version {version}'},
     'invalid_value': {
         'en': 'Invalid value for {chain}',
         'fr': 'Valeur invalide pour {chain}'
@@ -87,6 +88,108 @@ TRANSLATIONS = {
         'en': 'Ensemble update completed!',
         'fr': 'Mise à jour des ensembles terminée !'
     },
+    'profile_run': {'en': 'Profile this run', 'fr': 'Profiler cette exécution'},
+    'profile_reports': {'en': 'Profiling reports', 'fr': 'Rapports de profilage'},
+    'timeline_title': {'en': 'Shopify call timeline', 'fr': 'Chronologie des appels Shopify'},
+    'timeline_empty': {'en': 'No calls were recorded for this job.', 'fr': "Aucun appel n'a été enregistré pour cette tâche."},
+    'timeline_truncated': {
+        'en': 'Only the first {count} calls are shown.',
+        'fr': 'Seuls les {count} premiers appels sont affichés.'
+    },
+    'timeline_calls': {'en': 'calls', 'fr': 'appels'},
+    'timeline_concurrency': {'en': 'avg. concurrency', 'fr': 'concurrence moy.'},
+    'timeline_retries': {'en': 'retries', 'fr': 'reprises'},
+    'timeline_errors': {'en': 'errors', 'fr': 'erreurs'},
+    'timeline_cost': {'en': 'cost points', 'fr': 'points de coût'},
+    'timeline_products': {'en': 'Most expensive products', 'fr': 'Produits les plus coûteux'},
+    'timeline_slowest': {'en': 'Slowest calls', 'fr': 'Appels les plus lents'},
+    'timeline_operation': {'en': 'Operation', 'fr': 'Opération'},
+    'plan': {'en': 'Plan', 'fr': 'Planifier'},
+    'preview': {'en': 'Preview', 'fr': 'Aperçu'},
+    'preview_title': {'en': 'Price change preview', 'fr': 'Aperçu des changements de prix'},
+    'preview_intro': {
+        'en': 'Old and new price of every variant a job would update, from the catalog snapshot or the backup.',
+        'fr': "Ancien et nouveau prix de chaque variante qu'une tâche mettrait à jour, d'après l'instantané du catalogue ou la sauvegarde."
+    },
+    'preview_kind_percentage': {'en': 'Percentage', 'fr': 'Pourcentage'},
+    'preview_kind_ensemble': {'en': 'Ensemble', 'fr': 'Ensemble'},
+    'preview_kind_surcharge': {'en': 'Chain surcharges', 'fr': 'Suppléments de chaîne'},
+    'preview_min_change': {'en': 'Min. change %', 'fr': 'Variation min. %'},
+    'preview_changed_only': {'en': 'Changes only', 'fr': 'Changements uniquement'},
+    'preview_search': {'en': 'Product, variant or SKU', 'fr': 'Produit, variante ou SKU'},
+    'preview_show': {'en': 'Show', 'fr': 'Afficher'},
+    'preview_product': {'en': 'Product', 'fr': 'Produit'},
+    'preview_variant': {'en': 'Variant', 'fr': 'Variante'},
+    'preview_old': {'en': 'Current', 'fr': 'Actuel'},
+    'preview_new': {'en': 'New', 'fr': 'Nouveau'},
+    'preview_change': {'en': 'Change', 'fr': 'Écart'},
+    'preview_summary': {
+        'en': '{changed} of {total} variants change; {matched} match the filters (+{increase} / {decrease}).',
+        'fr': '{changed} variantes sur {total} changent ; {matched} correspondent aux filtres (+{increase} / {decrease}).'
+    },
+    'preview_page': {'en': 'Page {page} of {pages}', 'fr': 'Page {page} sur {pages}'},
+    'export_csv': {'en': 'Export CSV', 'fr': 'Exporter en CSV'},
+    'export_parquet': {'en': 'Export Parquet', 'fr': 'Exporter en Parquet'},
+    'export_completed': {'en': 'Export ready.', 'fr': 'Export prêt.'},
+    'import': {'en': 'Import', 'fr': 'Import'},
+    'catalog': {'en': 'Catalog', 'fr': 'Catalogue'},
+    'catalog_title': {'en': 'Catalog search', 'fr': 'Recherche dans le catalogue'},
+    'catalog_intro': {
+        'en': 'Search the catalog snapshot by tag, vendor, collection, option or chain, e.g. tag:bracelet chain:"Gourmette M". Terms must all match; prefix a term with - to exclude it.',
+        'fr': 'Recherchez dans l’instantané du catalogue par tag, fournisseur, collection, option ou chaîne, p. ex. tag:bracelet chain:"Gourmette M". Tous les termes doivent correspondre ; préfixez un terme par - pour l’exclure.',
+    },
+    'catalog_search': {'en': 'Search', 'fr': 'Rechercher'},
+    'catalog_matches': {'en': '{products} products, {variants} variants', 'fr': '{products} produits, {variants} variantes'},
+    'catalog_variants': {'en': 'Variants', 'fr': 'Variantes'},
+    'selection': {'en': 'Only variants matching (optional)', 'fr': 'Seulement les variantes correspondant à (optionnel)'},
+    'import_title': {'en': 'Price import', 'fr': 'Import de prix'},
+    'import_intro': {
+        'en': 'Upload a CSV with a price column and a variant_id or sku column. Rows are checked against the catalog snapshot; unchanged prices are skipped and rejected rows are listed in a report.',
+        'fr': 'Téléversez un CSV avec une colonne price et une colonne variant_id ou sku. Les lignes sont vérifiées avec l’instantané du catalogue ; les prix inchangés sont ignorés et les lignes rejetées sont listées dans un rapport.',
+    },
+    'import_dry_run': {'en': 'Check only (dry run)', 'fr': 'Vérifier seulement (essai)'},
+    'import_run': {'en': 'Import prices', 'fr': 'Importer les prix'},
+    'import_no_file': {'en': 'Choose a CSV file first.', 'fr': 'Choisissez d’abord un fichier CSV.'},
+    'import_completed': {'en': 'Import finished.', 'fr': 'Import terminé.'},
+    'pipeline': {'en': 'Pipeline', 'fr': 'Pipeline'},
+    'pipeline_title': {'en': 'Price pipeline', 'fr': 'Pipeline de prix'},
+    'pipeline_intro': {
+        'en': 'Runs the chosen steps in one job over a fresh catalog snapshot. Every variant is priced once with the result of all steps and only changed variants are sent. Webhooks are paused while it runs.',
+        'fr': 'Exécute les étapes choisies en une seule tâche sur un instantané récent du catalogue. Chaque variante est calculée une fois avec le résultat de toutes les étapes et seules les variantes modifiées sont envoyées. Les webhooks sont suspendus pendant l’exécution.',
+    },
+    'pipeline_step_percentage': {'en': 'Percentage', 'fr': 'Pourcentage'},
+    'pipeline_step_base_price': {'en': 'Base price from Forsat S', 'fr': 'Prix de base depuis Forsat S'},
+    'pipeline_step_surcharges': {'en': 'Chain surcharges', 'fr': 'Suppléments de chaîne'},
+    'pipeline_step_ensemble': {'en': 'Ensembles', 'fr': 'Ensembles'},
+    'pipeline_run': {'en': 'Run pipeline', 'fr': 'Lancer le pipeline'},
+    'pipeline_completed': {'en': 'Pipeline finished.', 'fr': 'Pipeline terminé.'},
+    'reconcile': {'en': 'Drift', 'fr': 'Écarts'},
+    'reconcile_title': {'en': 'Base price drift', 'fr': 'Écarts avec le prix de base'},
+    'reconcile_intro': {
+        'en': 'Compares every variant with the price its base price and tags give, using one bulk export, and repairs only the variants that drifted with one bulk mutation.',
+        'fr': 'Compare chaque variante au prix donné par son prix de base et ses tags, à partir d’un seul export groupé, et corrige uniquement les variantes en écart en une seule mutation groupée.',
+    },
+    'reconcile_run': {'en': 'Reconcile prices', 'fr': 'Réconcilier les prix'},
+    'reconcile_completed': {'en': 'Reconciliation finished.', 'fr': 'Réconciliation terminée.'},
+    'reconcile_history': {'en': 'Recent runs', 'fr': 'Exécutions récentes'},
+    'reconcile_none': {'en': 'No reconciliation has run yet.', 'fr': 'Aucune réconciliation n’a encore été lancée.'},
+    'reconcile_at': {'en': 'Date', 'fr': 'Date'},
+    'reconcile_variants': {'en': 'Variants', 'fr': 'Variantes'},
+    'reconcile_drift': {'en': 'Drift', 'fr': 'Écarts'},
+    'reconcile_repaired': {'en': 'Repaired', 'fr': 'Corrigées'},
+    'reconcile_failed': {'en': 'Failed', 'fr': 'Échecs'},
+    'reconcile_rule_flat': {'en': 'Flat', 'fr': 'Simple'},
+    'reconcile_rule_chain': {'en': 'Chains', 'fr': 'Chaînes'},
+    'reconcile_rule_ensemble': {'en': 'Ensembles', 'fr': 'Ensembles'},
+    'previous': {'en': 'Previous', 'fr': 'Précédent'},
+    'next': {'en': 'Next', 'fr': 'Suivant'},
+    'planning': {'en': 'Estimating…', 'fr': 'Estimation…'},
+    'job_eta': {'en': 'ETA', 'fr': 'Fin estimée dans'},
+    'job_errors': {'en': 'errors', 'fr': 'erreurs'},
+    'job_per_second': {'en': '/s', 'fr': '/s'},
+    'job_finished_in': {'en': 'Finished in', 'fr': 'Terminé en'},
+    'job_shops': {'en': 'Shops (none: default store)', 'fr': 'Boutiques (aucune : boutique par défaut)'},
+    'job_log_truncated': {'en': 'Earlier lines were dropped', 'fr': 'Les lignes précédentes ont été supprimées'},
     'ensemble': {'en': 'Ensemble', 'fr': 'Ensemble'},
     'ensemble_card_title': {'en': 'Ensemble Products', 'fr': 'Produits Ensemble'},
     'ensemble_card_desc': {
@@ -120,12 +223,25 @@ def create_app():
     from .auth import auth_bp
     from .routes import main_bp
     from .webhook import webhook_bp
+    from .monitoring import monitoring_bp
+    from .api import api_bp
+    from .variant_index import start_warmup
+    from .routes import start_reconcile_schedule
+    from . import assets
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(webhook_bp)
+    app.register_blueprint(monitoring_bp)
+    app.register_blueprint(api_bp)
+    assets.init_app(app)
+    start_warmup()
+    start_reconcile_schedule()
 
     @app.before_request
     def set_language():
+        # Reading the session would add "Vary: Cookie" to cacheable files.
+        if request.endpoint in ('static', 'assets.fingerprinted'):
+            return
         g.lang = session.get('lang', 'en')
 
     @app.context_processor
@@ -0,0 +1,161 @@
+"""JSON API for other systems (POS, quote tool).
+
+``POST /api/ensemble/quote`` prices collier + bracelet combinations with the
+rules of ``update_ensemble_prices.py``::
+
+    {"quotes": [{"base_price": 1000, "collier": "Forsat M", "bracelet": "Forsat S"},
+                [1250, "Chopard S", ""]]}
+
+Each quote is an object or a ``[base_price, collier, bracelet]`` list; an
+empty or missing chain means none.  The answer lists the results in the same
+order along with the surcharge table version they were priced with::
+
+    {"version": 3, "quotes": [{"price": "1390.00", "surcharge": 390.0},
+                              {"error": "unknown collier 'Chopard S'"}]}
+
+``POST /api/whatif`` compares percentage and surcharge table scenarios
+(``scripts/whatif.py``)::
+
+    {"percentages": [3, 5, 7], "tables": [{"colliers": {...}, "bracelets": {...}}],
+     "thresholds": [1000, 2000]}
+
+``GET /api/select?q=tag:bracelet chain:"Gourmette M"`` returns the product
+and variant IDs a catalog query selects (``scripts/search_index.py``).
+
+Callers send ``Authorization: Bearer <QUOTE_API_TOKEN>`` or use a logged-in
+session.
+"""
+
+import hmac
+import math
+import os
+import threading
+
+from flask import Blueprint, jsonify, request, session
+
+from scripts import pricing, search_index, surcharges as surcharge_config, whatif
+from . import csrf
+
+api_bp = Blueprint('api', __name__)
+
+# Quotes accepted per request (QUOTE_MAX_BATCH).
+MAX_QUOTES = 10000
+
+_matrix = (None, None)
+_matrix_lock = threading.Lock()
+
+
+def _authorized():
+    if 'user' in session:
+        return True
+    token = os.getenv('QUOTE_API_TOKEN', '')
+    if not token:
+        return False
+    header = request.headers.get('Authorization', '')
+    return hmac.compare_digest(header, f'Bearer {token}')
+
+
+def surcharge_matrix():
+    """Return ``(version, matrix)`` for the current surcharge table.
+
+    The matrix is rebuilt only when the store hands out a new table.
+    """
+    global _matrix
+    version, table = surcharge_config.store().current()
+    with _matrix_lock:
+        cached_table, cached = _matrix
+        if cached_table is not table:
+            cached = (version, pricing.surcharge_matrix(table))
+            _matrix = (table, cached)
+        return cached
+
+
+def _fields(quote):
+    if isinstance(quote, dict):
+        return quote.get('base_price'), quote.get('collier'), quote.get('bracelet')
+    if isinstance(quote, list) and len(quote) == 3:
+        return tuple(quote)
+    raise ValueError('expected {"base_price", "collier", "bracelet"} or a 3-item list')
+
+
+def quote(matrix, item):
+    """Price one quote; returns the result object."""
+    try:
+        base, collier, bracelet = _fields(item)
+    except ValueError as exc:
+        return {'error': str(exc)}
+    try:
+        if isinstance(base, bool):
+            raise ValueError
+        base = float(base)
+        if not math.isfinite(base) or base < 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        return {'error': 'base_price must be a non-negative number'}
+    collier, bracelet = collier or '', bracelet or ''
+    if not isinstance(collier, str) or not isinstance(bracelet, str):
+        return {'error': 'collier and bracelet must be chain names'}
+    surcharge = matrix.get((collier, bracelet))
+    if surcharge is None:
+        if (collier, '') not in matrix:
+            return {'error': f'unknown collier {collier!r}'}
+        return {'error': f'unknown bracelet {bracelet!r}'}
+    return {'price': pricing.round_to_tidy(base + surcharge), 'surcharge': surcharge}
+
+
+def _max_quotes():
+    try:
+        return int(os.getenv('QUOTE_MAX_BATCH', MAX_QUOTES))
+    except ValueError:
+        return MAX_QUOTES
+
+
+@api_bp.route('/api/ensemble/quote', methods=['POST'])
+@csrf.exempt
+def ensemble_quote():
+    if not _authorized():
+        return jsonify({'error': 'unauthorized'}), 401
+    payload = request.get_json(silent=True)
+    quotes = payload.get('quotes') if isinstance(payload, dict) else None
+    if not isinstance(quotes, list):
+        return jsonify({'error': 'expected {"quotes": [...]}'}), 400
+    if len(quotes) > _max_quotes():
+        return jsonify({'error': f'at most {_max_quotes()} quotes per request'}), 413
+    try:
+        version, matrix = surcharge_matrix()
+    except (OSError, ValueError):
+        return jsonify({'error': 'surcharge table unavailable'}), 503
+    return jsonify({'version': version, 'quotes': [quote(matrix, item) for item in quotes]})
+
+
+@api_bp.route('/api/whatif', methods=['POST'])
+@csrf.exempt
+def whatif_sweep():
+    if not _authorized():
+        return jsonify({'error': 'unauthorized'}), 401
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'expected {"percentages": [...], "tables": [...]}'}), 400
+    percents = payload.get('percentages') or []
+    tables = payload.get('tables') or []
+    thresholds = payload.get('thresholds') or whatif.THRESHOLDS
+    if not all(isinstance(v, list) for v in (percents, tables)) or not isinstance(thresholds, (list, tuple)):
+        return jsonify({'error': 'percentages, tables and thresholds must be lists'}), 400
+    if len(percents) + len(tables) > whatif.MAX_SCENARIOS:
+        return jsonify({'error': f'at most {whatif.MAX_SCENARIOS} scenarios per request'}), 413
+    try:
+        return jsonify(whatif.sweep(percents, tables, thresholds))
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+
+
+@api_bp.route('/api/select')
+def select():
+    if not _authorized():
+        return jsonify({'error': 'unauthorized'}), 401
+    query = request.args.get('q', '')
+    try:
+        products, variants = search_index.select(query)
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    return jsonify({'query': query, 'products': products, 'variants': variants})
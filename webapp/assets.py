@@ -0,0 +1,157 @@
+"""Fingerprinted, precompressed static files for the admin UI.
+
+``build()`` copies every file under ``webapp/static`` to ``ASSETS_DIR``
+(default ``webapp/dist``) as ``name.<hash>.ext``, adds ``.gz`` and, when the
+``brotli`` package is installed, ``.br`` variants of text files, and writes
+``manifest.json`` mapping each file to its fingerprinted name::
+
+    python -m webapp.assets
+
+Templates call ``asset_url('style.css')``.  The fingerprinted URLs are
+served from ``/assets/`` with ``Cache-Control: immutable``, picking the
+smallest encoding the browser accepts.  A changed file gets a new URL, so
+browsers never have to revalidate.  Files missing from the manifest fall
+back to the plain ``/static/`` URL.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+
+from flask import Blueprint, abort, request, send_file, url_for
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+assets_bp = Blueprint('assets', __name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), 'static')
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 12
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map'}
+# Preferred first when the browser accepts several.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_manifest = {}
+
+
+def assets_dir():
+    return os.getenv('ASSETS_DIR') or os.path.join(os.path.dirname(__file__), 'dist')
+
+
+def fingerprint(name, data):
+    """``css/style.css`` -> ``css/style.<hash>.css``."""
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    root, ext = os.path.splitext(name)
+    return f'{root}.{digest}{ext}'
+
+
+def _compressed(data):
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return {suffix: body for suffix, body in variants.items() if len(body) < len(data)}
+
+
+def _write(path, data):
+    """Write through a temporary file so a running server never reads half a file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build(source=STATIC_DIR, target=None):
+    """Fingerprint and compress ``source`` into ``target``; return the manifest.
+
+    Files of earlier builds are kept, so pages rendered before a deploy can
+    still load the assets they reference.
+    """
+    target = target or assets_dir()
+    manifest = {}
+    for root, _, files in os.walk(source):
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, source).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+            hashed = fingerprint(name, data)
+            out = os.path.join(target, hashed)
+            _write(out, data)
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE:
+                for suffix, body in _compressed(data).items():
+                    _write(out + suffix, body)
+            manifest[name] = hashed
+    _write(os.path.join(target, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def load_manifest(target=None, source=STATIC_DIR):
+    """Return the built manifest, or ``None`` when missing or older than ``source``."""
+    path = os.path.join(target or assets_dir(), MANIFEST)
+    try:
+        built = os.path.getmtime(path)
+        for root, _, files in os.walk(source):
+            if any(os.path.getmtime(os.path.join(root, name)) > built for name in files):
+                return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def init_app(app):
+    """Load the manifest, building it first when missing, stale or in debug mode."""
+    global _manifest
+    manifest = None if app.debug else load_manifest()
+    if manifest is None:
+        try:
+            manifest = build()
+        except OSError as exc:
+            app.logger.warning('Could not build static assets: %s', exc)
+            manifest = {}
+    _manifest = manifest
+    app.register_blueprint(assets_bp)
+    app.add_template_global(asset_url)
+
+
+def asset_url(name):
+    hashed = _manifest.get(name)
+    if hashed is None:
+        return url_for('static', filename=name)
+    return url_for('assets.fingerprinted', filename=hashed)
+
+
+@assets_bp.route('/assets/<path:filename>')
+def fingerprinted(filename):
+    if filename.endswith(('.gz', '.br')) or filename == MANIFEST:
+        abort(404)
+    root = os.path.realpath(assets_dir())
+    path = os.path.realpath(os.path.join(root, filename))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if name in request.accept_encodings and os.path.isfile(path + suffix):
+            encoding, path = name, path + suffix
+            break
+    resp = send_file(path, mimetype=mimetype, etag=True, conditional=True, max_age=None)
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+    resp.headers['Vary'] = 'Accept-Encoding'
+    resp.headers['Cache-Control'] = CACHE_CONTROL
+    return resp
+
+
+if __name__ == '__main__':
+    manifest = build()
+    print(f"[OK] {len(manifest)} assets written to {assets_dir()}"
+          + ("" if brotli else " (install brotli for .br files)"))
@@ -1,41 +1,304 @@
+import json
+import os
+import shutil
 import subprocess
+import tempfile
 import threading
 import queue
+import re
+import time
 import uuid
+from contextlib import nullcontext
+
+from scripts import events, metrics, surcharges
+from scripts import shops as shops_mod
 
 _job_queue = queue.Queue()
 _output_queues = {}
 _started = False
 
+PROFILER = os.path.join('scripts', 'profiling.py')
+JOB_FILE = 'job.json'
+JOB_ID_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9-]{0,63}$')
+# Jobs priced from the surcharge table; they get a copy pinned when they start.
+SURCHARGE_JOBS = {'update_ensemble_prices', 'update_prices', 'pipeline', 'reconcile_prices'}
+
+JOB_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+QUEUE_DEPTH = metrics.gauge("job_queue_depth", "Jobs waiting to start.")
+JOB_WAIT = metrics.histogram(
+    "job_wait_seconds", "Time jobs spent queued before starting.", ("job",), JOB_BUCKETS
+)
+JOB_RUN = metrics.histogram(
+    "job_run_seconds", "Job run time.", ("job",), JOB_BUCKETS
+)
+JOBS = metrics.counter("jobs_total", "Finished jobs by type and outcome.", ("job", "status"))
+
+
+def job_type(cmd):
+    """Name a job after the script it runs (``update_prices_shopify``)."""
+    for arg in cmd[1:]:
+        if arg.endswith(".py") and arg != PROFILER:
+            return os.path.splitext(os.path.basename(arg))[0]
+    return os.path.basename(cmd[0])
+
+
+def data_dir():
+    return os.getenv('JOB_DATA_DIR', 'job_data')
+
+
+def job_dir(job_id):
+    """Directory holding the record and reports of ``job_id``.
+
+    Raises ``ValueError`` for IDs that are not safe directory names.
+    """
+    job_id = str(job_id)
+    if not JOB_ID_RE.match(job_id):
+        raise ValueError(f"Invalid job id: {job_id!r}")
+    return os.path.join(data_dir(), job_id)
+
+
+def webhook_trace_id(when=None):
+    """Pseudo job ID under which a day's webhook spans are stored."""
+    return time.strftime('webhooks-%Y-%m-%d', time.localtime(when))
+
+
+def _save_job(record):
+    path = job_dir(record['id'])
+    tmp = os.path.join(path, JOB_FILE + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2)
+    os.replace(tmp, os.path.join(path, JOB_FILE))
+
+
+def load_job(job_id):
+    """Return the record of ``job_id`` or ``None``."""
+    try:
+        with open(os.path.join(job_dir(job_id), JOB_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def prune_jobs(max_age=None):
+    """Delete job directories older than ``JOB_RETENTION_DAYS`` (30)."""
+    if max_age is None:
+        try:
+            max_age = float(os.getenv('JOB_RETENTION_DAYS', '30')) * 86400
+        except ValueError:
+            max_age = 30 * 86400
+    root = data_dir()
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _artifacts(path, shops=None):
+    names = [
+        name for name in os.listdir(path)
+        if name != JOB_FILE and not name.endswith('.tmp') and name not in (shops or ())
+    ]
+    for shop in shops or ():
+        shop_path = os.path.join(path, shop)
+        if os.path.isdir(shop_path):
+            names += [f'{shop}/{name}' for name in _artifacts(shop_path)]
+    return sorted(names)
+
+
+def _pin_surcharges(kind, path):
+    """Environment pinning ``kind`` jobs to the current surcharge table."""
+    if kind not in SURCHARGE_JOBS:
+        return {}
+    try:
+        return surcharges.pin(path)
+    except (OSError, ValueError):
+        # The script reports the unreadable table itself.
+        return {}
+
+
+def _run(cmd, env, out_q, shop=None):
+    """Run ``cmd`` and forward its output; return ``(returncode, summary)``.
+
+    With ``shop`` log lines get a ``[shop]`` prefix and events a ``shop``
+    field, so the output of shops running side by side stays apart.
+    """
+    fd, metrics_file = tempfile.mkstemp(prefix="job-metrics-", suffix=".json")
+    os.close(fd)
+    env = dict(env, METRICS_FILE=metrics_file)
+    summary = None
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env)
+    for line in iter(process.stdout.readline, ''):
+        line = line.rstrip()
+        event = events.parse(line)
+        if event and event['type'] == 'summary':
+            summary = {k: v for k, v in event.items() if k != 'type'}
+        if shop is not None:
+            if event:
+                line = events.PREFIX + json.dumps(dict(event, shop=shop))
+            else:
+                line = f'[{shop}] {line}'
+        out_q.put(line)
+    process.wait()
+    metrics.load_file(metrics_file)
+    os.unlink(metrics_file)
+    return process.returncode, summary
+
+
+def _run_shops(cmd, env, out_q, path, shops):
+    """Run ``cmd`` once per shop, all at the same time.
+
+    Each shop gets its own process, environment (``scripts.shops.env``) and
+    ``JOB_DIR`` subdirectory.  Returns ``{shop: (returncode, summary)}``.
+    """
+    results = {}
+
+    def run(shop):
+        shop_path = os.path.join(path, shop)
+        os.makedirs(shop_path, exist_ok=True)
+        try:
+            shop_env = dict(env, JOB_DIR=shop_path, **shops_mod.env(shop))
+        except (OSError, ValueError) as exc:
+            out_q.put(f'[{shop}] [ERROR] {exc}')
+            results[shop] = (1, None)
+            return
+        results[shop] = _run(cmd, shop_env, out_q, shop)
+
+    threads = [threading.Thread(target=run, args=(shop,), daemon=True) for shop in shops]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def _execute(job_id, record):
+    kind = record['job']
+    path = job_dir(job_id)
+    started = time.time()
+    JOB_WAIT.observe(started - record['queued_at'], job=kind)
+    pinned = _pin_surcharges(kind, path)
+    if pinned:
+        record['surcharge_version'] = int(pinned['SURCHARGE_VERSION'])
+    record.update(status='running', started_at=started)
+    _save_job(record)
+
+    cmd = record['cmd']
+    shops = record.get('shops')
+    if record['profile']:
+        # Shop runs leave their reports in their own JOB_DIR.
+        out = [] if shops else ['--out', path]
+        cmd = [cmd[0], PROFILER] + out + cmd[1:]
+    out_q = _output_queues[job_id]
+    env = dict(os.environ, JOB_ID=job_id, JOB_DIR=path, JOB_EVENTS='1')
+    env.update(pinned)
+    if shops:
+        results = _run_shops(cmd, env, out_q, path, shops)
+        record['shop_results'] = {
+            shop: {'returncode': code, 'summary': summary}
+            for shop, (code, summary) in results.items()
+        }
+        returncode = next((code for code, _ in results.values() if code), 0)
+    else:
+        returncode, summary = _run(cmd, env, out_q)
+        if summary is not None:
+            record['summary'] = summary
+
+    finished = time.time()
+    JOB_RUN.observe(finished - started, job=kind)
+    JOBS.inc(job=kind, status="ok" if returncode == 0 else "failed")
+    record.update(
+        status='done' if returncode == 0 else 'failed',
+        returncode=returncode,
+        finished_at=finished,
+        artifacts=_artifacts(path, shops),
+    )
+    _save_job(record)
+
 
 def _worker():
     while True:
-        job_id, cmd = _job_queue.get()
+        job_id, record = _job_queue.get()
+        QUEUE_DEPTH.set(_job_queue.qsize())
         out_q = _output_queues[job_id]
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-        for line in iter(process.stdout.readline, ''):
-            out_q.put(line.rstrip())
-        process.wait()
-        out_q.put(None)
-        _job_queue.task_done()
+        try:
+            _execute(job_id, record)
+        except Exception as exc:
+            # Keep the only worker alive; the job fails instead.
+            out_q.put(f'[ERROR] Job failed: {exc}')
+            JOBS.inc(job=record['job'], status="failed")
+            record.update(status='failed', error=str(exc), finished_at=time.time())
+            try:
+                _save_job(record)
+            except Exception as save_exc:
+                print(f"Job {job_id}: could not save record: {save_exc}")
+        finally:
+            out_q.put(None)
+            _job_queue.task_done()
 
 
 def start_worker():
     global _started
     if not _started:
+        prune_jobs()
         t = threading.Thread(target=_worker, daemon=True)
         t.start()
         _started = True
 
 
-def enqueue(cmd):
+def enqueue(cmd, profile=False, shops=None):
+    """Queue ``cmd``; with ``profile`` it runs under ``scripts/profiling.py``.
+
+    ``shops`` names registered shops (``scripts.shops``) to run it against
+    concurrently; by default it runs once against the configured store.
+    """
     start_worker()
     job_id = str(uuid.uuid4())
+    os.makedirs(job_dir(job_id), exist_ok=True)
+    record = {
+        'id': job_id,
+        'job': job_type(cmd),
+        'cmd': list(cmd),
+        'profile': bool(profile),
+        'shops': list(shops or []),
+        'status': 'queued',
+        'queued_at': time.time(),
+        'artifacts': [],
+    }
+    _save_job(record)
     _output_queues[job_id] = queue.Queue()
-    _job_queue.put((job_id, cmd))
+    _job_queue.put((job_id, record))
+    QUEUE_DEPTH.set(_job_queue.qsize())
     return job_id
 
 
+def schedule(cmd, interval, shops=None, guard=None):
+    """Queue ``cmd`` every ``interval`` seconds from a background thread.
+
+    Nobody watches scheduled jobs, so the thread reads their output itself;
+    the next run is only queued once the previous one has finished.
+    ``guard``, when given, returns a context manager held around each run;
+    it yields ``False`` to skip the run.
+    """
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                with guard() if guard else nullcontext(True) as go:
+                    if go:
+                        for _ in stream(enqueue(cmd, shops=shops)):
+                            pass
+            except Exception as exc:
+                print(f"Scheduled job {job_type(cmd)} error: {exc}")
+
+    t = threading.Thread(target=loop, daemon=True)
+    t.start()
+    return t
+
+
 def stream(job_id):
     q = _output_queues.get(job_id)
     if q is None:
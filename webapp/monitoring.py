@@ -0,0 +1,22 @@
+import hmac
+import os
+from flask import Blueprint, Response, request
+from scripts import metrics
+
+monitoring_bp = Blueprint("monitoring", __name__)
+
+
+def _authorized() -> bool:
+    token = os.getenv("METRICS_TOKEN", "")
+    if not token:
+        return True
+    header = request.headers.get("Authorization", "")
+    return hmac.compare_digest(header, f"Bearer {token}")
+
+
+@monitoring_bp.route("/metrics")
+def metrics_endpoint():
+    """Serve the metrics registry in the Prometheus text format."""
+    if not _authorized():
+        return "Unauthorized", 401
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
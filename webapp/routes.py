@@ -6,14 +6,21 @@ from flask import (
     redirect,
     url_for,
     Response,
+    jsonify,
     flash,
+    abort,
+    send_from_directory,
 )
 import os
 import json
 import sys
+import time
+import uuid
+from contextlib import contextmanager
 
-from .jobqueue import enqueue, stream
-from . import translate
+from .jobqueue import enqueue, schedule, stream, load_job, job_dir, webhook_trace_id
+from scripts import events, export_prices, pipeline, planner, preview, reconcile_prices, search_index, shops, surcharges as surcharge_config, tracing
+from . import translate, webhook_queue
 
 main_bp = Blueprint('main', __name__)
 
@@ -33,9 +40,26 @@ SCRIPTS = {
 
     'ensemble': os.path.join('scripts', 'update_ensemble_prices.py'),
 
+    'export': os.path.join('scripts', 'export_prices.py'),
+
+    'import': os.path.join('scripts', 'import_prices.py'),
+
+    'pipeline': os.path.join('scripts', 'pipeline.py'),
+
+    'reconcile': os.path.join('scripts', 'reconcile_prices.py'),
+
 }
 
 
+TIMELINE_SPANS = 5000
+# Uploaded import files live in a job-like directory so old ones are pruned.
+UPLOAD_PREFIX = 'upload-'
+UPLOAD_FILE = 'prices.csv'
+PLANNED_JOBS = ('percentage', 'reset', 'ensemble')
+RECONCILE_RUNS = 50
+_reconcile_scheduled = False
+
+
 def login_required(view):
     from functools import wraps
     @wraps(view)
@@ -69,9 +93,8 @@ def ensemble_pricing():
 @main_bp.route('/variant-updater', methods=['GET', 'POST'])
 @login_required
 def variant_updater():
-    file_path = os.path.join('tempo solution', 'variant_prices.json')
-    with open(file_path, encoding='utf-8') as f:
-        surcharges = json.load(f)
+    store = surcharge_config.store()
+    version, surcharges = store.current()
 
     if request.method == 'POST':
         updated = {cat: {} for cat in surcharges}
@@ -83,25 +106,348 @@ def variant_updater():
                     updated[cat][chain] = float(val)
                 except ValueError:
                     flash(translate('invalid_value', chain=chain), 'error')
-                    return render_template('variant.html', surcharges=surcharges)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(updated, f, indent=2)
+                    return render_template('variant.html', surcharges=surcharges, version=version)
+        version = store.save(updated)
         surcharges = updated
         flash(translate('surcharges_saved'), 'success')
 
-    return render_template('variant.html', surcharges=surcharges)
+    return render_template('variant.html', surcharges=surcharges, version=version)
+
+
+@main_bp.app_template_global()
+def registered_shops():
+    """Shop names for the job pages' shop picker; empty without a registry."""
+    try:
+        return shops.names()
+    except (OSError, ValueError):
+        return []
+
+
+def _job_shops():
+    """Shops picked with ``?shop=ma&shop=fr`` (or ``?shop=ma,fr``).
+
+    Aborts with 400 for shops missing from the registry.
+    """
+    names = [
+        name.strip()
+        for value in request.args.getlist('shop')
+        for name in value.split(',') if name.strip()
+    ]
+    if not names:
+        return []
+    try:
+        registered = shops.load()
+    except (OSError, ValueError) as exc:
+        abort(400, str(exc))
+    unknown = [name for name in names if name not in registered]
+    if unknown:
+        abort(400, f"Unknown shop: {', '.join(unknown)}")
+    return list(dict.fromkeys(names))
 
 
 def stream_job(cmd):
-    job_id = enqueue(cmd)
+    """Run ``cmd`` and stream its output; ``?profile=1`` profiles the run.
+
+    Log lines are sent as plain ``data:`` messages.  Events printed by
+    ``scripts.events`` become named SSE events (``progress``, ``phase``,
+    ``ok``, ``error``, ``summary``) carrying JSON, with ``rate`` and ``eta``
+    added to ``progress``.  When the job leaves reports behind, their
+    download URLs are sent as an ``artifacts`` event just before ``--done--``.
+
+    ``?shop=`` runs the job against registered shops side by side; their
+    events carry a ``shop`` field and their log lines a ``[shop]`` prefix.
+    """
+    profile = request.args.get('profile') == '1'
+    job_id = enqueue(cmd, profile=profile, shops=_job_shops())
 
     def generator():
+        meters = {}
         for line in stream(job_id):
-            yield f"data: {line}\n\n"
+            event = events.parse(line)
+            if event is None:
+                yield f"data: {line}\n\n"
+                continue
+            meter = meters.setdefault(event.get('shop'), events.Meter())
+            event = meter.annotate(event)
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        record = load_job(job_id) or {}
+        if record.get('artifacts'):
+            links = [
+                {'name': name, 'url': f'/jobs/{job_id}/{name}'}
+                for name in record['artifacts']
+            ]
+            if tracing.TRACE_NAME in record['artifacts']:
+                links.append({'name': 'timeline', 'url': f'/jobs/{job_id}/timeline'})
+            yield f"event: artifacts\ndata: {json.dumps(links)}\n\n"
         yield "data: --done--\n\n"
 
     return generator()
 
+
+@main_bp.route('/jobs/<job_id>/timeline')
+@login_required
+def job_timeline(job_id):
+    """Waterfall of the Shopify calls recorded for a job."""
+    try:
+        path = os.path.join(job_dir(job_id), tracing.TRACE_NAME)
+    except ValueError:
+        abort(404)
+    spans = tracing.load(path, limit=TIMELINE_SPANS)
+    return render_template(
+        'timeline.html',
+        job_id=job_id,
+        record=load_job(job_id),
+        timeline=tracing.summarize(spans),
+        truncated=len(spans) >= TIMELINE_SPANS,
+    )
+
+
+@main_bp.route('/webhooks/timeline')
+@login_required
+def webhook_timeline():
+    return redirect(url_for('main.job_timeline', job_id=webhook_trace_id()))
+
+
+@main_bp.route('/jobs/<job_id>/<path:name>')
+@login_required
+def job_artifact(job_id, name):
+    record = load_job(job_id)
+    if not record or name not in record.get('artifacts', []):
+        abort(404)
+    return send_from_directory(os.path.abspath(job_dir(job_id)), name, as_attachment=True)
+
+@main_bp.route('/plan/<kind>')
+@login_required
+def plan_job(kind):
+    """Dry-run estimate of a job: counts, cost points and wall time."""
+    if kind not in PLANNED_JOBS:
+        abort(404)
+    try:
+        plan = planner.plan(kind)
+    except Exception as exc:
+        return jsonify({'error': str(exc)}), 502
+    return jsonify({'plan': plan, 'lines': planner.format_plan(plan)})
+
+
+@main_bp.route('/preview')
+@login_required
+def preview_page():
+    return render_template('preview.html', kinds=preview.KINDS, sort_keys=preview.SORT_KEYS)
+
+
+@main_bp.route('/catalog')
+@login_required
+def catalog_page():
+    return render_template('catalog.html')
+
+
+@main_bp.route('/catalog/search')
+@login_required
+def catalog_search():
+    """Match counts and the first products of a catalog query (search box)."""
+    try:
+        limit = int(request.args.get('limit', search_index.RESULTS))
+        return jsonify(search_index.get_index().search(request.args.get('q', ''), limit))
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+
+
+def _float_arg(name):
+    value = request.args.get(name, '').strip()
+    return float(value) if value else None
+
+
+@main_bp.route('/preview/<kind>')
+@login_required
+def preview_prices(kind):
+    """Old and new price of every variant a job would touch, one page at a time."""
+    if kind not in preview.KINDS:
+        abort(404)
+    try:
+        rows, info = preview.diff(kind, _float_arg('percent'))
+        result = preview.query(
+            rows,
+            sort=request.args.get('sort', 'change_pct'),
+            descending=request.args.get('order', 'desc') != 'asc',
+            min_change=_float_arg('min_change'),
+            changed_only=request.args.get('changed') == '1',
+            search=request.args.get('q', '').strip() or None,
+            page=request.args.get('page', 1),
+            per_page=request.args.get('per_page', preview.PER_PAGE),
+        )
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    result.update(info)
+    return jsonify(result)
+
+
+def _export_args():
+    """``(plan, percent)`` from the query string; raises ``ValueError``."""
+    plan = request.args.get('plan') or None
+    if plan is not None and plan not in preview.KINDS:
+        raise ValueError(f'Unknown plan: {plan}')
+    return plan, _float_arg('percent')
+
+
+@main_bp.route('/export/prices.csv')
+@login_required
+def export_csv():
+    """Stream current, base and planned prices of every variant as CSV."""
+    try:
+        plan, percent = _export_args()
+        products = export_prices.load_products()
+        planned = export_prices.planned_prices(plan, percent)
+    except ValueError as exc:
+        return str(exc), 400
+    body = export_prices.iter_csv(export_prices.rows(products, planned))
+    return Response(body, mimetype='text/csv', headers={
+        'Content-Disposition': 'attachment; filename=prices.csv',
+    })
+
+
+@main_bp.route('/stream/export')
+@login_required
+def stream_export():
+    """Run the export as a job; the file is offered as an artifact.
+
+    ``format`` defaults to CSV; Parquet needs the optional ``pyarrow``.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export_prices.FORMATS:
+        return 'Unknown format', 400
+    try:
+        plan, percent = _export_args()
+    except ValueError as exc:
+        return str(exc), 400
+    cmd = [sys.executable, SCRIPTS['export'], '--format', fmt]
+    if plan:
+        cmd += ['--plan', plan]
+    if percent is not None:
+        cmd += ['--percent', str(percent)]
+    return Response(stream_job(cmd), mimetype='text/event-stream')
+
+
+@main_bp.route('/import')
+@login_required
+def import_page():
+    return render_template('import.html')
+
+
+@main_bp.route('/import/upload', methods=['POST'])
+@login_required
+def import_upload():
+    """Store an uploaded price CSV; ``/stream/import`` then runs the import."""
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error': translate('import_no_file')}), 400
+    upload_id = uuid.uuid4().hex
+    path = job_dir(UPLOAD_PREFIX + upload_id)
+    os.makedirs(path, exist_ok=True)
+    upload.save(os.path.join(path, UPLOAD_FILE))
+    return jsonify({'upload': upload_id})
+
+
+@main_bp.route('/stream/import')
+@login_required
+def stream_import():
+    upload_id = request.args.get('upload', '')
+    try:
+        path = os.path.join(job_dir(UPLOAD_PREFIX + upload_id), UPLOAD_FILE)
+    except ValueError:
+        abort(404)
+    if not upload_id or not os.path.isfile(path):
+        abort(404)
+    cmd = [sys.executable, SCRIPTS['import'], path]
+    if request.args.get('dry_run') == '1':
+        cmd.append('--dry-run')
+    return Response(stream_job(cmd), mimetype='text/event-stream')
+
+
+@main_bp.route('/pipeline')
+@login_required
+def pipeline_page():
+    return render_template('pipeline.html', steps=pipeline.STEPS)
+
+
+@main_bp.route('/stream/pipeline')
+@login_required
+def stream_pipeline():
+    steps = request.args.getlist('step')
+    try:
+        pipeline.order(steps)
+    except ValueError as exc:
+        return str(exc), 400
+    if not steps:
+        return 'Pick at least one step', 400
+    percent = request.args.get('percent', '').strip()
+    if 'percentage' in steps and not percent:
+        return 'Missing percent', 400
+    cmd = [sys.executable, SCRIPTS['pipeline'], '--steps', ','.join(steps)]
+    if 'percentage' in steps:
+        cmd += ['--percent', percent]
+    if request.args.get('dry_run') == '1':
+        cmd.append('--dry-run')
+    return Response(stream_job(cmd), mimetype='text/event-stream')
+
+
+def start_reconcile_schedule():
+    """Run the reconciliation every ``RECONCILE_INTERVAL_MINUTES`` (0 = never).
+
+    ``RECONCILE_SHOPS`` (comma-separated) runs it against registered shops.
+    Every app process starts the schedule, so each run first takes the
+    ``reconcile`` lease in the webhook queue database; a run is skipped
+    while another process holds it or a price job pauses the webhooks.
+    """
+    global _reconcile_scheduled
+    try:
+        minutes = float(os.getenv('RECONCILE_INTERVAL_MINUTES', '0'))
+    except ValueError:
+        minutes = 0
+    if _reconcile_scheduled or minutes <= 0:
+        return
+    names = [s.strip() for s in os.getenv('RECONCILE_SHOPS', '').split(',') if s.strip()]
+    interval = minutes * 60
+
+    @contextmanager
+    def guard():
+        if webhook_queue.paused_until() is not None:
+            print('[reconcile] Scheduled run skipped: a price job is running')
+            yield False
+            return
+        with webhook_queue.leased('reconcile', interval) as held:
+            yield held
+
+    schedule([sys.executable, SCRIPTS['reconcile']], interval, shops=names or None, guard=guard)
+    _reconcile_scheduled = True
+
+
+@main_bp.route('/reconcile')
+@login_required
+def reconcile_page():
+    shop = request.args.get('shop', '').strip()
+    path = None
+    if shop:
+        if shop not in shops.names():
+            abort(404)
+        path = shops.env(shop)['RECONCILE_HISTORY']
+    try:
+        runs = reconcile_prices.load_history(path)[-RECONCILE_RUNS:][::-1]
+    except (OSError, ValueError):
+        runs = []
+    for run in runs:
+        run['when'] = time.strftime('%Y-%m-%d %H:%M', time.localtime(run['at']))
+    return render_template('reconcile.html', runs=runs, rules=reconcile_prices.RULES, shop=shop)
+
+
+@main_bp.route('/stream/reconcile')
+@login_required
+def stream_reconcile():
+    cmd = [sys.executable, SCRIPTS['reconcile']]
+    if request.args.get('dry_run') == '1':
+        cmd.append('--dry-run')
+    return Response(stream_job(cmd), mimetype='text/event-stream')
+
+
 @main_bp.route('/stream/percentage')
 @login_required
 def stream_percentage():
@@ -109,6 +455,10 @@ def stream_percentage():
     if not percent:
         return 'Missing percent', 400
     cmd = [sys.executable, SCRIPTS['percentage'], '--percent', percent]
+    select = request.args.get('select', '').strip()
+    if select:
+        # One argument, so a query starting with "-" is not read as an option.
+        cmd.append(f'--select={select}')
     return Response(stream_job(cmd), mimetype='text/event-stream')
 
 @main_bp.route('/stream/variant')
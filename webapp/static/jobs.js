@@ -0,0 +1,190 @@
+// Progress bar and log of a job streamed over SSE (see routes.stream_job).
+//
+// The log keeps at most MAX_LINES lines and only renders the ones in view,
+// so runs printing tens of thousands of lines do not slow the page down.
+
+const LINE_HEIGHT = 18;
+const MAX_LINES = 5000;
+const OVERSCAN = 20;
+
+class JobLog {
+    constructor(el, labels) {
+        this.el = el;
+        this.labels = labels || {};
+        this.el.textContent = '';
+        this.spacer = document.createElement('div');
+        this.view = document.createElement('pre');
+        this.view.className = 'job-log-lines';
+        this.spacer.appendChild(this.view);
+        this.el.appendChild(this.spacer);
+        this.el.addEventListener('scroll', () => this.schedule());
+        this.clear();
+    }
+
+    clear() {
+        this.lines = [];
+        this.dropped = 0;
+        this.follow = true;
+        this.schedule();
+    }
+
+    append(line) {
+        if (!this.pending) {
+            // Follow the tail only if the reader has not scrolled up.
+            const el = this.el;
+            this.follow = el.scrollTop + el.clientHeight >= el.scrollHeight - LINE_HEIGHT;
+        }
+        this.lines.push(line);
+        if (this.lines.length > MAX_LINES) {
+            const extra = this.lines.length - MAX_LINES;
+            this.lines.splice(0, extra);
+            this.dropped += extra;
+        }
+        this.schedule();
+    }
+
+    schedule() {
+        if (!this.pending) {
+            this.pending = true;
+            requestAnimationFrame(() => this.render());
+        }
+    }
+
+    render() {
+        this.pending = false;
+        const rows = this.dropped ? [`${this.labels.truncated} (${this.dropped})`].concat(this.lines) : this.lines;
+        this.spacer.style.height = `${rows.length * LINE_HEIGHT}px`;
+        if (this.follow) {
+            this.el.scrollTop = this.el.scrollHeight;
+        }
+        const first = Math.max(0, Math.floor(this.el.scrollTop / LINE_HEIGHT) - OVERSCAN);
+        const last = Math.min(rows.length, Math.ceil((this.el.scrollTop + this.el.clientHeight) / LINE_HEIGHT) + OVERSCAN);
+        this.view.style.top = `${first * LINE_HEIGHT}px`;
+        this.view.textContent = rows.slice(first, last).join('\n');
+    }
+}
+
+function formatSeconds(seconds) {
+    seconds = Math.round(seconds);
+    const m = Math.floor(seconds / 60);
+    const s = String(seconds % 60).padStart(2, '0');
+    return m >= 60 ? `${Math.floor(m / 60)}:${String(m % 60).padStart(2, '0')}:${s}` : `${m}:${s}`;
+}
+
+class JobView {
+    // ``root`` holds the markup of the job_progress.html partial.  Jobs run
+    // against several shops get one progress block per shop.
+    constructor(root) {
+        this.root = root;
+        this.labels = root.dataset;
+        this.progress = root.querySelector('.job-progress');
+        this.main = this.target(this.progress);
+        this.shopList = root.querySelector('.job-shops');
+        this.artifacts = root.querySelector('.job-artifacts');
+        this.log = new JobLog(root.querySelector('.job-log'), this.labels);
+    }
+
+    target(el, shop) {
+        return {
+            progress: el,
+            bar: el.querySelector('.progress-bar'),
+            phase: el.querySelector('.job-phase'),
+            stats: el.querySelector('.job-stats'),
+            prefix: shop ? `${shop} · ` : '',
+            errors: 0,
+        };
+    }
+
+    targetOf(event) {
+        if (!event.shop) return this.main;
+        if (!this.shops[event.shop]) {
+            const el = this.progress.cloneNode(true);
+            el.classList.remove('mt-3');
+            el.classList.add('mt-2');
+            this.shopList.appendChild(el);
+            this.shops[event.shop] = this.target(el, event.shop);
+            this.setPhase(this.shops[event.shop], '');
+        }
+        return this.shops[event.shop];
+    }
+
+    // URL of a job stream with the shops ticked in the shop picker.
+    url(base) {
+        const params = new URLSearchParams();
+        this.root.querySelectorAll('.job-shop-picker input:checked').forEach(input => params.append('shop', input.value));
+        const query = params.toString();
+        return query ? `${base}${base.includes('?') ? '&' : '?'}${query}` : base;
+    }
+
+    reset() {
+        this.log.clear();
+        this.main.errors = 0;
+        this.shops = {};
+        if (this.shopList) this.shopList.textContent = '';
+        this.progress.classList.add('d-none');
+        this.artifacts.classList.add('d-none');
+        this.main.phase.textContent = '';
+        this.main.stats.textContent = '';
+    }
+
+    setPhase(target, text) {
+        target.phase.textContent = `${target.prefix}${text}`;
+    }
+
+    showProgress(event, target = this.targetOf(event)) {
+        target.progress.classList.remove('d-none');
+        const known = event.total !== null && event.total !== undefined;
+        const percent = known && event.total > 0 ? Math.min(100, 100 * event.done / event.total) : 100;
+        target.bar.style.width = `${percent}%`;
+        target.bar.classList.toggle('progress-bar-striped', !known);
+        target.bar.classList.toggle('progress-bar-animated', !known);
+        const parts = [known ? `${event.done} / ${event.total}` : `${event.done}`];
+        if (event.rate) parts.push(`${event.rate}${this.labels.perSecond}`);
+        if (event.eta !== null && event.eta !== undefined) parts.push(`${this.labels.eta} ${formatSeconds(event.eta)}`);
+        const failed = Math.max(event.failed || 0, target.errors);
+        if (failed) parts.push(`${failed} ${this.labels.errors}`);
+        target.stats.textContent = parts.join(' · ');
+    }
+
+    watch(es, onDone) {
+        this.reset();
+        es.addEventListener('phase', e => {
+            const event = JSON.parse(e.data);
+            const target = this.targetOf(event);
+            this.setPhase(target, event.name);
+            this.showProgress({done: 0, total: event.total}, target);
+        });
+        es.addEventListener('progress', e => this.showProgress(JSON.parse(e.data)));
+        es.addEventListener('error', e => {
+            // Also fired by EventSource itself when the connection drops.
+            if (e.data) this.targetOf(JSON.parse(e.data)).errors += 1;
+        });
+        es.addEventListener('summary', e => {
+            const event = JSON.parse(e.data);
+            const target = this.targetOf(event);
+            this.showProgress(Object.assign({}, event, {total: event.total ?? event.done, eta: null,
+                rate: event.seconds ? Math.round(10 * event.done / event.seconds) / 10 : null}), target);
+            this.setPhase(target, `${this.labels.finishedIn} ${formatSeconds(event.seconds)}`);
+        });
+        es.addEventListener('artifacts', e => {
+            const links = this.artifacts.querySelector('.job-artifact-links');
+            links.textContent = '';
+            JSON.parse(e.data).forEach(a => {
+                const link = document.createElement('a');
+                link.href = a.url;
+                link.textContent = a.name;
+                link.className = 'me-3';
+                links.appendChild(link);
+            });
+            this.artifacts.classList.remove('d-none');
+        });
+        es.onmessage = e => {
+            if (e.data === '--done--') {
+                es.close();
+                onDone();
+            } else {
+                this.log.append(e.data);
+            }
+        };
+    }
+}
@@ -0,0 +1,212 @@
+"""In-process index from product ID to its variants and their prices.
+
+Webhook handlers consult it instead of asking Shopify for a product's
+variants on every delivery.  Entries are ``(variant_id, price,
+compare_at_price)`` tuples.  The index is bounded with LRU eviction and can
+be backed by SQLite (``VARIANT_INDEX_DB``) so evicted or restarted entries
+are reloaded from disk instead of from Shopify.  It is warmed from the
+catalog snapshot at startup and kept current by ``products/update`` and
+``products/delete`` webhooks and by our own mutations.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from scripts.catalog_snapshot import load_snapshot
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS product_variants (
+    product_id INTEGER PRIMARY KEY,
+    variants   TEXT NOT NULL,
+    updated_at REAL
+);
+"""
+
+
+class VariantIndex:
+    def __init__(self, capacity=20000, db_path=None):
+        self.capacity = capacity
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._updated = {}
+        self._lock = threading.Lock()
+        if db_path:
+            conn = self._connect()
+            try:
+                conn.executescript(SCHEMA)
+            finally:
+                conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _remember(self, product_id, variants):
+        self._entries[product_id] = variants
+        self._entries.move_to_end(product_id)
+        while len(self._entries) > self.capacity:
+            evicted, _ = self._entries.popitem(last=False)
+            self._updated.pop(evicted, None)
+
+    def get(self, product_id):
+        """Return the cached variants of ``product_id`` or ``None``."""
+        product_id = int(product_id)
+        with self._lock:
+            variants = self._entries.get(product_id)
+            if variants is not None:
+                self._entries.move_to_end(product_id)
+                return variants
+        if not self.db_path:
+            return None
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT variants, updated_at FROM product_variants WHERE product_id = ?",
+                (product_id,),
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        variants = [tuple(v) for v in json.loads(row[0])]
+        with self._lock:
+            self._remember(product_id, variants)
+            if row[1] is not None:
+                self._updated[product_id] = row[1]
+        return variants
+
+    def put(self, product_id, variants, updated_at=None):
+        """Store ``variants`` unless a newer update was already recorded.
+
+        Returns ``False`` when ``updated_at`` is older than what the index
+        holds (an out-of-order ``products/update`` delivery).
+        """
+        product_id = int(product_id)
+        variants = [(int(vid), price, compare_at) for vid, price, compare_at in variants]
+        stored = self._stored_updated_at(product_id) if updated_at is not None else None
+        with self._lock:
+            known = self._updated.get(product_id, stored)
+            if updated_at is not None and known is not None and updated_at < known:
+                return False
+            self._remember(product_id, variants)
+            if updated_at is not None:
+                self._updated[product_id] = updated_at
+        self._persist([(product_id, variants, updated_at)])
+        return True
+
+    def _stored_updated_at(self, product_id):
+        if not self.db_path:
+            return None
+        with self._lock:
+            if product_id in self._updated:
+                return None
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT updated_at FROM product_variants WHERE product_id = ?",
+                (product_id,),
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def _persist(self, rows):
+        if not self.db_path:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO product_variants (product_id, variants, updated_at) "
+                    "VALUES (?, ?, ?) ON CONFLICT(product_id) DO UPDATE SET "
+                    "variants = excluded.variants, "
+                    "updated_at = COALESCE(excluded.updated_at, product_variants.updated_at)",
+                    [(pid, json.dumps(variants), ts) for pid, variants, ts in rows],
+                )
+        finally:
+            conn.close()
+
+    def delete(self, product_id):
+        product_id = int(product_id)
+        with self._lock:
+            self._entries.pop(product_id, None)
+            self._updated.pop(product_id, None)
+        if self.db_path:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "DELETE FROM product_variants WHERE product_id = ?", (product_id,)
+                    )
+            finally:
+                conn.close()
+
+    def warm(self, products):
+        """Load snapshot ``products``; returns how many were indexed.
+
+        Products already known (from a webhook, a mutation or the SQLite
+        store) are newer than the snapshot and are left alone.
+        """
+        stored = set()
+        if self.db_path:
+            conn = self._connect()
+            try:
+                stored = {r[0] for r in conn.execute("SELECT product_id FROM product_variants")}
+            finally:
+                conn.close()
+        rows = []
+        with self._lock:
+            for prod in products:
+                pid = int(prod["id"])
+                if pid in self._entries or pid in stored:
+                    continue
+                variants = [
+                    (int(v["id"]), v.get("price"), v.get("compare_at_price"))
+                    for v in prod.get("variants", [])
+                ]
+                self._remember(pid, variants)
+                rows.append((pid, variants, None))
+        self._persist(rows)
+        return len(rows)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            try:
+                capacity = int(os.getenv("VARIANT_INDEX_SIZE", "20000"))
+            except ValueError:
+                capacity = 20000
+            _index = VariantIndex(capacity, os.getenv("VARIANT_INDEX_DB") or None)
+        return _index
+
+
+def reset_index():
+    """Drop the process-wide index (tests, configuration changes)."""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def warm_from_snapshot():
+    products = load_snapshot()
+    if not products:
+        return 0
+    count = get_index().warm(products)
+    print(f"[OK] Variant index warmed with {count} products")
+    return count
+
+
+def start_warmup():
+    threading.Thread(target=warm_from_snapshot, daemon=True).start()
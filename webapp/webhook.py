@@ -2,74 +2,199 @@ import os
 import hmac
 import hashlib
 import base64
-import requests
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
 from flask import Blueprint, request
+from scripts import shopify_client, tracing
 from . import csrf
-
-API_VERSION = os.getenv("API_VERSION", "2024-04")
+from . import jobqueue
+from . import variant_index
+from . import webhook_queue
 
 webhook_bp = Blueprint("webhook", __name__)
 
 
+def sign_webhook(body: bytes, secret: str) -> str:
+    """Return the ``X-Shopify-Hmac-SHA256`` value Shopify sends for ``body``."""
+    digest = hmac.new(secret.encode(), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode()
+
+
 def _verify_webhook(body: bytes, hmac_header: str) -> bool:
     secret = os.getenv("SHOPIFY_WEBHOOK_SECRET", "")
     if not secret or not hmac_header:
         return False
-    digest = hmac.new(secret.encode(), body, hashlib.sha256).digest()
-    computed = base64.b64encode(digest).decode()
-    return hmac.compare_digest(computed, hmac_header)
-
+    return hmac.compare_digest(sign_webhook(body, secret), hmac_header)
 
-def _shopify_session() -> requests.Session:
-    token = os.getenv("API_TOKEN")
-    session = requests.Session()
-    session.headers.update({
-        "X-Shopify-Access-Token": token,
-        "Content-Type": "application/json",
-    })
-    return session
 
-
-def _update_variant_prices(product_id: int, price: str) -> None:
-    session = _shopify_session()
-    domain = os.getenv("SHOP_DOMAIN")
-    base_url = f"https://{domain}/admin/api/{API_VERSION}"
-    resp = session.get(f"{base_url}/products/{product_id}.json", timeout=30)
-    resp.raise_for_status()
-    variants = [v["id"] for v in resp.json().get("product", {}).get("variants", [])]
-    if not variants:
-        return
-    mutation = """
-    mutation BulkUpdate($productId: ID!, $variants: [ProductVariantsBulkInput!]!) {
-      productVariantsBulkUpdate(productId: $productId, variants: $variants) {
-        userErrors { field message }
+VARIANTS_QUERY = """
+query ProductVariants($ids: [ID!]!) {
+  nodes(ids: $ids) {
+    ... on Product {
+      id
+      variants(first: 100) {
+        nodes { id price compareAtPrice }
       }
     }
+  }
+}
+"""
+
+# Products per variants query, keeping its cost under Shopify's 1000 points.
+VARIANTS_QUERY_IDS = 8
+
+
+def _bulk_threshold() -> int:
+    try:
+        return int(os.getenv("WEBHOOK_BULK_THRESHOLD", "100"))
+    except ValueError:
+        return 100
+
+
+def _legacy_id(gid) -> int:
+    return int(str(gid).rsplit("/", 1)[-1])
+
+
+def _fetch_variants(session, product_ids):
+    """Return ``{product_id: variants}``, asking Shopify only for index misses."""
+    index = variant_index.get_index()
+    found, missing = {}, []
+    for pid in product_ids:
+        variants = index.get(pid)
+        if variants is None:
+            missing.append(pid)
+        else:
+            found[pid] = variants
+    for i in range(0, len(missing), VARIANTS_QUERY_IDS):
+        chunk = missing[i:i+VARIANTS_QUERY_IDS]
+        resp = shopify_client.graphql_post(
+            session,
+            VARIANTS_QUERY,
+            {"ids": [shopify_client.product_gid(pid) for pid in chunk]},
+        )
+        for node in shopify_client.graphql_data(resp).get("nodes") or []:
+            if not node:
+                continue
+            pid = _legacy_id(node["id"])
+            variants = [
+                (_legacy_id(n["id"]), n.get("price"), n.get("compareAtPrice"))
+                for n in node.get("variants", {}).get("nodes", [])
+            ]
+            index.put(pid, variants)
+            found[pid] = variants
+    return found
+
+
+def _same_price(a, b) -> bool:
+    try:
+        return a is not None and Decimal(str(a)) == Decimal(str(b))
+    except InvalidOperation:
+        return False
+
+
+def _send_groups(session, groups):
+    """Push ``(product_id, variant_inputs)`` groups; return per-product errors.
+
+    Large batches go through one bulk mutation, smaller ones through aliased
+    documents packed up to the per-request cost ceiling.
     """
-    variables_base = {"productId": f"gid://shopify/Product/{product_id}"}
-    chunks = [variants[i:i+50] for i in range(0, len(variants), 50)]
-    for chunk in chunks:
-        vars_payload = {
-            **variables_base,
-            "variants": [
+    errors = {}
+    if len({pid for pid, _ in groups}) >= _bulk_threshold():
+        for pid, _, error in shopify_client.send_bulk_updates(session, groups):
+            if error:
+                errors[pid] = error
+        return errors
+    for pid, _, _, error in shopify_client.send_packed_updates(session, groups):
+        if error:
+            errors[pid] = error
+    return errors
+
+
+def _update_products(prices):
+    """Set every variant of each product in ``prices`` to its price.
+
+    ``prices`` maps product ID to price.  Variants already carrying the price
+    are left alone.  Returns ``{product_id: error}`` for failed products.
+    """
+    session = shopify_client.get_session()
+    try:
+        variants = _fetch_variants(session, list(prices))
+    except Exception as exc:
+        return {pid: str(exc) for pid in prices}
+    groups, changed = [], {}
+    for pid, price in prices.items():
+        stale = [
+            vid
+            for vid, current, compare_at in variants.get(pid, [])
+            if not (_same_price(current, price) and _same_price(compare_at, price))
+        ]
+        if not stale:
+            continue
+        changed[pid] = set(stale)
+        for i in range(0, len(stale), 50):
+            groups.append((pid, [
                 {
                     "id": f"gid://shopify/ProductVariant/{vid}",
                     "price": price,
                     "compareAtPrice": price,
                 }
-                for vid in chunk
-            ],
-        }
-        resp = session.post(
-            f"https://{domain}/admin/api/{API_VERSION}/graphql.json",
-            json={"query": mutation, "variables": vars_payload},
-            timeout=30,
-        )
-        resp.raise_for_status()
-        data = resp.json().get("data", {})
-        errors = data.get("productVariantsBulkUpdate", {}).get("userErrors")
-        if errors:
-            raise Exception(f"Bulk update errors: {errors}")
+                for vid in stale[i:i+50]
+            ]))
+    if not groups:
+        return {}
+    errors = _send_groups(session, groups)
+    index = variant_index.get_index()
+    now = time.time()
+    for pid, stale in changed.items():
+        if pid in errors:
+            index.delete(pid)
+            continue
+        price = prices[pid]
+        index.put(pid, [
+            (vid, price, price) if vid in stale else (vid, current, compare_at)
+            for vid, current, compare_at in variants[pid]
+        ], now)
+    return errors
+
+
+def _update_variant_prices(product_id: int, price: str) -> None:
+    error = _update_products({product_id: price}).get(product_id)
+    if error:
+        raise Exception(error)
+
+
+def _process_deliveries(prices):
+    trace = os.path.join(jobqueue.job_dir(jobqueue.webhook_trace_id()), tracing.TRACE_NAME)
+    with tracing.trace_to(trace):
+        return _update_products(prices)
+
+
+webhook_queue.set_handler(_process_deliveries)
+
+
+def _event_time(updated_at):
+    """Return the Shopify timestamp of a change as epoch seconds, if known."""
+    for raw in (updated_at, request.headers.get("X-Shopify-Triggered-At")):
+        if not raw:
+            continue
+        try:
+            return datetime.fromisoformat(str(raw)).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def _accept(product_id, price, updated_at=None):
+    """Queue a verified delivery and acknowledge it immediately."""
+    webhook_queue.enqueue(
+        request.headers.get("X-Shopify-Webhook-Id"),
+        request.headers.get("X-Shopify-Topic", ""),
+        product_id,
+        price,
+        _event_time(updated_at),
+    )
+    return "", 200
 
 
 @webhook_bp.route("/webhook/metafield", methods=["POST"])
@@ -79,13 +204,11 @@ def metafield_update():
         return "Unauthorized", 401
     data = request.get_json() or {}
     if data.get("namespace") == "custom" and data.get("key") == "base_price":
-        price = str(data.get("value"))
-        product_id = data.get("owner_id")
         try:
-            _update_variant_prices(product_id, price)
-        except Exception as exc:
-            print(f"Webhook error: {exc}")
-            return "", 500
+            product_id = int(data.get("owner_id"))
+        except (TypeError, ValueError):
+            return "", 200
+        return _accept(product_id, str(data.get("value")), data.get("updated_at"))
     return "", 200
 
 
@@ -105,9 +228,32 @@ def metaobject_update():
         price = str(payload["data"]["price"])
     except Exception:
         return "", 200
+    return _accept(product_id, price, payload.get("updated_at"))
+
+
+@webhook_bp.route("/webhook/product", methods=["POST"])
+@csrf.exempt
+def product_update():
+    """Keep the variant index current from ``products/update``/``delete``."""
+    if not _verify_webhook(
+        request.data, request.headers.get("X-Shopify-Hmac-SHA256", "")
+    ):
+        return "Unauthorized", 401
+    payload = request.get_json() or {}
     try:
-        _update_variant_prices(product_id, price)
-    except Exception as exc:
-        print(f"Webhook error: {exc}")
-        return "", 500
+        product_id = int(payload["id"])
+    except Exception:
+        return "", 200
+    index = variant_index.get_index()
+    if request.headers.get("X-Shopify-Topic") == "products/delete":
+        index.delete(product_id)
+    else:
+        index.put(
+            product_id,
+            [
+                (v["id"], v.get("price"), v.get("compare_at_price"))
+                for v in payload.get("variants", [])
+            ],
+            _event_time(payload.get("updated_at")),
+        )
     return "", 200
@@ -0,0 +1,658 @@
+"""Durable queue for verified Shopify webhook deliveries.
+
+Deliveries are written to a small SQLite database and acknowledged right
+away; a pool of background threads applies them afterwards.  The
+``X-Shopify-Webhook-Id`` header is the primary key, so redeliveries of a
+webhook that was already accepted are ignored.
+
+Work is scheduled per product.  The first delivery for a product opens a
+short coalescing window (``WEBHOOK_COALESCE_SECONDS``); when it closes only
+the newest pending price is applied and the older deliveries are marked
+``coalesced``.  Deliveries whose Shopify timestamp is older than the last
+value applied to the product are marked ``stale`` and never applied, and a
+per-product lock guarantees at most one update per product at a time.
+Across processes the claim does: deliveries are claimed under a unique
+``claimed_by`` token, and never while another claim on the same product is
+running.  Claims carry a ``claimed_at`` lease: a process only takes back
+``running`` deliveries whose claim is older than ``CLAIM_LEASE`` seconds,
+so workers of other live processes keep the ones they are applying.
+
+Products whose window has closed are collected for a further
+``WEBHOOK_BATCH_SECONDS`` (up to ``WEBHOOK_BATCH_MAX`` products) and handed
+to the handler together, so one GraphQL request can update many products.
+Batches run on a pool of ``WEBHOOK_WORKERS`` threads.
+
+Jobs that rewrite prices wholesale (``scripts/pipeline.py``) pause
+processing with ``paused()``: deliveries are still accepted and stored but
+stay pending until the pause is lifted.  Pauses are leases, so a job that
+dies holds webhooks back for at most ``PAUSE_LEASE`` seconds.  The base
+prices such a job wrote are remembered for ``ECHO_TTL`` seconds after it
+resumes, because Shopify's webhooks for them may arrive late.  The first
+delivery carrying exactly that price and a Shopify timestamp no later than
+the job's writes is that echo and is marked ``stale``; any other delivery
+applied to the product forgets the echo.
+
+``leased()`` takes a named lease in the same database, so periodic work
+started by every app process runs in only one of them.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+
+from scripts import metrics
+
+MAX_ATTEMPTS = 5
+RETENTION_SECONDS = 7 * 24 * 3600
+# Seconds a pause lasts unless renewed, and how often paused products are retried.
+PAUSE_LEASE = 300
+PAUSE_RETRY = 5
+# Seconds after which a delivery claimed by a worker counts as abandoned.
+CLAIM_LEASE = 300
+# Seconds the base prices written during a pause keep their echoes dropped.
+ECHO_TTL = 3600
+# Clock skew allowed between Shopify's timestamps and ours when matching echoes.
+ECHO_SKEW = 5
+
+_pending = queue.Queue()
+_handler = None
+_executor = None
+_started = False
+_start_lock = threading.Lock()
+_initialized = set()
+
+_scheduled = set()
+_schedule_lock = threading.Lock()
+_product_locks = {}
+_product_locks_guard = threading.Lock()
+
+DELIVERIES = metrics.counter(
+    "webhook_deliveries_total", "Webhook deliveries received.", ("topic", "result")
+)
+PROCESSING_SECONDS = metrics.histogram(
+    "webhook_processing_seconds",
+    "Time from receiving a webhook until it was settled, by final status.",
+    ("status",),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deliveries (
+    webhook_id   TEXT PRIMARY KEY,
+    topic        TEXT NOT NULL,
+    product_id   INTEGER NOT NULL,
+    price        TEXT NOT NULL,
+    status       TEXT NOT NULL DEFAULT 'pending',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    last_error   TEXT,
+    received_at  REAL NOT NULL,
+    processed_at REAL
+);
+CREATE INDEX IF NOT EXISTS deliveries_status ON deliveries (status);
+CREATE TABLE IF NOT EXISTS products (
+    product_id INTEGER PRIMARY KEY,
+    price      TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pauses (
+    owner TEXT PRIMARY KEY,
+    since REAL NOT NULL,
+    until REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name  TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    until REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS echoes (
+    product_id INTEGER PRIMARY KEY,
+    price      TEXT NOT NULL,
+    written_at REAL NOT NULL DEFAULT 0,
+    until      REAL NOT NULL
+);
+"""
+
+
+def _db_path():
+    return os.getenv("WEBHOOK_QUEUE_DB", "webhook_queue.sqlite3")
+
+
+def _migrate(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(deliveries)")}
+    if "updated_at" not in columns:
+        conn.execute("ALTER TABLE deliveries ADD COLUMN updated_at REAL")
+        conn.execute("UPDATE deliveries SET updated_at = received_at")
+    if "claimed_at" not in columns:
+        conn.execute("ALTER TABLE deliveries ADD COLUMN claimed_at REAL")
+    if "claimed_by" not in columns:
+        conn.execute("ALTER TABLE deliveries ADD COLUMN claimed_by TEXT")
+    if "written_at" not in {row[1] for row in conn.execute("PRAGMA table_info(echoes)")}:
+        conn.execute("ALTER TABLE echoes ADD COLUMN written_at REAL NOT NULL DEFAULT 0")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS deliveries_product "
+        "ON deliveries (product_id, status)"
+    )
+
+
+def _connect():
+    path = _db_path()
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    if path not in _initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _migrate(conn)
+        conn.execute(
+            "DELETE FROM deliveries WHERE status != 'pending' AND received_at < ?",
+            (time.time() - RETENTION_SECONDS,),
+        )
+        conn.commit()
+        _initialized.add(path)
+    return conn
+
+
+def _worker_count():
+    try:
+        return max(0, int(os.getenv("WEBHOOK_WORKERS", "4")))
+    except ValueError:
+        return 4
+
+
+def _float_env(name, default):
+    try:
+        return max(0.0, float(os.getenv(name, default)))
+    except ValueError:
+        return float(default)
+
+
+def _coalesce_window():
+    return _float_env("WEBHOOK_COALESCE_SECONDS", "2")
+
+
+def _batch_window():
+    return _float_env("WEBHOOK_BATCH_SECONDS", "1")
+
+
+def _batch_max():
+    return max(1, int(_float_env("WEBHOOK_BATCH_MAX", "250")))
+
+
+def set_handler(func):
+    """Register the delivery processor.
+
+    ``func`` receives ``{product_id: price}`` and returns
+    ``{product_id: error}`` for the products that could not be updated.
+    """
+    global _handler
+    _handler = func
+
+
+def enqueue(webhook_id, topic, product_id, price, updated_at=None):
+    """Persist a delivery; return ``False`` if it was already received.
+
+    ``updated_at`` is the Shopify-side timestamp of the change (epoch
+    seconds) and decides which of several deliveries is the newest.
+    """
+    webhook_id = webhook_id or str(uuid.uuid4())
+    received_at = time.time()
+    start_workers()
+    conn = _connect()
+    try:
+        with conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO deliveries "
+                "(webhook_id, topic, product_id, price, received_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    webhook_id,
+                    topic,
+                    int(product_id),
+                    str(price),
+                    received_at,
+                    received_at if updated_at is None else float(updated_at),
+                ),
+            )
+    finally:
+        conn.close()
+    if cur.rowcount == 0:
+        DELIVERIES.inc(topic=topic, result="duplicate")
+        return False
+    DELIVERIES.inc(topic=topic, result="accepted")
+    if _started:
+        _schedule(int(product_id), _coalesce_window())
+    return True
+
+
+def _schedule(product_id, delay):
+    with _schedule_lock:
+        if product_id in _scheduled:
+            return
+        _scheduled.add(product_id)
+    timer = threading.Timer(delay, _pending.put, args=(product_id,))
+    timer.daemon = True
+    timer.start()
+
+
+def _product_lock(product_id):
+    with _product_locks_guard:
+        lock = _product_locks.get(product_id)
+        if lock is None:
+            lock = _product_locks[product_id] = threading.Lock()
+        return lock
+
+
+def _claim(conn, product_id):
+    """Claim the pending deliveries of ``product_id`` and return them.
+
+    Returns nothing while deliveries of the product claimed elsewhere (by
+    another thread or process) are still running.
+    """
+    token = uuid.uuid4().hex
+    with conn:
+        conn.execute(
+            "UPDATE deliveries SET status = 'running', attempts = attempts + 1, "
+            "claimed_at = ?, claimed_by = ? "
+            "WHERE product_id = ? AND status = 'pending' AND NOT EXISTS ("
+            "SELECT 1 FROM deliveries WHERE product_id = ? AND status = 'running')",
+            (time.time(), token, product_id, product_id),
+        )
+        return conn.execute(
+            "SELECT * FROM deliveries WHERE claimed_by = ? AND status = 'running' "
+            "ORDER BY updated_at, received_at",
+            (token,),
+        ).fetchall()
+
+
+def _observe(rows, status):
+    now = time.time()
+    for row in rows:
+        PROCESSING_SECONDS.observe(now - row["received_at"], status=status)
+
+
+def _finish(conn, webhook_ids, status, error=None):
+    conn.executemany(
+        "UPDATE deliveries SET status = ?, last_error = ?, processed_at = ? "
+        "WHERE webhook_id = ?",
+        [(status, error, time.time(), wid) for wid in webhook_ids],
+    )
+
+
+def _record_success(conn, product_id, rows):
+    latest = rows[-1]
+    conn.execute(
+        "INSERT INTO products (product_id, price, updated_at) "
+        "VALUES (?, ?, ?) ON CONFLICT(product_id) DO UPDATE SET "
+        "price = excluded.price, updated_at = excluded.updated_at",
+        (product_id, latest["price"], latest["updated_at"]),
+    )
+    conn.execute("DELETE FROM echoes WHERE product_id = ?", (product_id,))
+    _finish(conn, [latest["webhook_id"]], "done")
+    _finish(conn, [r["webhook_id"] for r in rows[:-1]], "coalesced")
+    _observe(rows[-1:], "done")
+    _observe(rows[:-1], "coalesced")
+
+
+def _record_failure(conn, rows, error):
+    """Return the retry delay, or ``None`` once attempts are exhausted."""
+    print(f"Webhook error: {error}")
+    attempts = max(r["attempts"] for r in rows)
+    retry = attempts < MAX_ATTEMPTS
+    if not retry:
+        _observe(rows, "failed")
+    _finish(conn, [r["webhook_id"] for r in rows], "pending" if retry else "failed", str(error))
+    return min(60, 2 ** attempts) if retry else None
+
+
+def pause(owner, seconds=PAUSE_LEASE):
+    """Hold deliveries back for ``seconds`` on behalf of ``owner``.
+
+    Calling it again renews the lease; the start of the pause is kept.
+    """
+    now = time.time()
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO pauses (owner, since, until) VALUES (?, ?, ?) "
+                "ON CONFLICT(owner) DO UPDATE SET until = excluded.until",
+                (owner, now, now + seconds),
+            )
+    finally:
+        conn.close()
+
+
+def _same_price(a, b):
+    try:
+        return Decimal(str(a)) == Decimal(str(b))
+    except InvalidOperation:
+        return False
+
+
+def resume(owner, written=None):
+    """Lift ``owner``'s pause.
+
+    ``written`` maps product IDs to the base prices ``owner`` set itself.
+    Deliveries received during the pause that carry exactly that price are
+    only the echo of those writes and are marked ``stale``; everything else
+    is applied as usual.  The echoes that have not arrived yet are kept for
+    ``ECHO_TTL`` seconds and dropped when they do (see ``process_batch``).
+    Returns the number of deliveries dropped now.
+    """
+    now = time.time()
+    conn = _connect()
+    try:
+        with conn:
+            row = conn.execute("SELECT since FROM pauses WHERE owner = ?", (owner,)).fetchone()
+            conn.execute("DELETE FROM pauses WHERE owner = ?", (owner,))
+            conn.execute("DELETE FROM echoes WHERE until <= ?", (now,))
+            if row is None or not written:
+                return 0
+            echoes = [
+                r for r in conn.execute(
+                    "SELECT * FROM deliveries WHERE status = 'pending' AND received_at >= ?",
+                    (row["since"],),
+                )
+                if r["product_id"] in written and _same_price(r["price"], written[r["product_id"]])
+            ]
+            _finish(conn, [r["webhook_id"] for r in echoes], "stale")
+            # Every write was made before ``now``, the time echoes are checked against.
+            arrived = {r["product_id"] for r in echoes}
+            conn.executemany(
+                "INSERT INTO echoes (product_id, price, written_at, until) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(product_id) DO UPDATE SET price = excluded.price, "
+                "written_at = excluded.written_at, until = excluded.until",
+                [
+                    (int(pid), str(price), now, now + ECHO_TTL)
+                    for pid, price in written.items() if int(pid) not in arrived
+                ],
+            )
+    finally:
+        conn.close()
+    _observe(echoes, "stale")
+    return len(echoes)
+
+
+def _take_echo(conn, delivery):
+    """Consume the echo ``delivery`` is, if any; return whether it was one."""
+    with conn:
+        row = conn.execute(
+            "SELECT price, written_at FROM echoes WHERE product_id = ? AND until > ?",
+            (delivery["product_id"], time.time()),
+        ).fetchone()
+        echo = (
+            row is not None
+            and _same_price(row["price"], delivery["price"])
+            and delivery["updated_at"] <= row["written_at"] + ECHO_SKEW
+        )
+        if echo:
+            conn.execute("DELETE FROM echoes WHERE product_id = ?", (delivery["product_id"],))
+    return echo
+
+
+def paused_until():
+    """End of the longest active pause (epoch seconds), or ``None``."""
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT MAX(until) AS until FROM pauses WHERE until > ?", (time.time(),)).fetchone()
+    finally:
+        conn.close()
+    return row["until"]
+
+
+@contextmanager
+def paused(owner, lease=PAUSE_LEASE):
+    """Pause deliveries for the duration of the ``with`` block.
+
+    The lease is renewed in the background while the block runs.  Yields a
+    dict the caller fills with the base prices it writes (see ``resume``).
+    """
+    written = {}
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(lease / 3):
+            pause(owner, lease)
+
+    pause(owner, lease)
+    renewer = threading.Thread(target=renew, daemon=True)
+    renewer.start()
+    try:
+        yield written
+    finally:
+        stop.set()
+        renewer.join()
+        resume(owner, written)
+
+
+def _take_lease(name, owner, until):
+    """Set ``name``'s lease to ``owner`` unless another owner holds it."""
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO leases (name, owner, until) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, until = excluded.until "
+                "WHERE leases.owner = excluded.owner OR leases.until <= ?",
+                (name, owner, until, time.time()),
+            )
+            row = conn.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()
+    finally:
+        conn.close()
+    return row["owner"] == owner
+
+
+@contextmanager
+def leased(name, seconds):
+    """Hold the lease ``name`` for the ``with`` block; yields whether it was taken.
+
+    Only one process holds a lease at a time.  It is renewed while the block
+    runs and kept until ``seconds`` after it was taken, so the other
+    processes also skip the rest of that period.
+    """
+    owner = uuid.uuid4().hex
+    taken = time.time()
+    if not _take_lease(name, owner, taken + seconds):
+        yield False
+        return
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(seconds / 3):
+            _take_lease(name, owner, time.time() + seconds)
+
+    renewer = threading.Thread(target=renew, daemon=True)
+    renewer.start()
+    try:
+        yield True
+    finally:
+        stop.set()
+        renewer.join()
+        _take_lease(name, owner, max(taken + seconds, time.time()))
+
+
+def process_batch(product_ids):
+    """Apply the newest pending delivery of every product in ``product_ids``.
+
+    Returns ``{product_id: delay}`` for products that should be retried.
+    Products currently being updated by another batch are retried shortly,
+    and every product is while deliveries are paused.
+    """
+    until = paused_until()
+    if until is not None:
+        delay = max(0.1, min(PAUSE_RETRY, until - time.time()))
+        return {product_id: delay for product_id in dict.fromkeys(product_ids)}
+    retries = {}
+    locked = []
+    for product_id in dict.fromkeys(product_ids):
+        lock = _product_lock(product_id)
+        if lock.acquire(blocking=False):
+            locked.append((product_id, lock))
+        else:
+            retries[product_id] = 0.5
+    try:
+        conn = _connect()
+        try:
+            claimed = {}
+            for product_id, _ in locked:
+                rows = _claim(conn, product_id)
+                if not rows:
+                    pending = conn.execute(
+                        "SELECT 1 FROM deliveries WHERE product_id = ? AND status = 'pending' LIMIT 1",
+                        (product_id,),
+                    ).fetchone()
+                    if pending:
+                        # Another process is applying this product.
+                        retries[product_id] = 0.5
+                    continue
+                applied = conn.execute(
+                    "SELECT updated_at FROM products WHERE product_id = ?",
+                    (product_id,),
+                ).fetchone()
+                # A late echo of a paused job's own write: the product already
+                # has the prices that job gave it.
+                echo = _take_echo(conn, rows[-1])
+                if echo or (applied is not None and rows[-1]["updated_at"] < applied["updated_at"]):
+                    with conn:
+                        _finish(conn, [r["webhook_id"] for r in rows], "stale")
+                    _observe(rows, "stale")
+                    continue
+                claimed[product_id] = rows
+            if not claimed:
+                return retries
+            try:
+                errors = _handler({pid: rows[-1]["price"] for pid, rows in claimed.items()}) or {}
+            except Exception as exc:
+                errors = {pid: exc for pid in claimed}
+            with conn:
+                for product_id, rows in claimed.items():
+                    if errors.get(product_id):
+                        delay = _record_failure(conn, rows, errors[product_id])
+                        if delay is not None:
+                            retries[product_id] = delay
+                    else:
+                        _record_success(conn, product_id, rows)
+            return retries
+        finally:
+            conn.close()
+    finally:
+        for _, lock in locked:
+            lock.release()
+
+
+def _run_batch(product_ids):
+    try:
+        for product_id, delay in process_batch(product_ids).items():
+            _schedule(product_id, delay)
+    except Exception as exc:
+        print(f"Webhook worker error: {exc}")
+
+
+def _dispatcher():
+    while True:
+        batch = [_pending.get()]
+        deadline = time.monotonic() + _batch_window()
+        limit = _batch_max()
+        while len(batch) < limit:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        with _schedule_lock:
+            _scheduled.difference_update(batch)
+        _executor.submit(_run_batch, batch)
+
+
+def _pending_products(conn):
+    rows = conn.execute(
+        "SELECT product_id FROM deliveries WHERE status = 'pending' "
+        "GROUP BY product_id ORDER BY MIN(received_at)"
+    ).fetchall()
+    return [row["product_id"] for row in rows]
+
+
+def _recover(startup=False):
+    """Reschedule deliveries whose claim lease has expired.
+
+    Their worker died with its process (or hangs).  Claims younger than
+    ``CLAIM_LEASE`` may belong to a live process and are left alone.  At
+    ``startup`` every pending product is scheduled as well.
+    """
+    cutoff = time.time() - CLAIM_LEASE
+    conn = _connect()
+    try:
+        with conn:
+            expired = [
+                row["product_id"] for row in conn.execute(
+                    "SELECT DISTINCT product_id FROM deliveries WHERE status = 'running' "
+                    "AND (claimed_at IS NULL OR claimed_at < ?)",
+                    (cutoff,),
+                )
+            ]
+            conn.execute(
+                "UPDATE deliveries SET status = 'pending' WHERE status = 'running' "
+                "AND (claimed_at IS NULL OR claimed_at < ?)",
+                (cutoff,),
+            )
+        products = _pending_products(conn) if startup else expired
+    finally:
+        conn.close()
+    for product_id in products:
+        _schedule(product_id, 0)
+
+
+def _sweeper():
+    while True:
+        time.sleep(CLAIM_LEASE / 2)
+        try:
+            _recover()
+        except Exception as exc:
+            print(f"Webhook recovery error: {exc}")
+
+
+def start_workers():
+    global _executor, _started
+    with _start_lock:
+        if _started:
+            return
+        count = _worker_count()
+        if not count:
+            return
+        _executor = ThreadPoolExecutor(max_workers=count, thread_name_prefix="webhook")
+        threading.Thread(target=_dispatcher, daemon=True).start()
+        threading.Thread(target=_sweeper, daemon=True).start()
+        _started = True
+    _recover(startup=True)
+
+
+def drain():
+    """Process every pending delivery in the calling thread.
+
+    Used when ``WEBHOOK_WORKERS=0`` (tests, one-off maintenance runs); the
+    coalescing window is not waited for.
+    """
+    conn = _connect()
+    try:
+        products = _pending_products(conn)
+    finally:
+        conn.close()
+    if products:
+        process_batch(products)
+
+
+def status(webhook_id):
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT * FROM deliveries WHERE webhook_id = ?", (webhook_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None